@@ -0,0 +1,125 @@
+"""Markdown chunking and token counting throughput (chunks/sec) over a multi-megabyte corpus.
+
+The old path built a new splitter for every document and encoded each chunk
+on its own; the pipeline in :mod:`scraper.chunking` reuses one splitter and
+counts a whole batch of chunks with tiktoken's threaded batch encoder.
+Token-sized chunking is measured as well. Point ``--corpus`` at a directory
+of ``.md`` files, or leave it out to use generated documents:
+
+    python -m benchmarks.bench_chunking --megabytes 8 --threads 8
+"""
+import argparse
+import os
+import random
+import time
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from langchain_text_splitters import MarkdownTextSplitter  # noqa: E402
+
+from scraper.chunking import (  # noqa: E402
+    UNIT_CHARS, UNIT_TOKENS, chunk_documents, format_header_metadata, tokenizer,
+)
+
+WORDS = (
+    'crawler sitemap page content request response browser render token chunk markdown header '
+    'section table list link index domain cache worker process thread queue batch throughput'
+).split()
+
+
+def generated_document(number, target_bytes, rng):
+    parts = [f"# Document {number}\n"]
+    size = 0
+    section = 0
+    while size < target_bytes:
+        section += 1
+        parts.append(f"\n## Section {section}\n")
+        for _ in range(rng.randint(2, 5)):
+            paragraph = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))).capitalize() + '.'
+            parts.append(paragraph + '\n\n')
+            size += len(paragraph)
+        if section % 3 == 0:
+            parts.append('```python\n' + '\n'.join(f"value_{i} = {i}" for i in range(8)) + '\n```\n')
+        if section % 4 == 0:
+            parts.append(''.join(f"- {rng.choice(WORDS)} {rng.choice(WORDS)}\n" for _ in range(6)))
+    return ''.join(parts)
+
+
+def load_corpus(directory, megabytes, document_kb):
+    if directory:
+        paths = sorted(Path(directory).expanduser().glob('**/*.md'))
+        return [
+            {'url': path.as_uri(), 'title': path.stem, 'content': path.read_text(encoding='utf-8', errors='ignore')}
+            for path in paths
+        ]
+    rng = random.Random(13)
+    count = max(1, int(megabytes * 1024 / document_kb))
+    return [
+        {'url': f"https://docs.example.com/page/{number}", 'title': f"Page {number}",
+         'content': generated_document(number, document_kb * 1024, rng)}
+        for number in range(count)
+    ]
+
+
+def old_chunking(documents, chunk_size, chunk_overlap):
+    chunks = 0
+    for document in documents:
+        header = format_header_metadata(document['title'], document['url'])
+        splitter = MarkdownTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        final_chunks = [f"{header}\n\n{chunk}" for chunk in splitter.split_text(document['content'])]
+        [len(tokenizer.encode(chunk)) for chunk in final_chunks]
+        chunks += len(final_chunks)
+    return chunks
+
+
+def pipeline_chunking(documents, chunk_size, chunk_overlap, unit):
+    return sum(len(batch) for batch in chunk_documents(documents, chunk_size, chunk_overlap, unit))
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    chunks = func(*args)
+    return chunks, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', help='directory of .md files (searched recursively)')
+    parser.add_argument('--megabytes', type=float, default=4, help='size of the generated corpus')
+    parser.add_argument('--document-kb', type=int, default=24, help='size of each generated document')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='characters per chunk')
+    parser.add_argument('--chunk-overlap', type=int, default=200)
+    parser.add_argument('--token-chunk-size', type=int, default=256, help='tokens per chunk in token mode')
+    parser.add_argument('--token-chunk-overlap', type=int, default=32)
+    parser.add_argument('--threads', type=int, help='tokenizer threads (default SCRAPER_TOKENIZER_THREADS)')
+    args = parser.parse_args()
+
+    if args.threads:
+        settings.SCRAPER_TOKENIZER_THREADS = args.threads
+    documents = load_corpus(args.corpus, args.megabytes, args.document_kb)
+    if not documents:
+        parser.error('no .md files found')
+    megabytes = sum(len(document['content']) for document in documents) / 1e6
+    print(f"{len(documents)} documents, {megabytes:.1f} MB of markdown, "
+          f"{getattr(settings, 'SCRAPER_TOKENIZER_THREADS', 4)} tokenizer threads")
+
+    runs = [
+        ('old, chars', old_chunking, (documents, args.chunk_size, args.chunk_overlap)),
+        ('pipeline, chars', pipeline_chunking, (documents, args.chunk_size, args.chunk_overlap, UNIT_CHARS)),
+        ('pipeline, tokens', pipeline_chunking,
+         (documents, args.token_chunk_size, args.token_chunk_overlap, UNIT_TOKENS)),
+    ]
+    for label, func, func_args in runs:
+        chunks, seconds = timed(func, *func_args)
+        print(f"{label:>17}: {chunks:6d} chunks in {seconds:6.2f}s, {chunks / seconds:8.1f} chunks/sec, "
+              f"{megabytes / seconds:5.2f} MB/sec")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Pages/sec and event-loop latency of fetch + clean under concurrent load.
+
+Fetches pages from the local fixture site with ``fetch_url`` at a fixed
+concurrency while a probe task measures how late the event loop wakes up.
+Cleaning inline on the loop (the old behaviour) is compared with the
+process pool, for each installed parser backend:
+
+    python -m benchmarks.bench_cleaning --pages 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import override_settings  # noqa: E402
+
+from benchmarks.fixture_server import FixtureHandler, FixtureServer  # noqa: E402
+from scraper.cleaning import PARSER_PREFERENCE, cleaning_pool, parser_available  # noqa: E402
+from scraper.http_client import close_http_client  # noqa: E402
+from scraper.utils import fetch_url  # noqa: E402
+
+PROBE_INTERVAL = 0.005
+
+
+async def probe_loop(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(loop.time() - started - PROBE_INTERVAL)
+
+
+async def fetch_all(server, pages, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(number):
+        async with semaphore:
+            result = await fetch_url(server.url(f'/page/{number % FixtureHandler.page_count}.html'))
+            return len(result.content)
+
+    lags, stop = [], asyncio.Event()
+    probe = asyncio.ensure_future(probe_loop(lags, stop))
+    try:
+        started = time.perf_counter()
+        sizes = await asyncio.gather(*(fetch(number) for number in range(pages)))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        await probe
+        await close_http_client()
+    return elapsed, sizes, lags
+
+
+def run(label, server, pages, concurrency, **overrides):
+    with override_settings(**overrides):
+        # Start the workers before timing so process spawn is not measured.
+        asyncio.run(cleaning_pool.clean('<p>warm up</p>'))
+        elapsed, sizes, lags = asyncio.run(fetch_all(server, pages, concurrency))
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(f"{label:>28}: {pages / elapsed:7.1f} pages/sec, loop lag median {statistics.median(lags_ms):6.1f}ms "
+          f"p99 {p99:6.1f}ms max {lags_ms[-1]:6.1f}ms ({sum(sizes) // max(1, pages)} chars/page)")
+    cleaning_pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--paragraphs', type=int, default=400, help='paragraphs per fixture page')
+    parser.add_argument('--workers', type=int, default=None, help='cleaning processes (default: CPU count)')
+    args = parser.parse_args()
+
+    FixtureHandler.paragraphs = args.paragraphs
+    backends = [backend for backend in reversed(PARSER_PREFERENCE) if parser_available(backend)]
+    with FixtureServer() as server:
+        run('inline html.parser', server, args.pages, args.concurrency,
+            SCRAPER_CLEAN_WORKERS=0, SCRAPER_HTML_PARSER='html.parser')
+        for backend in backends:
+            run(f'pool {backend}', server, args.pages, args.concurrency,
+                SCRAPER_CLEAN_WORKERS=args.workers, SCRAPER_HTML_PARSER=backend)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Pages/sec of the async crawler against a synthetic local site.
+
+A sequential ``requests`` + BeautifulSoup BFS (the previous implementation of
+``crawl_website``) is run on the same site for comparison:
+
+    python -m benchmarks.bench_crawl --pages 2000
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import deque
+from urllib.parse import urljoin
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import requests  # noqa: E402
+from django.conf import settings  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+
+from benchmarks.fixture_server import FixtureHandler, FixtureServer  # noqa: E402
+from scraper.crawler import Crawler  # noqa: E402
+from scraper.http_client import close_http_client  # noqa: E402
+
+
+def sequential_crawl(root_url, max_pages):
+    visited, queue = set(), deque([root_url])
+    while queue and len(visited) < max_pages:
+        url = queue.popleft()
+        if url in visited:
+            continue
+        visited.add(url)
+        soup = BeautifulSoup(requests.get(url).content, 'html.parser')
+        for link in soup.find_all('a', href=True):
+            queue.append(urljoin(url, link['href']))
+    return len(visited)
+
+
+async def async_crawl(root_url, max_pages, workers):
+    try:
+        return len(await Crawler(root_url, max_pages=max_pages, workers=workers).crawl())
+    finally:
+        await close_http_client()
+
+
+def report(label, pages, elapsed):
+    print(f"{label:>12}: {pages} pages in {elapsed:.2f}s ({pages / elapsed:.1f} pages/sec)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--skip-sequential', action='store_true')
+    parser.add_argument('--host-rate', type=float, default=0,
+                        help='SCRAPER_HOST_RATE for the run (default 0: no per-host rate limit)')
+    args = parser.parse_args()
+
+    settings.SCRAPER_HOST_RATE = args.host_rate
+
+    FixtureHandler.page_count = args.pages
+    with FixtureServer() as server:
+        root = server.url('/page/0.html')
+        start = time.perf_counter()
+        pages = asyncio.run(async_crawl(root, args.pages, args.workers))
+        report('async', pages, time.perf_counter() - start)
+
+        if not args.skip_sequential:
+            start = time.perf_counter()
+            pages = sequential_crawl(root, args.pages)
+            report('sequential', pages, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
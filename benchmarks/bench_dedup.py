@@ -0,0 +1,143 @@
+"""Near-duplicate detection: fingerprint speed, index lookups, accuracy and what it saves chunking.
+
+Builds a synthetic site of Markdown pages, each ending with the same
+boilerplate sections, and adds near-duplicate copies of a share of them
+under other URLs (print views, tracking-parameter variants) with small
+edits: a changed date line, a replaced word, an appended footer. Then:
+
+* SimHash throughput over the corpus;
+* banded index lookups against a linear scan of every stored fingerprint;
+* page-level precision and recall against the known copies;
+* chunking the corpus without and with dedup, counting chunks and tokens.
+
+Fingerprints are kept in memory only (``SCRAPER_DEDUP_PERSIST`` is off):
+
+    python -m benchmarks.bench_dedup --pages 500 --duplicate-rate 0.3
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from scraper.chunking import chunk_batch  # noqa: E402
+from scraper.dedup import (  # noqa: E402
+    MODE_DROP, Deduplicator, FingerprintStore, SimHashIndex, hamming_distance, simhash,
+)
+
+BOILERPLATE = (
+    '## Support\n\nQuestions about this guide can be raised on the community forum, where maintainers answer '
+    'within a few days. Commercial support contracts include a guaranteed response time and access to the '
+    'private issue tracker for production incidents.\n\n'
+    '## License\n\nThis documentation is published under the Creative Commons Attribution license. Code '
+    'samples are released under the Apache license unless a page says otherwise, and may be copied freely '
+    'into your own projects.'
+)
+
+
+def sentence(rng, vocabulary):
+    return ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(8, 20))).capitalize() + '.'
+
+
+def make_page(rng, vocabulary, number, sections):
+    parts = [f'# Page {number}\n\nUpdated 2026-01-{number % 28 + 1:02d}.']
+    for section in range(sections):
+        paragraph = ' '.join(sentence(rng, vocabulary) for _ in range(rng.randint(3, 8)))
+        parts.append(f'## Topic {section}\n\n{paragraph}')
+    parts.append(BOILERPLATE)
+    return '\n\n'.join(parts)
+
+
+def near_copy(rng, vocabulary, content):
+    words = content.split(' ')
+    words[rng.randrange(len(words))] = rng.choice(vocabulary)
+    copy = ' '.join(words).replace('Updated 2026-01-', 'Updated 2026-02-', 1)
+    return copy + '\n\nPrinted from the online documentation.'
+
+
+def build_corpus(pages, sections, duplicate_rate, seed):
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+                  for _ in range(3000)]
+    documents = []
+    originals = {}
+    for number in range(pages):
+        url = f'https://docs.example.com/page/{number}.html'
+        documents.append({'url': url, 'title': f'Page {number}', 'content': make_page(rng, vocabulary, number, sections)})
+    for number in rng.sample(range(pages), int(pages * duplicate_rate)):
+        original = documents[number]
+        url = rng.choice((f'https://docs.example.com/print/{number}.html',
+                          f'https://www.example.com/page/{number}.html?ref=feed'))
+        originals[url] = original['url']
+        documents.append({'url': url, 'title': original['title'],
+                          'content': near_copy(rng, vocabulary, original['content'])})
+    rng.shuffle(documents)
+    return documents, originals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=500, help='distinct pages')
+    parser.add_argument('--sections', type=int, default=8, help='sections per page besides the boilerplate')
+    parser.add_argument('--duplicate-rate', type=float, default=0.3, help='near-duplicate copies per page')
+    parser.add_argument('--lookups', type=int, default=20000, help='index lookups to time')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--chunk-overlap', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    settings.SCRAPER_DEDUP_PERSIST = False
+
+    documents, originals = build_corpus(args.pages, args.sections, args.duplicate_rate, args.seed)
+    megabytes = sum(len(document['content']) for document in documents) / 1e6
+    print(f"{len(documents)} documents ({len(originals)} near-duplicate copies), {megabytes:.1f} MB of Markdown\n")
+
+    started = time.perf_counter()
+    fingerprints = [simhash(document['content']) for document in documents]
+    elapsed = time.perf_counter() - started
+    print(f"{'simhash':>16}: {len(documents) / elapsed:8.1f} documents/sec, {megabytes / elapsed:6.2f} MB/s")
+
+    rng = random.Random(args.seed)
+    stored = [rng.getrandbits(64) for _ in range(max(args.lookups, len(fingerprints)))]
+    index = SimHashIndex(settings.SCRAPER_DEDUP_PAGE_DISTANCE)
+    for key, fingerprint in enumerate(stored):
+        index.add(key, fingerprint)
+    probes = [stored[rng.randrange(len(stored))] ^ (1 << rng.randrange(64)) for _ in range(1000)]
+    started = time.perf_counter()
+    found = sum(index.find(probe) is not None for probe in probes)
+    indexed = (time.perf_counter() - started) / len(probes)
+    started = time.perf_counter()
+    for probe in probes[:100]:
+        min(stored, key=lambda fingerprint: hamming_distance(fingerprint, probe))
+    scanned = (time.perf_counter() - started) / 100
+    print(f"{'lookup':>16}: {indexed * 1e6:8.1f}us banded vs {scanned * 1e6:.1f}us linear scan "
+          f"over {len(stored)} fingerprints ({found}/{len(probes)} one-bit variants found)\n")
+
+    dedup = Deduplicator(MODE_DROP, FingerprintStore())
+    started = time.perf_counter()
+    flagged = {document['url']: dedup.page(document['url'], document['content']) for document in documents}
+    elapsed = time.perf_counter() - started
+    duplicates = {url for url, original in flagged.items() if original}
+    # A copy may be seen before its original, in which case the original is the one flagged.
+    pairs = {frozenset((copy, original)) for copy, original in originals.items()}
+    true_positives = sum(1 for url in duplicates if frozenset((url, flagged[url]['url'])) in pairs)
+    print(f"{'pages':>16}: {len(duplicates)} flagged in {elapsed:.2f}s, precision "
+          f"{true_positives / max(1, len(duplicates)):.1%}, recall {true_positives / max(1, len(originals)):.1%}")
+
+    for label, dedup in (('without dedup', None), ('with dedup', Deduplicator(MODE_DROP, FingerprintStore()))):
+        started = time.perf_counter()
+        records = chunk_batch(documents, args.chunk_size, args.chunk_overlap, dedup=dedup)
+        elapsed = time.perf_counter() - started
+        kept = [record for record in records if 'content' in record]
+        print(f"{label:>16}: {len(kept):6d} chunks, {sum(record['tokens'] for record in kept):9d} tokens "
+              f"in {elapsed:.2f}s" + (f", {dedup.report()}" if dedup else ''))
+
+
+if __name__ == '__main__':
+    main()
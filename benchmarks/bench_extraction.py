@@ -0,0 +1,78 @@
+"""Main-content extraction throughput and output token reduction over an HTML corpus.
+
+Every document is reduced twice, to all visible text (the old cleaning) and
+to its main content, and both are tokenized. Point ``--corpus`` at a
+directory of saved ``.html`` pages, or leave it out to use generated
+documentation pages wrapped in typical site chrome:
+
+    python -m benchmarks.bench_extraction --corpus ~/saved-pages
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from benchmarks.fixture_server import render_article_page  # noqa: E402
+from scraper.cleaning import (  # noqa: E402
+    PARSER_HTML, PARSER_LXML, clean_html_content, extract_main_content, parser_available,
+)
+
+
+def load_corpus(directory, generated):
+    if directory:
+        paths = sorted(Path(directory).expanduser().glob('**/*.html'))
+        return [path.read_text(encoding='utf-8', errors='ignore') for path in paths]
+    return [render_article_page(number, paragraphs=8 + number % 20).decode() for number in range(generated)]
+
+
+def token_counter():
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding('cl100k_base')
+        return 'tokens', lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        print(f"tiktoken unavailable ({e.__class__.__name__}), counting whitespace-separated words instead")
+        return 'words', lambda text: len(text.split())
+
+
+def measure(documents, func, parser):
+    started = time.perf_counter()
+    texts = [func(document, parser) for document in documents]
+    return texts, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', help='directory of .html files (searched recursively)')
+    parser.add_argument('--generated', type=int, default=300, help='generated pages when no corpus is given')
+    args = parser.parse_args()
+
+    documents = load_corpus(args.corpus, args.generated)
+    if not documents:
+        parser.error('no .html files found')
+    unit, count = token_counter()
+    megabytes = sum(len(document) for document in documents) / 1e6
+    print(f"{len(documents)} documents, {megabytes:.1f} MB of HTML")
+
+    for backend in (PARSER_HTML, PARSER_LXML):
+        if not parser_available(backend):
+            continue
+        full, full_time = measure(documents, clean_html_content, backend)
+        main_texts, main_time = measure(documents, extract_main_content, backend)
+        full_tokens = sum(count(text) for text in full)
+        main_tokens = sum(count(text) for text in main_texts)
+        reduction = 1 - main_tokens / full_tokens if full_tokens else 0.0
+        print(f"{backend:>12}: visible text {len(documents) / full_time:7.1f} pages/sec, {full_tokens} {unit}; "
+              f"main content {len(documents) / main_time:7.1f} pages/sec, {main_tokens} {unit} "
+              f"({reduction:.1%} fewer)")
+
+
+if __name__ == '__main__':
+    main()
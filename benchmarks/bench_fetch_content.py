@@ -0,0 +1,65 @@
+"""Requests/sec for ``/api/fetch-content/`` with and without the browser pool.
+
+Runs the Django ASGI stack in-process against a local fixture server, forcing
+the Playwright tier with ``render=1``. The page cache is off so both passes
+render every URL, and rows go to a scratch database:
+
+    python -m benchmarks.bench_fetch_content --requests 40 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import AsyncClient, override_settings  # noqa: E402
+
+from benchmarks.database import scratch_database  # noqa: E402
+from benchmarks.fixture_server import FixtureServer  # noqa: E402
+from scraper.browser_pool import browser_pool  # noqa: E402
+
+
+async def drive(urls, concurrency):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request(url):
+        async with semaphore:
+            response = await client.get('/api/fetch-content/', {'url': url, 'render': '1'})
+            return response.status_code
+
+    await request(urls[0])  # warm up (the pool launches its first browser here)
+    start = time.perf_counter()
+    statuses = await asyncio.gather(*(request(url) for url in urls))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(urls),
+        'ok': statuses.count(200),
+        'seconds': round(elapsed, 3),
+        'requests_per_sec': round(len(urls) / elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    with FixtureServer() as server, scratch_database(), override_settings(SCRAPER_CACHE_ENABLED=False):
+        urls = [server.url(f'/page/{i}.html') for i in range(args.requests)]
+        for enabled in (False, True):
+            with override_settings(SCRAPER_BROWSER_POOL_ENABLED=enabled):
+                result = asyncio.run(drive(urls, args.concurrency))
+            label = 'pooled' if enabled else 'per-request launch'
+            print(f"{label:>20}: {result}")
+    browser_pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Whole-site ingestion: the pipeline against one API call per page.
+
+Serves a synthetic site of ``--pages`` documentation pages with a sitemap,
+then ingests it twice against a scratch database:
+
+* ``pipeline``: one :class:`~scraper.ingest.IngestionPipeline` run (what
+  ``/api/ingest/`` starts), followed by its per-stage report;
+* ``per-page calls``: what the frontend did before - ``/api/fetch-sitemap/``,
+  then ``/api/fetch-content/`` and ``/api/chunk/`` for every URL, at most
+  ``--client-concurrency`` requests in flight like a browser.
+
+Near-duplicate detection is off for both unless ``--dedup`` is given, so
+they chunk the same pages:
+
+    python -m benchmarks.bench_ingest --pages 500 --fetch-concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import AsyncClient  # noqa: E402
+
+from benchmarks.database import scratch_database  # noqa: E402
+from benchmarks.fixture_server import FixtureHandler, FixtureServer, render_docs_page  # noqa: E402
+from scraper.cleaning import cleaning_pool  # noqa: E402
+from scraper.http_client import close_http_client  # noqa: E402
+from scraper.ingest import STAGES, IngestionPipeline  # noqa: E402
+from scraper.models import Chunk, SitemapURL  # noqa: E402
+
+
+class DocsHandler(FixtureHandler):
+    """The fixture site with documentation pages behind the ``/page/<n>.html`` URLs."""
+
+    def do_GET(self):
+        path = self.path.partition('?')[0]
+        if path.startswith('/page/') and path.endswith('.html'):
+            return self.send_body(render_docs_page(int(path[len('/page/'):-len('.html')]), self.sections),
+                                  'text/html; charset=utf-8')
+        return super().do_GET()
+
+
+async def run_pipeline(base_url, args):
+    try:
+        pipeline = IngestionPipeline(
+            base_url, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, dedup_mode=args.dedup,
+            concurrency={'fetch': args.fetch_concurrency, 'clean': args.clean_concurrency,
+                         'chunk': args.chunk_concurrency},
+        )
+        return await pipeline.run()
+    finally:
+        await close_http_client()
+
+
+async def run_per_page(base_url, args):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(args.client_concurrency)
+    response = await client.post('/api/fetch-sitemap/', {'domain': base_url}, content_type='application/json')
+    urls = [record['url'] for record in json.loads(response.content)['urls']]
+
+    async def ingest(url):
+        async with semaphore:
+            page = (await client.get('/api/fetch-content/', {'url': url, 'format': 'markdown'})).json()
+        async with semaphore:
+            response = await client.post('/api/chunk/', {
+                'documents': [{'url': url, 'content': page['content']}],
+                'chunk_size': args.chunk_size, 'chunk_overlap': args.chunk_overlap, 'dedup': args.dedup,
+            }, content_type='application/json')
+            body = b''.join([part async for part in response.streaming_content]).decode()
+        return sum(1 for line in body.splitlines() if '"chunk_index"' in line)
+
+    try:
+        return len(urls), sum(await asyncio.gather(*(ingest(url) for url in urls)))
+    finally:
+        await close_http_client()
+
+
+def print_stages(report):
+    print(f"{'stage':>10} {'workers':>7} {'items':>7} {'items/s':>8} {'busy s':>8} {'blocked s':>9} "
+          f"{'util':>6} {'max queue':>9}")
+    for stage in STAGES:
+        stats = report['stages'][stage]
+        print(f"{stage:>10} {stats['workers']:7d} {stats['items_in']:7d} {stats['items_per_second']:8.1f} "
+              f"{stats['busy_seconds']:8.2f} {stats['blocked_seconds']:9.2f} {stats['utilization']:6.1%} "
+              f"{stats['max_queue']:9d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--sections', type=int, default=6, help='sections per documentation page')
+    parser.add_argument('--fetch-concurrency', type=int, default=16)
+    parser.add_argument('--clean-concurrency', type=int, default=8)
+    parser.add_argument('--chunk-concurrency', type=int, default=2)
+    parser.add_argument('--client-concurrency', type=int, default=6, help='requests in flight for per-page calls')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--chunk-overlap', type=int, default=200)
+    parser.add_argument('--dedup', default='off', help="dedup mode for both runs (default 'off')")
+    parser.add_argument('--skip-per-page', action='store_true')
+    args = parser.parse_args()
+
+    settings.SCRAPER_HOST_RATE = 0
+    settings.SCRAPER_CACHE_PERSIST = False
+    settings.SCRAPER_DEDUP_PERSIST = False
+    DocsHandler.page_count = args.pages
+    DocsHandler.sections = args.sections
+
+    with scratch_database(), FixtureServer(DocsHandler) as server:
+        started = time.perf_counter()
+        report = asyncio.run(run_pipeline(server.base_url, args))
+        elapsed = time.perf_counter() - started
+        print(f"{'pipeline':>15}: {report['documents']} pages, {report['chunks']} chunks stored in {elapsed:.2f}s "
+              f"({report['documents'] / elapsed:.1f} pages/sec)")
+        print_stages(report)
+        if 'dedup' in report:
+            print(f"dedup: {report['dedup']}")
+
+        if not args.skip_per_page:
+            SitemapURL.objects.all().delete()
+            Chunk.objects.all().delete()
+            started = time.perf_counter()
+            pages, chunks = asyncio.run(run_per_page(server.base_url, args))
+            elapsed = time.perf_counter() - started
+            print(f"\n{'per-page calls':>15}: {pages} pages, {chunks} chunks returned (not stored) in {elapsed:.2f}s "
+                  f"({pages / elapsed:.1f} pages/sec)")
+    cleaning_pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
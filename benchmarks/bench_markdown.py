@@ -0,0 +1,104 @@
+"""HTML-to-Markdown conversion throughput, and what the structure buys chunking.
+
+Converts a corpus of structured documentation pages (headings, lists, code,
+tables inside typical site chrome) with the text cleaner and with the
+Markdown converter, whole page and main content only, in this process so the
+converters themselves are measured. The streamed converter is fed 16 KB
+pieces to show when the first block is ready. Then the flattened text and
+the Markdown are chunked the same way to compare chunk count, fill and the
+tokens that would be embedded. Point ``--corpus`` at a directory of
+``.html`` files to use real pages instead:
+
+    python -m benchmarks.bench_markdown --pages 200 --chunk-size 1000
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from benchmarks.fixture_server import render_docs_page  # noqa: E402
+from scraper.chunking import chunk_batch  # noqa: E402
+from scraper.cleaning import (  # noqa: E402
+    OUTPUT_MARKDOWN, PARSER_HTML, clean_html_content, clean_html_markdown, extract_main_content,
+)
+from scraper.markdown import iter_markdown  # noqa: E402
+
+STREAM_PIECE = 16 * 1024
+
+
+def load_corpus(directory, pages, sections):
+    if directory:
+        return [path.read_text(errors='ignore') for path in sorted(Path(directory).glob('*.html'))]
+    return [render_docs_page(number, sections).decode() for number in range(pages)]
+
+
+def stream(html):
+    pieces = (html[start:start + STREAM_PIECE] for start in range(0, len(html), STREAM_PIECE))
+    started = time.perf_counter()
+    first = None
+    parts = []
+    for part in iter_markdown(pieces):
+        if first is None:
+            first = time.perf_counter() - started
+        parts.append(part)
+    return ''.join(parts), first
+
+
+def convert(label, corpus, function):
+    megabytes = sum(len(html) for html in corpus) / 1e6
+    started = time.perf_counter()
+    outputs = [function(html) for html in corpus]
+    elapsed = time.perf_counter() - started
+    print(f"{label:>22}: {len(corpus) / elapsed:8.1f} pages/sec, {megabytes / elapsed:6.2f} MB/s of HTML, "
+          f"{sum(len(output) for output in outputs) // max(1, len(outputs))} chars/page out")
+    return outputs
+
+
+def chunk_stats(label, documents, chunk_size, chunk_overlap):
+    started = time.perf_counter()
+    records = chunk_batch(documents, chunk_size, chunk_overlap)
+    elapsed = time.perf_counter() - started
+    sizes = [len(record['content']) for record in records]
+    with_section = sum(1 for record in records if record['section'])
+    print(f"{label:>22}: {len(records):6d} chunks, {sum(sizes) / max(1, len(sizes)):7.1f} chars/chunk, "
+          f"{sum(record['tokens'] for record in records):9d} tokens, "
+          f"{with_section / max(1, len(records)):5.1%} with a section breadcrumb ({elapsed:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=200, help='generated pages (without --corpus)')
+    parser.add_argument('--sections', type=int, default=12, help='sections per generated page')
+    parser.add_argument('--corpus', help='directory of .html files to convert instead')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--chunk-overlap', type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.pages, args.sections)
+    print(f"{len(corpus)} pages, {sum(len(html) for html in corpus) / 1e6:.1f} MB of HTML\n")
+
+    convert('text, whole page', corpus, lambda html: clean_html_content(html, PARSER_HTML))
+    convert('markdown, whole page', corpus, clean_html_markdown)
+    texts = convert('text, main content', corpus, lambda html: extract_main_content(html, PARSER_HTML))
+    markdowns = convert('markdown, main content', corpus,
+                        lambda html: extract_main_content(html, PARSER_HTML, output=OUTPUT_MARKDOWN))
+
+    firsts = [stream(html)[1] for html in corpus]
+    print(f"{'markdown, streamed':>22}: first block after {sum(firsts) / len(firsts) * 1000:.2f}ms on average\n")
+
+    def documents(contents):
+        return [{'url': f'https://example.com/docs/{number}.html', 'title': f'Guide {number}', 'content': content}
+                for number, content in enumerate(contents)]
+
+    chunk_stats('flattened text', documents(texts), args.chunk_size, args.chunk_overlap)
+    chunk_stats('markdown sections', documents(markdowns), args.chunk_size, args.chunk_overlap)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Insert throughput of discovered URLs: row-by-row creates vs batched upserts.
+
+Runs against a scratch SQLite file, never the project database:
+
+    python -m benchmarks.bench_persistence --urls 50000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from asgiref.sync import sync_to_async  # noqa: E402
+
+from benchmarks.database import scratch_database  # noqa: E402
+from scraper.models import SitemapURL  # noqa: E402
+from scraper.storage import asave_sitemap_urls  # noqa: E402
+
+DOMAIN = 'bench.example.com'
+
+
+def make_records(count):
+    return [
+        {'url': f'https://{DOMAIN}/page/{number}.html', 'size': number, 'selected': True, 'processed': False}
+        for number in range(count)
+    ]
+
+
+async def row_by_row(records):
+    """What the views did before: one awaited ``create()`` per URL."""
+    create = sync_to_async(SitemapURL.objects.create)
+    for record in records:
+        await create(url=record['url'], size=record['size'],
+                     selected=record['selected'], processed=record['processed'])
+
+
+async def batched(records, batch_size):
+    await asave_sitemap_urls(records, DOMAIN, batch_size=batch_size)
+
+
+def measure(label, coro_factory):
+    SitemapURL.objects.all().delete()
+    started = time.perf_counter()
+    asyncio.run(coro_factory())
+    elapsed = time.perf_counter() - started
+    rows = SitemapURL.objects.count()
+    print(f"{label:>22}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/sec)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--urls', type=int, default=50000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--skip-row-by-row', action='store_true')
+    args = parser.parse_args()
+
+    records = make_records(args.urls)
+    with scratch_database():
+        if not args.skip_row_by_row:
+            measure('row-by-row create', lambda: row_by_row(records))
+        measure('batched upsert', lambda: batched(records, args.batch_size))
+        # Same domain again: every row already exists and is updated in place.
+        started = time.perf_counter()
+        asyncio.run(batched(records, args.batch_size))
+        elapsed = time.perf_counter() - started
+        print(f"{'batched re-fetch':>22}: {SitemapURL.objects.count()} rows after upsert in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
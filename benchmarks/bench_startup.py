@@ -0,0 +1,94 @@
+"""Process startup: ``manage.py check``, ASGI app boot and the first tokenizer load.
+
+Every measurement is a fresh interpreter, run ``--repeat`` times and
+reported as the median, so import costs are paid each time like they are
+by a management command, a worker spawn or a server reload:
+
+* ``python``: the bare interpreter, for reference;
+* ``manage.py check``: settings, app registry and URLconf (every view module);
+* ``asgi boot``: importing ``scraper_project.asgi``, what uvicorn does before
+  serving, plus which heavy libraries that pulled in;
+* ``tokenizer``: loading the default encoding from the local cache in a
+  fresh process, then one more lookup in the same process.
+
+Run ``python manage.py warm_tokenizer`` first for the tokenizer numbers:
+
+    python -m benchmarks.bench_startup --repeat 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ('tiktoken', 'langchain_text_splitters', 'langchain_core', 'playwright', 'bs4', 'lxml', 'selectolax')
+
+ASGI_BOOT = f"""
+import json, sys
+import scraper_project.asgi
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+TOKENIZER_LOAD = """
+import json, time
+import django
+django.setup()
+from scraper.tokenizer import cache_dir, get_encoding
+started = time.perf_counter()
+try:
+    get_encoding()
+except Exception as e:
+    print(json.dumps({'error': str(e)}))
+    raise SystemExit
+cold = time.perf_counter() - started
+started = time.perf_counter()
+get_encoding()
+print(json.dumps({'cold': cold, 'warm': time.perf_counter() - started, 'cache': cache_dir()}))
+"""
+
+
+def run(command):
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if completed.returncode:
+        raise RuntimeError(f"{' '.join(command[:3])} failed: {completed.stderr.strip()[-500:]}")
+    return elapsed, completed.stdout
+
+
+def measure(label, command, repeat):
+    timings = []
+    output = ''
+    for _ in range(repeat):
+        elapsed, output = run(command)
+        timings.append(elapsed)
+    print(f"{label:>18}: {statistics.median(timings) * 1000:7.0f}ms median, {min(timings) * 1000:7.0f}ms best")
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    measure('python', [sys.executable, '-c', 'pass'], args.repeat)
+    measure('manage.py check', [sys.executable, 'manage.py', 'check'], args.repeat)
+    loaded = json.loads(measure('asgi boot', [sys.executable, '-c', ASGI_BOOT], args.repeat).splitlines()[-1])
+    print(f"{'heavy imports':>18}: {', '.join(loaded) or 'none'}")
+
+    result = json.loads(run([sys.executable, '-c', TOKENIZER_LOAD])[1].splitlines()[-1])
+    if 'error' in result:
+        print(f"{'tokenizer':>18}: unavailable ({result['error']})")
+    else:
+        print(f"{'tokenizer':>18}: {result['cold'] * 1000:7.0f}ms first load from {result['cache']}, "
+              f"{result['warm'] * 1e6:.1f}us once loaded")
+
+
+if __name__ == '__main__':
+    main()
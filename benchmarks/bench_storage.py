@@ -0,0 +1,234 @@
+"""Storage: compressed page bodies, indexed chunk lookups, SQLite pragmas and JSONL export.
+
+Every section runs against its own scratch SQLite file, never the project
+database:
+
+* ``pages``: packs and writes a synthetic site's pages with each codec,
+  with and without the per-site dictionary, and reports write rate, stored
+  body bytes, database file size and the latency of reading one page back;
+* ``chunks``: writes chunk rows and times lookups by URL, domain and
+  content hash with the indexes and after dropping them;
+* ``writers``: several threads writing small transactions (like the page
+  cache does) while another reads, with the default journal and in WAL
+  mode with ``SCRAPER_SQLITE_PRAGMAS``;
+* ``export``: streams every chunk as JSONL through ``iter_export`` and
+  compares peak memory with loading the table at once.
+
+    python -m benchmarks.bench_storage --pages 2000 --chunks 50000
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+import tracemalloc
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.serializers.json import DjangoJSONEncoder  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from benchmarks.bench_dedup import build_corpus  # noqa: E402
+from benchmarks.database import scratch_database  # noqa: E402
+from scraper.compression import COMPRESSION_OFF, ContentCompressor, zstd_available  # noqa: E402
+from scraper.models import Chunk, Document, ScrapedData  # noqa: E402
+from scraper.storage import EXPORT_CHUNKS, iter_export, set_journal_mode  # noqa: E402
+
+DOMAIN = 'docs.example.com'
+
+
+def file_size(path):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return os.path.getsize(path)
+
+
+def median_us(function, probes):
+    timings = []
+    for probe in probes:
+        started = time.perf_counter()
+        function(probe)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1e6
+
+
+def bench_pages(documents, args):
+    configs = [('plain', COMPRESSION_OFF, 0), ('zlib', 'zlib', 0), ('zlib + dictionary', 'zlib', args.samples)]
+    if zstd_available():
+        configs += [('zstd', 'zstd', 0), ('zstd + dictionary', 'zstd', args.samples)]
+    else:
+        print('zstandard is not installed, skipping zstd')
+    text_bytes = sum(len(document['content'].encode()) for document in documents)
+    print(f"pages: {len(documents)} pages, {text_bytes / 1e6:.1f} MB of text")
+    for label, codec, samples in configs:
+        settings.SCRAPER_COMPRESSION = codec
+        settings.SCRAPER_COMPRESSION_DICT_SAMPLES = samples
+        compressor = ContentCompressor()
+        with scratch_database() as path:
+            started = time.perf_counter()
+            for start in range(0, len(documents), args.batch_size):
+                rows = [
+                    ScrapedData(url=document['url'], normalized_url=document['url'], domain=DOMAIN, status='success',
+                                **compressor.pack(DOMAIN, document['content']))
+                    for document in documents[start:start + args.batch_size]
+                ]
+                with transaction.atomic():
+                    ScrapedData.objects.bulk_create(rows)
+            elapsed = time.perf_counter() - started
+            stats = compressor.stats()
+            probes = [document['url'] for document in documents[::max(1, len(documents) // 500)]]
+            read = median_us(lambda url: compressor.unpack(ScrapedData.objects.get(normalized_url=url)), probes)
+            print(f"{label:>20}: {len(documents) / elapsed:7.0f} pages/sec, bodies {stats['bytes_out'] / 1e6:6.2f} MB "
+                  f"({stats['ratio'] or 1:.1%}), database {file_size(path) / 1e6:6.2f} MB, read {read:6.0f}us")
+
+
+def chunk_rows(count, args):
+    documents = Document.objects.bulk_create(
+        Document(url=f'https://{DOMAIN}/page/{number}.html', domain=f'site{number % args.sites}.example.com')
+        for number in range(max(1, count // args.chunks_per_document))
+    )
+    text = 'lorem ipsum dolor sit amet consectetur ' * 20
+    rows = [
+        Chunk(document=document, url=document.url, domain=document.domain, chunk_index=index,
+              content=f'{number} {text}', content_hash=f'{number:064x}', tokens=120)
+        for number, (document, index) in enumerate(
+            (document, index) for document in documents for index in range(args.chunks_per_document)
+        )
+    ]
+    started = time.perf_counter()
+    with transaction.atomic():
+        Chunk.objects.bulk_create(rows, batch_size=args.batch_size)
+    return documents, rows, time.perf_counter() - started
+
+
+def bench_chunks(args):
+    with scratch_database() as path:
+        documents, rows, elapsed = chunk_rows(args.chunks, args)
+        print(f"\nchunks: {len(rows)} rows written in {elapsed:.2f}s ({len(rows) / elapsed:.0f} rows/sec), "
+              f"database {file_size(path) / 1e6:.1f} MB")
+        step = max(1, len(rows) // 200)
+        lookups = {
+            'by url': (lambda url: list(Chunk.objects.filter(url=url).values_list('id', flat=True)),
+                       [row.url for row in rows[::step]]),
+            'by domain (count)': (lambda domain: Chunk.objects.filter(domain=domain).count(),
+                                  [f'site{number % args.sites}.example.com' for number in range(20)]),
+            'by content hash': (lambda digest: list(Chunk.objects.filter(content_hash=digest).values_list('url')),
+                                [row.content_hash for row in rows[::step]]),
+        }
+        indexed = {label: median_us(function, probes) for label, (function, probes) in lookups.items()}
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'scraper_chunk' "
+                           "AND sql IS NOT NULL AND (sql LIKE '%\"url\"%' OR sql LIKE '%\"domain\"%' "
+                           "OR sql LIKE '%\"content_hash\"%')")
+            for (name,) in cursor.fetchall():
+                cursor.execute(f'DROP INDEX "{name}"')
+        for label, (function, probes) in lookups.items():
+            print(f"{label:>20}: {indexed[label]:8.0f}us indexed, {median_us(function, probes[:20]):8.0f}us without")
+
+
+def bench_writers(args):
+    payload = 'x' * 2000
+
+    def writer(number, counts):
+        for index in range(args.writes):
+            url = f'https://{DOMAIN}/w{number}/{index}'
+            try:
+                ScrapedData.objects.update_or_create(normalized_url=url, defaults={
+                    'url': url, 'domain': DOMAIN, 'content': payload, 'status': 'success',
+                })
+                counts['ok'] += 1
+            except Exception:
+                counts['failed'] += 1
+        connection.close()
+
+    def reader(stop, latencies):
+        while not stop.is_set():
+            started = time.perf_counter()
+            ScrapedData.objects.filter(domain=DOMAIN).order_by('-id').values_list('id', flat=True).first()
+            latencies.append(time.perf_counter() - started)
+        connection.close()
+
+    print(f"\nwriters: {args.writers} threads x {args.writes} single-row transactions, one reader")
+    tuned = getattr(settings, 'SCRAPER_SQLITE_PRAGMAS', {})
+    for label, pragmas in (('default journal', {}), ('WAL + pragmas', tuned)):
+        settings.SCRAPER_SQLITE_PRAGMAS = pragmas
+        connection.close()
+        with scratch_database():
+            if pragmas:
+                set_journal_mode(connection, 'wal')
+                # Reconnect so the WAL-only pragmas apply.
+                connection.close()
+            counts = [{'ok': 0, 'failed': 0} for _ in range(args.writers)]
+            latencies = []
+            stop = threading.Event()
+            threads = [threading.Thread(target=writer, args=(number, counts[number])) for number in range(args.writers)]
+            watcher = threading.Thread(target=reader, args=(stop, latencies))
+            started = time.perf_counter()
+            watcher.start()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            stop.set()
+            watcher.join()
+            ok = sum(count['ok'] for count in counts)
+            failed = sum(count['failed'] for count in counts)
+            read = statistics.median(latencies) * 1e6 if latencies else 0
+            print(f"{label:>20}: {ok / elapsed:7.0f} commits/sec, {failed} failed, "
+                  f"reads {read:6.0f}us median ({len(latencies)} reads)")
+        connection.close()
+    settings.SCRAPER_SQLITE_PRAGMAS = tuned
+
+
+def bench_export(args):
+    with scratch_database():
+        _, rows, _ = chunk_rows(args.chunks, args)
+        del rows
+        tracemalloc.start()
+        started = time.perf_counter()
+        written = sum(len(json.dumps(record, cls=DjangoJSONEncoder)) + 1 for record in iter_export(EXPORT_CHUNKS))
+        elapsed = time.perf_counter() - started
+        streamed = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        records = list(Chunk.objects.values())
+        loaded = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"\nexport: {len(records)} chunks, {written / 1e6:.1f} MB of JSONL in {elapsed:.2f}s "
+              f"({len(records) / elapsed:.0f} rows/sec); peak memory {streamed / 1e6:.1f} MB streamed "
+              f"vs {loaded / 1e6:.1f} MB loading the table")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--sections', type=int, default=8, help='sections per page besides the boilerplate')
+    parser.add_argument('--samples', type=int, default=32, help='pages sampled for the site dictionary')
+    parser.add_argument('--chunks', type=int, default=50000)
+    parser.add_argument('--chunks-per-document', type=int, default=10)
+    parser.add_argument('--sites', type=int, default=20, help='domains the chunks are spread over')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--writes', type=int, default=200, help='transactions per writer thread')
+    parser.add_argument('--only', choices=('pages', 'chunks', 'writers', 'export'))
+    args = parser.parse_args()
+
+    if args.only in (None, 'pages'):
+        documents, _ = build_corpus(args.pages, args.sections, 0, seed=1)
+        bench_pages(documents, args)
+    if args.only in (None, 'chunks'):
+        bench_chunks(args)
+    if args.only in (None, 'writers'):
+        bench_writers(args)
+    if args.only in (None, 'export'):
+        bench_export(args)
+
+
+if __name__ == '__main__':
+    main()
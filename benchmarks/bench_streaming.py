@@ -0,0 +1,89 @@
+"""Time-to-first-URL and peak memory of /api/fetch-sitemap/: one JSON body vs a streamed response.
+
+The fixture site runs in a child process so its own allocations stay out of
+the measurement; rows are written to a scratch database:
+
+    python -m benchmarks.bench_streaming --urls 100000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import AsyncClient  # noqa: E402
+
+from benchmarks.database import scratch_database  # noqa: E402
+from benchmarks.fixture_server import serve_until  # noqa: E402
+from scraper.http_client import close_http_client  # noqa: E402
+
+
+async def fetch_json(client, location):
+    response = await client.post('/api/fetch-sitemap/', {'custom_location': location},
+                                 content_type='application/json')
+    return len(json.loads(response.content)['urls']), None
+
+
+async def fetch_streamed(client, location, fmt):
+    started = time.perf_counter()
+    response = await client.post('/api/fetch-sitemap/', {'custom_location': location, 'stream': fmt},
+                                 content_type='application/json')
+    first_url = None
+    urls = 0
+    async for part in response.streaming_content:
+        if b'"summary"' in part or part.startswith(b'event: summary'):
+            continue
+        urls += 1
+        if first_url is None:
+            first_url = time.perf_counter() - started
+    return urls, first_url
+
+
+def measure(label, coro_factory):
+    async def run():
+        try:
+            return await coro_factory(AsyncClient())
+        finally:
+            await close_http_client()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    urls, first_url = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    first_url = elapsed if first_url is None else first_url
+    print(f"{label:>8}: {urls} urls in {elapsed:6.2f}s, first url after {first_url * 1000:8.1f}ms, "
+          f"peak {peak / 1e6:7.1f} MB traced")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--urls', type=int, default=100000, help='URLs listed in the fixture sitemap')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    base_urls, stop = context.Queue(), context.Event()
+    server = context.Process(target=serve_until, args=(stop, base_urls, args.urls), daemon=True)
+    server.start()
+    try:
+        location = base_urls.get(timeout=30) + '/sitemap.xml'
+        with scratch_database():
+            measure('json', lambda client: fetch_json(client, location))
+            measure('ndjson', lambda client: fetch_streamed(client, location, 'ndjson'))
+            measure('sse', lambda client: fetch_streamed(client, location, 'sse'))
+    finally:
+        stop.set()
+        server.join(timeout=5)
+
+
+if __name__ == '__main__':
+    main()
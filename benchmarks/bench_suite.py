@@ -0,0 +1,369 @@
+"""Offline benchmark suite: API endpoints and hot utilities against a local fixture site, reported as JSON.
+
+Every scenario runs ``--iterations`` operations (after ``--warmup`` untimed
+ones), ``--concurrency`` at a time, against a generated site (nested and
+gzipped sitemap indexes, heavy article pages, large HTML, slow and erroring
+endpoints) served from a child process.
+Each scenario reports throughput, p50/p95/p99 latency, errors and the peak
+RSS of this process while it ran (HTML cleaning workers and the fixture
+server are separate processes and not included). Rows are written to a
+scratch database.
+
+    python -m benchmarks.bench_suite --output before.json
+    python -m benchmarks.bench_suite --output after.json --compare before.json
+    python -m benchmarks.bench_suite --scenarios api_fetch_content,clean_large_html
+
+Rendering scenarios need a Playwright browser and only run with ``--browser``.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import AsyncClient  # noqa: E402
+
+from benchmarks.database import scratch_database  # noqa: E402
+from benchmarks.fixture_server import FixtureHandler, render_article_page, serve_until  # noqa: E402
+from scraper.browser_pool import browser_pool  # noqa: E402
+from scraper.cache import page_cache  # noqa: E402
+from scraper.http_client import close_http_client  # noqa: E402
+from scraper.politeness import host_scheduler  # noqa: E402
+from scraper.sitemap import SitemapResolver  # noqa: E402
+from scraper.utils import aclean_html_content, fetch_content, fetch_url, stream_sitemap_document  # noqa: E402
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (peak so far where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssSampler:
+    """Track the highest RSS seen while the block runs, sampling from a thread."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Context:
+    """What scenario operations need: the fixture site and an API client."""
+
+    def __init__(self, base_url: str, page_count: int):
+        self.base_url = base_url
+        self.page_count = page_count
+        self.client = AsyncClient()
+        self.large_html = render_article_page(0, FixtureHandler.large_paragraphs).decode()
+        self.documents = [
+            {'url': f'{base_url}/article/{i}.html', 'content': render_article_page(i).decode()}
+            for i in range(10)
+        ]
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+
+def _check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f'HTTP {response.status_code}')
+    return response
+
+
+async def _consume(response):
+    _check(response)
+    async for _ in response.streaming_content:
+        pass
+
+
+async def api_fetch_sitemap(ctx, i):
+    response = _check(await ctx.client.post(
+        '/api/fetch-sitemap/', {'custom_location': ctx.url('/sitemap_index.xml')}, content_type='application/json'
+    ))
+    urls = len(json.loads(response.content)['urls'])
+    if urls != ctx.page_count:
+        raise RuntimeError(f'{urls} of {ctx.page_count} urls')
+
+
+async def api_fetch_sitemap_stream(ctx, i):
+    await _consume(await ctx.client.post(
+        '/api/fetch-sitemap/', {'custom_location': ctx.url('/sitemap_index.xml'), 'stream': 'ndjson'},
+        content_type='application/json',
+    ))
+
+
+async def api_fetch_content(ctx, i):
+    _check(await ctx.client.get('/api/fetch-content/', {'url': ctx.url(f'/article/{i}.html')}))
+
+
+async def api_get_page_size(ctx, i):
+    _check(await ctx.client.post(
+        '/api/get-page-size/', {'url': ctx.url(f'/article/{i}.html')}, content_type='application/json'
+    ))
+
+
+async def api_get_page_sizes(ctx, i):
+    urls = [ctx.url(f'/page/{(i * 50 + n) % ctx.page_count}.html') for n in range(50)]
+    await _consume(await ctx.client.post(
+        '/api/get-page-sizes/', {'urls': urls, 'method': 'text'}, content_type='application/json'
+    ))
+
+
+async def api_crawl(ctx, i):
+    _check(await ctx.client.post(
+        '/api/crawl/', {'url': ctx.url('/page/0.html'), 'max_pages': min(100, ctx.page_count)},
+        content_type='application/json',
+    ))
+
+
+async def api_chunk(ctx, i):
+    await _consume(await ctx.client.post(
+        '/api/chunk/', {'documents': ctx.documents}, content_type='application/json'
+    ))
+
+
+async def clean_large_html(ctx, i):
+    await aclean_html_content(ctx.large_html)
+
+
+async def resolve_nested_sitemap(ctx, i):
+    entries = await SitemapResolver(stream_sitemap_document).resolve(ctx.url('/sitemap_index.xml'))
+    if len(entries) != ctx.page_count:
+        raise RuntimeError(f'{len(entries)} of {ctx.page_count} entries')
+
+
+def _fetch(path_for):
+    async def operation(ctx, i):
+        result = await fetch_url(ctx.url(path_for(i)), clean=True)
+        if not result.ok:
+            raise RuntimeError(f'HTTP {result.status}')
+    return operation
+
+
+async def render_article(ctx, i):
+    content, _ = await browser_pool.run(fetch_content, ctx.url(f'/article/{i}.html'))
+    if not content:
+        raise RuntimeError('empty render')
+
+
+class Scenario:
+    def __init__(self, name, operation, share: float = 1.0, browser: bool = False):
+        self.name = name
+        self.operation = operation
+        # Fraction of --iterations to run, for scenarios that do a lot per operation.
+        self.share = share
+        self.browser = browser
+
+
+SCENARIOS = [
+    Scenario('api_fetch_sitemap', api_fetch_sitemap, share=0.1),
+    Scenario('api_fetch_sitemap_stream', api_fetch_sitemap_stream, share=0.1),
+    Scenario('api_fetch_content', api_fetch_content),
+    Scenario('api_get_page_size', api_get_page_size),
+    Scenario('api_get_page_sizes', api_get_page_sizes, share=0.1),
+    Scenario('api_crawl', api_crawl, share=0.1),
+    Scenario('api_chunk', api_chunk, share=0.2),
+    Scenario('clean_large_html', clean_large_html, share=0.2),
+    Scenario('resolve_nested_sitemap', resolve_nested_sitemap, share=0.1),
+    Scenario('fetch_url', _fetch(lambda i: f'/page/{i}.html')),
+    Scenario('fetch_url_large', _fetch(lambda i: f'/large/{i}.html'), share=0.2),
+    Scenario('fetch_url_slow', _fetch(lambda i: f'/slow/{i}.html')),
+    Scenario('fetch_url_error', _fetch(lambda i: f'/error/500/{i}.html'), share=0.2),
+    Scenario('render_article', render_article, browser=True),
+]
+
+
+async def run_scenario(scenario, ctx, iterations: int, concurrency: int, warmup: int = 1) -> dict:
+    # Untimed operations first, so pool start-up (clean workers, HTTP client) is not measured.
+    for i in range(iterations, iterations + warmup):
+        try:
+            await scenario.operation(ctx, i)
+        except Exception:
+            pass
+
+    latencies, errors = [], {}
+    next_index = iter(range(iterations))
+
+    async def worker():
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                await scenario.operation(ctx, i)
+            except Exception as e:
+                message = f'{type(e).__name__}: {e}'
+                errors[message] = errors.get(message, 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, iterations)))))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'errors': sum(errors.values()),
+        'error_messages': errors,
+        'seconds': round(elapsed, 4),
+        'throughput': round(iterations / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2),
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+            'max': round(latencies[-1] * 1000, 2),
+        },
+        'rss_mb': {
+            'start': round(rss.start / 2 ** 20, 1),
+            'peak': round(rss.peak / 2 ** 20, 1),
+        },
+    }
+
+
+async def run_suite(scenarios, ctx, args) -> dict:
+    results = {}
+    try:
+        for scenario in scenarios:
+            iterations = max(1, round(args.iterations * scenario.share))
+            page_cache.clear()
+            host_scheduler.clear()
+            results[scenario.name] = result = await run_scenario(
+                scenario, ctx, iterations, args.concurrency, args.warmup
+            )
+            print(f"{scenario.name:>24}: {result['throughput']:9.2f} ops/s  p50 {result['latency_ms']['p50']:9.2f}ms  "
+                  f"p95 {result['latency_ms']['p95']:9.2f}ms  p99 {result['latency_ms']['p99']:9.2f}ms  "
+                  f"peak {result['rss_mb']['peak']:7.1f} MB  errors {result['errors']}/{iterations}")
+    finally:
+        await close_http_client()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict):
+    """Print throughput and p95 changes against an earlier report."""
+    print(f"\nCompared with {baseline['meta'].get('revision')} ({baseline['meta'].get('started')}):")
+    for name, result in report['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if not before:
+            continue
+        throughput = (result['throughput'] / before['throughput'] - 1) * 100 if before['throughput'] else 0
+        p95_before = before['latency_ms']['p95']
+        p95 = (result['latency_ms']['p95'] / p95_before - 1) * 100 if p95_before else 0
+        print(f"{name:>24}: throughput {throughput:+7.1f}%  p95 {p95:+7.1f}%  "
+              f"peak RSS {result['rss_mb']['peak'] - before['rss_mb']['peak']:+7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=100, help='operations per scenario (some run a fraction)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=1, help='untimed operations before each scenario')
+    parser.add_argument('--pages', type=int, default=1000, help='pages in the fixture site and its sitemaps')
+    parser.add_argument('--slow-ms', type=int, default=200, help='response delay of the slow endpoint')
+    parser.add_argument('--scenarios', help='comma-separated scenario names (default: all)')
+    parser.add_argument('--browser', action='store_true', help='also run scenarios that render with Playwright')
+    parser.add_argument('--host-rate', type=float, default=0,
+                        help='SCRAPER_HOST_RATE for the run (default 0: no per-host rate limit)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--compare', help='earlier JSON report to compare against')
+    args = parser.parse_args()
+
+    scenarios = [scenario for scenario in SCENARIOS if args.browser or not scenario.browser]
+    if args.scenarios:
+        wanted = set(args.scenarios.split(','))
+        unknown = wanted - {scenario.name for scenario in SCENARIOS}
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name in wanted]
+
+    random.seed(args.seed)
+    settings.SCRAPER_HOST_RATE = args.host_rate
+
+    context = multiprocessing.get_context('spawn')
+    base_urls, stop = context.Queue(), context.Event()
+    server = context.Process(target=serve_until, args=(stop, base_urls, args.pages),
+                             kwargs={'slow_ms': args.slow_ms}, daemon=True)
+    server.start()
+    started = datetime.now(timezone.utc)
+    try:
+        ctx = Context(base_urls.get(timeout=30), args.pages)
+        with scratch_database():
+            results = asyncio.run(run_suite(scenarios, ctx, args))
+    finally:
+        stop.set()
+        server.join(timeout=5)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'started': started.isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'options': {name: value for name, value in vars(args).items() if name not in ('output', 'compare')},
+        },
+        'scenarios': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(report, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
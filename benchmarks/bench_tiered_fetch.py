@@ -0,0 +1,68 @@
+"""Compare the HTTP fast path against Playwright rendering for the same URLs.
+
+Runs with the page cache off, against a scratch database:
+
+    python -m benchmarks.bench_tiered_fetch --pages 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import override_settings  # noqa: E402
+
+from benchmarks.database import scratch_database  # noqa: E402
+from benchmarks.fixture_server import FixtureHandler, FixtureServer  # noqa: E402
+from scraper.browser_pool import browser_pool  # noqa: E402
+from scraper.http_client import close_http_client  # noqa: E402
+from scraper.utils import fetch_url  # noqa: E402
+
+
+async def drive(urls, concurrency, render):
+    semaphore = asyncio.Semaphore(concurrency)
+    tiers = {}
+
+    async def fetch(url):
+        async with semaphore:
+            result = await fetch_url(url, render=render, clean=False)
+            tiers[result.tier] = tiers.get(result.tier, 0) + 1
+            return result.ok
+
+    await fetch(urls[0])
+    start = time.perf_counter()
+    ok = await asyncio.gather(*(fetch(url) for url in urls))
+    elapsed = time.perf_counter() - start
+    await close_http_client()
+    return {
+        'urls': len(urls),
+        'ok': sum(ok),
+        'tiers': tiers,
+        'seconds': round(elapsed, 3),
+        'urls_per_sec': round(len(urls) / elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    FixtureHandler.page_count = args.pages
+    with FixtureServer() as server, scratch_database(), override_settings(SCRAPER_CACHE_ENABLED=False):
+        urls = [server.url('/sitemap.xml')] + [server.url(f'/page/{i}.html') for i in range(args.pages)]
+        for render in (False, True):
+            result = asyncio.run(drive(urls, args.concurrency, render))
+            label = 'playwright' if render else 'http fast path'
+            print(f"{label:>15}: {result}")
+    browser_pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+"""Throwaway on-disk database for benchmarks that write rows."""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def scratch_database():
+    """Migrate a temporary SQLite file, point the default connection at it, then drop it.
+
+    A file rather than ``:memory:`` so commit and fsync costs are part of the
+    measurement, like they are against the real database.
+    """
+    directory = tempfile.mkdtemp(prefix='scraper-bench-')
+    connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        os.rmdir(directory)
@@ -0,0 +1,267 @@
+"""Local HTTP server serving generated pages so benchmarks never touch the network."""
+import gzip
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def render_page(number: int, paragraphs: int = 20, links=()) -> bytes:
+    nav = ''.join(f'<a href="/page/{link}.html">Page {link}</a>' for link in links)
+    body = ''.join(
+        f'<p>Paragraph {i} of page {number}. Lorem ipsum dolor sit amet, consectetur '
+        f'adipiscing elit, sed do eiusmod tempor incididunt ut labore.</p>'
+        for i in range(paragraphs)
+    )
+    return (
+        f'<!DOCTYPE html><html><head><title>Page {number}</title></head>'
+        f'<body><nav><a href="/page/0.html">Home</a>{nav}</nav><main><h1>Page {number}</h1>{body}</main>'
+        f'<footer>Fixture site</footer></body></html>'
+    ).encode()
+
+
+def render_article_page(number: int, paragraphs: int = 12) -> bytes:
+    """A documentation-style page wrapped in typical site chrome (menus, sidebar, footer, banners)."""
+    menu = ''.join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(40))
+    sidebar = ''.join(f'<li><a href="/article/{i}.html">Related article number {i}</a></li>' for i in range(30))
+    footer = ''.join(f'<a href="/legal/{i}">Footer link {i}</a> ' for i in range(50))
+    body = ''.join(
+        f'<p>Step {i}: configure the <a href="/glossary/{i}">component</a> for page {number}, then restart '
+        f'the service, verify the logs, and repeat if needed. Detailed notes follow, with caveats, edge '
+        f'cases, and examples of expected output.</p>'
+        for i in range(paragraphs)
+    )
+    return (
+        f'<!DOCTYPE html><html><head><title>Article {number}</title>'
+        f'<script>window.analytics = {{}};</script><style>body {{ margin: 0 }}</style></head><body>'
+        f'<div class="cookie-banner">We use cookies to improve your experience. <a href="/privacy">Learn more</a></div>'
+        f'<header class="site-header"><nav><ul class="menu">{menu}</ul></nav></header>'
+        f'<div class="layout"><div class="sidebar"><ul>{sidebar}</ul></div>'
+        f'<div class="page-body"><div class="breadcrumbs"><a href="/">Home</a> / <a href="/docs">Docs</a></div>'
+        f'<div class="post"><h1>Article {number}</h1>{body}<pre>$ service restart --page {number}</pre></div>'
+        f'<div class="share-buttons"><a href="#">Twitter</a> <a href="#">Facebook</a> <a href="#">LinkedIn</a></div>'
+        f'<div class="related-posts"><h3>Related</h3><ul>{sidebar[:1500]}</ul></div></div></div>'
+        f'<footer>{footer}</footer></body></html>'
+    ).encode()
+
+
+def render_docs_page(number: int, sections: int = 12) -> bytes:
+    """A structured documentation page: nested headings, lists, a table and code in every section."""
+    parts = []
+    for section in range(sections):
+        parts.append(
+            f'<h2>Section {section}</h2><p>Section {section} of guide {number} explains how the '
+            f'<a href="/docs/{number}/{section}">component</a> is configured, deployed and monitored, '
+            f'with the defaults, the limits and the trade-offs of each option.</p>'
+            f'<h3>Options</h3><ul>'
+            + ''.join(f'<li><code>option_{i}</code>: controls <em>behaviour {i}</em> of the service.</li>'
+                      for i in range(6))
+            + '</ul><h3>Example</h3><pre><code class="language-python">'
+            f'client = Client(timeout={section})\nclient.configure(retries=3)\nclient.run()\n</code></pre>'
+            '<table><thead><tr><th>Setting</th><th>Default</th><th>Notes</th></tr></thead><tbody>'
+            + ''.join(f'<tr><td>setting_{i}</td><td>{i * 10}</td><td>Applies to section {section}.</td></tr>'
+                      for i in range(5))
+            + '</tbody></table>'
+            f'<blockquote><p>Note: restart the service after changing section {section}.</p></blockquote>'
+        )
+    return render_article_page(number, 0).replace(
+        f'<h1>Article {number}</h1>'.encode(), f'<h1>Guide {number}</h1>{"".join(parts)}'.encode()
+    )
+
+
+def render_urlset(base_url: str, page_numbers, lastmod: str = None) -> bytes:
+    extra = f'<lastmod>{lastmod}</lastmod>' if lastmod else ''
+    entries = ''.join(f'<url><loc>{base_url}/page/{number}.html</loc>{extra}</url>' for number in page_numbers)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+    ).encode()
+
+
+def render_sitemap_index(locations) -> bytes:
+    entries = ''.join(f'<sitemap><loc>{location}</loc></sitemap>' for location in locations)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</sitemapindex>'
+    ).encode()
+
+
+def _path_number(path: str, prefix: str):
+    try:
+        return int(path[len(prefix):].split('/')[-1].split('.')[0])
+    except ValueError:
+        return None
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serve ``/page/<n>.html``, ``/robots.txt`` and a ``/sitemap.xml`` listing ``page_count`` pages.
+
+    Page ``n`` links to pages ``2n + 1`` and ``2n + 2``, so a crawl starting at
+    page 0 reaches the whole site. ``/article/<n>.html`` serves the same kind
+    of content wrapped in heavy site chrome, for extraction benchmarks.
+
+    The same pages are also listed through ``/sitemap_index.xml``: an index of
+    ``sitemap_fanout`` indexes (``/sitemaps/<i>.xml``) of ``sitemap_fanout``
+    gzipped urlsets each (``/sitemaps/<i>/<j>.xml.gz``). ``/docs/<n>.html`` is
+    a structured guide (headings, lists, code, tables), ``/large/<n>.html``
+    is an article of ``large_paragraphs`` paragraphs, ``/slow/<n>.html`` a
+    page answered after ``slow_ms`` (or ``?ms=``) and ``/error/<status>/<n>.html``
+    always fails with ``status``.
+
+    Responses carry an ETag (answered with 304 when it matches) and are
+    gzip-compressed when the client asks for it.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without TCP_NODELAY keep-alive
+    # clients stall ~40ms per response on delayed ACKs.
+    disable_nagle_algorithm = True
+    page_count = 100
+    paragraphs = 20
+    # <lastmod> given for every sitemap entry, if set.
+    lastmod = None
+    sitemap_fanout = 4
+    large_paragraphs = 2000
+    slow_ms = 200
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path.startswith('/page/'):
+            try:
+                number = int(path[len('/page/'):].split('.')[0])
+            except ValueError:
+                return self.send_error(404)
+            if number >= self.page_count:
+                return self.send_error(404)
+            links = [link for link in (2 * number + 1, 2 * number + 2) if link < self.page_count]
+            return self.send_body(render_page(number, self.paragraphs, links=links), 'text/html; charset=utf-8')
+        if path.startswith('/article/'):
+            try:
+                number = int(path[len('/article/'):].split('.')[0])
+            except ValueError:
+                return self.send_error(404)
+            return self.send_body(render_article_page(number, self.paragraphs), 'text/html; charset=utf-8')
+        if path.startswith('/docs/'):
+            number = _path_number(path, '/docs/')
+            if number is None:
+                return self.send_error(404)
+            return self.send_body(render_docs_page(number), 'text/html; charset=utf-8')
+        if path.startswith('/large/'):
+            number = _path_number(path, '/large/')
+            if number is None:
+                return self.send_error(404)
+            return self.send_body(render_article_page(number, self.large_paragraphs), 'text/html; charset=utf-8')
+        if path.startswith('/slow/'):
+            number = _path_number(path, '/slow/')
+            if number is None:
+                return self.send_error(404)
+            delay_ms = int(query[len('ms='):]) if query.startswith('ms=') else self.slow_ms
+            time.sleep(delay_ms / 1000)
+            return self.send_body(render_page(number, self.paragraphs), 'text/html; charset=utf-8')
+        if path.startswith('/error/'):
+            try:
+                status = int(path.split('/')[2])
+            except (IndexError, ValueError):
+                return self.send_error(404)
+            return self.send_body(b'<html><body>Error</body></html>', 'text/html; charset=utf-8', status=status)
+        if path == '/sitemap_index.xml' or path.startswith('/sitemaps/'):
+            return self.send_sitemap_tree(path)
+        if path == '/robots.txt':
+            return self.send_body(b'User-agent: *\nDisallow: /private/\n', 'text/plain')
+        if path == '/sitemap.xml':
+            host = self.headers.get('Host')
+            return self.send_body(render_urlset(f'http://{host}', range(self.page_count), self.lastmod), 'application/xml')
+        self.send_error(404)
+
+    do_HEAD = do_GET
+
+    def send_sitemap_tree(self, path: str):
+        base_url = f'http://{self.headers.get("Host")}'
+        fanout = self.sitemap_fanout
+        if path == '/sitemap_index.xml':
+            locations = (f'{base_url}/sitemaps/{i}.xml' for i in range(fanout))
+            return self.send_body(render_sitemap_index(locations), 'application/xml')
+        parts = path[len('/sitemaps/'):].split('/')
+        try:
+            if len(parts) == 1 and parts[0].endswith('.xml'):
+                i = int(parts[0][:-len('.xml')])
+                locations = (f'{base_url}/sitemaps/{i}/{j}.xml.gz' for j in range(fanout))
+                return self.send_body(render_sitemap_index(locations), 'application/xml')
+            if len(parts) == 2 and parts[1].endswith('.xml.gz'):
+                leaf = int(parts[0]) * fanout + int(parts[1][:-len('.xml.gz')])
+                pages = range(leaf, self.page_count, fanout * fanout)
+                body = gzip.compress(render_urlset(base_url, pages, self.lastmod), compresslevel=5)
+                return self.send_body(body, 'application/x-gzip', compress=False)
+        except ValueError:
+            pass
+        self.send_error(404)
+
+    def send_body(self, body: bytes, content_type: str, status: int = 200, headers=None, compress: bool = True):
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('ETag', etag)
+        if compress and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """Run :class:`FixtureHandler` on an ephemeral localhost port in a thread.
+
+    Usage::
+
+        with FixtureServer() as server:
+            server.url('/page/1.html')
+    """
+
+    def __init__(self, handler=FixtureHandler):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def serve_until(stop, base_urls, page_count: int = None, **options):
+    """Child-process entry point: run a fixture server, report its base URL, wait for ``stop``.
+
+    Keeps the server's allocations and CPU out of a benchmark's own process.
+    ``options`` override other :class:`FixtureHandler` attributes, e.g. ``slow_ms``.
+    """
+    if page_count is not None:
+        FixtureHandler.page_count = page_count
+    for name, value in options.items():
+        setattr(FixtureHandler, name, value)
+    with FixtureServer() as server:
+        base_urls.put(server.base_url)
+        stop.wait()
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class ScraperConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scraper'
+
+    def ready(self):
+        from .storage import configure_sqlite
+        from .tokenizer import configure_cache_dir
+        connection_created.connect(configure_sqlite, dispatch_uid='scraper_configure_sqlite')
+        configure_cache_dir()
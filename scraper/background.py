@@ -0,0 +1,59 @@
+"""Event loops running in daemon threads for work that outlives a request.
+
+Django hands each request whatever loop the server (or ``async_to_sync``)
+provides, and under WSGI that loop is gone once the response is sent. Objects
+that must persist across requests - Playwright browsers, background jobs -
+live on a :class:`BackgroundLoop` instead. The loop keeps one pooled HTTP
+client (see scraper.http_client) until it is stopped.
+"""
+import asyncio
+import threading
+
+from .http_client import close_http_client, keep_http_client
+
+
+class BackgroundLoop:
+    """A lazily started event loop running forever in a daemon thread."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                keep_http_client(self._loop)
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro):
+        """Schedule ``coro`` on the loop and return a ``concurrent.futures.Future``."""
+        return asyncio.run_coroutine_threadsafe(coro, self.get_loop())
+
+    async def run(self, coro):
+        """Run ``coro`` on the loop and await its result from the caller's loop."""
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def stop(self, cleanup=None, timeout: float = 30.0):
+        """Optionally await ``cleanup()`` on the loop, close its HTTP client, then stop and join it (blocking)."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            if cleanup is not None:
+                asyncio.run_coroutine_threadsafe(cleanup(), loop).result(timeout)
+            asyncio.run_coroutine_threadsafe(close_http_client(), loop).result(timeout)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            loop.close()
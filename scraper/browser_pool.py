@@ -0,0 +1,368 @@
+"""Process-wide pool of long-lived headless Chromium browsers.
+
+Launching Chromium costs around a second, so instead of starting one per
+request every Playwright entry point borrows a browser from ``browser_pool``.
+The pool owns a dedicated event loop thread: Playwright objects are bound to
+the loop that created them, while Django runs each request on whatever loop
+the server (or ``async_to_sync``) happens to provide.
+"""
+import asyncio
+import atexit
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+
+from .background import BackgroundLoop
+from .metrics import span
+
+LAUNCH_OPTIONS = {
+    'headless': True,
+    'args': ['--disable-dev-shm-usage'],
+}
+
+MEMORY_CHECK_INTERVAL = 5.0
+
+DEFAULT_VIEWPORT = {'width': 1920, 'height': 1080}
+
+# Contexts are replaced after this many pages so cookies, storage and cache
+# from earlier sites cannot accumulate indefinitely.
+MAX_CONTEXT_USES = 100
+
+
+def _read_rss_kb(pid: int) -> int:
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def child_processes_rss_mb() -> float:
+    """Return the resident memory of all descendants of this process in MB.
+
+    Chromium runs as grandchildren of the Playwright driver, so this is the
+    memory used by every pooled browser together. Only Linux exposes the
+    information cheaply through /proc; elsewhere this returns 0.
+    """
+    children = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return 0.0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                ppid = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total_kb = 0
+    stack = list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        total_kb += _read_rss_kb(pid)
+    return total_kb / 1024
+
+
+class PooledBrowser:
+    """A launched browser plus the bookkeeping used to decide when to recycle it."""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.in_use = 0
+        self.pages_served = 0
+        self.retiring = False
+        self.launched_at = time.monotonic()
+
+    @property
+    def healthy(self) -> bool:
+        return not self.retiring and self.browser.is_connected()
+
+
+class BrowserPool:
+    """Lend long-lived browsers to coroutines running on the pool's own loop.
+
+    Settings (read on every call so ``override_settings`` works):
+        SCRAPER_BROWSER_POOL_ENABLED: borrow from the pool instead of launching
+            a fresh browser per call.
+        SCRAPER_BROWSER_POOL_SIZE: maximum number of browsers kept running.
+        SCRAPER_BROWSER_MAX_PAGES: recycle a browser after serving this many calls.
+        SCRAPER_BROWSER_MAX_MEMORY_MB: recycle browsers once the browser
+            processes together exceed this much resident memory.
+        SCRAPER_PAGES_PER_BROWSER: pages each browser renders concurrently
+            (see :class:`PageSlots`).
+    """
+
+    def __init__(self):
+        self._background = BackgroundLoop('browser-pool')
+        self._lock = None
+        self._playwright = None
+        self._browsers = []
+        self._last_memory_check = 0.0
+        self._launched = 0
+        self._recycled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'SCRAPER_BROWSER_POOL_ENABLED', True)
+
+    @property
+    def size(self) -> int:
+        return max(1, getattr(settings, 'SCRAPER_BROWSER_POOL_SIZE', 2))
+
+    @property
+    def max_pages(self) -> int:
+        return getattr(settings, 'SCRAPER_BROWSER_MAX_PAGES', 200)
+
+    @property
+    def max_memory_mb(self) -> float:
+        return getattr(settings, 'SCRAPER_BROWSER_MAX_MEMORY_MB', 2048)
+
+    async def run(self, func, *args, **kwargs):
+        """Await ``func(*args, browser=<browser>, **kwargs)`` and return its result.
+
+        The coroutine runs on the pool loop, so everything it does with the
+        browser (contexts, pages, responses) stays on the loop that owns it.
+        """
+        if not self.enabled:
+            return await run_with_fresh_browser(func, *args, **kwargs)
+        return await self._background.run(self._run(func, args, kwargs))
+
+    def stats(self) -> dict:
+        """Return a snapshot of pool utilization."""
+        return {
+            'browsers': len(self._browsers),
+            'in_use': sum(pooled.in_use for pooled in self._browsers),
+            'pages_served': sum(pooled.pages_served for pooled in self._browsers),
+            'launched': self._launched,
+            'recycled': self._recycled,
+        }
+
+    async def _run(self, func, args, kwargs):
+        pooled = await self._acquire()
+        try:
+            return await func(*args, browser=pooled.browser, **kwargs)
+        finally:
+            await self._release(pooled)
+
+    async def _acquire(self) -> PooledBrowser:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._playwright is None:
+                # Imported here so processes that never render don't pay for Playwright.
+                from playwright.async_api import async_playwright
+                self._playwright = await async_playwright().start()
+
+            for pooled in list(self._browsers):
+                if not pooled.browser.is_connected() and not pooled.in_use:
+                    self._browsers.remove(pooled)
+
+            candidates = [pooled for pooled in self._browsers if pooled.healthy]
+            if not candidates or (
+                len(candidates) < self.size and all(pooled.in_use for pooled in candidates)
+            ):
+                with span('browser_launch'):
+                    browser = await self._playwright.chromium.launch(**LAUNCH_OPTIONS)
+                self._launched += 1
+                candidates.append(PooledBrowser(browser))
+                self._browsers.append(candidates[-1])
+
+            pooled = min(candidates, key=lambda candidate: candidate.in_use)
+            pooled.in_use += 1
+            pooled.pages_served += 1
+            if pooled.pages_served >= self.max_pages:
+                pooled.retiring = True
+            return pooled
+
+    async def _release(self, pooled: PooledBrowser):
+        pooled.in_use -= 1
+        if self._over_memory_limit():
+            pooled.retiring = True
+        if pooled.in_use or pooled.healthy:
+            return
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        self._recycled += 1
+        await self._close_browser(pooled)
+
+    def _over_memory_limit(self) -> bool:
+        now = time.monotonic()
+        if now - self._last_memory_check < MEMORY_CHECK_INTERVAL:
+            return False
+        self._last_memory_check = now
+        return child_processes_rss_mb() > self.max_memory_mb
+
+    async def _close_browser(self, pooled: PooledBrowser):
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            print(f"Error closing pooled browser: {e}")
+
+    async def _shutdown(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            browsers, self._browsers = self._browsers, []
+            for pooled in browsers:
+                await self._close_browser(pooled)
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+        self._lock = None
+
+    def shutdown(self, timeout: float = 30.0):
+        """Close every browser and stop the pool loop (blocking)."""
+        try:
+            self._background.stop(self._shutdown, timeout)
+        except Exception as e:
+            print(f"Error shutting down browser pool: {e}")
+
+    async def close(self):
+        """Async wrapper around :meth:`shutdown` for ASGI lifespan handlers."""
+        await asyncio.to_thread(self.shutdown)
+
+
+class ProfileContext:
+    """A browser context shared by pages with the same user agent and headers."""
+
+    def __init__(self, context):
+        self.context = context
+        self.idle_pages = []
+        self.in_use = 0
+        self.uses = 0
+        self.retired = False
+
+    @property
+    def exhausted(self) -> bool:
+        return self.uses >= MAX_CONTEXT_USES
+
+    async def close(self):
+        try:
+            await self.context.close()
+        except Exception as e:
+            print(f"Error closing browser context: {e}")
+
+
+class PageSlots:
+    """Reusable contexts and pages for a single browser.
+
+    Contexts are keyed by user agent, extra headers and viewport, so repeated
+    fetches with the same profile skip context setup entirely. At most
+    ``SCRAPER_PAGES_PER_BROWSER`` pages are in flight at once, and a returned
+    page is navigated to about:blank (and its context's cookies cleared once
+    idle) before anyone else gets it.
+    """
+
+    def __init__(self, browser, max_pages: int = None):
+        if max_pages is None:
+            max_pages = getattr(settings, 'SCRAPER_PAGES_PER_BROWSER', 8)
+        self.browser = browser
+        self.semaphore = asyncio.Semaphore(max(1, max_pages))
+        self._lock = asyncio.Lock()
+        self._contexts = {}
+
+    @asynccontextmanager
+    async def page(self, user_agent: str, headers: dict = None, viewport: dict = None):
+        """Yield a ready-to-use page for the given profile."""
+        headers = headers or {}
+        viewport = viewport or DEFAULT_VIEWPORT
+        key = (user_agent, tuple(sorted(headers.items())), tuple(sorted(viewport.items())))
+
+        async with self.semaphore:
+            entry = await self._context_for(key, user_agent, headers, viewport)
+            entry.in_use += 1
+            entry.uses += 1
+            page = None
+            reusable = False
+            try:
+                while entry.idle_pages and page is None:
+                    candidate = entry.idle_pages.pop()
+                    if not candidate.is_closed():
+                        page = candidate
+                if page is None:
+                    page = await entry.context.new_page()
+                yield page
+                reusable = True
+            finally:
+                entry.in_use -= 1
+                await self._give_back(entry, page, reusable)
+
+    async def _context_for(self, key, user_agent, headers, viewport) -> ProfileContext:
+        async with self._lock:
+            entry = self._contexts.get(key)
+            if entry is not None and entry.exhausted:
+                entry.retired = True
+                if not entry.in_use:
+                    await entry.close()
+                entry = None
+            if entry is None:
+                with span('context_create'):
+                    context = await self.browser.new_context(
+                        user_agent=user_agent,
+                        viewport=viewport,
+                        extra_http_headers=headers,
+                    )
+                entry = self._contexts[key] = ProfileContext(context)
+            return entry
+
+    async def _give_back(self, entry: ProfileContext, page, reusable: bool):
+        if page is not None and not page.is_closed():
+            if reusable and not entry.exhausted:
+                try:
+                    await page.goto('about:blank', timeout=5000)
+                    entry.idle_pages.append(page)
+                    page = None
+                except Exception as e:
+                    print(f"Discarding page that could not be reset: {e}")
+            if page is not None:
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+        if entry.in_use:
+            return
+        if entry.retired:
+            await entry.close()
+            return
+        try:
+            await entry.context.clear_cookies()
+        except Exception:
+            pass
+
+
+_page_slots = weakref.WeakKeyDictionary()
+
+
+def page_slots(browser) -> PageSlots:
+    """Return the :class:`PageSlots` attached to ``browser``, creating it on first use."""
+    slots = _page_slots.get(browser)
+    if slots is None:
+        slots = _page_slots[browser] = PageSlots(browser)
+    return slots
+
+
+async def run_with_fresh_browser(func, *args, **kwargs):
+    """Launch a throwaway browser for a single call, as before the pool existed."""
+    from playwright.async_api import async_playwright
+    async with async_playwright() as playwright:
+        with span('browser_launch'):
+            browser = await playwright.chromium.launch(**LAUNCH_OPTIONS)
+        try:
+            return await func(*args, browser=browser, **kwargs)
+        finally:
+            await browser.close()
+
+
+browser_pool = BrowserPool()
+atexit.register(browser_pool.shutdown)
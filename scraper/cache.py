@@ -0,0 +1,283 @@
+"""Two-tier cache for fetched page content and measured page sizes.
+
+The first tier is an in-process LRU bounded by the memory its entries take;
+the second is the ``ScrapedData`` table, so cached pages survive restarts
+and are shared between worker processes. Entries are keyed by normalized URL.
+
+Bodies are stored compressed with a per-site dictionary (see
+scraper.compression); the memory tier holds them as text.
+
+Content older than ``SCRAPER_CACHE_TTL`` seconds is revalidated: pages
+served over plain HTTP with an ETag or Last-Modified are re-requested
+conditionally and a 304 just refreshes the entry, everything else is fetched
+again. Page sizes from ``/get-page-size/`` are cached the same way.
+
+Settings: SCRAPER_CACHE_ENABLED, SCRAPER_CACHE_MAX_BYTES, SCRAPER_CACHE_TTL,
+SCRAPER_CACHE_PERSIST.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .cleaning import OUTPUT_TEXT
+from .compression import content_compressor
+from .http_client import TIER_HTTP, FetchResult
+from .metrics import span
+from .models import ScrapedData
+from .storage import source_domain
+from .url_filter import normalize_url
+from .utils import fetch_url, get_page_content_size
+
+CACHE_HIT = 'hit'
+CACHE_REVALIDATED = 'revalidated'
+CACHE_MISS = 'miss'
+CACHE_BYPASS = 'bypass'
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc) if timestamp else None
+
+
+def _to_timestamp(value):
+    return value.timestamp() if value else None
+
+
+class CachedPage:
+    """Cached state of one URL: cleaned content plus validators, and/or its measured size.
+
+    ``content`` is None when only the page size has been measured.
+    """
+
+    def __init__(self, url, content=None, size=0, tier=TIER_HTTP, etag=None,
+                 last_modified=None, fetched_at=None, text_size=None, measured_at=None):
+        self.url = url
+        self.content = content
+        self.size = size
+        self.tier = tier
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.text_size = text_size
+        self.measured_at = measured_at
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.content or '') + sys.getsizeof(self.url)
+
+    def to_result(self) -> FetchResult:
+        return FetchResult(self.url, self.content, self.size, status=200, tier=self.tier,
+                           etag=self.etag, last_modified=self.last_modified)
+
+    @classmethod
+    def from_row(cls, row: ScrapedData):
+        return cls(
+            row.url,
+            content=content_compressor.unpack(row) if row.fetched_at else None,
+            size=row.size,
+            tier=row.tier or TIER_HTTP,
+            etag=row.etag or None,
+            last_modified=row.last_modified or None,
+            fetched_at=_to_timestamp(row.fetched_at),
+            text_size=row.text_size,
+            measured_at=_to_timestamp(row.measured_at),
+        )
+
+    def row_defaults(self) -> dict:
+        domain = source_domain(self.url)
+        return {
+            'url': self.url,
+            'domain': domain,
+            **content_compressor.pack(domain, self.content),
+            'size': self.size,
+            'status': 'success',
+            'tier': self.tier,
+            'etag': self.etag or '',
+            'last_modified': self.last_modified or '',
+            'fetched_at': _to_datetime(self.fetched_at),
+            'text_size': self.text_size,
+            'measured_at': _to_datetime(self.measured_at),
+        }
+
+
+class PageCache:
+    """LRU memory tier in front of the ``ScrapedData`` table, with hit/miss counters."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ('hits', 'misses', 'revalidated', 'memory_hits', 'persistent_hits', 'evictions', 'errors'), 0
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'SCRAPER_CACHE_ENABLED', True)
+
+    @property
+    def max_bytes(self) -> int:
+        return getattr(settings, 'SCRAPER_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+
+    @property
+    def ttl(self) -> float:
+        return getattr(settings, 'SCRAPER_CACHE_TTL', 3600)
+
+    @property
+    def persist(self) -> bool:
+        return getattr(settings, 'SCRAPER_CACHE_PERSIST', True)
+
+    async def fetch(self, url: str, render: bool = False, max_age: float = None, output: str = OUTPUT_TEXT):
+        """Return ``(FetchResult, cache_status)`` for ``url``, fetching only when needed.
+
+        A ``render`` request is only answered from entries that were
+        rendered by the browser as well. ``max_age`` overrides the TTL for
+        this lookup; 0 always revalidates. Only cleaned text is cached;
+        other ``output`` formats bypass the cache.
+        """
+        if not self.enabled or output != OUTPUT_TEXT:
+            return await fetch_url(url, render=render, output=output), CACHE_BYPASS
+
+        key = normalize_url(url)
+        entry = await self._lookup(key)
+        result = None
+        if entry is not None and entry.content is not None and (not render or entry.tier != TIER_HTTP):
+            if self._is_fresh(entry.fetched_at, max_age):
+                self._count('hits')
+                return entry.to_result(), CACHE_HIT
+            if entry.tier == TIER_HTTP and (entry.etag or entry.last_modified):
+                result = await fetch_url(url, etag=entry.etag, last_modified=entry.last_modified)
+                if result.not_modified:
+                    entry.fetched_at = time.time()
+                    await self._store(key, entry)
+                    self._count('revalidated')
+                    return entry.to_result(), CACHE_REVALIDATED
+
+        if result is None:
+            result = await fetch_url(url, render=render)
+        self._count('misses')
+        if result.content:
+            # A new entry rather than ``entry`` updated in place, whose old size the memory tier still counts;
+            # the page size measured for it is carried over.
+            await self._store(key, CachedPage(
+                url,
+                content=result.content,
+                size=result.size,
+                tier=result.tier,
+                etag=result.etag,
+                last_modified=result.last_modified,
+                fetched_at=time.time(),
+                text_size=entry.text_size if entry is not None else None,
+                measured_at=entry.measured_at if entry is not None else None,
+            ))
+        return result, CACHE_MISS
+
+    async def page_size(self, url: str):
+        """Return ``(size, cache_status)`` where size is the rendered main-content length."""
+        if not self.enabled:
+            return await get_page_content_size(url), CACHE_BYPASS
+
+        key = normalize_url(url)
+        entry = await self._lookup(key)
+        if entry is not None and entry.text_size is not None and self._is_fresh(entry.measured_at):
+            self._count('hits')
+            return entry.text_size, CACHE_HIT
+
+        self._count('misses')
+        size = await get_page_content_size(url)
+        if size is not None:
+            entry = entry or CachedPage(url)
+            entry.text_size = size
+            entry.measured_at = time.time()
+            await self._store(key, entry)
+        return size, CACHE_MISS
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['revalidated'] + stats['misses']
+        stats['max_bytes'] = self.max_bytes
+        stats['hit_ratio'] = round((stats['hits'] + stats['revalidated']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Drop the memory tier and reset the counters (the table is left alone)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def _is_fresh(self, timestamp, max_age: float = None) -> bool:
+        if max_age is None:
+            max_age = self.ttl
+        return timestamp is not None and time.time() - timestamp < max_age
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    async def _lookup(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return entry
+        if not self.persist:
+            return None
+        try:
+            entry = await sync_to_async(self._read)(key)
+        except Exception as e:
+            print(f"Error reading page cache for {key}: {e}")
+            self._count('errors')
+            return None
+        if entry is None:
+            return None
+        self._count('persistent_hits')
+        self._remember(key, entry)
+        return entry
+
+    @staticmethod
+    def _read(key: str):
+        row = ScrapedData.objects.filter(normalized_url=key).first()
+        return CachedPage.from_row(row) if row is not None else None
+
+    @staticmethod
+    def _write(key: str, entry: CachedPage):
+        # Packing may train or load the site's dictionary, so it happens here, off the event loop.
+        ScrapedData.objects.update_or_create(normalized_url=key, defaults=entry.row_defaults())
+
+    def _remember(self, key: str, entry: CachedPage):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            if entry.nbytes > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self._counters['evictions'] += 1
+
+    async def _store(self, key: str, entry: CachedPage):
+        self._remember(key, entry)
+        if not self.persist:
+            return
+        try:
+            with span('db_write'):
+                await sync_to_async(self._write)(key, entry)
+        except Exception as e:
+            print(f"Error writing page cache for {key}: {e}")
+            self._count('errors')
+
+
+page_cache = PageCache()
@@ -0,0 +1,241 @@
+"""Markdown chunking and token counting for many documents at once.
+
+Chunking is section-aware: the Markdown is cut at its headings, consecutive
+small sections are packed together up to the chunk size, and only sections
+larger than a chunk go through the text splitter. Every chunk's header names
+the headings it sits under (its breadcrumb).
+
+Splitters are built once per ``(size, overlap, unit)`` configuration and
+reused. Token counts for a whole batch of chunks go through tiktoken's
+threaded batch encoder in one call. Chunk sizes can be given in characters
+(the original behaviour) or in tokens, counted with any encoding allowed by
+``SCRAPER_TOKENIZER_ENCODINGS`` (see scraper.tokenizer). The splitter
+library and the encoding are only loaded when the first document is chunked.
+"""
+import asyncio
+import re
+from functools import lru_cache, partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .metrics import span
+from .tokenizer import default_encoding, get_encoding
+
+UNIT_CHARS = 'chars'
+UNIT_TOKENS = 'tokens'
+UNITS = (UNIT_CHARS, UNIT_TOKENS)
+
+HEADING_PATTERN = re.compile(r'^(#{1,6})[ \t]+(.+?)(?:[ \t]+#+)?[ \t]*$')
+FENCE_PATTERN = re.compile(r'^[ \t]*(`{3,}|~{3,})')
+SECTION_SEPARATOR = '\n\n'
+
+
+def __getattr__(name):
+    # ``tokenizer`` used to be built at import; it is now the shared default encoding.
+    if name == 'tokenizer':
+        return get_encoding()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _token_length(text: str, encoding: str = None) -> int:
+    return len(get_encoding(encoding).encode_ordinary(text))
+
+
+@lru_cache(maxsize=32)
+def get_splitter(chunk_size: int, chunk_overlap: int, unit: str = UNIT_CHARS, encoding: str = None):
+    """Return a shared ``MarkdownTextSplitter`` for this configuration."""
+    if unit not in UNITS:
+        raise ValueError(f"Unknown chunk size unit: {unit}")
+    from langchain_text_splitters import MarkdownTextSplitter
+    if unit == UNIT_TOKENS:
+        return MarkdownTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                    length_function=partial(_token_length, encoding=encoding or default_encoding()))
+    return MarkdownTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def count_tokens(texts: list, encoding: str = None) -> list:
+    """Token counts for ``texts``, encoded in parallel (``SCRAPER_TOKENIZER_THREADS``)."""
+    if not texts:
+        return []
+    threads = getattr(settings, 'SCRAPER_TOKENIZER_THREADS', 4)
+    tokenizer = get_encoding(encoding)
+    with span('tokenize'):
+        return [len(tokens) for tokens in tokenizer.encode_ordinary_batch(texts, num_threads=max(1, threads))]
+
+
+def format_header_metadata(title: str, url: str, breadcrumb=()) -> str:
+    header = f"Document Title: {title}. Document URL: {url}\n"
+    if breadcrumb:
+        header += f"Section: {' > '.join(breadcrumb)}\n"
+    return header
+
+
+def split_sections(markdown_text: str) -> list:
+    """Cut Markdown at its headings into ``(breadcrumb, text)`` pairs.
+
+    ``breadcrumb`` holds the titles of the enclosing headings, ending with
+    the section's own; text before the first heading has an empty one.
+    Lines inside fenced code blocks are never taken for headings.
+    """
+    sections = []
+    path = []
+    lines = []
+    fence = None
+    for line in markdown_text.split('\n'):
+        if fence is not None:
+            if line.lstrip().startswith(fence):
+                fence = None
+        elif (match := FENCE_PATTERN.match(line)) is not None:
+            fence = match.group(1)
+        elif (match := HEADING_PATTERN.match(line)) is not None:
+            # Headings directly followed by a subheading stay with it.
+            if not all(HEADING_PATTERN.match(previous) for previous in lines if previous.strip()):
+                sections.append((tuple(title for _, title in path), '\n'.join(lines).strip()))
+                lines = []
+            level = len(match.group(1))
+            path = [(depth, title) for depth, title in path if depth < level] + [(level, match.group(2))]
+        lines.append(line)
+    text = '\n'.join(lines).strip()
+    if text:
+        sections.append((tuple(title for _, title in path), text))
+    return sections
+
+
+def _common_breadcrumb(breadcrumbs) -> tuple:
+    common = breadcrumbs[0]
+    for breadcrumb in breadcrumbs[1:]:
+        size = 0
+        while size < min(len(common), len(breadcrumb)) and common[size] == breadcrumb[size]:
+            size += 1
+        common = common[:size]
+    return common
+
+
+def chunk_markdown(markdown_text: str, chunk_size: int, chunk_overlap: int, unit: str = UNIT_CHARS,
+                   encoding: str = None) -> list:
+    """Section-aware chunks of ``markdown_text`` as ``(breadcrumb, text)`` pairs.
+
+    Consecutive sections are packed into one chunk while they fit in
+    ``chunk_size``; the breadcrumb of a packed chunk is what its sections
+    share. A section larger than a chunk is split with overlap by the
+    Markdown splitter, each piece keeping the section's breadcrumb.
+    ``encoding`` only matters for token units.
+    """
+    encoding = (encoding or default_encoding()) if unit == UNIT_TOKENS else None
+    splitter = get_splitter(chunk_size, chunk_overlap, unit, encoding)
+    length = partial(_token_length, encoding=encoding) if unit == UNIT_TOKENS else len
+    separator = length(SECTION_SEPARATOR)
+    chunks = []
+    texts, breadcrumbs, size = [], [], 0
+
+    def flush():
+        if texts:
+            chunks.append((_common_breadcrumb(breadcrumbs), SECTION_SEPARATOR.join(texts)))
+
+    for breadcrumb, text in split_sections(markdown_text or ''):
+        text_size = length(text)
+        if text_size > chunk_size:
+            flush()
+            texts, breadcrumbs, size = [], [], 0
+            chunks.extend((breadcrumb, piece) for piece in splitter.split_text(text))
+            continue
+        if texts and size + separator + text_size > chunk_size:
+            flush()
+            texts, breadcrumbs, size = [], [], 0
+        size += (separator if texts else 0) + text_size
+        texts.append(text)
+        breadcrumbs.append(breadcrumb)
+    flush()
+    return chunks
+
+
+def split_markdown(markdown_text, header_metadata, max_chunk_size, chunk_overlap_size, unit=UNIT_CHARS,
+                   encoding=None):
+    """Split markdown text into chunks (see :func:`chunk_markdown`).
+
+    Returns ``(chunk, token_count)`` pairs; every chunk starts with
+    ``header_metadata``, or with ``header_metadata(breadcrumb)`` when it is
+    callable (e.g. ``lambda breadcrumb: get_header_metadata(soup, url,
+    breadcrumb)``). ``max_chunk_size`` and ``chunk_overlap_size`` are
+    measured in ``unit`` and apply to the text after the header. Tokens
+    are counted with ``encoding`` (the default encoding for None).
+    """
+    chunks = chunk_markdown(markdown_text, max_chunk_size, chunk_overlap_size, unit, encoding)
+    final_chunks = [
+        f"{header_metadata(breadcrumb) if callable(header_metadata) else header_metadata}\n\n{chunk}"
+        for breadcrumb, chunk in chunks
+    ]
+    return list(zip(final_chunks, count_tokens(final_chunks, encoding)))
+
+
+def chunk_documents(documents, chunk_size: int, chunk_overlap: int, unit: str = UNIT_CHARS, batch_size: int = None,
+                    dedup=None, encoding: str = None):
+    """Chunk many documents, yielding one list of chunk records per batch of documents.
+
+    ``documents`` is an iterable of ``{'url', 'title', 'content'}`` dicts.
+    Records are ``{'url', 'chunk_index', 'content', 'tokens'}``. Batching
+    (``SCRAPER_CHUNK_BATCH_DOCUMENTS`` documents) keeps each tokenizer call
+    large enough to use all its threads while results still arrive early.
+    See :func:`chunk_batch` for ``dedup`` and ``encoding``.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'SCRAPER_CHUNK_BATCH_DOCUMENTS', 32)
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield chunk_batch(batch, chunk_size, chunk_overlap, unit, dedup, encoding)
+            batch = []
+    if batch:
+        yield chunk_batch(batch, chunk_size, chunk_overlap, unit, dedup, encoding)
+
+
+def chunk_batch(documents: list, chunk_size: int, chunk_overlap: int, unit: str = UNIT_CHARS, dedup=None,
+                encoding: str = None) -> list:
+    """Chunk a list of documents, counting all their chunks' tokens in one batch call.
+
+    With a :class:`~scraper.dedup.Deduplicator` as ``dedup``, a document
+    that near-duplicates an already indexed page is not chunked and a chunk
+    that near-duplicates an indexed chunk is not tokenized; each leaves a
+    record with a ``duplicate_of`` key (and no ``content``) instead. The
+    new fingerprints are saved once the batch is done. ``tokens`` (and
+    token-unit sizes) are counted with ``encoding``, the default for None.
+    """
+    records = _chunk_records(documents, chunk_size, chunk_overlap, unit, dedup, encoding)
+    if dedup is not None:
+        dedup.save()
+    return records
+
+
+async def achunk_batch(documents: list, chunk_size: int, chunk_overlap: int, unit: str = UNIT_CHARS, dedup=None,
+                       encoding: str = None) -> list:
+    """Async :func:`chunk_batch`: chunking runs in a worker thread, fingerprints are loaded and saved around it."""
+    if dedup is not None:
+        await sync_to_async(dedup.load)([document['url'] for document in documents])
+    records = await asyncio.to_thread(_chunk_records, documents, chunk_size, chunk_overlap, unit, dedup, encoding)
+    if dedup is not None:
+        await sync_to_async(dedup.save)()
+    return records
+
+
+def _chunk_records(documents: list, chunk_size: int, chunk_overlap: int, unit: str, dedup, encoding: str) -> list:
+    records = []
+    for document in documents:
+        content = document['content'] or ''
+        if dedup is not None and (original := dedup.page(document['url'], content)):
+            records.append({'url': document['url'], 'duplicate_of': original})
+            continue
+        chunks = chunk_markdown(content, chunk_size, chunk_overlap, unit, encoding)
+        for index, (breadcrumb, chunk) in enumerate(chunks):
+            record = {'url': document['url'], 'chunk_index': index, 'section': list(breadcrumb)}
+            if dedup is not None and (original := dedup.chunk(document['url'], index, chunk)):
+                record['duplicate_of'] = original
+            else:
+                header = format_header_metadata(document['title'], document['url'], breadcrumb)
+                record['content'] = f"{header}\n\n{chunk}"
+            records.append(record)
+    chunked = [record for record in records if 'content' in record]
+    for record, tokens in zip(chunked, count_tokens([record['content'] for record in chunked], encoding)):
+        record['tokens'] = tokens
+    return records
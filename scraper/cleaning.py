@@ -0,0 +1,362 @@
+"""HTML-to-text cleaning, run in a process pool so it never blocks the event loop.
+
+By default only a page's main content is kept (``SCRAPER_EXTRACT_MAIN_CONTENT``,
+see :mod:`scraper.extraction`); otherwise all visible text is returned.
+Callers that chunk the result ask for ``OUTPUT_MARKDOWN`` instead of
+whitespace-collapsed text, so headings, lists, tables and code blocks
+survive (see :mod:`scraper.markdown`).
+
+Parsing a large page takes long enough to stall every other coroutine on the
+loop, so :func:`aclean_html_content` ships documents to worker processes.
+Documents smaller than ``SCRAPER_CLEAN_BATCH_BYTES`` are grouped into one
+task (up to ``SCRAPER_CLEAN_BATCH_SIZE`` of them, waiting at most
+``SCRAPER_CLEAN_BATCH_WAIT_MS`` for company) to amortize the IPC round trip.
+
+The parser backend is chosen by ``SCRAPER_HTML_PARSER``: ``'html.parser'``
+(BeautifulSoup, always available), ``'lxml'``, ``'selectolax'``, or
+``'auto'`` for the fastest one installed. This module is imported by the
+worker processes, so it must stay free of Django and Playwright imports at
+module level.
+"""
+import asyncio
+import multiprocessing
+import os
+import re
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .metrics import span
+
+XML_STYLESHEET_PATTERN = re.compile(r'<\?xml-stylesheet.*?\?>')
+DOCTYPE_PATTERN = re.compile(r'<!DOCTYPE.*?>')
+HTML_BODY_PATTERN = re.compile(r'</?(?:html|body).*?>')
+HTML_END_PATTERN = re.compile(r'</html>')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+REMOVED_TAGS = ('script', 'style', 'meta', 'link', 'noscript')
+
+OUTPUT_TEXT = 'text'
+OUTPUT_MARKDOWN = 'markdown'
+OUTPUTS = (OUTPUT_TEXT, OUTPUT_MARKDOWN)
+
+PARSER_HTML = 'html.parser'
+PARSER_LXML = 'lxml'
+PARSER_SELECTOLAX = 'selectolax'
+# Fastest first; 'auto' picks the first one that imports.
+PARSER_PREFERENCE = (PARSER_SELECTOLAX, PARSER_LXML, PARSER_HTML)
+
+
+def _text_html_parser(html: str) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(list(REMOVED_TAGS)):
+        element.decompose()
+    return soup.get_text(separator=' ', strip=True)
+
+
+def _text_lxml(html: str) -> str:
+    from lxml import etree, html as lxml_html
+
+    document = lxml_html.document_fromstring(html)
+    etree.strip_elements(document, *REMOVED_TAGS, with_tail=False)
+    etree.strip_tags(document, etree.Comment, etree.ProcessingInstruction)
+    return ' '.join(text.strip() for text in document.itertext() if text.strip())
+
+
+def _text_selectolax(html: str) -> str:
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(list(REMOVED_TAGS))
+    root = tree.root
+    return root.text(separator=' ', strip=True) if root is not None else ''
+
+
+BACKENDS = {
+    PARSER_HTML: _text_html_parser,
+    PARSER_LXML: _text_lxml,
+    PARSER_SELECTOLAX: _text_selectolax,
+}
+
+_MODULES = {PARSER_HTML: 'bs4', PARSER_LXML: 'lxml.html', PARSER_SELECTOLAX: 'selectolax.lexbor'}
+_available = {}
+_warned = set()
+
+
+def parser_available(name: str) -> bool:
+    if name not in _available:
+        try:
+            __import__(_MODULES[name])
+            _available[name] = True
+        except ImportError:
+            _available[name] = False
+    return _available[name]
+
+
+def resolve_parser(name: str = None) -> str:
+    """Map a configured parser name to an installed backend."""
+    if name in (None, 'auto'):
+        return next((candidate for candidate in PARSER_PREFERENCE if parser_available(candidate)), PARSER_HTML)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser: {name}")
+    if not parser_available(name):
+        if name not in _warned:
+            _warned.add(name)
+            print(f"HTML parser {name} is not installed, using {PARSER_HTML}")
+        return PARSER_HTML
+    return name
+
+
+def clean_html_content(html_content: str, parser: str = PARSER_HTML) -> str:
+    """Clean HTML content and extract readable text.
+
+    Args:
+        html_content: Raw HTML string
+        parser: Backend name, see :data:`BACKENDS`
+    Returns:
+        Visible text with whitespace collapsed
+    """
+    try:
+        html_content = XML_STYLESHEET_PATTERN.sub('', html_content)
+        html_content = DOCTYPE_PATTERN.sub('', html_content)
+        html_content = HTML_BODY_PATTERN.sub('', html_content)
+        html_content = HTML_END_PATTERN.sub('', html_content)
+        if not html_content.strip():
+            return ''
+
+        text = BACKENDS[parser](html_content)
+        return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+    except Exception as e:
+        print(f"Error cleaning HTML content: {e}")
+        return ""
+
+
+def clean_html_markdown(html_content: str, base_url: str = None) -> str:
+    """Whole-page Markdown (see :mod:`scraper.markdown`); relative links are resolved against ``base_url``."""
+    from .markdown import html_to_markdown
+
+    try:
+        return html_to_markdown(XML_STYLESHEET_PATTERN.sub('', html_content), base_url)
+    except Exception as e:
+        print(f"Error converting HTML to Markdown: {e}")
+        return clean_html_content(html_content)
+
+
+def extract_main_content(html_content: str, parser: str = PARSER_HTML, main_selectors=None,
+                         remove_selectors=(), output: str = OUTPUT_TEXT, base_url: str = None) -> str:
+    """Main-content text (or Markdown) of a page (see :mod:`scraper.extraction`), with noise dropped.
+
+    Falls back to the whole page if extraction fails.
+    """
+    from .extraction import DEFAULT_MAIN_SELECTORS, extract_main_markdown, extract_main_text
+
+    # BeautifulSoup has no selectolax tree builder; lxml is the fast option.
+    builder = PARSER_LXML if parser != PARSER_HTML and parser_available(PARSER_LXML) else PARSER_HTML
+    try:
+        if main_selectors is None:
+            main_selectors = DEFAULT_MAIN_SELECTORS
+        if output == OUTPUT_MARKDOWN:
+            return extract_main_markdown(html_content, builder, main_selectors, remove_selectors, base_url)
+        return extract_main_text(html_content, builder, main_selectors, remove_selectors)
+    except Exception as e:
+        print(f"Error extracting main content: {e}")
+        if output == OUTPUT_MARKDOWN:
+            return clean_html_markdown(html_content, base_url)
+        return clean_html_content(html_content, parser)
+
+
+def clean_batch(documents: list, parser: str, extract=None, output: str = OUTPUT_TEXT, base_urls=None) -> list:
+    """Worker entry point: clean several documents in one task.
+
+    ``extract`` is None for the whole page, or a ``(main_selectors,
+    remove_selectors)`` pair to extract the main content instead.
+    ``base_urls`` (one per document) resolve relative links in Markdown.
+    """
+    if base_urls is None:
+        base_urls = [None] * len(documents)
+    if extract is None:
+        if output == OUTPUT_MARKDOWN:
+            return [clean_html_markdown(document, url) for document, url in zip(documents, base_urls)]
+        return [clean_html_content(document, parser) for document in documents]
+    return [
+        extract_main_content(document, parser, *extract, output=output, base_url=url)
+        for document, url in zip(documents, base_urls)
+    ]
+
+
+class _Batcher:
+    """Collects small documents on one event loop and submits them together."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.pending = {}
+        self.handles = {}
+
+    def add(self, html: str, parser: str, extract, output: str, base_url: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (parser, extract, output)
+        batch = self.pending.setdefault(key, [])
+        batch.append((html, base_url, future))
+        if len(batch) >= self.pool.batch_size:
+            self.flush(key)
+        elif key not in self.handles:
+            self.handles[key] = loop.call_later(self.pool.batch_wait, self.flush, key)
+        return future
+
+    def flush(self, key):
+        handle = self.handles.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+        batch = self.pending.pop(key, [])
+        if not batch:
+            return
+        futures = [future for _, _, future in batch]
+        try:
+            done = asyncio.wrap_future(self.pool.submit(
+                clean_batch, [html for html, _, _ in batch], *key, [url for _, url, _ in batch]
+            ))
+        except Exception as e:
+            done = asyncio.get_running_loop().create_future()
+            done.set_exception(e)
+        done.add_done_callback(lambda task: self._deliver(task, futures))
+
+    @staticmethod
+    def _deliver(task, futures):
+        error = None if task.cancelled() else task.exception()
+        for index, future in enumerate(futures):
+            if future.done():
+                continue
+            if task.cancelled():
+                future.cancel()
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(task.result()[index])
+
+
+class CleaningPool:
+    """Lazily started process pool for :func:`clean_html_content`.
+
+    Settings (read on every call):
+        SCRAPER_CLEAN_WORKERS: worker processes; None for one per CPU, 0 to
+            clean inline on the calling loop.
+        SCRAPER_HTML_PARSER: backend used when the caller does not pick one.
+        SCRAPER_CLEAN_BATCH_BYTES, SCRAPER_CLEAN_BATCH_SIZE,
+        SCRAPER_CLEAN_BATCH_WAIT_MS: batching of small documents.
+        SCRAPER_EXTRACT_MAIN_CONTENT: return only the main content (see
+            :func:`extract_main_content`) instead of all visible text.
+        SCRAPER_EXTRACT_MAIN_SELECTORS, SCRAPER_EXTRACT_REMOVE_SELECTORS:
+            CSS selectors for the extractor.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._batchers = weakref.WeakKeyDictionary()
+
+    def _setting(self, name, default):
+        from django.conf import settings
+
+        return getattr(settings, name, default)
+
+    @property
+    def workers(self) -> int:
+        workers = self._setting('SCRAPER_CLEAN_WORKERS', None)
+        return (os.cpu_count() or 1) if workers is None else workers
+
+    @property
+    def parser(self) -> str:
+        return resolve_parser(self._setting('SCRAPER_HTML_PARSER', 'auto'))
+
+    @property
+    def main_content(self) -> bool:
+        return self._setting('SCRAPER_EXTRACT_MAIN_CONTENT', True)
+
+    @property
+    def extract_options(self) -> tuple:
+        main_selectors = self._setting('SCRAPER_EXTRACT_MAIN_SELECTORS', None)
+        return (
+            tuple(main_selectors) if main_selectors is not None else None,
+            tuple(self._setting('SCRAPER_EXTRACT_REMOVE_SELECTORS', ())),
+        )
+
+    @property
+    def batch_bytes(self) -> int:
+        return self._setting('SCRAPER_CLEAN_BATCH_BYTES', 32 * 1024)
+
+    @property
+    def batch_size(self) -> int:
+        return max(1, self._setting('SCRAPER_CLEAN_BATCH_SIZE', 16))
+
+    @property
+    def batch_wait(self) -> float:
+        return self._setting('SCRAPER_CLEAN_BATCH_WAIT_MS', 2) / 1000
+
+    def submit(self, func, *args):
+        with self._executor_lock:
+            if self._executor is None:
+                # Not fork: the parent runs browser and job threads.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            executor = self._executor
+        return executor.submit(func, *args)
+
+    async def clean(self, html: str, parser: str = None, main_content: bool = None,
+                    output: str = OUTPUT_TEXT, base_url: str = None) -> str:
+        """Clean ``html`` in a worker process and return its text, or Markdown with ``OUTPUT_MARKDOWN``.
+
+        ``main_content`` defaults to ``SCRAPER_EXTRACT_MAIN_CONTENT``.
+        """
+        if not html:
+            return ''
+        if output not in OUTPUTS:
+            raise ValueError(f"Unknown cleaning output: {output}")
+        with span('html_clean' if output == OUTPUT_TEXT else 'html_markdown'):
+            return await self._clean(html, parser, main_content, output, base_url)
+
+    async def _clean(self, html: str, parser: str, main_content: bool, output: str, base_url: str) -> str:
+        parser = resolve_parser(parser) if parser else self.parser
+        if main_content is None:
+            main_content = self.main_content
+        extract = self.extract_options if main_content else None
+        if self.workers <= 0:
+            return clean_batch([html], parser, extract, output, [base_url])[0]
+        try:
+            if len(html) < self.batch_bytes and self.batch_size > 1:
+                loop = asyncio.get_running_loop()
+                batcher = self._batchers.get(loop)
+                if batcher is None:
+                    batcher = self._batchers[loop] = _Batcher(self)
+                return await batcher.add(html, parser, extract, output, base_url)
+            return (await asyncio.wrap_future(
+                self.submit(clean_batch, [html], parser, extract, output, [base_url])
+            ))[0]
+        except BrokenProcessPool as e:
+            print(f"HTML cleaning pool broke, restarting it: {e}")
+            self.shutdown(wait=False)
+            return clean_batch([html], parser, extract, output, [base_url])[0]
+
+    def shutdown(self, wait: bool = True):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    async def close(self):
+        await asyncio.to_thread(self.shutdown)
+
+
+cleaning_pool = CleaningPool()
+
+
+async def aclean_html_content(html_content: str, parser: str = None, main_content: bool = None,
+                              output: str = OUTPUT_TEXT, base_url: str = None) -> str:
+    """Async :func:`clean_html_content` / :func:`extract_main_content` backed by :data:`cleaning_pool`."""
+    return await cleaning_pool.clean(html_content, parser, main_content, output, base_url)
@@ -0,0 +1,251 @@
+"""Compression of stored page bodies with a dictionary trained per site.
+
+Cached pages of one site share most of their navigation, headers and
+footers, and a compressor that already knows those strings stores them as
+back-references from the first byte. :data:`content_compressor` collects the
+first ``SCRAPER_COMPRESSION_DICT_SAMPLES`` bodies of each host, trains a
+dictionary of at most ``SCRAPER_COMPRESSION_DICT_SIZE`` bytes from them and
+keeps it in the ``CompressionDictionary`` table, so rows written later (by
+any process) can be decoded. Bodies compressed before a site has a
+dictionary are compressed without one.
+
+The codec is chosen by ``SCRAPER_COMPRESSION``: ``'zstd'`` needs the
+optional ``zstandard`` package and trains a real zstd dictionary, ``'zlib'``
+uses the standard library with the samples themselves as its preset
+dictionary (zstd does the same when there is too little sample data to
+train on), ``'auto'`` picks zstd when installed, and ``'off'`` stores text
+as it is. Bodies shorter than ``SCRAPER_COMPRESSION_MIN_BYTES``,
+or that would not get smaller, are stored as plain text too.
+
+Settings: SCRAPER_COMPRESSION, SCRAPER_COMPRESSION_LEVEL,
+SCRAPER_COMPRESSION_MIN_BYTES, SCRAPER_COMPRESSION_DICT_SAMPLES,
+SCRAPER_COMPRESSION_DICT_SIZE.
+"""
+import threading
+import zlib
+
+from django.conf import settings
+
+from .metrics import span
+from .models import CompressionDictionary
+
+CODEC_PLAIN = ''
+CODEC_ZLIB = 'zlib'
+CODEC_ZSTD = 'zstd'
+CODECS = (CODEC_ZSTD, CODEC_ZLIB)
+COMPRESSION_AUTO = 'auto'
+COMPRESSION_OFF = 'off'
+
+DEFAULT_LEVELS = {CODEC_ZLIB: 6, CODEC_ZSTD: 3}
+# zlib only looks back 32 KB, so a longer preset dictionary is never used.
+ZLIB_WINDOW = 32 * 1024
+
+
+def zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_codec(name: str) -> str:
+    """Map a ``SCRAPER_COMPRESSION`` value to the codec used, falling back to zlib."""
+    if name == COMPRESSION_OFF:
+        return CODEC_PLAIN
+    if name == COMPRESSION_AUTO:
+        return CODEC_ZSTD if zstd_available() else CODEC_ZLIB
+    if name not in CODECS:
+        raise ValueError(f"Unknown compression {name!r}; use one of {', '.join(CODECS)}, auto or off")
+    if name == CODEC_ZSTD and not zstd_available():
+        print(f"Compression {CODEC_ZSTD} needs the zstandard package, using {CODEC_ZLIB}")
+        return CODEC_ZLIB
+    return name
+
+
+def _raw_dictionary(samples: list, size: int):
+    """The samples themselves, newest last, cut to ``size`` bytes.
+
+    Cleaned text often has no line breaks to find shared lines by, and a
+    page compressed against a few siblings turns every string they share
+    (navigation, boilerplate, repeated phrasing) into a back-reference.
+    """
+    return b''.join(samples)[-size:] or None
+
+
+def train_dictionary(samples: list, codec: str, size: int):
+    """Return dictionary bytes trained on ``samples`` (bytes), or None if there is nothing to share."""
+    if codec == CODEC_ZSTD:
+        import zstandard
+        try:
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        except zstandard.ZstdError:
+            # Too little sample data to train on; zstd takes any bytes as a raw-content dictionary.
+            return _raw_dictionary(samples, size)
+    return _raw_dictionary(samples, min(size, ZLIB_WINDOW))
+
+
+class Dictionary:
+    """Dictionary bytes digested once, so each page only pays for compressing its own bytes.
+
+    zlib hashes a preset dictionary every time one is set, so a compressor
+    primed with it is copied instead; zstd precomputes its tables.
+    """
+
+    def __init__(self, data: bytes, codec: str, level: int = None):
+        self.data = data
+        self.codec = codec
+        self.level = DEFAULT_LEVELS[codec] if level is None else level
+        if codec == CODEC_ZSTD:
+            import zstandard
+            self.zstd = zstandard.ZstdCompressionDict(data)
+            self.zstd.precompute_compress(level=self.level)
+        else:
+            self.zlib = zlib.compressobj(self.level, zdict=data)
+
+
+def compress(data: bytes, codec: str, dictionary: Dictionary = None, level: int = None) -> bytes:
+    """Compress ``data`` at ``level``, or at the level ``dictionary`` was prepared for."""
+    if dictionary is not None:
+        level = dictionary.level
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    if codec == CODEC_ZSTD:
+        import zstandard
+        return zstandard.ZstdCompressor(level=level, dict_data=dictionary.zstd if dictionary else None).compress(data)
+    compressor = dictionary.zlib.copy() if dictionary else zlib.compressobj(level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(blob: bytes, codec: str, dictionary: Dictionary = None) -> bytes:
+    if codec == CODEC_ZSTD:
+        import zstandard
+        return zstandard.ZstdDecompressor(dict_data=dictionary.zstd if dictionary else None).decompress(blob)
+    decompressor = zlib.decompressobj(zdict=dictionary.data) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(blob) + decompressor.flush()
+
+
+class ContentCompressor:
+    """Packs page bodies into ``ScrapedData`` columns, training one dictionary per site and codec.
+
+    Dictionaries are loaded from the table the first time a site is seen and
+    kept in memory, prepared, by id; nothing else is cached. Packing may train and save
+    a dictionary and unpacking may load one, so both touch the database and
+    async callers go through ``sync_to_async``.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (domain, codec) -> dictionary row or None; (id, level) -> prepared Dictionary.
+        self._sites = {}
+        self._dictionaries = {}
+        self._samples = {}
+        self._counters = dict.fromkeys(
+            ('packed', 'plain', 'compressed', 'bytes_in', 'bytes_out', 'dictionaries_trained'), 0
+        )
+
+    @property
+    def codec(self) -> str:
+        return resolve_codec(getattr(settings, 'SCRAPER_COMPRESSION', COMPRESSION_AUTO))
+
+    @property
+    def level(self):
+        return getattr(settings, 'SCRAPER_COMPRESSION_LEVEL', None)
+
+    @property
+    def min_bytes(self) -> int:
+        return getattr(settings, 'SCRAPER_COMPRESSION_MIN_BYTES', 256)
+
+    @property
+    def dictionary_samples(self) -> int:
+        return getattr(settings, 'SCRAPER_COMPRESSION_DICT_SAMPLES', 32)
+
+    @property
+    def dictionary_size(self) -> int:
+        return getattr(settings, 'SCRAPER_COMPRESSION_DICT_SIZE', 32 * 1024)
+
+    def pack(self, domain: str, text: str) -> dict:
+        """Return the ``content``/``codec``/``compressed_content``/``dictionary`` fields storing ``text``."""
+        codec = self.codec
+        data = (text or '').encode('utf-8')
+        self._count(packed=1, bytes_in=len(data))
+        if codec == CODEC_PLAIN or len(data) < self.min_bytes:
+            return self._plain(text, len(data))
+        with span('compress'):
+            row = self._dictionary_for(domain, codec, data)
+            dictionary = self._dictionary(row.id, codec, row.data) if row else None
+            blob = compress(data, codec, dictionary, self.level)
+        if len(blob) >= len(data):
+            return self._plain(text, len(data))
+        self._count(compressed=1, bytes_out=len(blob))
+        return {'content': '', 'codec': codec, 'compressed_content': blob, 'dictionary': row}
+
+    def unpack(self, row) -> str:
+        """Return the text stored in a ``ScrapedData`` row, whichever way it was packed."""
+        if not row.codec:
+            return row.content
+        dictionary = self._dictionary(row.dictionary_id, row.codec) if row.dictionary_id else None
+        with span('decompress'):
+            return decompress(bytes(row.compressed_content), row.codec, dictionary).decode('utf-8')
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['sites'] = sum(1 for row in self._sites.values() if row is not None)
+            stats['sampling'] = len(self._samples)
+        stats['codec'] = self.codec or COMPRESSION_OFF
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 4) if stats['bytes_in'] else 0.0
+        return stats
+
+    def clear(self):
+        """Forget loaded dictionaries, pending samples and counters (the table is left alone)."""
+        with self._lock:
+            self._sites.clear()
+            self._dictionaries.clear()
+            self._samples.clear()
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def _plain(self, text: str, size: int) -> dict:
+        self._count(plain=1, bytes_out=size)
+        return {'content': text or '', 'codec': CODEC_PLAIN, 'compressed_content': None, 'dictionary': None}
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self._counters[name] += amount
+
+    def _dictionary(self, dictionary_id: int, codec: str, data: bytes = None) -> Dictionary:
+        key = (dictionary_id, self.level)
+        with self._lock:
+            if key not in self._dictionaries:
+                if data is None:
+                    data = CompressionDictionary.objects.values_list('data', flat=True).get(pk=dictionary_id)
+                self._dictionaries[key] = Dictionary(bytes(data), codec, self.level)
+            return self._dictionaries[key]
+
+    def _dictionary_for(self, domain: str, codec: str, data: bytes):
+        """Return the site's dictionary row, training one once enough samples are in."""
+        key = (domain, codec)
+        with self._lock:
+            if key not in self._sites:
+                rows = CompressionDictionary.objects.filter(domain=domain, codec=codec)
+                self._sites[key] = rows.order_by('-id').first()
+            if self._sites[key] is not None or self.dictionary_samples <= 0:
+                return self._sites[key]
+            samples = self._samples.setdefault(key, [])
+            samples.append(data)
+            if len(samples) < self.dictionary_samples:
+                return None
+            del self._samples[key]
+            with span('train_dictionary'):
+                trained = train_dictionary(samples, codec, self.dictionary_size)
+            if trained is None:
+                return None
+            row = CompressionDictionary.objects.create(domain=domain, codec=codec, data=trained,
+                                                       sample_count=len(samples))
+            self._sites[key] = row
+            self._counters['dictionaries_trained'] += 1
+            return row
+
+
+content_compressor = ContentCompressor()
@@ -0,0 +1,252 @@
+"""Concurrent same-domain crawler built on the pooled HTTP client."""
+import asyncio
+import random
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+import httpx
+from django.conf import settings
+
+from .http_client import get_http_client
+from .politeness import host_scheduler
+from .url_filter import UrlFilter, normalize_url
+from .utils import USER_AGENTS
+
+SKIPPED_TEXT_TAGS = {'script', 'style', 'template', 'noscript'}
+
+
+class LinkAndTextParser(HTMLParser):
+    """Single pass over a page collecting ``<a href>`` values and visible text length."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self.text_length = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TEXT_TAGS:
+            self._skip_depth += 1
+        elif tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TEXT_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.text_length += len(data.strip())
+
+
+def parse_page(html: str):
+    """Return ``(links, text_length)`` for an HTML document."""
+    parser = LinkAndTextParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        print(f"Error parsing page: {e}")
+    return parser.links, parser.text_length
+
+
+class RobotsCache:
+    """Fetch and cache robots.txt per host; unreachable robots files allow everything."""
+
+    def __init__(self, user_agent: str):
+        self.user_agent = user_agent
+        self._parsers = {}
+
+    async def parser_for(self, url: str) -> RobotFileParser:
+        parsed = urlparse(url)
+        origin = f'{parsed.scheme}://{parsed.netloc}'
+        if origin not in self._parsers:
+            self._parsers[origin] = asyncio.ensure_future(self._fetch(origin))
+        return await self._parsers[origin]
+
+    async def _fetch(self, origin: str) -> RobotFileParser:
+        robots = RobotFileParser(origin + '/robots.txt')
+        try:
+            client = get_http_client()
+            response = await host_scheduler.request(
+                robots.url, lambda: client.get(robots.url, headers={'User-Agent': self.user_agent})
+            )
+            if response.status_code in (401, 403):
+                robots.disallow_all = True
+            elif response.is_success:
+                robots.parse(response.text.splitlines())
+                host_scheduler.set_crawl_delay(origin, robots.crawl_delay(self.user_agent) or 0)
+            else:
+                robots.allow_all = True
+        except httpx.HTTPError:
+            robots.allow_all = True
+        return robots
+
+    async def allowed(self, url: str) -> bool:
+        robots = await self.parser_for(url)
+        return robots.can_fetch(self.user_agent, url)
+
+
+class Crawler:
+    """Breadth-first crawl of a site with a pool of async workers.
+
+    URLs are normalized and deduplicated when they are enqueued, so every page
+    is fetched at most once. Links are followed when ``UrlFilter`` puts them
+    in scope: same registrable domain and the ``include``/``exclude``
+    patterns; the root URL is always visited. ``max_pages`` counts visited
+    pages: URLs robots.txt disallows and fetches that fail are recorded with
+    ``selected: False`` and leave room for another page. Per-host rate and concurrency
+    limits, including the robots.txt Crawl-delay (read before a host's first
+    page when robots.txt is respected), are left to :data:`~scraper.politeness.host_scheduler` like every
+    other fetch.
+
+    Settings: SCRAPER_CRAWL_WORKERS, SCRAPER_CRAWL_MAX_DEPTH,
+    SCRAPER_CRAWL_RESPECT_ROBOTS.
+    """
+
+    def __init__(self, root_url: str, max_pages: int = 100, max_depth: int = None,
+                 workers: int = None, respect_robots: bool = None, include=None, exclude=None):
+        self.root_url = root_url
+        self.url_filter = UrlFilter(root_url, include, exclude)
+        self.max_pages = max_pages
+        self.max_depth = max_depth if max_depth is not None else getattr(settings, 'SCRAPER_CRAWL_MAX_DEPTH', None)
+        self.workers = workers or getattr(settings, 'SCRAPER_CRAWL_WORKERS', 16)
+        if respect_robots is None:
+            respect_robots = getattr(settings, 'SCRAPER_CRAWL_RESPECT_ROBOTS', True)
+        self.respect_robots = respect_robots
+
+        self.user_agent = random.choice(USER_AGENTS)
+        self.robots = RobotsCache(self.user_agent)
+        self.url_info = []
+        self._results = None
+        self._seen = set()
+        self._queue = asyncio.Queue()
+        # Pages visited so far and visits under way; a visit that does not count gives its place back.
+        self._visited = 0
+        self._in_flight = 0
+        self._budget = asyncio.Condition()
+
+    async def crawl(self) -> list:
+        """Crawl until the frontier is empty or ``max_pages`` URLs were visited."""
+        self.url_info = [record async for record in self.iter_crawl()]
+        return self.url_info
+
+    async def iter_crawl(self):
+        """Crawl like :meth:`crawl`, yielding each ``url_info`` record as soon as its page is done.
+
+        Records are handed over, not kept on the crawler.
+        """
+        self._results = asyncio.Queue()
+        self._enqueue(self.root_url, 0)
+        workers = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        finished = asyncio.ensure_future(self._queue.join())
+        finished.add_done_callback(lambda _: self._results.put_nowait(None))
+        try:
+            while True:
+                record = await self._results.get()
+                if record is None:
+                    break
+                yield record
+        finally:
+            finished.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(finished, *workers, return_exceptions=True)
+
+    def _record(self, record: dict):
+        self._results.put_nowait(record)
+
+    def _enqueue(self, url: str, depth: int):
+        if self._visited >= self.max_pages:
+            return
+        if self.max_depth is not None and depth > self.max_depth:
+            return
+        if depth and not self.url_filter.in_scope(url):
+            return
+        key = normalize_url(url)
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        self._queue.put_nowait((url, depth))
+
+    async def _worker(self):
+        while True:
+            url, depth = await self._queue.get()
+            try:
+                if await self._reserve():
+                    visited = False
+                    try:
+                        visited = await self._visit(url, depth)
+                    finally:
+                        await self._release(visited)
+            except Exception as e:
+                print(f"Error crawling {url}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _reserve(self) -> bool:
+        """Claim a place in the ``max_pages`` budget, waiting while visits under way might still give one back."""
+        async with self._budget:
+            await self._budget.wait_for(
+                lambda: self._visited + self._in_flight < self.max_pages or not self._in_flight
+            )
+            if self._visited >= self.max_pages:
+                return False
+            self._in_flight += 1
+            return True
+
+    async def _release(self, visited: bool):
+        async with self._budget:
+            self._in_flight -= 1
+            self._visited += visited
+            self._budget.notify_all()
+
+    async def _visit(self, url: str, depth: int) -> bool:
+        """Visit ``url`` and record it; returns whether it counts towards ``max_pages``."""
+        if not self.url_filter.is_page(url):
+            self._record({'url': url, 'selected': True, 'processed': False, 'size': 0})
+            return True
+        if self.respect_robots and not await self.robots.allowed(url):
+            self._record({'url': url, 'selected': False, 'processed': False, 'size': 0})
+            return False
+
+        try:
+            response = await self._fetch(url)
+        except httpx.HTTPError:
+            self._record({'url': url, 'selected': False, 'processed': False, 'size': 0})
+            return False
+
+        size = 0
+        if 'html' in response.headers.get('content-type', 'text/html'):
+            links, size = parse_page(response.text)
+            for link in links:
+                self._enqueue(urljoin(url, link), depth + 1)
+        self._record({
+            'url': url,
+            'selected': True,
+            'processed': bool(size),
+            'size': size
+        })
+        return True
+
+    async def _fetch(self, url: str) -> httpx.Response:
+        client = get_http_client()
+        return await host_scheduler.request(url, lambda: client.get(url, headers={'User-Agent': self.user_agent}))
+
+
+async def crawl_website(root_url: str, max_pages: int = 100, max_depth: int = None,
+                        include=None, exclude=None) -> list:
+    """Crawl ``root_url``'s domain and return ``url_info`` records."""
+    crawler = Crawler(root_url, max_pages=max_pages, max_depth=max_depth, include=include, exclude=exclude)
+    return await crawler.crawl()
+
+
+async def iter_crawl_website(root_url: str, max_pages: int = 100, max_depth: int = None,
+                             include=None, exclude=None):
+    """Like :func:`crawl_website`, but yield each record as soon as its page is done."""
+    crawler = Crawler(root_url, max_pages=max_pages, max_depth=max_depth, include=include, exclude=exclude)
+    async for record in crawler.iter_crawl():
+        yield record
@@ -0,0 +1,387 @@
+"""Near-duplicate detection for pages and chunks before they are embedded.
+
+Every text gets a 64-bit SimHash over its word 3-shingles (weighted by how
+often each shingle occurs), so two texts that share most of their wording
+end up a few bits apart. Markup is ignored - only ``\\w+`` words count - so
+cleaned text and Markdown of the same page fingerprint alike.
+
+A :class:`SimHashIndex` finds a stored fingerprint within ``distance`` bits
+without comparing against every entry: the 64 bits are cut into
+``distance + 1`` bands, and by the pigeonhole principle two fingerprints that
+close agree exactly on at least one band, so only entries sharing a band
+value are compared. At 8 bytes per entry the index stays small enough to
+keep a whole site in memory.
+
+:data:`fingerprint_store` keeps one page index and one chunk index per site
+(registrable domain), loaded from the ``ContentFingerprint`` table the first
+time a site is seen and written back as texts are checked. A page that was
+already indexed under its own URL is not its own duplicate: re-submitting it
+replaces its fingerprints. Async callers check texts in worker threads, so
+they :meth:`Deduplicator.load` the sites first and :meth:`Deduplicator.save`
+afterwards through ``sync_to_async``; the checks themselves then never touch
+the database.
+
+Settings: SCRAPER_DEDUP_MODE, SCRAPER_DEDUP_PAGE_DISTANCE,
+SCRAPER_DEDUP_CHUNK_DISTANCE, SCRAPER_DEDUP_MIN_WORDS, SCRAPER_DEDUP_PERSIST.
+"""
+import re
+import sys
+import threading
+from array import array
+from hashlib import blake2b
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+
+from .metrics import registry, span
+from .models import ContentFingerprint
+from .url_filter import registrable_domain
+
+MODE_DROP = 'drop'
+MODE_LINK = 'link'
+MODE_OFF = 'off'
+MODES = (MODE_DROP, MODE_LINK, MODE_OFF)
+
+KIND_PAGE = ContentFingerprint.Kind.PAGE
+KIND_CHUNK = ContentFingerprint.Kind.CHUNK
+
+WORD_PATTERN = re.compile(r'\w+')
+FINGERPRINT_BITS = 64
+# Shingles are hashed as h(w1) ^ rotl(h(w2), 21) ^ rotl(h(w3), 42).
+SHINGLE_ROTATIONS = (21, 42)
+# Word hashes are remembered across calls; a site's vocabulary is small.
+WORD_CACHE_SIZE = 1 << 18
+
+_word_hashes = {}
+
+checks_total = registry.counter('scraper_dedup_checks_total', 'Texts checked for near-duplicates by kind and outcome.')
+
+
+def words(text: str) -> list:
+    return WORD_PATTERN.findall(text.lower())
+
+
+def _lanes(pattern: bytes, count: int) -> int:
+    """``pattern`` (one little-endian 64-bit lane) repeated ``count`` times, as one integer."""
+    return int.from_bytes(pattern * count, 'little')
+
+
+def _rotate_lanes(packed: int, count: int, bits: int) -> int:
+    """Rotate each of the ``count`` 64-bit lanes of ``packed`` left by ``bits``."""
+    low = _lanes(((1 << bits) - 1).to_bytes(8, 'little'), count)
+    everything = (1 << (FINGERPRINT_BITS * count)) - 1
+    return ((packed << bits) & (everything ^ low)) | ((packed >> (FINGERPRINT_BITS - bits)) & low)
+
+
+def _pack_word_hashes(tokens) -> int:
+    global _word_hashes
+    hashes = _word_hashes
+    missing = set(tokens).difference(hashes)
+    if len(hashes) + len(missing) > WORD_CACHE_SIZE:
+        # Start over rather than clear: other threads may be reading the old table.
+        hashes = _word_hashes = {}
+        missing = set(tokens)
+    for word in missing:
+        hashes[word] = int.from_bytes(blake2b(word.encode(), digest_size=8).digest(), 'little')
+    lanes = array('Q', map(hashes.__getitem__, tokens))
+    if sys.byteorder == 'big':
+        lanes.byteswap()
+    return int.from_bytes(lanes.tobytes(), 'little')
+
+
+def simhash(text: str):
+    """64-bit SimHash of ``text``'s word 3-shingles, or None when it has no words.
+
+    The shingle hashes are packed side by side into one integer, so
+    combining them and counting each bit's votes are a few operations on
+    big integers instead of a Python loop per shingle.
+    """
+    tokens = words(text or '')
+    if not tokens:
+        return None
+    count = len(tokens)
+    packed = _pack_word_hashes(tokens)
+    shingles = packed
+    for offset, bits in enumerate(SHINGLE_ROTATIONS, 1):
+        if count > offset:
+            shingles ^= _rotate_lanes(packed, count, bits) >> (FINGERPRINT_BITS * offset)
+    count = max(1, count - len(SHINGLE_ROTATIONS))
+    shingles &= (1 << (FINGERPRINT_BITS * count)) - 1
+    data = shingles.to_bytes(8 * count, 'little')
+    # Bit ``8 * i + j`` of the fingerprint is set when bit ``j`` of byte
+    # ``i`` is set in more than half the shingle hashes.
+    ones = _lanes(b'\x01', count)
+    fingerprint = 0
+    for i in range(8):
+        column = int.from_bytes(data[i::8], 'little')
+        for j in range(8):
+            if ((column >> j) & ones).bit_count() * 2 > count:
+                fingerprint |= 1 << (8 * i + j)
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _to_signed(fingerprint: int) -> int:
+    # BigIntegerField is a signed 64-bit column.
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class SimHashIndex:
+    """Fingerprints by key, searchable for the nearest one within ``distance`` bits."""
+
+    def __init__(self, distance: int = 3):
+        if not 0 <= distance < FINGERPRINT_BITS // 2:
+            raise ValueError(f"distance must be between 0 and {FINGERPRINT_BITS // 2 - 1}")
+        self.distance = distance
+        bands = distance + 1
+        bounds = [FINGERPRINT_BITS * band // bands for band in range(bands + 1)]
+        self._bands = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._buckets = [{} for _ in self._bands]
+        self._fingerprints = {}
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def __contains__(self, key):
+        return key in self._fingerprints
+
+    def _band_values(self, fingerprint: int):
+        return [(fingerprint >> start) & mask for start, mask in self._bands]
+
+    def add(self, key, fingerprint: int):
+        self.remove(key)
+        self._fingerprints[key] = fingerprint
+        for buckets, value in zip(self._buckets, self._band_values(fingerprint)):
+            buckets.setdefault(value, set()).add(key)
+
+    def remove(self, key):
+        fingerprint = self._fingerprints.pop(key, None)
+        if fingerprint is None:
+            return
+        for buckets, value in zip(self._buckets, self._band_values(fingerprint)):
+            bucket = buckets[value]
+            bucket.discard(key)
+            if not bucket:
+                del buckets[value]
+
+    def find(self, fingerprint: int, exclude=None):
+        """``(key, distance)`` of the closest entry within ``distance`` bits, or None."""
+        best = None
+        seen = set()
+        for buckets, value in zip(self._buckets, self._band_values(fingerprint)):
+            for key in buckets.get(value, ()):
+                if key in seen or key == exclude:
+                    continue
+                seen.add(key)
+                distance = hamming_distance(fingerprint, self._fingerprints[key])
+                if distance <= self.distance and (best is None or distance < best[1]):
+                    best = (key, distance)
+        return best
+
+
+def site_of(url: str) -> str:
+    return registrable_domain((urlsplit(url).hostname or '').lower())
+
+
+class FingerprintStore:
+    """Page and chunk indexes per site, backed by ``ContentFingerprint``.
+
+    Page keys are URLs, chunk keys ``(url, chunk_index)``. Changes are kept
+    until :meth:`save` writes them in one transaction.
+    """
+
+    def __init__(self):
+        self._sites = {}
+        self._pending = {}
+        self._forgotten = set()
+        self._lock = threading.RLock()
+
+    def _persist(self) -> bool:
+        return getattr(settings, 'SCRAPER_DEDUP_PERSIST', True)
+
+    def _site(self, site: str):
+        indexes = self._sites.get(site)
+        if indexes is None:
+            pages = SimHashIndex(getattr(settings, 'SCRAPER_DEDUP_PAGE_DISTANCE', 6))
+            chunks = SimHashIndex(getattr(settings, 'SCRAPER_DEDUP_CHUNK_DISTANCE', 3))
+            chunk_counts = {}
+            if self._persist():
+                with span('dedup_load'):
+                    rows = ContentFingerprint.objects.filter(domain=site).values_list(
+                        'kind', 'url', 'chunk_index', 'fingerprint'
+                    )
+                    for kind, url, chunk_index, fingerprint in rows.iterator():
+                        if kind == KIND_PAGE:
+                            pages.add(url, _to_unsigned(fingerprint))
+                        else:
+                            chunks.add((url, chunk_index), _to_unsigned(fingerprint))
+                            chunk_counts[url] = max(chunk_counts.get(url, 0), chunk_index + 1)
+            indexes = self._sites[site] = (pages, chunks, chunk_counts)
+        return indexes
+
+    def load(self, urls):
+        """Load the indexes of the sites ``urls`` belong to, so checking them needs no queries."""
+        with self._lock:
+            for site in {site_of(url) for url in urls if url}:
+                self._site(site)
+
+    def _forget(self, site: str, url: str):
+        pages, chunks, chunk_counts = self._site(site)
+        pages.remove(url)
+        for index in range(chunk_counts.pop(url, 0)):
+            chunks.remove((url, index))
+        for key in [key for key in self._pending if key[0] == site and key[2] == url]:
+            del self._pending[key]
+        self._forgotten.add((site, url))
+
+    def check_page(self, url: str, fingerprint: int):
+        """Return ``(url, distance)`` of a near-duplicate page of the same site, else index this one."""
+        site = site_of(url)
+        with self._lock:
+            pages, _, _ = self._site(site)
+            match = pages.find(fingerprint, exclude=url)
+            # The page's previous fingerprints and chunks are out of date
+            # either way; a duplicate is not indexed again.
+            self._forget(site, url)
+            if match is None:
+                pages.add(url, fingerprint)
+                self._pending[(site, KIND_PAGE, url, 0)] = fingerprint
+            return match
+
+    def check_chunk(self, url: str, chunk_index: int, fingerprint: int):
+        """Return ``((url, chunk_index), distance)`` of a near-duplicate chunk, else index this one."""
+        site = site_of(url)
+        key = (url, chunk_index)
+        with self._lock:
+            _, chunks, chunk_counts = self._site(site)
+            match = chunks.find(fingerprint, exclude=key)
+            if match is None:
+                chunks.add(key, fingerprint)
+                chunk_counts[url] = max(chunk_counts.get(url, 0), chunk_index + 1)
+                self._pending[(site, KIND_CHUNK, url, chunk_index)] = fingerprint
+            return match
+
+    def save(self):
+        """Write the fingerprints added and removed since the last save."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            forgotten, self._forgotten = self._forgotten, set()
+        if not self._persist() or not (pending or forgotten):
+            return
+        rows = [
+            ContentFingerprint(domain=site, kind=kind, url=url, chunk_index=chunk_index,
+                               fingerprint=_to_signed(fingerprint))
+            for (site, kind, url, chunk_index), fingerprint in pending.items()
+        ]
+        batch_size = getattr(settings, 'SCRAPER_DB_BATCH_SIZE', 500)
+        with span('db_write'), transaction.atomic():
+            for site, url in forgotten:
+                ContentFingerprint.objects.filter(domain=site, url=url).delete()
+            ContentFingerprint.objects.bulk_create(
+                rows,
+                batch_size=max(1, batch_size),
+                update_conflicts=True,
+                unique_fields=['domain', 'kind', 'url', 'chunk_index'],
+                update_fields=['fingerprint'],
+            )
+
+    def clear(self):
+        """Drop the in-memory indexes (stored fingerprints are reloaded on next use)."""
+        with self._lock:
+            self._sites.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'sites': len(self._sites),
+                'pages': sum(len(pages) for pages, _, _ in self._sites.values()),
+                'chunks': sum(len(chunks) for _, chunks, _ in self._sites.values()),
+            }
+
+
+fingerprint_store = FingerprintStore()
+
+
+class Deduplicator:
+    """Near-duplicate checks for one chunking run, counting what it found.
+
+    Documents without a URL have no site to be compared within and are
+    always kept. Chunks shorter than ``SCRAPER_DEDUP_MIN_WORDS`` words are
+    kept too: short boilerplate lines carry their meaning in the section
+    they sit under.
+    """
+
+    def __init__(self, mode: str = None, store: FingerprintStore = None):
+        if mode is None:
+            mode = getattr(settings, 'SCRAPER_DEDUP_MODE', MODE_OFF)
+        if mode not in MODES:
+            raise ValueError(f"Unknown dedup mode: {mode}")
+        self.mode = mode
+        self.store = store or fingerprint_store
+        self.min_words = getattr(settings, 'SCRAPER_DEDUP_MIN_WORDS', 20)
+        self.pages = self.duplicate_pages = 0
+        self.chunks = self.duplicate_chunks = 0
+        self.duplicate_chars = 0
+        # Several chunking threads may share one run.
+        self._lock = threading.Lock()
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def page(self, url: str, text: str):
+        """``{'url', 'distance'}`` of the page ``text`` near-duplicates, or None to keep it."""
+        self._count(pages=1)
+        fingerprint = simhash(text) if url else None
+        if fingerprint is None:
+            return None
+        with span('dedup'):
+            match = self.store.check_page(url, fingerprint)
+        checks_total.inc(kind=KIND_PAGE, outcome='duplicate' if match else 'unique')
+        if match is None:
+            return None
+        self._count(duplicate_pages=1, duplicate_chars=len(text))
+        original, distance = match
+        return {'url': original, 'distance': distance}
+
+    def chunk(self, url: str, chunk_index: int, text: str):
+        """``{'url', 'chunk_index', 'distance'}`` of the chunk ``text`` near-duplicates, or None."""
+        self._count(chunks=1)
+        if not url or len(words(text)) < self.min_words:
+            return None
+        fingerprint = simhash(text)
+        with span('dedup'):
+            match = self.store.check_chunk(url, chunk_index, fingerprint)
+        checks_total.inc(kind=KIND_CHUNK, outcome='duplicate' if match else 'unique')
+        if match is None:
+            return None
+        self._count(duplicate_chunks=1, duplicate_chars=len(text))
+        (original, original_index), distance = match
+        return {'url': original, 'chunk_index': original_index, 'distance': distance}
+
+    def load(self, urls):
+        self.store.load(urls)
+
+    def save(self):
+        self.store.save()
+
+    def report(self) -> dict:
+        return {
+            'mode': self.mode,
+            'documents_checked': self.pages,
+            'documents_duplicate': self.duplicate_pages,
+            'document_ratio': round(self.duplicate_pages / self.pages, 4) if self.pages else 0.0,
+            'chunks_checked': self.chunks,
+            'chunks_duplicate': self.duplicate_chunks,
+            'chunk_ratio': round(self.duplicate_chunks / self.chunks, 4) if self.chunks else 0.0,
+            'chars_skipped': self.duplicate_chars,
+        }
@@ -0,0 +1,248 @@
+"""Boilerplate-aware main-content extraction from raw HTML.
+
+A small readability-style extractor: navigation chrome is dropped by tag and
+by class/id hints, then either a configured main-content selector or the
+highest scoring text block (paragraph density, commas, link density) is
+kept, and link-heavy lists inside it are pruned. It needs no browser and,
+like :mod:`scraper.cleaning`, no Django, so it runs inside the cleaning
+worker processes.
+"""
+import re
+
+from bs4 import BeautifulSoup, Tag
+
+from .cleaning import REMOVED_TAGS, WHITESPACE_PATTERN
+from .markdown import convert_elements
+
+BOILERPLATE_TAGS = REMOVED_TAGS + (
+    'nav', 'header', 'footer', 'aside', 'form', 'iframe', 'svg', 'button',
+    'select', 'input', 'textarea', 'template', 'dialog',
+)
+
+DEFAULT_MAIN_SELECTORS = ('main', 'article', '[role="main"]', '.content')
+
+POSITIVE_PATTERN = re.compile(
+    r'article|blog|body|content|doc|entry|main|markdown|page|post|prose|story|text', re.IGNORECASE
+)
+NEGATIVE_PATTERN = re.compile(
+    r'\bads?\b|advert|banner|breadcrumb|comment|cookie|consent|disqus|foot|header|legal|masthead|menu|'
+    r'modal|nav|newsletter|outbrain|pagination|popup|promo|related|share|sidebar|social|sponsor|'
+    r'subscribe|taboola|toolbar|widget',
+    re.IGNORECASE,
+)
+
+PARAGRAPH_TAGS = ('p', 'pre', 'td', 'blockquote')
+PRUNED_TAGS = ('ul', 'ol', 'dl', 'div', 'section', 'table')
+TAG_SCORES = {'article': 10, 'main': 10, 'section': 5, 'div': 5, 'td': 3, 'blockquote': 3, 'body': -5}
+
+# Blocks that never hold content are cut out before parsing; building the
+# tree is most of the cost and inline scripts are often most of the page.
+NON_CONTENT_BLOCK_PATTERN = re.compile(r'<(script|style|svg|noscript)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+
+# Selectors simple enough to answer with find_all instead of soupsieve.
+TAG_SELECTOR_PATTERN = re.compile(r'^[a-z][a-z0-9]*$')
+CLASS_SELECTOR_PATTERN = re.compile(r'^\.([\w-]+)$')
+ID_SELECTOR_PATTERN = re.compile(r'^#([\w-]+)$')
+ATTRIBUTE_SELECTOR_PATTERN = re.compile(r'^\[([\w-]+)=["\']?([^"\'\]]*)["\']?\]$')
+
+# A selector match or scored block with less text than this is not trusted
+# as the main content.
+MIN_MAIN_TEXT = 200
+MIN_PARAGRAPH_TEXT = 25
+# Siblings of the best block scoring at least this share of it are kept too.
+SIBLING_SCORE_RATIO = 0.2
+
+
+class _Measure:
+    """Text and link-text lengths per element, computed once per extraction."""
+
+    def __init__(self):
+        self._text = {}
+        self._links = {}
+
+    def text_length(self, element) -> int:
+        key = id(element)
+        if key not in self._text:
+            self._text[key] = len(element.get_text(' ', strip=True))
+        return self._text[key]
+
+    def link_density(self, element) -> float:
+        text_length = self.text_length(element)
+        if not text_length:
+            return 0.0
+        key = id(element)
+        if key not in self._links:
+            self._links[key] = sum(len(link.get_text(' ', strip=True)) for link in element.find_all('a'))
+        return self._links[key] / text_length
+
+
+def _hints(element) -> str:
+    classes = element.get('class') or []
+    if isinstance(classes, str):
+        classes = [classes]
+    return ' '.join(classes) + ' ' + (element.get('id') or '')
+
+
+def _class_weight(element) -> int:
+    hints = _hints(element)
+    weight = 0
+    if NEGATIVE_PATTERN.search(hints):
+        weight -= 25
+    if POSITIVE_PATTERN.search(hints):
+        weight += 25
+    return weight
+
+
+def _prune(root, should_drop):
+    """Decompose every element under ``root`` for which ``should_drop`` is true, top-down.
+
+    Subtrees are skipped once removed (bs4's ``decomposed`` check is a tree
+    search on tags, far too slow to call per element).
+    """
+    stack = [root]
+    while stack:
+        element = stack.pop()
+        for child in list(element.contents):
+            if not isinstance(child, Tag):
+                continue
+            if should_drop(child):
+                child.decompose()
+            else:
+                stack.append(child)
+
+
+def _is_boilerplate(element, measure) -> bool:
+    if element.name in BOILERPLATE_TAGS:
+        return True
+    hints = _hints(element)
+    if not NEGATIVE_PATTERN.search(hints) or POSITIVE_PATTERN.search(hints):
+        return False
+    # A wrapper that merely has a misleading class but holds real prose stays.
+    return measure.link_density(element) > 0.2 or measure.text_length(element) < 300
+
+
+def _drop_boilerplate(soup, remove_selectors, measure):
+    for selector in remove_selectors:
+        for element in soup.select(selector):
+            element.decompose()
+    _prune(soup, lambda element: _is_boilerplate(element, measure))
+
+
+def _find(root, selector):
+    if TAG_SELECTOR_PATTERN.match(selector):
+        return root.find_all(selector)
+    match = CLASS_SELECTOR_PATTERN.match(selector)
+    if match:
+        return root.find_all(class_=match.group(1))
+    match = ID_SELECTOR_PATTERN.match(selector)
+    if match:
+        return root.find_all(id=match.group(1))
+    match = ATTRIBUTE_SELECTOR_PATTERN.match(selector)
+    if match:
+        return root.find_all(attrs={match.group(1): match.group(2)})
+    return root.select(selector)
+
+
+def _select_main(root, main_selectors, measure):
+    for selector in main_selectors:
+        matches = _find(root, selector)
+        if not matches:
+            continue
+        best = max(matches, key=measure.text_length)
+        if measure.text_length(best) >= MIN_MAIN_TEXT:
+            return [best]
+    return None
+
+
+def _score_candidates(root, measure):
+    scores = {}
+    nodes = {}
+
+    def add(element, points):
+        if element is None or element.name is None:
+            return
+        key = id(element)
+        if key not in scores:
+            nodes[key] = element
+            scores[key] = TAG_SCORES.get(element.name, 0) + _class_weight(element)
+        scores[key] += points
+
+    for paragraph in root.find_all(PARAGRAPH_TAGS):
+        text = paragraph.get_text(' ', strip=True)
+        if len(text) < MIN_PARAGRAPH_TEXT:
+            continue
+        points = 1 + text.count(',') + min(len(text) // 100, 3)
+        add(paragraph.parent, points)
+        if paragraph.parent is not None:
+            add(paragraph.parent.parent, points / 2)
+
+    return {key: (nodes[key], score * (1 - measure.link_density(nodes[key]))) for key, score in scores.items()}
+
+
+def _best_blocks(root, measure):
+    candidates = _score_candidates(root, measure)
+    if not candidates:
+        return None
+    best, best_score = max(candidates.values(), key=lambda candidate: candidate[1])
+    if best_score <= 0 or best.parent is None:
+        return [best]
+    threshold = max(10, best_score * SIBLING_SCORE_RATIO)
+    blocks = []
+    for sibling in best.parent.find_all(True, recursive=False):
+        if sibling is best:
+            blocks.append(sibling)
+            continue
+        candidate = candidates.get(id(sibling))
+        if candidate is not None and candidate[1] >= threshold:
+            blocks.append(sibling)
+        elif sibling.name == 'p' and measure.text_length(sibling) >= 80 and measure.link_density(sibling) < 0.25:
+            blocks.append(sibling)
+    return blocks
+
+
+def _prune_link_blocks(block, measure):
+    _prune(block, lambda element: (
+        element.name in PRUNED_TAGS
+        and measure.text_length(element)
+        and measure.link_density(element) > 0.5
+    ))
+
+
+def _main_blocks(html: str, builder: str, main_selectors, remove_selectors) -> list:
+    soup = BeautifulSoup(NON_CONTENT_BLOCK_PATTERN.sub(' ', html), builder)
+    measure = _Measure()
+    _drop_boilerplate(soup, remove_selectors, measure)
+    root = soup.body or soup
+
+    # Scores and lengths from before the pruning pass would be stale.
+    measure = _Measure()
+    blocks = _select_main(root, main_selectors, measure) or _best_blocks(root, measure)
+    if not blocks or sum(measure.text_length(block) for block in blocks) < MIN_MAIN_TEXT:
+        blocks = [root]
+    for block in blocks:
+        _prune_link_blocks(block, measure)
+    return blocks
+
+
+def extract_main_text(html: str, builder: str = 'html.parser', main_selectors=DEFAULT_MAIN_SELECTORS,
+                      remove_selectors=()) -> str:
+    """Return the main content of an HTML document as whitespace-collapsed text.
+
+    Args:
+        html: Raw (or browser-rendered) HTML
+        builder: BeautifulSoup tree builder, ``'html.parser'`` or ``'lxml'``
+        main_selectors: CSS selectors tried in order before falling back to scoring
+        remove_selectors: extra CSS selectors for elements to always drop
+    Returns:
+        Main-content text; the whole visible text if no content block stands out
+    """
+    blocks = _main_blocks(html, builder, main_selectors, remove_selectors)
+    text = ' '.join(block.get_text(' ', strip=True) for block in blocks)
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def extract_main_markdown(html: str, builder: str = 'html.parser', main_selectors=DEFAULT_MAIN_SELECTORS,
+                          remove_selectors=(), base_url: str = None) -> str:
+    """Like :func:`extract_main_text`, but keep the content's structure as Markdown."""
+    blocks = _main_blocks(html, builder, main_selectors, remove_selectors)
+    return convert_elements(blocks, base_url)
@@ -0,0 +1,265 @@
+"""Pooled keep-alive HTTP client: the cheap first tier before Playwright.
+
+Sitemaps and most server-rendered pages do not need a browser at all. This
+module fetches them with a shared ``httpx.AsyncClient`` and decides whether
+the response is good enough or has to be rendered by Chromium instead.
+Brotli and zstd responses are only requested when the matching decoder
+(``brotli`` / ``zstandard``) is installed.
+"""
+import asyncio
+import re
+import weakref
+
+import httpx
+
+from .politeness import host_scheduler
+
+TIER_HTTP = 'http'
+TIER_BROWSER = 'browser'
+
+BLOCKED_STATUSES = {401, 403, 429, 503}
+BLOCK_MARKERS = ('cf-browser-verification', 'challenge-platform', '<title>Just a moment...</title>')
+
+JS_APP_ROOT_PATTERN = re.compile(
+    r'<div[^>]+id=["\'](?:root|app|__next|__nuxt|svelte)["\'][^>]*>\s*</div>', re.IGNORECASE
+)
+NOSCRIPT_JS_PATTERN = re.compile(
+    r'<noscript[^>]*>[^<]*(?:enable|requires?|turn on)\s+javascript', re.IGNORECASE
+)
+SCRIPT_STYLE_PATTERN = re.compile(r'<(script|style)\b.*?</\1>', re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+# Pages with less visible text than this and at least one script are assumed
+# to be rendered client-side.
+MIN_STATIC_TEXT_CHARS = 200
+
+
+def _supported_encodings() -> str:
+    encodings = ['gzip', 'deflate']
+    try:
+        import brotli  # noqa: F401
+        encodings.append('br')
+    except ImportError:
+        pass
+    try:
+        import zstandard  # noqa: F401
+        encodings.append('zstd')
+    except ImportError:
+        pass
+    return ', '.join(encodings)
+
+
+ACCEPT_ENCODING = _supported_encodings()
+
+
+class FetchResult:
+    """Content of a fetched URL and which tier served it."""
+
+    def __init__(self, url, content='', size=0, status=None, tier=TIER_HTTP,
+                 content_type='', etag=None, last_modified=None):
+        self.url = url
+        self.content = content
+        self.size = size
+        self.status = status
+        self.tier = tier
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        # Subresources skipped while rendering (browser tier only).
+        self.savings = None
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.content) or self.not_modified
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+    @property
+    def is_html(self) -> bool:
+        if self.content_type:
+            return 'html' in self.content_type
+        return '<html' in self.content[:2048].lower()
+
+
+def looks_blocked(status: int, content: str) -> bool:
+    """Return True for bot-protection responses a real browser may get past."""
+    if status in BLOCKED_STATUSES:
+        return True
+    head = content[:4096]
+    return any(marker in head for marker in BLOCK_MARKERS)
+
+
+def looks_js_rendered(html: str) -> bool:
+    """Return True if an HTML document probably needs JavaScript to show its content."""
+    if JS_APP_ROOT_PATTERN.search(html) or NOSCRIPT_JS_PATTERN.search(html):
+        return True
+    if '<script' not in html.lower():
+        return False
+    visible = TAG_PATTERN.sub('', SCRIPT_STYLE_PATTERN.sub('', html))
+    return len(visible.strip()) < MIN_STATIC_TEXT_CHARS
+
+
+# loop -> client; see get_http_client().
+_clients = weakref.WeakKeyDictionary()
+# Loops whose client stays open across requests until close_http_client().
+_long_lived_loops = weakref.WeakSet()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the keep-alive client for the running event loop.
+
+    httpx connection pools are bound to the loop they were opened on, so each
+    loop gets its own client. Long-lived loops (the ASGI server's, a
+    :class:`~scraper.background.BackgroundLoop`) are marked with
+    :func:`keep_http_client`, share one client across requests and close it
+    with :func:`close_http_client` at shutdown. On any other loop, like the
+    one ``async_to_sync`` runs a request on under WSGI,
+    :class:`HttpClientMiddleware` closes the client when the response is done.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0),
+        )
+    return client
+
+
+def keep_http_client(loop=None):
+    """Keep the client of ``loop`` (the running one by default) open across requests."""
+    _long_lived_loops.add(loop or asyncio.get_running_loop())
+
+
+async def close_http_client():
+    """Close the running loop's client, if one was opened."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def release_http_client():
+    """Close the running loop's client unless the loop was marked with :func:`keep_http_client`."""
+    if asyncio.get_running_loop() not in _long_lived_loops:
+        await close_http_client()
+
+
+async def _releasing(content):
+    try:
+        async for chunk in content:
+            yield chunk
+    finally:
+        await release_http_client()
+
+
+class HttpClientMiddleware:
+    """Close the HTTP clients a request opened on loops that do not outlive it.
+
+    Under WSGI a request's async code runs on a loop of its own, and an async
+    streaming body is consumed on yet another one; their clients are closed
+    once the response, or its body, is finished. Long-lived loops keep theirs.
+    """
+
+    async_capable = True
+    sync_capable = False
+
+    def __init__(self, get_response):
+        from asgiref.sync import markcoroutinefunction
+
+        self.get_response = get_response
+        markcoroutinefunction(self)
+
+    async def __call__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            await release_http_client()
+        if response.streaming and response.is_async:
+            response.streaming_content = _releasing(response.streaming_content)
+        return response
+
+
+async def open_http_stream(url: str, headers: dict = None):
+    """Send a streaming GET with the pooled client.
+
+    Returns the response with its body unread (the caller must ``aclose()``
+    it), or None if the request failed outright.
+    """
+    request_headers = dict(headers or {})
+    request_headers['Accept-Encoding'] = ACCEPT_ENCODING
+    client = get_http_client()
+    try:
+        return await host_scheduler.request(
+            url, lambda: client.send(client.build_request('GET', url, headers=request_headers), stream=True)
+        )
+    except httpx.HTTPError as e:
+        print(f"HTTP fetch failed for {url}: {e}")
+        return None
+
+
+async def http_fetch(url: str, headers: dict = None, etag: str = None, last_modified: str = None):
+    """GET ``url`` with the pooled client.
+
+    Returns ``(result, needs_browser)``. ``needs_browser`` is True when the
+    response is blocked, looks JS-rendered, or the request failed outright.
+    Passing ``etag`` / ``last_modified`` sends a conditional request; an
+    unchanged resource comes back as a 304 result with no content.
+    """
+    request_headers = dict(headers or {})
+    request_headers['Accept-Encoding'] = ACCEPT_ENCODING
+    if etag or last_modified:
+        request_headers.pop('Cache-Control', None)
+        request_headers.pop('Pragma', None)
+    if etag:
+        request_headers['If-None-Match'] = etag
+    if last_modified:
+        request_headers['If-Modified-Since'] = last_modified
+
+    try:
+        client = get_http_client()
+        response = await host_scheduler.request(url, lambda: client.get(url, headers=request_headers))
+    except httpx.HTTPError as e:
+        print(f"HTTP fetch failed for {url}: {e}")
+        return FetchResult(url), True
+
+    result = FetchResult(
+        url,
+        status=response.status_code,
+        content_type=response.headers.get('content-type', ''),
+        etag=response.headers.get('etag'),
+        last_modified=response.headers.get('last-modified'),
+    )
+    if response.status_code == 304:
+        return result, False
+
+    content = response.text
+    if looks_blocked(response.status_code, content):
+        return result, True
+    if not response.is_success:
+        return result, False
+
+    result.content = content
+    result.size = len(response.content)
+    return result, result.is_html and looks_js_rendered(content)
+
+
+async def http_content_length(url: str, headers: dict = None):
+    """HEAD ``url`` and return its uncompressed Content-Length, or None if unknown."""
+    request_headers = dict(headers or {})
+    # A compressed Content-Length would say nothing about the page itself.
+    request_headers['Accept-Encoding'] = 'identity'
+    try:
+        client = get_http_client()
+        response = await host_scheduler.request(url, lambda: client.head(url, headers=request_headers))
+    except httpx.HTTPError as e:
+        print(f"HTTP HEAD failed for {url}: {e}")
+        return None
+    if not response.is_success:
+        return None
+    try:
+        return int(response.headers['content-length'])
+    except (KeyError, ValueError):
+        return None
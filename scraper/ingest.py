@@ -0,0 +1,368 @@
+"""Site ingestion pipeline: discover, fetch, clean, chunk and store in one run.
+
+Each stage is a small pool of async workers reading from a bounded queue
+and writing to the next one::
+
+    discover -> fetch -> clean -> chunk -> store
+
+``discover`` streams a site's sitemap (or crawls it) and records the URLs as
+``SitemapURL`` rows, skipping those already processed or deselected.
+``fetch`` downloads raw HTML through the usual tiers, ``clean`` converts it
+to Markdown on the cleaning pool, ``chunk`` chunks and tokenizes batches of
+documents (dropping near-duplicates when asked to, see :mod:`scraper.dedup`) and
+``store`` writes ``Document`` and ``Chunk`` rows and marks the URLs
+processed.
+
+Queues hold at most ``SCRAPER_INGEST_QUEUE_SIZE`` items, so when a stage
+falls behind the ones before it block on ``put`` instead of piling pages up
+in memory. Every stage reports its throughput, the time its workers were
+busy and how full its input queue got.
+
+Settings: SCRAPER_INGEST_QUEUE_SIZE, SCRAPER_INGEST_FETCH_CONCURRENCY,
+SCRAPER_INGEST_CLEAN_CONCURRENCY, SCRAPER_INGEST_CHUNK_CONCURRENCY,
+SCRAPER_INGEST_STORE_BATCH.
+"""
+import asyncio
+import hashlib
+import html
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .chunking import UNIT_CHARS, achunk_batch
+from .cleaning import OUTPUT_MARKDOWN, aclean_html_content
+from .crawler import iter_crawl_website
+from .dedup import MODE_OFF, Deduplicator
+from .metrics import span
+from .models import Chunk, Document, SitemapURL
+from .storage import asave_sitemap_urls, source_domain
+from .tokenizer import default_encoding
+from .utils import extract_page_name, fetch_url, iter_sitemap_records
+
+STAGES = ('discover', 'fetch', 'clean', 'chunk', 'store')
+
+TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+
+# Marks the end of a stage's input; one is queued per worker of the next stage.
+_DONE = object()
+
+
+def page_title(markup: str, url: str) -> str:
+    match = TITLE_PATTERN.search(markup[:65536])
+    title = ' '.join(html.unescape(match.group(1)).split()) if match else ''
+    return title[:512] or extract_page_name(url)
+
+
+class StageStats:
+    """Counters for one pipeline stage."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.failed = 0
+        self.busy = 0.0
+        # Part of ``busy`` spent waiting for room in the next stage's queue.
+        self.blocked = 0.0
+        self.max_queue = 0
+        self.started = None
+        self.finished = None
+
+    def to_dict(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started if self.started else 0.0
+        return {
+            'workers': self.workers,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'failed': self.failed,
+            'seconds': round(elapsed, 3),
+            'items_per_second': round(self.items_in / elapsed, 2) if elapsed else 0.0,
+            'busy_seconds': round(self.busy, 3),
+            'blocked_seconds': round(self.blocked, 3),
+            # Share of the stage's worker time spent working rather than
+            # waiting for input or for the next stage to catch up.
+            'utilization': round((self.busy - self.blocked) / (elapsed * self.workers), 3) if elapsed else 0.0,
+            'max_queue': self.max_queue,
+        }
+
+
+class IngestionPipeline:
+    """One ingestion run of a site.
+
+    ``target`` is a domain or URL whose sitemap is read, the sitemap itself
+    with ``custom_location``, or the start page with ``crawl``.
+    ``concurrency`` overrides the workers per stage, e.g. ``{'fetch': 32}``.
+    ``progress`` is awaited with the report so far after every stored batch.
+    """
+
+    def __init__(self, target: str, custom_location: bool = False, crawl: bool = False, max_pages: int = None,
+                 max_depth: int = None, include=None, exclude=None, render: bool = False, reprocess: bool = False,
+                 chunk_size: int = 1000, chunk_overlap: int = 200, unit: str = UNIT_CHARS, encoding: str = None,
+                 dedup_mode: str = None, concurrency: dict = None, job=None, progress=None):
+        if not target.startswith(('http://', 'https://')):
+            target = 'https://' + target
+        self.target = target
+        self.domain = source_domain(target)
+        self.custom_location = custom_location
+        self.crawl = crawl
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.include = include
+        self.exclude = exclude
+        self.render = render
+        self.reprocess = reprocess
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.unit = unit
+        self.encoding = encoding or default_encoding()
+        if dedup_mode is None:
+            dedup_mode = getattr(settings, 'SCRAPER_DEDUP_MODE', MODE_OFF)
+        self.dedup = Deduplicator(dedup_mode) if dedup_mode != MODE_OFF else None
+        self.job = job
+        self.progress = progress
+
+        concurrency = concurrency or {}
+        defaults = {
+            'discover': 1,
+            'fetch': getattr(settings, 'SCRAPER_INGEST_FETCH_CONCURRENCY', 16),
+            'clean': getattr(settings, 'SCRAPER_INGEST_CLEAN_CONCURRENCY', 8),
+            'chunk': getattr(settings, 'SCRAPER_INGEST_CHUNK_CONCURRENCY', 2),
+            # SQLite has a single writer; more would only queue on its lock.
+            'store': 1,
+        }
+        self.workers = {stage: max(1, int(concurrency.get(stage, defaults[stage]))) for stage in STAGES}
+        self.stats = {stage: StageStats(stage, self.workers[stage]) for stage in STAGES}
+        queue_size = max(1, getattr(settings, 'SCRAPER_INGEST_QUEUE_SIZE', 64))
+        # queues[stage] is that stage's input.
+        self.queues = {stage: asyncio.Queue(queue_size) for stage in STAGES[1:]}
+        self.chunk_batch_size = getattr(settings, 'SCRAPER_CHUNK_BATCH_DOCUMENTS', 32)
+        self.store_batch_size = getattr(settings, 'SCRAPER_INGEST_STORE_BATCH', 64)
+        self.documents = self.chunks = self.tokens = 0
+        self.started = None
+
+    async def run(self) -> dict:
+        """Run every stage to completion and return the report."""
+        self.started = time.perf_counter()
+        tasks = [
+            asyncio.ensure_future(self._discover()),
+            asyncio.ensure_future(self._run_stage('fetch', self._fetch)),
+            asyncio.ensure_future(self._run_stage('clean', self._clean)),
+            asyncio.ensure_future(self._run_stage('chunk', self._chunk, self.chunk_batch_size)),
+            asyncio.ensure_future(self._run_stage('store', self._store, self.store_batch_size, self._stored)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return self.report()
+
+    def report(self) -> dict:
+        report = {
+            'urls': self.stats['discover'].items_in,
+            'skipped': self.stats['discover'].items_in - self.stats['discover'].items_out,
+            'documents': self.documents,
+            'chunks': self.chunks,
+            'tokens': self.tokens,
+            'encoding': self.encoding,
+            'stages': {stage: self.stats[stage].to_dict() for stage in STAGES},
+            'seconds': round(time.perf_counter() - self.started, 3) if self.started else 0.0,
+        }
+        if self.dedup is not None:
+            report['dedup'] = self.dedup.report()
+        return report
+
+    async def _put(self, stage: str, item):
+        queue = self.queues[stage]
+        if queue.full():
+            started = time.perf_counter()
+            await queue.put(item)
+            self.stats[STAGES[STAGES.index(stage) - 1]].blocked += time.perf_counter() - started
+        else:
+            queue.put_nowait(item)
+        stats = self.stats[stage]
+        stats.max_queue = max(stats.max_queue, queue.qsize())
+
+    async def _finish_stage(self, stage: str):
+        self.stats[stage].finished = time.perf_counter()
+        following = STAGES[STAGES.index(stage) + 1] if stage != STAGES[-1] else None
+        if following is not None:
+            for _ in range(self.workers[following]):
+                await self.queues[following].put(_DONE)
+
+    async def _run_stage(self, stage: str, handler, batch_size: int = 1, after=None):
+        """Feed ``stage``'s queue to ``handler`` (one item, or a list when ``batch_size`` > 1).
+
+        Failed items are counted and skipped. ``after`` is awaited once a
+        batch succeeded; what it raises ends the run.
+        """
+        stats = self.stats[stage]
+        queue = self.queues[stage]
+
+        async def worker():
+            done = False
+            while not done:
+                items = [await queue.get()]
+                while len(items) < batch_size and not queue.empty():
+                    items.append(queue.get_nowait())
+                if _DONE in items:
+                    # A batch worker may have taken another worker's marker too.
+                    for _ in range(items.count(_DONE) - 1):
+                        queue.put_nowait(_DONE)
+                    items = [item for item in items if item is not _DONE]
+                    done = True
+                if not items:
+                    continue
+                if stats.started is None:
+                    stats.started = time.perf_counter()
+                stats.items_in += len(items)
+                started = time.perf_counter()
+                try:
+                    with span(f'ingest_{stage}'):
+                        await handler(items if batch_size > 1 else items[0])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Ingestion {stage} failed for {len(items)} item(s): {e}")
+                    stats.failed += len(items)
+                    continue
+                finally:
+                    stats.busy += time.perf_counter() - started
+                if after is not None:
+                    await after()
+
+        await asyncio.gather(*(worker() for _ in range(self.workers[stage])))
+        await self._finish_stage(stage)
+
+    async def _discover(self):
+        stats = self.stats['discover']
+        stats.started = time.perf_counter()
+        if self.crawl:
+            records = iter_crawl_website(self.target, max_pages=self.max_pages or 100, max_depth=self.max_depth,
+                                         include=self.include, exclude=self.exclude)
+        else:
+            records = iter_sitemap_records(
+                None if self.custom_location else self.target,
+                self.target if self.custom_location else None,
+                self.include, self.exclude,
+            )
+        batch_size = getattr(settings, 'SCRAPER_DB_BATCH_SIZE', 500)
+        batch = []
+        seen = 0
+        async for record in records:
+            batch.append(record)
+            seen += 1
+            # Hand URLs on early while the fetchers are idle, in full batches otherwise.
+            if len(batch) >= batch_size or self.queues['fetch'].empty():
+                await self._discovered(batch)
+                batch = []
+            if self.max_pages and seen >= self.max_pages:
+                break
+        await self._discovered(batch)
+        stats.busy = time.perf_counter() - stats.started
+        await self._finish_stage('discover')
+
+    async def _discovered(self, records: list):
+        if not records:
+            return
+        stats = self.stats['discover']
+        stats.items_in += len(records)
+        # The crawler marks the pages it visited processed; here that means stored, which they are not yet.
+        await asave_sitemap_urls([{**record, 'processed': False} for record in records], self.domain, job=self.job)
+        urls = [record['url'] for record in records]
+        if not self.reprocess:
+            skipped = {
+                url async for url in SitemapURL.objects.filter(domain=self.domain, url__in=urls).filter(
+                    Q(processed=True) | Q(selected=False)
+                ).values_list('url', flat=True)
+            }
+            urls = [url for url in urls if url not in skipped]
+        for url in urls:
+            stats.items_out += 1
+            await self._put('fetch', url)
+
+    async def _fetch(self, url: str):
+        result = await fetch_url(url, render=self.render, clean=False)
+        if not result.content:
+            raise ValueError(f"No content for {url} (HTTP {result.status})")
+        self.stats['fetch'].items_out += 1
+        await self._put('clean', {'url': url, 'html': result.content})
+
+    async def _clean(self, page: dict):
+        content = await aclean_html_content(page['html'], output=OUTPUT_MARKDOWN, base_url=page['url'])
+        self.stats['clean'].items_out += 1
+        await self._put('chunk', {
+            'url': page['url'],
+            'title': page_title(page['html'], page['url']),
+            'content': content or '',
+        })
+
+    async def _chunk(self, documents: list):
+        records = await achunk_batch(
+            documents, self.chunk_size, self.chunk_overlap, self.unit, self.dedup, self.encoding
+        )
+        by_url = {document['url']: (document, []) for document in documents}
+        for record in records:
+            by_url[record['url']][1].append(record)
+        self.stats['chunk'].items_out += len(documents)
+        for item in by_url.values():
+            await self._put('store', item)
+
+    async def _store(self, items: list):
+        await sync_to_async(self._save)(items)
+        self.stats['store'].items_out += len(items)
+
+    async def _stored(self):
+        if self.progress is not None:
+            await self.progress(self.report())
+
+    def _save(self, items: list):
+        documents = {}
+        chunks = {}
+        for document, records in items:
+            url = document['url']
+            duplicate = next((record['duplicate_of']['url'] for record in records
+                              if 'duplicate_of' in record and 'chunk_index' not in record), '')
+            kept = [record for record in records if 'content' in record]
+            documents[url] = Document(
+                url=url,
+                domain=self.domain,
+                title=document['title'][:512],
+                content_hash=hashlib.sha256(document['content'].encode()).hexdigest(),
+                chunk_count=len(kept),
+                token_count=sum(record['tokens'] for record in kept),
+                duplicate_of=duplicate,
+                job=self.job,
+            )
+            chunks[url] = kept
+        with span('db_write'), transaction.atomic():
+            Document.objects.bulk_create(
+                documents.values(),
+                update_conflicts=True,
+                unique_fields=['domain', 'url'],
+                update_fields=['title', 'content_hash', 'chunk_count', 'token_count', 'duplicate_of',
+                               'ingested_at', 'job'],
+            )
+            ids = dict(Document.objects.filter(domain=self.domain, url__in=list(documents)).values_list('url', 'id'))
+            Chunk.objects.filter(document_id__in=ids.values()).delete()
+            Chunk.objects.bulk_create(
+                [
+                    Chunk(document_id=ids[url], url=url, domain=self.domain, chunk_index=record['chunk_index'],
+                          section=record['section'], content=record['content'],
+                          content_hash=hashlib.sha256(record['content'].encode()).hexdigest(),
+                          tokens=record['tokens'])
+                    for url, records in chunks.items() for record in records
+                ],
+                batch_size=max(1, getattr(settings, 'SCRAPER_DB_BATCH_SIZE', 500)),
+            )
+            SitemapURL.objects.filter(domain=self.domain, url__in=list(documents)).update(processed=True)
+        self.documents += len(documents)
+        self.chunks += sum(len(records) for records in chunks.values())
+        self.tokens += sum(document.token_count for document in documents.values())
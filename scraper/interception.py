@@ -0,0 +1,207 @@
+"""Playwright route interception: skip subresources that never contribute text.
+
+Rendering only needs the document and the scripts that build it; images,
+fonts, media and (for text extraction) stylesheets are discarded anyway, as
+are analytics and ad requests. A profile picks what is aborted:
+
+    off:    nothing
+    assets: images, media, fonts and known tracker/ad domains
+    text:   ``assets`` plus stylesheets (the default)
+
+``SCRAPER_RESOURCE_ALLOWLIST`` re-allows resource types or domains for
+particular sites, e.g. ``{'example.com': ['stylesheet', 'cdn.example.net']}``.
+With ``SCRAPER_RENDER_STOP_AT_PARSE`` navigation returns once the main
+document is parsed and any subresource requested after that is aborted too,
+except scripts and XHR/fetch calls, which may still be filling in the page.
+
+Sizes of aborted responses are unknown, so saved bytes are estimated from
+typical sizes per resource type.
+"""
+import threading
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+PROFILE_OFF = 'off'
+PROFILE_ASSETS = 'assets'
+PROFILE_TEXT = 'text'
+
+PROFILES = {
+    PROFILE_OFF: {'resource_types': (), 'block_trackers': False},
+    PROFILE_ASSETS: {'resource_types': ('image', 'media', 'font'), 'block_trackers': True},
+    PROFILE_TEXT: {'resource_types': ('image', 'media', 'font', 'stylesheet'), 'block_trackers': True},
+}
+
+TRACKER_DOMAINS = (
+    'google-analytics.com', 'googletagmanager.com', 'googlesyndication.com', 'googleadservices.com',
+    'doubleclick.net', 'adservice.google.com', 'connect.facebook.net', 'amazon-adsystem.com',
+    'adsrvr.org', 'criteo.com', 'criteo.net', 'taboola.com', 'outbrain.com', 'scorecardresearch.com',
+    'quantserve.com', 'hotjar.com', 'clarity.ms', 'bat.bing.com', 'mc.yandex.ru', 'cdn.segment.com',
+    'api.segment.io', 'mixpanel.com', 'amplitude.com', 'fullstory.com', 'js-agent.newrelic.com',
+    'nr-data.net', 'optimizely.com', 'hs-analytics.net', 'hs-scripts.com', 'adroll.com',
+)
+
+# Typical transfer sizes, used to estimate what an aborted request would have cost.
+ESTIMATED_BYTES = {
+    'image': 60_000, 'media': 500_000, 'font': 40_000, 'stylesheet': 25_000,
+    'script': 40_000, 'xhr': 5_000, 'fetch': 5_000,
+}
+DEFAULT_ESTIMATED_BYTES = 10_000
+
+REASON_RESOURCE_TYPE = 'resource_type'
+REASON_TRACKER = 'tracker'
+REASON_AFTER_PARSE = 'after_parse'
+
+# Never aborted just for arriving after the document was parsed.
+AFTER_PARSE_ALLOWED_TYPES = ('script', 'xhr', 'fetch')
+
+
+def _host_matches(host: str, domains) -> bool:
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+class ResourcePolicy:
+    """Which subresources to abort for pages of one site."""
+
+    def __init__(self, resource_types=(), blocked_domains=(), allowed_types=(), allowed_domains=()):
+        self.resource_types = frozenset(resource_types) - frozenset(allowed_types)
+        self.blocked_domains = tuple(blocked_domains)
+        self.allowed_domains = tuple(allowed_domains)
+
+    @property
+    def blocks_anything(self) -> bool:
+        return bool(self.resource_types or self.blocked_domains)
+
+    @classmethod
+    def for_url(cls, url: str, profile: str = None):
+        """Policy for rendering ``url``: the configured profile plus its site's allowlist."""
+        if profile is None:
+            profile = getattr(settings, 'SCRAPER_RESOURCE_PROFILE', PROFILE_TEXT)
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown resource profile: {profile}")
+        options = PROFILES[profile]
+        blocked_domains = ()
+        if options['block_trackers']:
+            blocked_domains = TRACKER_DOMAINS + tuple(getattr(settings, 'SCRAPER_BLOCKED_DOMAINS', ()))
+
+        site = (urlparse(url).hostname or '').lower()
+        allowed_types, allowed_domains = [], []
+        for pattern, entries in getattr(settings, 'SCRAPER_RESOURCE_ALLOWLIST', {}).items():
+            if not _host_matches(site, (pattern.lower(),)):
+                continue
+            for entry in entries:
+                (allowed_domains if '.' in entry else allowed_types).append(entry.lower())
+        return cls(options['resource_types'], blocked_domains, allowed_types, allowed_domains)
+
+    def blocks(self, resource_type: str, url: str):
+        """Return why a request should be aborted, or None to let it through."""
+        host = (urlparse(url).hostname or '').lower()
+        if _host_matches(host, self.allowed_domains):
+            return None
+        if resource_type in self.resource_types:
+            return REASON_RESOURCE_TYPE
+        if self.blocked_domains and _host_matches(host, self.blocked_domains):
+            return REASON_TRACKER
+        return None
+
+
+class ResourceSavings:
+    """Requests seen and aborted during one fetch."""
+
+    def __init__(self):
+        self.requests = 0
+        self.blocked = 0
+        self.bytes_saved = 0
+        self.by_type = {}
+        self.by_reason = {}
+
+    def record_blocked(self, resource_type: str, reason: str):
+        self.blocked += 1
+        self.bytes_saved += ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+        self.by_type[resource_type] = self.by_type.get(resource_type, 0) + 1
+        self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'requests_blocked': self.blocked,
+            'bytes_saved_estimate': self.bytes_saved,
+            'blocked_by_type': dict(self.by_type),
+            'blocked_by_reason': dict(self.by_reason),
+        }
+
+
+class _Totals:
+    """Process-wide sums of every fetch's :class:`ResourceSavings`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = dict.fromkeys(('fetches', 'requests', 'requests_blocked', 'bytes_saved_estimate'), 0)
+
+    def add(self, savings: ResourceSavings):
+        with self._lock:
+            self._totals['fetches'] += 1
+            self._totals['requests'] += savings.requests
+            self._totals['requests_blocked'] += savings.blocked
+            self._totals['bytes_saved_estimate'] += savings.bytes_saved
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._totals)
+
+
+interception_totals = _Totals()
+
+
+class RouteInterceptor:
+    """Route handler for one page fetch; install it with :meth:`installed`."""
+
+    def __init__(self, policy: ResourcePolicy, savings: ResourceSavings = None, stop_at_parse: bool = False):
+        self.policy = policy
+        self.savings = savings if savings is not None else ResourceSavings()
+        self.stop_at_parse = stop_at_parse
+        self.parsed = False
+
+    @property
+    def needed(self) -> bool:
+        return self.policy.blocks_anything or self.stop_at_parse
+
+    async def handle(self, route):
+        request = route.request
+        self.savings.requests += 1
+        resource_type = request.resource_type
+        reason = None
+        if resource_type != 'document':
+            reason = self.policy.blocks(resource_type, request.url)
+            if (reason is None and self.parsed and self.stop_at_parse
+                    and resource_type not in AFTER_PARSE_ALLOWED_TYPES):
+                reason = REASON_AFTER_PARSE
+        try:
+            if reason is None:
+                await route.continue_()
+            else:
+                self.savings.record_blocked(resource_type, reason)
+                await route.abort('blockedbyclient')
+        except Exception:
+            # The page was closed or navigated away while the request was pending.
+            pass
+
+    def document_parsed(self):
+        self.parsed = True
+
+    @asynccontextmanager
+    async def installed(self, page):
+        """Route every request of ``page`` through :meth:`handle` for the duration of the block."""
+        if not self.needed:
+            yield self
+            return
+        await page.route('**/*', self.handle)
+        try:
+            yield self
+        finally:
+            try:
+                await page.unroute('**/*', self.handle)
+            except Exception:
+                pass
+            interception_totals.add(self.savings)
@@ -0,0 +1,234 @@
+"""In-process background runner for sitemap, crawl and ingestion jobs.
+
+Jobs are ``CrawlJob`` rows; the runner executes them on its own
+:class:`BackgroundLoop` so they keep going after the submitting request has
+returned, with at most ``SCRAPER_JOB_WORKERS`` running at once. Everything is
+stored in the regular database - no broker is needed.
+
+A job only runs in the process that accepted it, so rows still queued or
+running when that process stopped would never finish. With
+``SCRAPER_JOB_RECOVER`` on, the first time a runner is used (or the ASGI app
+starts) it marks jobs created before the process started that are still
+queued or running as failed. Only enable it when a single server process
+uses the database: a sibling process's live jobs look exactly the same.
+"""
+import asyncio
+import atexit
+import contextvars
+
+from django.conf import settings
+from django.utils import timezone
+
+from .background import BackgroundLoop
+from .chunking import UNIT_CHARS
+from .crawler import iter_crawl_website
+from .ingest import IngestionPipeline
+from .incremental import refresh_sitemap_urls
+from .models import CrawlJob
+from .sitemap import SITEMAP_LOCATIONS, SitemapResolver
+from .storage import asave_sitemap_urls, source_domain
+from .url_filter import UrlFilter
+from .utils import build_url_records, stream_sitemap_document
+
+RESULT_BATCH_SIZE = 500
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation was requested for it."""
+
+
+class JobRunner:
+    """Execute queued ``CrawlJob`` rows on a background loop."""
+
+    def __init__(self):
+        self._background = BackgroundLoop('scraper-jobs')
+        self._semaphore = None
+        self._futures = {}
+        self._started_at = timezone.now()
+        self._recovered = False
+
+    @property
+    def workers(self) -> int:
+        return max(1, getattr(settings, 'SCRAPER_JOB_WORKERS', 2))
+
+    async def recover(self) -> int:
+        """Fail the jobs an earlier process left queued or running (once per process); returns how many."""
+        if self._recovered or not getattr(settings, 'SCRAPER_JOB_RECOVER', False):
+            return 0
+        self._recovered = True
+        orphaned = await CrawlJob.objects.filter(
+            status__in=(CrawlJob.Status.QUEUED, CrawlJob.Status.RUNNING), created_at__lt=self._started_at
+        ).aupdate(
+            status=CrawlJob.Status.FAILED,
+            error='Interrupted: the process running this job stopped before it finished',
+            finished_at=timezone.now(),
+        )
+        if orphaned:
+            print(f"Marked {orphaned} interrupted job(s) as failed")
+        return orphaned
+
+    async def enqueue(self, kind: str, target: str, options: dict = None) -> CrawlJob:
+        """Create a queued job and start it in the background."""
+        await self.recover()
+        job = await CrawlJob.objects.acreate(kind=kind, target=target, options=options or {})
+        # A fresh context: the job must not inherit the request's (under WSGI its
+        # sync_to_async calls would go to the request thread, gone once it returns).
+        self._futures[job.id] = contextvars.Context().run(self._background.submit, self._run(job.id))
+        return job
+
+    async def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job; returns False if it had already finished."""
+        queued = await CrawlJob.objects.filter(pk=job_id, status=CrawlJob.Status.QUEUED).aupdate(
+            status=CrawlJob.Status.CANCELLED, cancel_requested=True, finished_at=timezone.now()
+        )
+        running = await CrawlJob.objects.filter(pk=job_id, status=CrawlJob.Status.RUNNING).aupdate(
+            cancel_requested=True
+        )
+        future = self._futures.get(job_id)
+        if future is not None:
+            future.cancel()
+        return bool(queued or running)
+
+    async def _run(self, job_id: int):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        try:
+            async with self._semaphore:
+                job = await CrawlJob.objects.aget(pk=job_id)
+                if job.status != CrawlJob.Status.QUEUED:
+                    return
+                job.status = CrawlJob.Status.RUNNING
+                job.started_at = timezone.now()
+                await job.asave(update_fields=['status', 'started_at'])
+                try:
+                    if job.kind == CrawlJob.Kind.SITEMAP:
+                        await self._run_sitemap(job)
+                    elif job.kind == CrawlJob.Kind.INGEST:
+                        await self._run_ingest(job)
+                    else:
+                        await self._run_crawl(job)
+                except (asyncio.CancelledError, JobCancelled):
+                    await self._finish(job, CrawlJob.Status.CANCELLED)
+                    raise
+                except Exception as e:
+                    print(f"Job {job_id} failed: {e}")
+                    await self._finish(job, CrawlJob.Status.FAILED, str(e))
+                else:
+                    await self._finish(job, CrawlJob.Status.DONE)
+        except (asyncio.CancelledError, JobCancelled):
+            pass
+        finally:
+            self._futures.pop(job_id, None)
+
+    async def _run_sitemap(self, job: CrawlJob):
+        target = job.target
+        if not target.startswith(('http://', 'https://')):
+            target = 'https://' + target
+
+        resolver = SitemapResolver(stream_sitemap_document)
+        if job.options.get('custom_location'):
+            entries = resolver.iter_entries(target)
+        else:
+            entries = resolver.iter_probe(target, SITEMAP_LOCATIONS)
+
+        url_filter = UrlFilter(target, job.options.get('include'), job.options.get('exclude'))
+        if job.options.get('incremental'):
+            # Removed URLs are only known once the whole listing has been read.
+            records = build_url_records([entry async for entry in entries], target, url_filter)
+            job.result = await refresh_sitemap_urls(records, source_domain(job.target), job=job)
+            job.url_count = len(records)
+            await job.asave(update_fields=['result', 'url_count'])
+            return
+
+        batch = []
+        async for entry in entries:
+            batch.append(entry)
+            if len(batch) >= RESULT_BATCH_SIZE:
+                await self._store(job, build_url_records(batch, target, url_filter))
+                batch = []
+        await self._store(job, build_url_records(batch, target, url_filter))
+
+    async def _run_crawl(self, job: CrawlJob):
+        target = job.target
+        if not target.startswith(('http://', 'https://')):
+            target = 'https://' + target
+
+        records = iter_crawl_website(
+            target,
+            max_pages=job.options.get('max_pages', 100),
+            max_depth=job.options.get('max_depth'),
+            include=job.options.get('include'),
+            exclude=job.options.get('exclude'),
+        )
+        batch = []
+        async for record in records:
+            batch.append(record)
+            if len(batch) >= RESULT_BATCH_SIZE:
+                await self._store(job, batch)
+                batch = []
+        await self._store(job, batch)
+
+    async def _run_ingest(self, job: CrawlJob):
+        async def progress(report):
+            job.result = report
+            job.url_count = report['urls']
+            await job.asave(update_fields=['result', 'url_count'])
+            if await CrawlJob.objects.filter(pk=job.pk, cancel_requested=True).aexists():
+                raise JobCancelled()
+
+        options = job.options
+        pipeline = IngestionPipeline(
+            job.target,
+            custom_location=options.get('custom_location', False),
+            crawl=options.get('crawl', False),
+            max_pages=options.get('max_pages'),
+            max_depth=options.get('max_depth'),
+            include=options.get('include'),
+            exclude=options.get('exclude'),
+            render=options.get('render', False),
+            reprocess=options.get('reprocess', False),
+            chunk_size=options.get('chunk_size', 1000),
+            chunk_overlap=options.get('chunk_overlap', 200),
+            unit=options.get('unit', UNIT_CHARS),
+            encoding=options.get('encoding'),
+            dedup_mode=options.get('dedup'),
+            concurrency=options.get('concurrency'),
+            job=job,
+            progress=progress,
+        )
+        await progress(await pipeline.run())
+
+    async def _store(self, job: CrawlJob, records: list):
+        if records:
+            job.url_count += await asave_sitemap_urls(records, source_domain(job.target), job=job)
+            await job.asave(update_fields=['url_count'])
+        if await CrawlJob.objects.filter(pk=job.pk, cancel_requested=True).aexists():
+            raise JobCancelled()
+
+    async def _finish(self, job: CrawlJob, status: str, error: str = ''):
+        job.status = status
+        job.error = error
+        job.finished_at = timezone.now()
+        await job.asave(update_fields=['status', 'error', 'finished_at'])
+
+    async def _cancel_all(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._semaphore = None
+
+    def shutdown(self, timeout: float = 30.0):
+        """Cancel running jobs (marking them cancelled) and stop the runner loop."""
+        try:
+            self._background.stop(self._cancel_all, timeout)
+        except Exception as e:
+            print(f"Error shutting down job runner: {e}")
+        self._futures.clear()
+
+    async def close(self):
+        await asyncio.to_thread(self.shutdown)
+
+
+job_runner = JobRunner()
+atexit.register(job_runner.shutdown)
@@ -0,0 +1,45 @@
+"""ASGI lifespan support for the scraper's long-lived resources."""
+from .browser_pool import browser_pool
+from .cleaning import cleaning_pool
+from .http_client import close_http_client, keep_http_client
+from .jobs import job_runner
+from .tokenizer import start_warm_up
+
+
+class LifespanMiddleware:
+    """Handle ``lifespan`` events so servers like uvicorn shut the scraper down cleanly.
+
+    Django's ASGI handler only speaks HTTP, so lifespan messages are answered
+    here and every other scope is passed through to the wrapped application.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # The server's loop outlives every request, so its HTTP client is shared until shutdown.
+        keep_http_client()
+        if scope['type'] != 'lifespan':
+            return await self.app(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Load the default encoding off the startup path, before the first chunking request.
+                start_warm_up()
+                try:
+                    await job_runner.recover()
+                except Exception as e:
+                    print(f"Error recovering interrupted jobs: {e}")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                try:
+                    await job_runner.close()
+                    await close_http_client()
+                    await browser_pool.close()
+                    await cleaning_pool.close()
+                except Exception as e:
+                    await send({'type': 'lifespan.shutdown.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,30 @@
+"""Show or switch the journal mode of the SQLite database (WAL is a deploy-time choice)."""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from scraper.storage import set_journal_mode
+
+JOURNAL_MODES = ('wal', 'delete', 'truncate', 'persist')
+
+
+class Command(BaseCommand):
+    help = ('Switch the SQLite database to WAL (or back to a rollback journal). The mode is stored in the '
+            'database file, so run this once per deployment rather than on every connection.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('mode', nargs='?', choices=JOURNAL_MODES, help='new journal mode (default: show it)')
+        parser.add_argument('--database', default='default', help='database alias (default: default)')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"Database {options['database']} is {connection.vendor}, not SQLite")
+        if options['mode'] is None:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.stdout.write(f"Journal mode: {cursor.fetchone()[0].lower()}")
+            return
+        mode = set_journal_mode(connection, options['mode'])
+        if mode != options['mode']:
+            raise CommandError(f"SQLite kept journal mode {mode} (is another connection using the database?)")
+        self.stdout.write(f"Journal mode: {mode}")
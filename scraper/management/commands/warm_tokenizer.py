@@ -0,0 +1,23 @@
+"""Download tokenizer encodings into the local cache so later processes load them offline."""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scraper.tokenizer import allowed_encodings, cache_dir, get_encoding
+
+
+class Command(BaseCommand):
+    help = 'Fetch tokenizer encodings into SCRAPER_TOKENIZER_CACHE_DIR (all allowed ones by default).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('encodings', nargs='*', help='encoding names (default: SCRAPER_TOKENIZER_ENCODINGS)')
+
+    def handle(self, *args, **options):
+        for name in options['encodings'] or allowed_encodings():
+            started = time.perf_counter()
+            try:
+                get_encoding(name)
+            except Exception as e:
+                raise CommandError(f"Could not load {name}: {e}")
+            self.stdout.write(f"{name}: ready in {time.perf_counter() - started:.2f}s")
+        self.stdout.write(f"Cache: {cache_dir()}")
@@ -0,0 +1,408 @@
+"""Streaming HTML-to-Markdown conversion that keeps the structure chunking splits on.
+
+Headings, paragraphs, lists (nested, ordered and unordered), fenced code
+blocks, blockquotes, GFM tables, links and emphasis survive; scripts, styles
+and other invisible elements are dropped. :class:`MarkdownConverter` is an
+``html.parser`` subclass, so markup can be fed in chunks as it arrives and
+finished blocks collected with :meth:`MarkdownConverter.drain`;
+:func:`convert_elements` replays an already parsed BeautifulSoup tree (e.g.
+the blocks picked by :mod:`scraper.extraction`) through the same converter.
+
+Like :mod:`scraper.cleaning`, this module runs in the cleaning worker
+processes and must not import Django.
+"""
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+SKIPPED_TAGS = frozenset((
+    'head', 'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'object', 'canvas',
+    'button', 'select', 'input', 'textarea', 'meta', 'link', 'title',
+))
+VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'))
+BLOCK_TAGS = frozenset((
+    'address', 'article', 'aside', 'body', 'caption', 'center', 'dd', 'details', 'dialog', 'div', 'dl', 'dt',
+    'fieldset', 'figcaption', 'figure', 'footer', 'form', 'header', 'html', 'main', 'nav', 'p', 'section',
+    'summary',
+))
+HEADING_TAGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+EMPHASIS = {'strong': '**', 'b': '**', 'em': '_', 'i': '_'}
+
+# Stands in for <br> until whitespace has been collapsed.
+LINE_BREAK = '\x00'
+CODE_LANGUAGE_PATTERN = re.compile(r'(?:^|\s)(?:language|lang)-([\w+#-]+)')
+WHITESPACE_PATTERN = re.compile(r'[ \t\r\n\f\v]+')
+
+# How finished blocks are joined: items of one list stay on adjacent lines.
+_TIGHT = 'tight'
+_LOOSE = 'loose'
+# First item of a top-level list: apart from what precedes it, tight with what follows.
+_LIST_START = 'list_start'
+
+
+def _attr(attrs, name: str) -> str:
+    for key, value in attrs:
+        if key == name:
+            return ' '.join(value) if isinstance(value, list) else (value or '')
+    return ''
+
+
+def _collapse(text: str) -> str:
+    text = WHITESPACE_PATTERN.sub(' ', text)
+    return '\n'.join(line.strip() for line in text.split(LINE_BREAK)).strip()
+
+
+class MarkdownConverter(HTMLParser):
+    """Incremental HTML to Markdown converter; see the module docstring."""
+
+    def __init__(self, base_url: str = None):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self._blocks = []
+        self._inline = []
+        self._marks = []
+        # Position in ``_inline`` right after the last link written, if nothing has followed it.
+        self._link_end = None
+        self._skip = 0
+        self._heading = 0
+        self._lists = []
+        self._list_start = False
+        self._item_prefix = None
+        self._quote = 0
+        self._pre = 0
+        self._pre_language = ''
+        self._tables = []
+
+    # Output.
+
+    def _emit(self, text: str, spacing: str = _LOOSE):
+        if self._quote:
+            text = '\n'.join(('> ' * self._quote + line).rstrip() for line in text.split('\n'))
+        self._blocks.append((text, spacing))
+
+    def _flush(self):
+        """Turn the pending inline text into a block (heading, list item, table cell or paragraph)."""
+        text = _collapse(''.join(self._inline))
+        self._inline = []
+        self._marks = []
+        self._link_end = None
+        if not text:
+            return
+        if self._tables and self._tables[-1]['cell'] is not None:
+            self._tables[-1]['cell'].append(text)
+            return
+        if self._heading:
+            self._emit('#' * self._heading + ' ' + text.replace('\n', ' '))
+        elif self._item_prefix is not None:
+            indent = '   ' * (len(self._lists) - 1)
+            continuation = '\n' + indent + ' ' * len(self._item_prefix)
+            spacing = _LIST_START if self._list_start else _TIGHT
+            self._list_start = False
+            self._emit(indent + self._item_prefix + text.replace('\n', continuation), spacing)
+            self._item_prefix = None
+        elif self._lists:
+            # More text inside an item that already had its line.
+            indent = '   ' * len(self._lists)
+            self._emit(indent + text.replace('\n', '\n' + indent), _TIGHT)
+        else:
+            self._emit(text)
+
+    def drain(self) -> list:
+        """Return the Markdown blocks finished so far and forget them."""
+        blocks, self._blocks = self._blocks, []
+        return blocks
+
+    @staticmethod
+    def join(blocks, previous: str = None) -> str:
+        """Join drained blocks; pass the last block's spacing of an earlier drain to continue it."""
+        parts = []
+        for text, spacing in blocks:
+            if previous is not None:
+                parts.append('\n' if spacing == _TIGHT and previous in (_TIGHT, _LIST_START) else '\n\n')
+            parts.append(text)
+            previous = spacing
+        return ''.join(parts)
+
+    def markdown(self) -> str:
+        """Close the document and return all remaining Markdown."""
+        self.close()
+        return self.join(self.drain())
+
+    def close(self):
+        super().close()
+        if self._pre:
+            self._end_pre()
+        while self._tables:
+            self._end_table()
+        self._flush()
+
+    # Parser callbacks.
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip:
+            if tag in SKIPPED_TAGS and tag not in VOID_TAGS:
+                self._skip += 1
+            return
+        if tag in SKIPPED_TAGS:
+            if tag not in VOID_TAGS:
+                self._skip += 1
+            return
+        if self._pre:
+            if tag == 'pre':
+                self._pre += 1
+            elif tag == 'br':
+                self._inline.append('\n')
+            elif tag == 'code' and not self._pre_language:
+                self._pre_language = self._language(attrs)
+            return
+
+        if tag in HEADING_TAGS:
+            self._flush()
+            self._heading = HEADING_TAGS[tag]
+        elif tag in ('ul', 'ol', 'menu'):
+            self._flush()
+            if not self._lists:
+                self._list_start = True
+            self._lists.append([tag == 'ol', 0])
+        elif tag == 'li':
+            self._flush()
+            if not self._lists:
+                self._list_start = True
+                self._lists.append([False, 0])
+            ordered = self._lists[-1]
+            ordered[1] += 1
+            self._item_prefix = f'{ordered[1]}. ' if ordered[0] else '- '
+        elif tag == 'pre':
+            self._flush()
+            self._pre = 1
+            self._pre_language = self._language(attrs)
+        elif tag == 'blockquote':
+            self._flush()
+            self._quote += 1
+        elif tag == 'table':
+            self._flush()
+            self._tables.append({'rows': [], 'row': None, 'cell': None})
+        elif tag == 'tr' and self._tables:
+            self._end_row()
+            self._tables[-1]['row'] = []
+        elif tag in ('td', 'th') and self._tables:
+            self._end_cell()
+            table = self._tables[-1]
+            if table['row'] is None:
+                table['row'] = []
+            table['cell'] = []
+        elif tag in ('td', 'th'):
+            # A stray cell outside any table still sits apart from its neighbours.
+            self._inline.append(' ')
+        elif tag == 'hr':
+            self._flush()
+            self._emit('---')
+        elif tag == 'br':
+            self._inline.append(LINE_BREAK)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+        elif tag == 'a':
+            self._marks.append(('a', len(self._inline), _attr(attrs, 'href')))
+        elif tag in EMPHASIS:
+            self._marks.append((tag, len(self._inline), None))
+        elif tag == 'code':
+            self._marks.append(('code', len(self._inline), None))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self._skip:
+            if tag in SKIPPED_TAGS and tag not in VOID_TAGS:
+                self._skip -= 1
+            return
+        if self._pre:
+            if tag == 'pre':
+                self._pre -= 1
+                if not self._pre:
+                    self._end_pre()
+            return
+
+        if tag in HEADING_TAGS:
+            self._flush()
+            self._heading = 0
+        elif tag in ('ul', 'ol', 'menu'):
+            self._flush()
+            if self._lists:
+                self._lists.pop()
+            self._item_prefix = None
+        elif tag == 'li':
+            self._flush()
+            self._item_prefix = None
+        elif tag == 'blockquote':
+            self._flush()
+            self._quote = max(0, self._quote - 1)
+        elif tag in ('td', 'th') and self._tables:
+            self._end_cell()
+        elif tag == 'tr' and self._tables:
+            self._end_row()
+        elif tag == 'table' and self._tables:
+            self._end_table()
+        elif tag in BLOCK_TAGS:
+            self._flush()
+        elif tag == 'a' or tag in EMPHASIS or tag == 'code':
+            self._close_mark(tag)
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self._inline.append(data)
+
+    # Inline formatting.
+
+    def _close_mark(self, tag: str):
+        for index in range(len(self._marks) - 1, -1, -1):
+            name, start, href = self._marks[index]
+            if name == tag or (tag in EMPHASIS and EMPHASIS.get(name) == EMPHASIS[tag]):
+                break
+        else:
+            return
+        del self._marks[index:]
+        text = _collapse(''.join(self._inline[start:]))
+        if not text:
+            return
+        if tag == 'a':
+            if href.startswith('#') and len(text) == 1 and not text.isalnum():
+                # Heading permalinks (a lone pilcrow or hash sign).
+                del self._inline[start:]
+                return
+            if not href or href.startswith(('#', 'javascript:', 'mailto:')):
+                return
+            if self.base_url:
+                href = urljoin(self.base_url, href)
+            formatted = f'[{text}]({href.replace(" ", "%20")})'
+        elif tag == 'code':
+            fence = '``' if '`' in text else '`'
+            formatted = f'{fence}{text}{fence}'
+        else:
+            marker = EMPHASIS[tag]
+            formatted = f'{marker}{text}{marker}'
+        # Keep the whitespace around the element so words stay apart.
+        raw = ''.join(self._inline[start:])
+        leading = ' ' if raw[:1].isspace() else ''
+        trailing = ' ' if raw[-1:].isspace() else ''
+        if tag == 'a':
+            # Links written back to back (menus, breadcrumbs) would read as one word.
+            if not leading and start == self._link_end:
+                leading = ' '
+            self._link_end = start + 1
+        self._inline[start:] = [leading + formatted + trailing]
+
+    # Code blocks.
+
+    @staticmethod
+    def _language(attrs) -> str:
+        match = CODE_LANGUAGE_PATTERN.search(_attr(attrs, 'class'))
+        return match.group(1) if match else ''
+
+    def _end_pre(self):
+        code = ''.join(self._inline).strip('\n')
+        self._inline = []
+        self._marks = []
+        self._link_end = None
+        self._pre = 0
+        if code.strip():
+            fence = '````' if '```' in code else '```'
+            block = f'{fence}{self._pre_language}\n{code}\n{fence}'
+            if self._lists:
+                indent = '   ' * len(self._lists)
+                block = '\n'.join(indent + line if line else line for line in block.split('\n'))
+                self._emit(block, _TIGHT)
+            else:
+                self._emit(block)
+        self._pre_language = ''
+
+    # Tables.
+
+    def _end_cell(self):
+        table = self._tables[-1]
+        if table['cell'] is None:
+            return
+        self._flush()
+        cell = ' '.join(table['cell']).replace('\n', ' ').replace('|', '\\|')
+        table['row'].append(cell)
+        table['cell'] = None
+
+    def _end_row(self):
+        table = self._tables[-1]
+        self._end_cell()
+        if table['row']:
+            table['rows'].append(table['row'])
+        table['row'] = None
+
+    def _end_table(self):
+        self._end_row()
+        table = self._tables.pop()
+        rows = table['rows']
+        if not rows:
+            return
+        if len(rows) == 1 and len(rows[0]) == 1:
+            # Layout tables around a single block of text.
+            self._inline.append(rows[0][0])
+            self._flush()
+            return
+        width = max(len(row) for row in rows)
+        rows = [row + [''] * (width - len(row)) for row in rows]
+        lines = ['| ' + ' | '.join(rows[0]) + ' |', '|' + ' --- |' * width]
+        lines.extend('| ' + ' | '.join(row) + ' |' for row in rows[1:])
+        if self._tables and self._tables[-1]['cell'] is not None:
+            # Nested table: flatten into the enclosing cell.
+            self._tables[-1]['cell'].append(' '.join(' '.join(row) for row in rows))
+            return
+        self._emit('\n'.join(lines))
+
+
+def html_to_markdown(html: str, base_url: str = None) -> str:
+    """Convert a whole HTML document to Markdown."""
+    converter = MarkdownConverter(base_url)
+    converter.feed(html)
+    return converter.markdown()
+
+
+def iter_markdown(chunks, base_url: str = None):
+    """Yield Markdown as soon as blocks are complete while HTML ``chunks`` are fed in.
+
+    The pieces concatenate to what :func:`html_to_markdown` returns.
+    """
+    converter = MarkdownConverter(base_url)
+    previous = None
+    for chunk in chunks:
+        converter.feed(chunk)
+        blocks = converter.drain()
+        if blocks:
+            yield converter.join(blocks, previous)
+            previous = blocks[-1][1]
+    converter.close()
+    blocks = converter.drain()
+    if blocks:
+        yield converter.join(blocks, previous)
+
+
+def convert_elements(elements, base_url: str = None) -> str:
+    """Markdown for already parsed BeautifulSoup elements, without serializing and reparsing them."""
+    from bs4 import NavigableString, Tag
+
+    converter = MarkdownConverter(base_url)
+    for element in elements:
+        # Explicit stack instead of recursion: page trees can be very deep.
+        stack = [(element, False)]
+        while stack:
+            node, closing = stack.pop()
+            if closing:
+                converter.handle_endtag(node.name)
+            elif isinstance(node, Tag):
+                converter.handle_starttag(node.name, list(node.attrs.items()))
+                if node.name in VOID_TAGS:
+                    continue
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.contents))
+            elif type(node) is NavigableString:
+                converter.handle_data(str(node))
+    return converter.markdown()
@@ -0,0 +1,263 @@
+"""In-process counters, histograms and timing spans, exported in Prometheus text format.
+
+Hot paths wrap their work in :func:`span`, which feeds the
+``scraper_span_seconds`` histogram and counts exceptions by type in
+``scraper_errors_total``. When a request carries the
+``SCRAPER_TIMING_HEADER`` header, :class:`TimingMiddleware` also collects
+that request's spans - including those run on the browser pool loop, which
+inherits the request's context - and returns them in a ``Server-Timing``
+header and, for JSON responses, a ``timing`` key.
+
+Like :mod:`scraper.cleaning`, this module is imported by the HTML cleaning
+worker processes and must not touch Django settings at import time.
+"""
+import bisect
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_request_timings = contextvars.ContextVar('scraper_request_timings', default=None)
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.type = 'counter'
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.type = 'histogram'
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        samples = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append((self.name + '_bucket', key + (('le', _format_value(float(bound))),), cumulative))
+            samples.append((self.name + '_sum', key, total))
+            samples.append((self.name + '_count', key, count))
+        return samples
+
+
+class Registry:
+    """Named metrics, rendered together by :meth:`render`."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render(self, gauges=()) -> str:
+        """Prometheus text exposition of every metric plus ``gauges``.
+
+        ``gauges`` are ``(name, help, [(labels_dict, value), ...])`` triples
+        sampled at scrape time, e.g. pool utilization.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for name, help_text, samples in gauges:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
+
+
+registry = Registry()
+
+span_seconds = registry.histogram('scraper_span_seconds', 'Duration of instrumented hot-path operations.')
+errors_total = registry.counter('scraper_errors_total', 'Exceptions raised inside instrumented operations.')
+fetch_seconds = registry.histogram('scraper_fetch_seconds', 'Page fetch latency by serving tier.')
+fetches_total = registry.counter('scraper_fetches_total', 'Page fetches by serving tier and outcome.')
+requests_total = registry.counter('scraper_http_requests_total', 'API requests by view and status code.')
+request_seconds = registry.histogram('scraper_http_request_seconds', 'API request latency by view.')
+
+
+class RequestTimings:
+    """Spans recorded while serving one request (possibly from several threads)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            count, total = self._spans.get(name, (0, 0.0))
+            self._spans[name] = (count + 1, total + seconds)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = dict(self._spans)
+        return {
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'spans': {
+                name: {'count': count, 'ms': round(total * 1000, 2)}
+                for name, (count, total) in sorted(spans.items())
+            },
+        }
+
+    def server_timing(self) -> str:
+        with self._lock:
+            spans = sorted(self._spans.items())
+        return ', '.join(f'{name};dur={total * 1000:.2f}' for name, (_, total) in spans)
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as ``name`` (works around ``await`` too)."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        errors_total.inc(span=name, type=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        span_seconds.observe(elapsed, span=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(name, elapsed)
+
+
+def record_fetch(tier: str, seconds: float, ok: bool):
+    fetch_seconds.observe(seconds, tier=tier)
+    fetches_total.inc(tier=tier, outcome='ok' if ok else 'failed')
+
+
+def stats_gauges(prefix: str, help_text: str, stats: dict):
+    """Turn a ``stats()`` dict into ``(name, help, samples)`` gauges, one per numeric key."""
+    return labelled_stats_gauges(prefix, help_text, None, {None: stats})
+
+
+def labelled_stats_gauges(prefix: str, help_text: str, label: str, stats_by_value: dict):
+    """Like :func:`stats_gauges` for one ``stats()`` dict per label value (e.g. per host)."""
+    gauges = {}
+    for label_value, stats in stats_by_value.items():
+        labels = {label: label_value} if label else {}
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges.setdefault(key, []).append((labels, value))
+    return [(f'{prefix}_{key}', f'{help_text} ({key}).', samples) for key, samples in gauges.items()]
+
+
+class TimingMiddleware:
+    """Count API requests and, on request, return their span breakdown.
+
+    Sending the ``SCRAPER_TIMING_HEADER`` header (``X-Scraper-Timing: 1``)
+    adds a ``Server-Timing`` response header and a ``timing`` key to JSON
+    object responses. Streaming responses only get the header.
+    """
+
+    async_capable = True
+    sync_capable = False
+
+    def __init__(self, get_response):
+        from asgiref.sync import markcoroutinefunction
+
+        self.get_response = get_response
+        markcoroutinefunction(self)
+
+    async def __call__(self, request):
+        from django.conf import settings
+
+        header = getattr(settings, 'SCRAPER_TIMING_HEADER', 'X-Scraper-Timing')
+        timings = None
+        if request.headers.get(header, '').lower() in ('1', 'true', 'yes'):
+            timings = RequestTimings()
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        requests_total.inc(view=view, status=response.status_code)
+        request_seconds.observe(time.perf_counter() - started, view=view)
+        if timings is not None:
+            response['Server-Timing'] = timings.server_timing()
+            if not response.streaming and response.get('Content-Type', '').startswith('application/json'):
+                try:
+                    body = json.loads(response.content)
+                except ValueError:
+                    body = None
+                if isinstance(body, dict):
+                    body['timing'] = timings.to_dict()
+                    response.content = json.dumps(body)
+        return response
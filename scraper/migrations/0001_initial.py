@@ -0,0 +1,24 @@
+# Generated by Django 5.1.5 on 2025-02-01 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapedData',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField()),
+                ('content', models.TextField()),
+                ('scraped_at', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(max_length=50)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2025-02-02 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SitemapURL',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField()),
+                ('size', models.IntegerField(default=0)),
+                ('selected', models.BooleanField(default=True)),
+                ('processed', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='processed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='selected',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='size',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:19
+
+from urllib.parse import urlparse
+
+from django.db import migrations, models
+
+
+def populate_domain_and_dedupe(apps, schema_editor):
+    """Fill ``domain`` from each row's URL and keep only the newest row per (domain, url)."""
+    SitemapURL = apps.get_model('scraper', 'SitemapURL')
+    seen = set()
+    duplicates = []
+    for row in SitemapURL.objects.order_by('-id').only('id', 'url').iterator():
+        domain = (urlparse(row.url).hostname or '').lower()
+        if (domain, row.url) in seen:
+            duplicates.append(row.id)
+            continue
+        seen.add((domain, row.url))
+        SitemapURL.objects.filter(pk=row.id).update(domain=domain)
+    for start in range(0, len(duplicates), 500):
+        SitemapURL.objects.filter(pk__in=duplicates[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0003_crawljob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitemapurl',
+            name='domain',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(populate_domain_and_dedupe, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='sitemapurl',
+            constraint=models.UniqueConstraint(fields=('domain', 'url'), name='unique_sitemap_url_per_domain'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0004_sitemapurl_domain_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='etag',
+            field=models.CharField(blank=True, max_length=512),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='last_modified',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='measured_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='normalized_url',
+            field=models.CharField(blank=True, max_length=2048, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='text_size',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='tier',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0005_scrapeddata_cache_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crawljob',
+            name='result',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='sitemapurl',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='sitemapurl',
+            name='lastmod',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
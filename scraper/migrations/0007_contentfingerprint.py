@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0006_sitemapurl_lastmod_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255)),
+                ('kind', models.CharField(choices=[('page', 'Page'), ('chunk', 'Chunk')], max_length=10)),
+                ('url', models.URLField(max_length=2048)),
+                ('chunk_index', models.IntegerField(default=0)),
+                ('fingerprint', models.BigIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('domain', 'kind', 'url', 'chunk_index'), name='unique_fingerprint_per_domain')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0007_contentfingerprint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='crawljob',
+            name='kind',
+            field=models.CharField(choices=[('sitemap', 'Sitemap'), ('crawl', 'Crawl'), ('ingest', 'Ingest')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='Document',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=2048)),
+                ('domain', models.CharField(max_length=255)),
+                ('title', models.CharField(blank=True, max_length=512)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('chunk_count', models.IntegerField(default=0)),
+                ('token_count', models.IntegerField(default=0)),
+                ('duplicate_of', models.URLField(blank=True, max_length=2048)),
+                ('ingested_at', models.DateTimeField(auto_now=True)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='documents', to='scraper.crawljob')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Chunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunk_index', models.IntegerField()),
+                ('section', models.JSONField(blank=True, default=list)),
+                ('content', models.TextField()),
+                ('tokens', models.IntegerField(default=0)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='scraper.document')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='document',
+            constraint=models.UniqueConstraint(fields=('domain', 'url'), name='unique_document_per_domain'),
+        ),
+        migrations.AddConstraint(
+            model_name='chunk',
+            constraint=models.UniqueConstraint(fields=('document', 'chunk_index'), name='unique_chunk_per_document'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:16
+
+from urllib.parse import urlparse
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_domains(apps, schema_editor):
+    """Fill ``ScrapedData.domain`` from each URL and copy ``url``/``domain`` onto existing chunks."""
+    ScrapedData = apps.get_model('scraper', 'ScrapedData')
+    Chunk = apps.get_model('scraper', 'Chunk')
+    Document = apps.get_model('scraper', 'Document')
+    for row in ScrapedData.objects.only('id', 'url').iterator():
+        ScrapedData.objects.filter(pk=row.id).update(domain=(urlparse(row.url).hostname or '').lower())
+    documents = Document.objects.filter(pk=OuterRef('document_id'))
+    Chunk.objects.update(url=Subquery(documents.values('url')[:1]), domain=Subquery(documents.values('domain')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0008_document_chunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(db_index=True, max_length=255)),
+                ('codec', models.CharField(max_length=10)),
+                ('data', models.BinaryField()),
+                ('sample_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='domain',
+            field=models.CharField(db_index=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='url',
+            field=models.URLField(db_index=True, default='', max_length=2048),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='codec',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='compressed_content',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='domain',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='scrapeddata',
+            name='scraped_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='scrapeddata',
+            name='url',
+            field=models.URLField(db_index=True),
+        ),
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='dictionary',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='scraper.compressiondictionary'),
+        ),
+        migrations.RunPython(populate_domains, migrations.RunPython.noop),
+    ]
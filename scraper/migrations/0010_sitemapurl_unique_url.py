@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:02
+
+from django.db import migrations, models
+
+
+def dedupe_urls(apps, schema_editor):
+    """Keep only the newest row per URL, whichever domain it was stored under."""
+    SitemapURL = apps.get_model('scraper', 'SitemapURL')
+    seen = set()
+    duplicates = []
+    for row in SitemapURL.objects.order_by('-id').only('id', 'url').iterator():
+        if row.url in seen:
+            duplicates.append(row.id)
+            continue
+        seen.add(row.url)
+    for start in range(0, len(duplicates), 500):
+        SitemapURL.objects.filter(pk__in=duplicates[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0009_compressed_storage'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='sitemapurl',
+            name='unique_sitemap_url_per_domain',
+        ),
+        migrations.RunPython(dedupe_urls, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='sitemapurl',
+            constraint=models.UniqueConstraint(fields=('url',), name='unique_sitemap_url'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:12
+
+from urllib.parse import urlparse
+
+from django.db import migrations, models
+
+
+def source_domain(url):
+    # Same rule as scraper.storage.source_domain().
+    if '://' not in url:
+        url = 'https://' + url
+    return (urlparse(url).hostname or '').lower()
+
+
+def copy_job_membership(apps, schema_editor):
+    """Carry each row's single ``job`` over to the ``jobs`` membership table."""
+    SitemapURL = apps.get_model('scraper', 'SitemapURL')
+    Membership = SitemapURL.jobs.through
+    rows = SitemapURL.objects.filter(job__isnull=False).values_list('id', 'job_id').iterator()
+    batch = []
+    for url_id, job_id in rows:
+        batch.append(Membership(sitemapurl_id=url_id, crawljob_id=job_id))
+        if len(batch) == 500:
+            Membership.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Membership.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def normalize_domains(apps, schema_editor):
+    """Store every ``domain`` as ``source_domain()`` of what was recorded, or of the URL for rows without one."""
+    SitemapURL = apps.get_model('scraper', 'SitemapURL')
+    for row in SitemapURL.objects.only('id', 'url', 'domain').iterator():
+        domain = source_domain(row.domain or row.url)
+        if domain != row.domain:
+            SitemapURL.objects.filter(pk=row.id).update(domain=domain)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0010_sitemapurl_unique_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitemapurl',
+            name='jobs',
+            field=models.ManyToManyField(blank=True, related_name='urls', to='scraper.crawljob'),
+        ),
+        migrations.AlterField(
+            model_name='sitemapurl',
+            name='job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=models.SET_NULL, related_name='+',
+                                    to='scraper.crawljob'),
+        ),
+        migrations.RunPython(copy_job_membership, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='sitemapurl',
+            name='job',
+        ),
+        # URLs are unique on their own until the constraint below, so
+        # normalizing cannot produce duplicate (url, domain) pairs.
+        migrations.RemoveConstraint(
+            model_name='sitemapurl',
+            name='unique_sitemap_url',
+        ),
+        migrations.RunPython(normalize_domains, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='sitemapurl',
+            constraint=models.UniqueConstraint(fields=('url', 'domain'), name='unique_sitemap_url_per_domain'),
+        ),
+    ]
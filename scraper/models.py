@@ -1,25 +1,189 @@
 from django.db import models
+from django.utils import timezone
+
+
+class CompressionDictionary(models.Model):
+    """Dictionary trained on one site's page bodies (see scraper.compression)."""
+
+    domain = models.CharField(max_length=255, db_index=True)
+    codec = models.CharField(max_length=10)
+    data = models.BinaryField()
+    sample_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.codec} dictionary for {self.domain} ({len(self.data)} bytes)"
 
 
 class ScrapedData(models.Model):
-    url = models.URLField()
+    url = models.URLField(db_index=True)
+    domain = models.CharField(max_length=255, default='', blank=True, db_index=True)
+    # Empty when the body is kept compressed in ``compressed_content`` (see
+    # scraper.compression); read it through ``content_compressor.unpack()``.
     content = models.TextField()
-    scraped_at = models.DateTimeField(auto_now_add=True)
+    codec = models.CharField(max_length=10, default='', blank=True)
+    compressed_content = models.BinaryField(null=True, blank=True)
+    dictionary = models.ForeignKey(CompressionDictionary, null=True, blank=True, on_delete=models.PROTECT,
+                                   related_name='+')
+    scraped_at = models.DateTimeField(auto_now_add=True, db_index=True)
     status = models.CharField(max_length=50)
     size = models.IntegerField(default=0)
     selected = models.BooleanField(default=True)
     processed = models.BooleanField(default=False)
+    # Page cache fields (see scraper.cache); rows written by the cache are
+    # keyed by normalized URL.
+    normalized_url = models.CharField(max_length=2048, null=True, blank=True, unique=True)
+    tier = models.CharField(max_length=20, blank=True)
+    etag = models.CharField(max_length=512, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+    text_size = models.IntegerField(null=True, blank=True)
+    measured_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.url} - {self.scraped_at}"
 
 
+class CrawlJob(models.Model):
+    class Kind(models.TextChoices):
+        SITEMAP = 'sitemap'
+        CRAWL = 'crawl'
+        INGEST = 'ingest'
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued'
+        RUNNING = 'running'
+        DONE = 'done'
+        FAILED = 'failed'
+        CANCELLED = 'cancelled'
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    target = models.CharField(max_length=2048)
+    options = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+    url_count = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(default=dict, blank=True)
+
+    @property
+    def is_finished(self):
+        return self.status in (self.Status.DONE, self.Status.FAILED, self.Status.CANCELLED)
+
+    @property
+    def duration(self):
+        if not self.started_at:
+            return None
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'target': self.target,
+            'status': self.status,
+            'url_count': self.url_count,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration': self.duration,
+            'result': self.result,
+        }
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} for {self.target} ({self.status})"
+
+
 class SitemapURL(models.Model):
     url = models.URLField()
+    domain = models.CharField(max_length=255, default='', blank=True)
     size = models.IntegerField(default=0)
     selected = models.BooleanField(default=True)
     processed = models.BooleanField(default=False)
+    lastmod = models.CharField(max_length=64, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Every job that listed the URL; a later fetch adds to this instead of
+    # taking the row away from earlier jobs.
+    jobs = models.ManyToManyField(CrawlJob, blank=True, related_name='urls')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['url', 'domain'], name='unique_sitemap_url_per_domain'),
+        ]
+
+    def __str__(self):
+        return self.url
+
+
+class ContentFingerprint(models.Model):
+    """SimHash of a page's or chunk's text, for near-duplicate detection (see scraper.dedup)."""
+
+    class Kind(models.TextChoices):
+        PAGE = 'page'
+        CHUNK = 'chunk'
+
+    domain = models.CharField(max_length=255)
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    url = models.URLField(max_length=2048)
+    chunk_index = models.IntegerField(default=0)
+    # Unsigned 64-bit fingerprint stored as its signed two's-complement value.
+    fingerprint = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['domain', 'kind', 'url', 'chunk_index'],
+                                    name='unique_fingerprint_per_domain'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.url} #{self.chunk_index}"
+
+
+class Document(models.Model):
+    """A page run through the ingestion pipeline (see scraper.ingest)."""
+
+    url = models.URLField(max_length=2048)
+    domain = models.CharField(max_length=255)
+    title = models.CharField(max_length=512, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)
+    chunk_count = models.IntegerField(default=0)
+    token_count = models.IntegerField(default=0)
+    # Set instead of chunks when the page near-duplicates an ingested one.
+    duplicate_of = models.URLField(max_length=2048, blank=True)
+    ingested_at = models.DateTimeField(auto_now=True)
+    job = models.ForeignKey(CrawlJob, null=True, blank=True, on_delete=models.SET_NULL, related_name='documents')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['domain', 'url'], name='unique_document_per_domain'),
+        ]
 
     def __str__(self):
         return self.url
+
+
+class Chunk(models.Model):
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chunks')
+    # Copied from the document so chunks can be looked up without a join.
+    url = models.URLField(max_length=2048, db_index=True, default='')
+    domain = models.CharField(max_length=255, db_index=True, default='')
+    chunk_index = models.IntegerField()
+    section = models.JSONField(default=list, blank=True)
+    content = models.TextField()
+    content_hash = models.CharField(max_length=64, default='', blank=True, db_index=True)
+    tokens = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'chunk_index'], name='unique_chunk_per_document'),
+        ]
+
+    def __str__(self):
+        return f"{self.document.url} #{self.chunk_index}"
@@ -0,0 +1,359 @@
+"""Per-host politeness: rate limits, adaptive concurrency and retries for every fetch path.
+
+Each host gets a token bucket (``SCRAPER_HOST_RATE`` requests per second,
+bursts of ``SCRAPER_HOST_BURST``, lowered to one request per robots.txt
+``Crawl-delay`` once one is known) and an in-flight limit that adapts AIMD
+style: it grows by about one per round of successful requests that finish
+within ``SCRAPER_HOST_TARGET_LATENCY_MS`` and halves on throttling, errors or
+slow responses. A 429/503 with ``Retry-After`` pauses the whole host for that
+long. Transient failures are retried with jittered exponential backoff.
+
+The scheduler is shared by the request loops, the browser pool loop and the
+job runner loop, so its state sits behind a thread lock and waiters are
+woken on their own loop.
+
+Settings: SCRAPER_POLITENESS_ENABLED, SCRAPER_HOST_RATE, SCRAPER_HOST_BURST,
+SCRAPER_HOST_CONCURRENCY, SCRAPER_HOST_MIN_CONCURRENCY,
+SCRAPER_HOST_MAX_CONCURRENCY, SCRAPER_HOST_TARGET_LATENCY_MS,
+SCRAPER_RETRY_ATTEMPTS, SCRAPER_RETRY_BASE_DELAY_MS,
+SCRAPER_RETRY_MAX_DELAY_MS, SCRAPER_MAX_RETRY_AFTER.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import httpx
+from django.conf import settings
+
+OUTCOME_OK = 'ok'
+OUTCOME_THROTTLED = 'throttled'
+OUTCOME_BLOCKED = 'blocked'
+OUTCOME_ERROR = 'error'
+
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Weight of the newest sample in the smoothed latency.
+LATENCY_SMOOTHING = 0.2
+# A waiter re-checks its host at least this often, in case a wake-up was lost
+# because its loop was busy shutting down.
+SLOT_RECHECK_SECONDS = 1.0
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a ``Retry-After`` header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=dt_timezone.utc)
+    return max(0.0, (when - datetime.now(tz=dt_timezone.utc)).total_seconds())
+
+
+def status_outcome(status) -> str:
+    if status is None or (status >= 500 and status not in THROTTLE_STATUSES):
+        return OUTCOME_ERROR
+    if status in THROTTLE_STATUSES:
+        return OUTCOME_THROTTLED
+    if status == 403:
+        return OUTCOME_BLOCKED
+    return OUTCOME_OK
+
+
+def host_key(url: str) -> str:
+    parsed = urlparse(url if '://' in url else 'https://' + url)
+    return parsed.netloc.lower()
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Slot:
+    """Handed out by :meth:`HostScheduler.slot`; record how the request went with :meth:`observe`."""
+
+    def __init__(self):
+        self.outcome = OUTCOME_OK
+        self.retry_after = None
+
+    def observe(self, status, retry_after=None):
+        self.outcome = status_outcome(status)
+        self.retry_after = parse_retry_after(retry_after)
+
+    def fail(self):
+        self.outcome = OUTCOME_ERROR
+
+
+class HostState:
+    """Bucket, concurrency limit and counters of one host. Guarded by the scheduler's lock."""
+
+    def __init__(self, host: str, rate: float, burst: float, concurrency: float):
+        self.host = host
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.limit = float(concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.crawl_delay = 0.0
+        self.latency = None
+        self.last_decrease = 0.0
+        self.waiters = deque()
+        self.counters = dict.fromkeys(('requests', 'successes', 'throttled', 'blocked', 'errors', 'retries'), 0)
+
+    @property
+    def effective_rate(self) -> float:
+        if self.crawl_delay:
+            return min(self.rate, 1 / self.crawl_delay) if self.rate else 1 / self.crawl_delay
+        return self.rate
+
+    @property
+    def capacity(self) -> float:
+        return 1.0 if self.crawl_delay else self.burst
+
+    def try_start(self, now: float):
+        """Start a request if allowed: 0 when started, seconds to wait, or None to wait for a free slot."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.in_flight >= max(1, int(self.limit)):
+            return None
+        rate = self.effective_rate
+        if rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / rate
+            self.tokens -= 1
+        self.in_flight += 1
+        self.counters['requests'] += 1
+        return 0
+
+    def finish(self, now: float, latency: float, slot: Slot, scheduler):
+        self.in_flight -= 1
+        if slot.outcome is None:
+            return
+        if slot.outcome == OUTCOME_OK:
+            self.counters['successes'] += 1
+            self.latency = latency if self.latency is None else (
+                LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self.latency
+            )
+            if latency * 1000 <= scheduler.target_latency_ms:
+                self.limit = min(scheduler.max_concurrency, self.limit + 1 / self.limit)
+            else:
+                self._decrease(now, scheduler)
+            return
+
+        self.counters[{OUTCOME_THROTTLED: 'throttled', OUTCOME_BLOCKED: 'blocked'}.get(slot.outcome, 'errors')] += 1
+        self._decrease(now, scheduler)
+        if slot.outcome == OUTCOME_THROTTLED:
+            pause = slot.retry_after
+            if pause is None:
+                pause = scheduler.retry_base_delay
+            self.blocked_until = max(self.blocked_until, now + min(pause, scheduler.max_retry_after))
+
+    def _decrease(self, now: float, scheduler):
+        # Many requests in flight fail together; halve once per round trip, not once per failure.
+        if now - self.last_decrease < (self.latency or 1.0):
+            return
+        self.limit = max(scheduler.min_concurrency, self.limit / 2)
+        self.last_decrease = now
+
+    def stats(self, now: float) -> dict:
+        return {
+            **self.counters,
+            'in_flight': self.in_flight,
+            'concurrency': round(self.limit, 2),
+            'rate': round(self.effective_rate, 3),
+            'crawl_delay': self.crawl_delay,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'paused_for': round(max(0.0, self.blocked_until - now), 3),
+        }
+
+
+class HostScheduler:
+    """Process-wide per-host admission control for outgoing requests."""
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'SCRAPER_POLITENESS_ENABLED', True)
+
+    @property
+    def rate(self) -> float:
+        return getattr(settings, 'SCRAPER_HOST_RATE', 20)
+
+    @property
+    def burst(self) -> float:
+        return getattr(settings, 'SCRAPER_HOST_BURST', 20)
+
+    @property
+    def min_concurrency(self) -> float:
+        return max(1, getattr(settings, 'SCRAPER_HOST_MIN_CONCURRENCY', 1))
+
+    @property
+    def max_concurrency(self) -> float:
+        return max(self.min_concurrency, getattr(settings, 'SCRAPER_HOST_MAX_CONCURRENCY', 32))
+
+    @property
+    def initial_concurrency(self) -> float:
+        concurrency = getattr(settings, 'SCRAPER_HOST_CONCURRENCY', 4)
+        return min(self.max_concurrency, max(self.min_concurrency, concurrency))
+
+    @property
+    def target_latency_ms(self) -> float:
+        return getattr(settings, 'SCRAPER_HOST_TARGET_LATENCY_MS', 3000)
+
+    @property
+    def retry_attempts(self) -> int:
+        return max(0, getattr(settings, 'SCRAPER_RETRY_ATTEMPTS', 2))
+
+    @property
+    def retry_base_delay(self) -> float:
+        return getattr(settings, 'SCRAPER_RETRY_BASE_DELAY_MS', 500) / 1000
+
+    @property
+    def retry_max_delay(self) -> float:
+        return getattr(settings, 'SCRAPER_RETRY_MAX_DELAY_MS', 30000) / 1000
+
+    @property
+    def max_retry_after(self) -> float:
+        return getattr(settings, 'SCRAPER_MAX_RETRY_AFTER', 120)
+
+    def _host(self, url: str) -> HostState:
+        key = host_key(url)
+        with self._lock:
+            state = self._hosts.get(key)
+            if state is None:
+                state = self._hosts[key] = HostState(key, self.rate, self.burst, self.initial_concurrency)
+            return state
+
+    def set_crawl_delay(self, url: str, delay: float):
+        """Cap a host's rate at one request per robots.txt ``Crawl-delay`` seconds."""
+        state = self._host(url)
+        with self._lock:
+            state.crawl_delay = max(0.0, float(delay or 0))
+
+    async def _acquire(self, state: HostState):
+        while True:
+            loop = asyncio.get_running_loop()
+            waiter = None
+            with self._lock:
+                delay = state.try_start(time.monotonic())
+                if delay == 0:
+                    return
+                if delay is None:
+                    waiter = loop.create_future()
+                    state.waiters.append((loop, waiter))
+            if waiter is None:
+                await asyncio.sleep(delay)
+                continue
+            try:
+                await asyncio.wait_for(waiter, SLOT_RECHECK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _release(self, state: HostState, latency: float, slot: Slot):
+        now = time.monotonic()
+        with self._lock:
+            state.finish(now, latency, slot, self)
+            free = max(1, int(state.limit)) - state.in_flight
+            woken = []
+            while free > 0 and state.waiters:
+                loop, waiter = state.waiters.popleft()
+                if not waiter.done():
+                    woken.append((loop, waiter))
+                    free -= 1
+        for loop, waiter in woken:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Hold one of ``url``'s host slots for the duration of a request."""
+        if not self.enabled:
+            yield Slot()
+            return
+        state = self._host(url)
+        await self._acquire(state)
+        slot = Slot()
+        started = time.monotonic()
+        try:
+            yield slot
+        except asyncio.CancelledError:
+            slot.outcome = None
+            raise
+        except BaseException:
+            slot.fail()
+            raise
+        finally:
+            self._release(state, time.monotonic() - started, slot)
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's ``Retry-After``."""
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+    async def request(self, url: str, send):
+        """Await ``send()`` (returning an httpx response) under ``url``'s host slot, retrying transient failures.
+
+        Connection errors and 429/5xx responses are retried up to
+        ``SCRAPER_RETRY_ATTEMPTS`` times; the last response or error is
+        passed on as-is.
+        """
+        attempts = self.retry_attempts + 1 if self.enabled else 1
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            async with self.slot(url) as slot:
+                try:
+                    response = await send()
+                except httpx.TransportError:
+                    slot.fail()
+                    if last:
+                        raise
+                    response = None
+                else:
+                    slot.observe(response.status_code, response.headers.get('retry-after'))
+                    if last or response.status_code not in RETRY_STATUSES:
+                        return response
+                    await response.aclose()
+            self._count_retry(url)
+            await asyncio.sleep(self.backoff(attempt, slot.retry_after))
+
+    def _count_retry(self, url: str):
+        state = self._host(url)
+        with self._lock:
+            state.counters['retries'] += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {host: state.stats(now) for host, state in sorted(self._hosts.items())}
+
+    def clear(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+host_scheduler = HostScheduler()
@@ -0,0 +1,374 @@
+"""Sitemap discovery, streaming parsing and concurrent sitemap-index traversal."""
+import asyncio
+import xml.etree.ElementTree as ET
+import zlib
+from urllib.parse import urljoin
+
+from django.conf import settings
+
+from .metrics import span
+
+SITEMAP_LOCATIONS = [
+    '/sitemap.xml',
+    '/sitemap_index.xml',
+    '/sitemap.php',
+    '/sitemap.txt'
+]
+
+SITEMAP_MARKERS = ('<?xml', '<urlset', '<sitemapindex')
+
+ENTRY_FIELDS = ('loc', 'lastmod', 'changefreq', 'priority')
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Page entries buffered between the sitemap walkers and the consumer.
+ENTRY_QUEUE_SIZE = 1000
+
+
+def find_sitemap_start(content: str) -> int:
+    """Return the offset of the sitemap markup in browser-rendered content."""
+    offsets = [offset for offset in (content.find(marker) for marker in SITEMAP_MARKERS) if offset >= 0]
+    return min(offsets, default=0)
+
+
+class SitemapStreamParser:
+    """Incremental parser for sitemap XML, gzipped sitemaps and sitemap.txt.
+
+    Feed raw byte chunks as they arrive; every call returns the entries
+    completed so far as ``{'loc', 'lastmod', 'changefreq', 'priority'}``
+    dicts. Finished ``<url>`` / ``<sitemap>`` elements are dropped from the
+    tree straight away, so memory stays flat however large the sitemap is.
+
+    ``kind`` becomes ``'urlset'``, ``'sitemapindex'``, ``'text'`` or
+    ``'unknown'`` once enough of the document has been seen.
+    """
+
+    def __init__(self):
+        self.kind = None
+        self._started = False
+        self._decompressor = None
+        self._pending = b''
+        self._xml = None
+        self._root = None
+        self._text_buffer = b''
+        self._done = False
+
+    @property
+    def is_index(self) -> bool:
+        return self.kind == 'sitemapindex'
+
+    @property
+    def is_sitemap(self) -> bool:
+        return self.kind in ('urlset', 'sitemapindex', 'text')
+
+    def feed(self, chunk: bytes) -> list:
+        if self._done or not chunk:
+            return []
+        if not self._started:
+            self._started = True
+            if chunk.startswith(GZIP_MAGIC):
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._decompressor is not None:
+            chunk = self._decompressor.decompress(chunk)
+        return self._feed_decoded(chunk)
+
+    def close(self) -> list:
+        """Flush buffered input and return any entries it completes."""
+        entries = []
+        if self._decompressor is not None and not self._done:
+            entries.extend(self._feed_decoded(self._decompressor.flush()))
+        if self.kind == 'text':
+            entries.extend(self._feed_text(b'\n'))
+        elif self._xml is not None and not self._done:
+            try:
+                self._xml.close()
+            except ET.ParseError:
+                pass
+            entries.extend(self._drain())
+        self._done = True
+        return entries
+
+    def _feed_decoded(self, data: bytes) -> list:
+        if self.kind is None:
+            self._pending += data
+            data = self._pending.lstrip(b'\xef\xbb\xbf \t\r\n')
+            if not data:
+                return []
+            self._pending = b''
+            if data.startswith(b'<'):
+                self._xml = ET.XMLPullParser(events=('start', 'end'))
+                self.kind = 'xml'
+            else:
+                self.kind = 'text'
+        if self.kind == 'text':
+            return self._feed_text(data)
+        try:
+            self._xml.feed(data)
+        except ET.ParseError:
+            if self._root is not None:
+                raise
+            self.kind = 'unknown'
+            self._done = True
+            return []
+        return self._drain()
+
+    def _feed_text(self, data: bytes) -> list:
+        *lines, self._text_buffer = (self._text_buffer + data).split(b'\n')
+        entries = []
+        for line in lines:
+            loc = line.strip().decode('utf-8', errors='ignore')
+            if loc.startswith(('http://', 'https://')):
+                entries.append({**dict.fromkeys(ENTRY_FIELDS), 'loc': loc})
+        return entries
+
+    def _drain(self) -> list:
+        entries = []
+        for event, element in self._xml.read_events():
+            tag = element.tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                if self._root is None:
+                    self._root = element
+                    self.kind = tag if tag in ('urlset', 'sitemapindex') else 'unknown'
+                    if self.kind == 'unknown':
+                        self._done = True
+                        break
+                continue
+            if element is self._root:
+                self._done = True
+                break
+            if tag not in ('url', 'sitemap'):
+                continue
+            entry = dict.fromkeys(ENTRY_FIELDS)
+            for child in element:
+                name = child.tag.rsplit('}', 1)[-1]
+                if name in entry and child.text:
+                    entry[name] = child.text.strip()
+            if entry['loc']:
+                entries.append(entry)
+            self._root.clear()
+        return entries
+
+
+class _Sniffed:
+    """A candidate sitemap read by ``iter_probe``: the chunks already read, then the rest of its download."""
+
+    def __init__(self, chunks: list, rest=None):
+        self.chunks = chunks
+        self.rest = rest
+        self.started = False
+
+    async def __aiter__(self):
+        self.started = True
+        for item in self.chunks:
+            yield item
+        if self.rest is not None:
+            async for item in self.rest:
+                yield item
+
+    async def aclose(self):
+        rest, self.rest = self.rest, None
+        if rest is not None:
+            await rest.aclose()
+
+
+class _Traversal:
+    """Bookkeeping for one ``iter_entries`` call: walker tasks and their output queue.
+
+    The queue itself is unbounded so the end-of-traversal marker can always be
+    posted; ``room`` bounds how many page entries may wait in it.
+    """
+
+    def __init__(self, resolver):
+        self.resolver = resolver
+        self.queue = asyncio.Queue()
+        self.room = asyncio.Semaphore(ENTRY_QUEUE_SIZE)
+        self.tasks = set()
+        self.pending = 0
+
+    def spawn(self, sitemap_url: str, depth: int, stream=None):
+        if sitemap_url in self.resolver.visited:
+            return
+        self.resolver.visited.add(sitemap_url)
+        self.pending += 1
+        task = asyncio.ensure_future(self.resolver._walk(sitemap_url, depth, self, stream))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def put(self, entry: dict):
+        await self.room.acquire()
+        self.queue.put_nowait(entry)
+
+    def finish_one(self):
+        self.pending -= 1
+        if not self.pending:
+            self.queue.put_nowait(None)
+
+    def cancel(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+
+class SitemapResolver:
+    """Resolve a sitemap (or sitemap index) into page entries.
+
+    Entries are ``{'url', 'size', 'lastmod', 'changefreq', 'priority'}`` dicts
+    and are yielded while the documents are still downloading. Child sitemaps
+    of an index are walked concurrently, limited by
+    ``SCRAPER_SITEMAP_CONCURRENCY`` documents in flight; per-host rate limits
+    are applied by the stream's HTTP requests (see scraper.politeness). Every
+    sitemap URL is fetched at most once, which also breaks cycles between
+    indexes, and indexes nested deeper than ``SCRAPER_SITEMAP_MAX_DEPTH`` are
+    ignored.
+
+    Args:
+        stream: Async generator function taking a URL and yielding
+            ``(chunk, size)`` pairs of raw document bytes, where ``size`` is
+            the document size if known up front.
+    """
+
+    def __init__(self, stream, concurrency: int = None, max_depth: int = None):
+        if concurrency is None:
+            concurrency = getattr(settings, 'SCRAPER_SITEMAP_CONCURRENCY', 8)
+        if max_depth is None:
+            max_depth = getattr(settings, 'SCRAPER_SITEMAP_MAX_DEPTH', 5)
+        self.stream = stream
+        self.max_depth = max_depth
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.visited = set()
+
+    async def iter_entries(self, sitemap_url: str, stream=None):
+        """Yield every page entry reachable from ``sitemap_url`` as it is parsed.
+
+        ``stream`` is the document's download if one is already open.
+        """
+        traversal = _Traversal(self)
+        traversal.spawn(sitemap_url, 0, stream)
+        if not traversal.pending:
+            return
+        try:
+            while True:
+                entry = await traversal.queue.get()
+                if entry is None:
+                    return
+                traversal.room.release()
+                yield entry
+        finally:
+            traversal.cancel()
+
+    async def resolve(self, sitemap_url: str) -> list:
+        """Return every page entry reachable from ``sitemap_url``."""
+        return [entry async for entry in self.iter_entries(sitemap_url)]
+
+    async def iter_probe(self, root_url: str, locations=SITEMAP_LOCATIONS):
+        """Yield the entries of the first candidate location that has any.
+
+        All candidates are sniffed in parallel, but they keep their priority
+        order: a later location is only walked when every earlier sitemap
+        turned out empty. A candidate is walked from the download that
+        sniffed it, so nothing is fetched twice; the downloads of later
+        candidates are closed once one has yielded an entry.
+        """
+        candidates = [urljoin(root_url, location) for location in locations]
+        sniffed = list(await asyncio.gather(*(self._sniff(url) for url in candidates)))
+        try:
+            for index, sitemap_url in enumerate(candidates):
+                stream, sniffed[index] = sniffed[index], None
+                if stream is None:
+                    continue
+                if sitemap_url in self.visited:
+                    await stream.aclose()
+                    continue
+                found = False
+                try:
+                    async for entry in self.iter_entries(sitemap_url, stream):
+                        if not found:
+                            found = True
+                            await self._close(sniffed)
+                        yield entry
+                finally:
+                    # A walk closes the stream it reads; this one may have been cancelled before starting.
+                    if not stream.started:
+                        await stream.aclose()
+                if found:
+                    return
+        finally:
+            await self._close(sniffed)
+
+    async def probe(self, root_url: str, locations=SITEMAP_LOCATIONS) -> list:
+        return [entry async for entry in self.iter_probe(root_url, locations)]
+
+    @staticmethod
+    async def _close(streams: list):
+        for index, stream in enumerate(streams):
+            if stream is not None:
+                streams[index] = None
+                await stream.aclose()
+
+    async def _sniff(self, sitemap_url: str):
+        """Read just enough of a document to tell whether it is a sitemap.
+
+        Returns None if it is not, or a :class:`_Sniffed` stream that replays
+        what was read and then continues the download.
+        """
+        parser = SitemapStreamParser()
+        chunks = []
+        stream = self.stream(sitemap_url)
+        done = False
+        async with self.semaphore:
+            try:
+                while parser.kind in (None, 'xml'):
+                    try:
+                        chunk = await stream.__anext__()
+                    except StopAsyncIteration:
+                        parser.close()
+                        done = True
+                        break
+                    chunks.append(chunk)
+                    parser.feed(chunk[0])
+            except Exception as e:
+                print(f"Parse sitemap error: {str(e)}")
+                await stream.aclose()
+                return None
+        if done or not parser.is_sitemap:
+            await stream.aclose()
+        if not parser.is_sitemap:
+            return None
+        return _Sniffed(chunks, None if done else stream)
+
+    async def _walk(self, sitemap_url: str, depth: int, traversal: _Traversal, stream=None):
+        try:
+            async with self.semaphore:
+                parser = SitemapStreamParser()
+                if stream is None:
+                    stream = self.stream(sitemap_url)
+                size = 0
+                try:
+                    async for chunk, size in stream:
+                        with span('xml_parse'):
+                            entries = parser.feed(chunk)
+                        if parser.is_index and depth >= self.max_depth:
+                            print(f"Skipping sitemap index nested too deeply: {sitemap_url}")
+                            return
+                        await self._dispatch(entries, parser, size, depth, traversal)
+                    with span('xml_parse'):
+                        entries = parser.close()
+                    await self._dispatch(entries, parser, size, depth, traversal)
+                finally:
+                    await stream.aclose()
+        except Exception as e:
+            print(f"Parse sitemap error: {str(e)}")
+        finally:
+            traversal.finish_one()
+
+    async def _dispatch(self, entries, parser, size, depth, traversal):
+        for entry in entries:
+            if parser.is_index:
+                traversal.spawn(entry['loc'], depth + 1)
+            else:
+                await traversal.put({
+                    'url': entry['loc'],
+                    'size': size,
+                    'lastmod': entry['lastmod'],
+                    'changefreq': entry['changefreq'],
+                    'priority': entry['priority'],
+                })
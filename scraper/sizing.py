@@ -0,0 +1,119 @@
+"""Page sizes for many URLs at once, with cheaper estimates when rendering is not needed.
+
+Methods, from most to least faithful:
+    render: render in a pooled browser page and measure the main-content text.
+    auto:   what ``/get-page-size/`` does - main-content text of the HTTP
+            response, rendering only pages that need it; cached.
+    text:   main-content text of the raw HTML over plain HTTP, never rendered.
+    head:   Content-Length of a HEAD response (markup bytes, not text).
+
+With ``fallback`` a URL the chosen method cannot size is retried with the
+cheaper methods after it. Rendering goes through ``browser_pool`` and its
+page slots, so a batch never launches browsers of its own.
+
+Settings: SCRAPER_PAGE_SIZE_CONCURRENCY, SCRAPER_PAGE_SIZE_MAX_URLS.
+"""
+import asyncio
+import random
+import time
+
+from django.conf import settings
+
+from .cache import page_cache
+from .http_client import http_content_length, http_fetch
+from .utils import FETCH_HEADERS, USER_AGENTS, aclean_html_content, clean_url, fetch_url
+
+METHOD_RENDER = 'render'
+METHOD_AUTO = 'auto'
+METHOD_TEXT = 'text'
+METHOD_HEAD = 'head'
+METHODS = (METHOD_RENDER, METHOD_AUTO, METHOD_TEXT, METHOD_HEAD)
+
+FALLBACKS = {
+    METHOD_RENDER: (METHOD_TEXT, METHOD_HEAD),
+    METHOD_AUTO: (METHOD_TEXT, METHOD_HEAD),
+    METHOD_TEXT: (METHOD_HEAD,),
+    METHOD_HEAD: (),
+}
+
+
+async def _rendered_size(url: str):
+    result = await fetch_url(url, render=True, clean=False)
+    if not result.content:
+        return None, None
+    return len(await aclean_html_content(result.content, main_content=True)), None
+
+
+async def _auto_size(url: str):
+    return await page_cache.page_size(url)
+
+
+async def _text_size(url: str):
+    headers = {**FETCH_HEADERS, 'User-Agent': random.choice(USER_AGENTS)}
+    result, _ = await http_fetch(clean_url(url), headers)
+    if not result.content:
+        return None, None
+    return len(await aclean_html_content(result.content, main_content=True)), None
+
+
+async def _head_size(url: str):
+    headers = {**FETCH_HEADERS, 'User-Agent': random.choice(USER_AGENTS)}
+    return await http_content_length(clean_url(url), headers), None
+
+
+ESTIMATORS = {
+    METHOD_RENDER: _rendered_size,
+    METHOD_AUTO: _auto_size,
+    METHOD_TEXT: _text_size,
+    METHOD_HEAD: _head_size,
+}
+
+
+async def measure_page_size(url: str, method: str = METHOD_AUTO, fallback: bool = False) -> dict:
+    """Size one URL and report how.
+
+    Returns ``{'url', 'size', 'method', 'latency_ms'}`` plus ``'cache'`` when
+    the cached ``auto`` measurement answered, or ``'error'`` when no method
+    produced a size (``size`` is then None and ``method`` the last one tried).
+    """
+    started = time.perf_counter()
+    attempts = (method,) + (FALLBACKS[method] if fallback else ())
+    record = {'url': url, 'size': None, 'method': method}
+    for attempt in attempts:
+        record['method'] = attempt
+        try:
+            size, cache_status = await ESTIMATORS[attempt](url)
+        except Exception as e:
+            print(f"Error sizing {url} with {attempt}: {e}")
+            record['error'] = str(e)
+            continue
+        if size is not None:
+            record.pop('error', None)
+            record['size'] = size
+            if cache_status is not None:
+                record['cache'] = cache_status
+            break
+    else:
+        record.setdefault('error', 'No size could be determined')
+    record['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return record
+
+
+async def iter_page_sizes(urls, method: str = METHOD_AUTO, fallback: bool = False, concurrency: int = None):
+    """Yield :func:`measure_page_size` records in completion order, ``concurrency`` URLs at a time."""
+    if concurrency is None:
+        concurrency = getattr(settings, 'SCRAPER_PAGE_SIZE_CONCURRENCY', 8)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def measure(url):
+        async with semaphore:
+            return await measure_page_size(url, method, fallback)
+
+    tasks = [asyncio.ensure_future(measure(url)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,194 @@
+"""Persistence: batched URL upserts, SQLite connection tuning and JSONL export.
+
+Settings: SCRAPER_DB_BATCH_SIZE, SCRAPER_SQLITE_PRAGMAS, SCRAPER_EXPORT_BATCH_SIZE.
+"""
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .compression import content_compressor
+from .metrics import span
+from .models import Chunk, ScrapedData, SitemapURL
+
+# Used when SCRAPER_SQLITE_PRAGMAS is not set; see configure_sqlite().
+DEFAULT_SQLITE_PRAGMAS = {
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    'temp_store': 'memory',
+    'cache_size': -32000,
+    'mmap_size': 128 * 1024 * 1024,
+}
+# Only applied to databases already in WAL mode; a rollback journal needs full syncs.
+WAL_ONLY_PRAGMAS = ('synchronous',)
+
+EXPORT_CHUNKS = 'chunks'
+EXPORT_PAGES = 'pages'
+EXPORT_KINDS = (EXPORT_CHUNKS, EXPORT_PAGES)
+CHUNK_EXPORT_FIELDS = ('url', 'domain', 'chunk_index', 'section', 'content', 'content_hash', 'tokens')
+
+# Columns refreshed when a URL is discovered again for the same source
+# domain. ``selected`` and ``processed`` are left alone so user choices and
+# processing state survive a re-fetch; job membership lives in
+# ``SitemapURL.jobs`` and is only ever added to.
+UPSERT_FIELDS = ['size']
+
+# Incremental refreshes also record what the stored content hash was taken
+# from and whether the page still needs processing.
+INCREMENTAL_UPSERT_FIELDS = UPSERT_FIELDS + ['lastmod', 'content_hash', 'processed']
+
+
+def source_domain(url: str) -> str:
+    """Return the lowercase host a sitemap or crawl was started from.
+
+    This is the one rule for ``SitemapURL.domain``; it accepts a bare host as
+    well as a URL, so applying it to its own result changes nothing.
+    """
+    if '://' not in url:
+        url = 'https://' + url
+    return (urlparse(url).hostname or '').lower()
+
+
+def save_sitemap_urls(records, domain: str, job=None, batch_size: int = None, update_fields=None) -> int:
+    """Upsert ``url_info`` records for ``domain`` and return how many were written.
+
+    Rows are unique on ``(url, domain)`` and go out as multi-row
+    ``INSERT ... ON CONFLICT DO UPDATE`` statements of
+    ``SCRAPER_DB_BATCH_SIZE`` rows, all inside a single transaction, so
+    re-fetching a domain refreshes its rows instead of adding duplicates.
+    Repeated URLs within ``records`` are collapsed (last wins). With ``job``
+    the rows are also added to that job's URLs, keeping any earlier jobs.
+    ``update_fields`` overrides which columns a conflict refreshes.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'SCRAPER_DB_BATCH_SIZE', 500)
+    batch_size = max(1, batch_size)
+    domain = source_domain(domain)
+    rows = {}
+    for record in records:
+        rows[record['url']] = SitemapURL(
+            url=record['url'],
+            domain=domain,
+            size=record['size'],
+            selected=record['selected'],
+            processed=record['processed'],
+            lastmod=record.get('lastmod') or '',
+            content_hash=record.get('content_hash') or '',
+        )
+    if not rows:
+        return 0
+    with span('db_write'), transaction.atomic():
+        SitemapURL.objects.bulk_create(
+            rows.values(),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['url', 'domain'],
+            update_fields=update_fields or UPSERT_FIELDS,
+        )
+        if job is not None:
+            _add_to_job(list(rows), domain, job, batch_size)
+    return len(rows)
+
+
+def _add_to_job(urls: list, domain: str, job, batch_size: int):
+    Membership = SitemapURL.jobs.through
+    for start in range(0, len(urls), batch_size):
+        ids = SitemapURL.objects.filter(domain=domain, url__in=urls[start:start + batch_size]).values_list(
+            'id', flat=True)
+        Membership.objects.bulk_create([Membership(sitemapurl_id=url_id, crawljob_id=job.pk) for url_id in ids],
+                                       ignore_conflicts=True)
+
+
+asave_sitemap_urls = sync_to_async(save_sitemap_urls)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """``connection_created`` receiver applying ``SCRAPER_SQLITE_PRAGMAS`` to every SQLite connection.
+
+    Only per-connection pragmas belong there, so opening the database never
+    rewrites the file. ``busy_timeout`` (ms) makes a writer wait for the lock
+    instead of failing with "database is locked"; ``synchronous=normal`` lets
+    a commit append to the write-ahead log without waiting for the database
+    file to be synced, and is skipped unless the database is in WAL mode
+    (see :func:`set_journal_mode`).
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SCRAPER_SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+    with connection.cursor() as cursor:
+        if any(name in pragmas for name in WAL_ONLY_PRAGMAS):
+            cursor.execute('PRAGMA journal_mode')
+            wal = cursor.fetchone()[0].lower() == 'wal'
+        for name, value in pragmas.items():
+            if name in WAL_ONLY_PRAGMAS and not wal:
+                continue
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def set_journal_mode(connection, mode: str = 'wal') -> str:
+    """Switch an SQLite database's journal mode and return the mode now in effect.
+
+    Unlike the per-connection pragmas this is stored in the database file,
+    so it is a deploy-time step (``manage.py sqlite_journal wal``): WAL lets
+    readers go on while another connection writes, at the cost of ``-wal``
+    and ``-shm`` files next to the database.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA journal_mode = {mode}')
+        return cursor.fetchone()[0].lower()
+
+
+def export_batch(kind: str, domain: str = None, after: int = 0, batch_size: int = None):
+    """Return ``(records, last_id)`` for up to ``batch_size`` rows with an id above ``after``.
+
+    ``last_id`` is None once there is nothing left. Walking the table by
+    primary key keeps every query short and memory bounded by one batch,
+    however large the export. Pages are cached ``ScrapedData`` bodies,
+    decompressed; chunks are the ingested ``Chunk`` rows.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'SCRAPER_EXPORT_BATCH_SIZE', 1000)
+    if kind == EXPORT_CHUNKS:
+        queryset = Chunk.objects.filter(pk__gt=after)
+        if domain:
+            queryset = queryset.filter(domain=domain)
+        rows = list(queryset.order_by('pk').values('id', *CHUNK_EXPORT_FIELDS, title=F('document__title'))[:batch_size])
+        if not rows:
+            return [], None
+        last_id = rows[-1]['id']
+        for row in rows:
+            del row['id']
+        return rows, last_id
+
+    queryset = ScrapedData.objects.filter(pk__gt=after, fetched_at__isnull=False)
+    if domain:
+        queryset = queryset.filter(domain=domain)
+    rows = list(queryset.order_by('pk')[:batch_size])
+    if not rows:
+        return [], None
+    records = [
+        {'url': row.url, 'domain': row.domain, 'tier': row.tier, 'size': row.size, 'fetched_at': row.fetched_at,
+         'content': content_compressor.unpack(row)}
+        for row in rows
+    ]
+    return records, rows[-1].pk
+
+
+def iter_export(kind: str, domain: str = None, batch_size: int = None):
+    """Yield export records batch by batch (see :func:`export_batch`)."""
+    after = 0
+    while after is not None:
+        records, after = export_batch(kind, domain, after, batch_size)
+        yield from records
+
+
+async def aiter_export_batches(kind: str, domain: str = None, batch_size: int = None):
+    """Yield lists of export records, reading each batch in a worker thread."""
+    after = 0
+    while True:
+        records, after = await sync_to_async(export_batch)(kind, domain, after, batch_size)
+        if after is None:
+            return
+        yield records
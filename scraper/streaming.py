@@ -0,0 +1,72 @@
+"""Streaming API responses: one JSON record per result as it is produced.
+
+Views opt in with a ``stream`` request field (``'ndjson'``, ``'sse'``, or
+``true`` for NDJSON) or an ``Accept`` header of ``application/x-ndjson`` /
+``text/event-stream``. A producer is an async generator of ``(event,
+payload)`` pairs and always ends with a ``summary`` event. In NDJSON,
+records are written as they are and other events are wrapped as
+``{"<event>": payload}``; in Server-Sent Events every pair becomes an
+``event:``/``data:`` block.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+STREAM_NDJSON = 'ndjson'
+STREAM_SSE = 'sse'
+STREAM_FORMATS = (STREAM_NDJSON, STREAM_SSE)
+CONTENT_TYPES = {
+    STREAM_NDJSON: 'application/x-ndjson',
+    STREAM_SSE: 'text/event-stream',
+}
+
+EVENT_RECORD = 'record'
+EVENT_SUMMARY = 'summary'
+EVENT_ERROR = 'error'
+
+
+def stream_format(request, data: dict):
+    """Return the streaming format a request asked for, or None for a plain JSON response."""
+    requested = data.get('stream')
+    if requested is True or requested in ('true', '1'):
+        return STREAM_NDJSON
+    if requested in STREAM_FORMATS:
+        return requested
+    if requested not in (None, False, 'false', '0', ''):
+        raise ValueError(f"stream must be one of {', '.join(STREAM_FORMATS)}")
+    accept = request.headers.get('Accept', '')
+    if CONTENT_TYPES[STREAM_SSE] in accept:
+        return STREAM_SSE
+    if CONTENT_TYPES[STREAM_NDJSON] in accept:
+        return STREAM_NDJSON
+    return None
+
+
+def encode_event(event: str, payload, fmt: str) -> str:
+    if fmt == STREAM_SSE:
+        return f"event: {event}\ndata: {json.dumps(payload, cls=DjangoJSONEncoder)}\n\n"
+    if event != EVENT_RECORD:
+        payload = {event: payload}
+    return json.dumps(payload, cls=DjangoJSONEncoder) + '\n'
+
+
+def streaming_response(events, fmt: str = STREAM_NDJSON) -> StreamingHttpResponse:
+    """Stream the ``(event, payload)`` pairs of ``events``.
+
+    The status line has gone out before the first record, so a failure part
+    way through is reported as a final ``error`` event instead.
+    """
+    async def body():
+        try:
+            async for event, payload in events:
+                yield encode_event(event, payload, fmt)
+        except Exception as e:
+            print(f"Error while streaming response: {e}")
+            yield encode_event(EVENT_ERROR, {'status': 'error', 'message': str(e)}, fmt)
+
+    response = StreamingHttpResponse(body(), content_type=CONTENT_TYPES[fmt])
+    response['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies (nginx) from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,66 @@
+from django.test import SimpleTestCase, override_settings
+
+from scraper.browser_pool import BrowserPool
+from scraper.tests.test_page_slots import FakeBrowser
+
+
+class FakeChromium:
+    def __init__(self):
+        self.launched = []
+
+    async def launch(self, **options):
+        self.launched.append(FakeBrowser())
+        return self.launched[-1]
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+        self.stopped = False
+
+    async def stop(self):
+        self.stopped = True
+
+
+async def borrow(browser):
+    return browser
+
+
+@override_settings(SCRAPER_BROWSER_POOL_ENABLED=True, SCRAPER_BROWSER_POOL_SIZE=1, SCRAPER_BROWSER_MAX_PAGES=2,
+                   SCRAPER_BROWSER_MAX_MEMORY_MB=1024 * 1024)
+class BrowserPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.playwright = FakePlaywright()
+        self.pool = BrowserPool()
+        self.pool._playwright = self.playwright
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    async def test_browser_is_recycled_after_max_pages(self):
+        browsers = [await self.pool.run(borrow) for _ in range(3)]
+
+        self.assertIs(browsers[0], browsers[1])
+        self.assertIsNot(browsers[2], browsers[0])
+        self.assertTrue(browsers[0].closed)
+        self.assertFalse(browsers[2].closed)
+        stats = self.pool.stats()
+        self.assertEqual((stats['launched'], stats['recycled'], stats['browsers'], stats['in_use']), (2, 1, 1, 0))
+
+    async def test_failing_call_releases_the_browser(self):
+        async def fail(browser):
+            raise RuntimeError('navigation failed')
+
+        with self.assertRaises(RuntimeError):
+            await self.pool.run(fail)
+        self.assertEqual(self.pool.stats()['in_use'], 0)
+        self.assertIs(await self.pool.run(borrow), self.playwright.chromium.launched[0])
+
+    async def test_shutdown_closes_browsers_and_playwright(self):
+        browser = await self.pool.run(borrow)
+        await self.pool.close()
+
+        self.assertTrue(browser.closed)
+        self.assertTrue(self.playwright.stopped)
+        self.assertEqual(self.pool.stats()['browsers'], 0)
+        self.assertFalse(self.pool._background.running)
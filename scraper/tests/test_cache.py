@@ -0,0 +1,86 @@
+from django.test import TestCase, override_settings
+
+from benchmarks.fixture_server import FixtureHandler, FixtureServer
+from scraper.cache import CACHE_HIT, CACHE_MISS, CACHE_REVALIDATED, CachedPage, page_cache
+from scraper.compression import content_compressor
+from scraper.http_client import close_http_client
+from scraper.models import ScrapedData
+from scraper.url_filter import normalize_url
+
+
+class RecordingHandler(FixtureHandler):
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('If-None-Match')))
+        super().do_GET()
+
+
+@override_settings(SCRAPER_CACHE_ENABLED=True, SCRAPER_CACHE_PERSIST=True, SCRAPER_CLEAN_WORKERS=0,
+                   SCRAPER_COMPRESSION='zlib')
+class PageCacheTests(TestCase):
+    def setUp(self):
+        page_cache.clear()
+        content_compressor.clear()
+        RecordingHandler.requests = []
+
+    def tearDown(self):
+        page_cache.clear()
+        content_compressor.clear()
+
+    async def test_etag_revalidation(self):
+        with FixtureServer(RecordingHandler) as server:
+            url = server.url('/page/1.html')
+            try:
+                first, status = await page_cache.fetch(url)
+                self.assertEqual(status, CACHE_MISS)
+                self.assertIn('Paragraph 0 of page 1', first.content)
+
+                result, status = await page_cache.fetch(url)
+                self.assertEqual(status, CACHE_HIT)
+
+                result, status = await page_cache.fetch(url, max_age=0)
+                self.assertEqual(status, CACHE_REVALIDATED)
+                self.assertEqual(result.content, first.content)
+            finally:
+                await close_http_client()
+
+        self.assertEqual([etag for _, etag in RecordingHandler.requests], [None, first.etag])
+        self.assertEqual(page_cache.stats()['revalidated'], 1)
+        # The stored row is read back the same way after a restart.
+        page_cache.clear()
+        entry = await page_cache._lookup(normalize_url(url))
+        self.assertEqual((entry.content, entry.etag), (first.content, first.etag))
+
+    async def test_refetch_keeps_measured_page_size(self):
+        with FixtureServer(RecordingHandler) as server:
+            url = server.url('/page/2.html')
+            key = normalize_url(url)
+            await page_cache._store(key, CachedPage(url, content='old', fetched_at=1.0, text_size=1234,
+                                                    measured_at=2.0))
+            try:
+                result, status = await page_cache.fetch(url)
+            finally:
+                await close_http_client()
+
+        self.assertEqual(status, CACHE_MISS)
+        self.assertEqual([etag for _, etag in RecordingHandler.requests], [None])
+        entry = await page_cache._lookup(key)
+        self.assertEqual(entry.content, result.content)
+        self.assertEqual((entry.text_size, entry.measured_at), (1234, 2.0))
+        row = await ScrapedData.objects.aget(normalized_url=key)
+        self.assertEqual(row.text_size, 1234)
+
+
+
+    def test_fetch_content_is_served_from_the_cache(self):
+        with FixtureServer(RecordingHandler) as server:
+            url = server.url('/page/3.html')
+            first = self.client.get('/api/fetch-content/', {'url': url}).json()
+            second = self.client.get('/api/fetch-content/', {'url': url}).json()
+
+        self.assertEqual(second['content'], first['content'])
+        self.assertEqual(len(RecordingHandler.requests), 1)
+        stats = self.client.get('/api/cache-stats/').json()
+        self.assertEqual((stats['cache']['hits'], stats['cache']['misses']), (1, 1))
+        self.assertIn('compression', stats)
@@ -0,0 +1,121 @@
+import json
+
+import tiktoken
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from scraper import tokenizer
+from scraper.chunking import (
+    UNIT_TOKENS, chunk_documents, chunk_markdown, get_splitter, split_markdown, split_sections,
+)
+
+BYTE_ENCODING = 'test_bytes'
+
+
+def byte_encoding() -> tiktoken.Encoding:
+    """A tiny real encoding with one token per UTF-8 byte, so tests need no downloaded BPE ranks."""
+    return tiktoken.Encoding(BYTE_ENCODING, pat_str=r'\S+|\s+',
+                             mergeable_ranks={bytes([value]): value for value in range(256)}, special_tokens={})
+
+
+class ByteEncodingMixin:
+    """Makes :data:`BYTE_ENCODING` the default encoding for the duration of each test."""
+
+    def setUp(self):
+        super().setUp()
+        tokenizer._encodings[BYTE_ENCODING] = byte_encoding()
+        settings = override_settings(SCRAPER_TOKENIZER_ENCODING=BYTE_ENCODING, SCRAPER_TOKENIZER_ENCODINGS=[])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(tokenizer._encodings.pop, BYTE_ENCODING, None)
+
+
+def documents(count: int) -> list:
+    return [{'url': f'https://example.com/{number}', 'title': f'Page {number}',
+             'content': '\n\n'.join(f'Paragraph {i} of page {number} has a few words.' for i in range(8))}
+            for number in range(count)]
+
+
+class ChunkDocumentsTests(ByteEncodingMixin, SimpleTestCase):
+    def test_one_list_of_records_per_batch(self):
+        batches = list(chunk_documents(documents(5), 120, 0, batch_size=2))
+
+        self.assertEqual([len({record['url'] for record in batch}) for batch in batches], [2, 2, 1])
+        records = [record for batch in batches for record in batch]
+        indexes = [record['chunk_index'] for record in records if record['url'] == 'https://example.com/0']
+        self.assertEqual(indexes, list(range(len(indexes))))
+        self.assertGreater(len(indexes), 1)
+        for record in records:
+            self.assertTrue(record['content'].startswith(f"Document Title: Page {record['url'][-1]}."))
+            self.assertEqual(record['tokens'], len(record['content'].encode()))
+
+    def test_token_sized_chunks(self):
+        text = '\n\n'.join(f'Paragraph {i} is written in café style, with ünïcode.' for i in range(20))
+        chunks = chunk_markdown(text, 60, 10, UNIT_TOKENS)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk.encode()) <= 60 for _, chunk in chunks))
+
+    def test_splitters_are_shared(self):
+        self.assertIs(get_splitter(100, 10), get_splitter(100, 10))
+        self.assertIsNot(get_splitter(100, 10), get_splitter(100, 10, UNIT_TOKENS))
+        with self.assertRaises(ValueError):
+            get_splitter(100, 10, 'words')
+
+    def test_split_markdown_counts_tokens_with_the_header(self):
+        pairs = split_markdown('Some text.', lambda breadcrumb: 'Header', 100, 0)
+        self.assertEqual(pairs, [('Header\n\nSome text.', len('Header\n\nSome text.'))])
+
+
+class SectionChunkingTests(SimpleTestCase):
+    MARKDOWN = (
+        'Intro line.\n\n# Guide\n\n## Install\n\nRun the installer.\n\n### Linux\n\nUse the package.\n\n'
+        '```\n# not a heading\n```\n\n## Usage\n\nCall the client.'
+    )
+
+    def test_split_sections_tracks_breadcrumbs(self):
+        sections = split_sections(self.MARKDOWN)
+        self.assertEqual([breadcrumb for breadcrumb, _ in sections], [
+            (), ('Guide', 'Install'), ('Guide', 'Install', 'Linux'), ('Guide', 'Usage'),
+        ])
+        self.assertTrue(sections[1][1].startswith('# Guide\n\n## Install'))
+        self.assertIn('# not a heading', sections[2][1])
+
+    def test_small_sections_are_packed_under_their_common_breadcrumb(self):
+        chunks = chunk_markdown(self.MARKDOWN, 1000, 0)
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0][0], ())
+
+        chunks = chunk_markdown(self.MARKDOWN.split('\n\n', 1)[1], 80, 0)
+        self.assertEqual([breadcrumb for breadcrumb, _ in chunks], [('Guide', 'Install'), ('Guide',)])
+        self.assertTrue(all(len(text) <= 80 for _, text in chunks))
+
+    def test_large_section_is_split_with_its_breadcrumb(self):
+        body = '\n\n'.join(f'Paragraph {number} explains one more option in detail.' for number in range(20))
+        chunks = chunk_markdown(f'## Options\n\n{body}', 200, 40)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual({breadcrumb for breadcrumb, _ in chunks}, {('Options',)})
+        self.assertTrue(all(len(text) <= 200 for _, text in chunks))
+
+
+@override_settings(SCRAPER_CHUNK_BATCH_DOCUMENTS=2)
+class ChunkEndpointTests(ByteEncodingMixin, TestCase):
+    async def post(self, body: dict):
+        response = await self.async_client.post('/api/chunk/', json.dumps(body), content_type='application/json')
+        if not response.streaming:
+            return response, None
+        lines = b''.join([part async for part in response.streaming_content]).decode().splitlines()
+        return response, [json.loads(line) for line in lines]
+
+    async def test_chunks_are_streamed_with_a_summary(self):
+        response, lines = await self.post({'documents': documents(3), 'chunk_size': 120, 'chunk_overlap': 0})
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        *records, summary = lines
+        self.assertEqual({record['url'] for record in records}, {f'https://example.com/{n}' for n in range(3)})
+        self.assertEqual(summary['summary']['chunks'], len(records))
+        self.assertEqual(summary['summary']['tokens'], sum(record['tokens'] for record in records))
+
+    async def test_invalid_sizes(self):
+        response, _ = await self.post({'documents': documents(1), 'chunk_size': 100, 'chunk_overlap': 100})
+        self.assertEqual(response.status_code, 400)
+        response, _ = await self.post({'documents': []})
+        self.assertEqual(response.status_code, 400)
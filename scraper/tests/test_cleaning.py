@@ -0,0 +1,54 @@
+import asyncio
+
+from django.test import SimpleTestCase, override_settings
+
+from benchmarks.fixture_server import render_page
+from scraper.cleaning import (
+    OUTPUT_MARKDOWN, PARSER_HTML, CleaningPool, clean_batch, clean_html_content, resolve_parser,
+)
+
+PAGE = ('<?xml-stylesheet href="a.xsl"?><!DOCTYPE html><html><head><style>p {}</style>'
+        '<script>var x = 1;</script></head><body><h1>Title</h1>\n<p>Some   <b>bold</b>\ntext</p></body></html>')
+
+
+class CleanHtmlContentTests(SimpleTestCase):
+    def test_visible_text_with_whitespace_collapsed(self):
+        self.assertEqual(clean_html_content(PAGE), 'Title Some bold text')
+        self.assertEqual(clean_html_content('<!DOCTYPE html><html><body>  </body></html>'), '')
+
+    def test_batch_keeps_document_order(self):
+        self.assertEqual(clean_batch(['<p>one</p>', '<p>two</p>'], PARSER_HTML), ['one', 'two'])
+
+    def test_parser_resolution(self):
+        self.assertIn(resolve_parser('auto'), ('selectolax', 'lxml', 'html.parser'))
+        self.assertEqual(resolve_parser(PARSER_HTML), PARSER_HTML)
+        with self.assertRaises(ValueError):
+            resolve_parser('regex')
+
+
+@override_settings(SCRAPER_EXTRACT_MAIN_CONTENT=False, SCRAPER_HTML_PARSER='html.parser')
+class CleaningPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = CleaningPool()
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    @override_settings(SCRAPER_CLEAN_WORKERS=1, SCRAPER_CLEAN_BATCH_WAIT_MS=50)
+    async def test_small_documents_are_cleaned_in_a_worker_process(self):
+        pages = [render_page(number, 3).decode() for number in range(5)]
+        texts = await asyncio.gather(*(self.pool.clean(page) for page in pages))
+
+        self.assertEqual(texts, [clean_html_content(page) for page in pages])
+        self.assertIn('Paragraph 2 of page 4', texts[4])
+        self.assertIsNotNone(self.pool._executor)
+        markdown = await self.pool.clean('<h2>Heading</h2><p>Body</p>', output=OUTPUT_MARKDOWN)
+        self.assertEqual(markdown.split('\n\n'), ['## Heading', 'Body'])
+
+    @override_settings(SCRAPER_CLEAN_WORKERS=0)
+    async def test_no_workers_cleans_inline(self):
+        self.assertEqual(await self.pool.clean(PAGE), 'Title Some bold text')
+        self.assertEqual(await self.pool.clean(''), '')
+        self.assertIsNone(self.pool._executor)
+        with self.assertRaises(ValueError):
+            await self.pool.clean(PAGE, output='pdf')
@@ -0,0 +1,57 @@
+from django.test import TestCase, override_settings
+
+from benchmarks.fixture_server import render_docs_page
+from scraper.compression import CODEC_PLAIN, CODEC_ZLIB, CODEC_ZSTD, content_compressor, zstd_available
+from scraper.markdown import html_to_markdown
+from scraper.models import CompressionDictionary, ScrapedData
+
+
+@override_settings(SCRAPER_COMPRESSION_MIN_BYTES=256, SCRAPER_COMPRESSION_DICT_SAMPLES=4,
+                   SCRAPER_COMPRESSION_DICT_SIZE=4096, SCRAPER_COMPRESSION_LEVEL=None)
+class ContentCompressorTests(TestCase):
+    def setUp(self):
+        content_compressor.clear()
+        self.addCleanup(content_compressor.clear)
+
+    def round_trip(self, text: str, domain: str = 'example.com') -> ScrapedData:
+        row = ScrapedData(url=f'https://{domain}/', **content_compressor.pack(domain, text))
+        self.assertEqual(content_compressor.unpack(row), text)
+        return row
+
+    def pages(self, count: int) -> list:
+        return [html_to_markdown(render_docs_page(number, sections=3).decode()) for number in range(count)]
+
+    def check_codec(self, codec: str):
+        with override_settings(SCRAPER_COMPRESSION=codec):
+            rows = [self.round_trip(text) for text in self.pages(6)]
+            self.assertTrue(all(row.codec == codec and not row.content for row in rows))
+            self.assertIsNone(rows[0].dictionary)
+            # The fourth page trains the site's dictionary; later pages use it too.
+            self.assertIsNotNone(rows[3].dictionary)
+            self.assertEqual(rows[5].dictionary_id, rows[3].dictionary_id)
+            self.assertEqual(CompressionDictionary.objects.filter(domain='example.com', codec=codec).count(), 1)
+
+            # A fresh process loads the dictionary from the table to unpack.
+            content_compressor.clear()
+            row = ScrapedData.objects.get(pk=ScrapedData.objects.create(
+                url='https://example.com/stored', normalized_url='https://example.com/stored',
+                **content_compressor.pack('example.com', self.pages(7)[6]),
+            ).pk)
+            self.assertEqual(content_compressor.unpack(row), self.pages(7)[6])
+
+    def test_zlib_round_trip(self):
+        self.check_codec(CODEC_ZLIB)
+
+    def test_zstd_round_trip(self):
+        if not zstd_available():
+            self.skipTest('zstandard is not installed')
+        self.check_codec(CODEC_ZSTD)
+
+    @override_settings(SCRAPER_COMPRESSION='zlib')
+    def test_short_or_disabled_bodies_stay_plain(self):
+        row = self.round_trip('short page')
+        self.assertEqual((row.codec, row.content, row.compressed_content), (CODEC_PLAIN, 'short page', None))
+        with override_settings(SCRAPER_COMPRESSION='off'):
+            row = self.round_trip(self.pages(1)[0])
+        self.assertEqual(row.codec, CODEC_PLAIN)
+        self.assertEqual(self.round_trip('').content, '')
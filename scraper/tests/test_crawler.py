@@ -0,0 +1,90 @@
+import json
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from benchmarks.fixture_server import FixtureHandler, FixtureServer
+from scraper.crawler import Crawler, crawl_website, parse_page
+from scraper.http_client import close_http_client
+from scraper.models import SitemapURL
+
+
+class SmallSiteHandler(FixtureHandler):
+    """Fifteen pages; page ``n`` links to ``2n + 1`` and ``2n + 2``. robots.txt disallows page 1."""
+
+    page_count = 15
+
+    def do_GET(self):
+        if self.path == '/robots.txt':
+            return self.send_body(b'User-agent: *\nDisallow: /page/1.html\n', 'text/plain')
+        return super().do_GET()
+
+
+# Reachable without page 1: page 0, then 2 and its descendants.
+ALLOWED_PAGES = (0, 2, 5, 6, 11, 12, 13, 14)
+
+
+def page_numbers(records, selected: bool = True) -> list:
+    return sorted(int(record['url'].rsplit('/', 1)[1].split('.')[0])
+                  for record in records if record['selected'] == selected)
+
+
+class ParsePageTests(SimpleTestCase):
+    def test_links_and_visible_text(self):
+        links, size = parse_page('<p>Hello <a href="/a">world</a></p><script>var hidden = 1;</script>'
+                                 '<a name="anchor">x</a>')
+        self.assertEqual(links, ['/a'])
+        self.assertEqual(size, len('Hello') + len('world') + len('x'))
+
+
+@override_settings(SCRAPER_CRAWL_RESPECT_ROBOTS=True, SCRAPER_CRAWL_MAX_DEPTH=None)
+class CrawlerTests(TestCase):
+    async def crawl(self, server, **options):
+        try:
+            return await Crawler(server.url('/page/0.html'), **options).crawl()
+        finally:
+            await close_http_client()
+
+    async def test_disallowed_pages_are_recorded_unselected(self):
+        with FixtureServer(SmallSiteHandler) as server:
+            records = await self.crawl(server, max_pages=100, workers=4)
+        self.assertEqual(page_numbers(records), list(ALLOWED_PAGES))
+        self.assertEqual(page_numbers(records, selected=False), [1])
+        self.assertTrue(all(record['processed'] and record['size'] for record in records if record['selected']))
+
+    async def test_max_pages_counts_visited_pages(self):
+        with FixtureServer(SmallSiteHandler) as server:
+            records = await self.crawl(server, max_pages=len(ALLOWED_PAGES), workers=8)
+            few = await self.crawl(server, max_pages=3, workers=8)
+        # Page 1 is disallowed, so it does not use up any of the budget.
+        self.assertEqual(page_numbers(records), list(ALLOWED_PAGES))
+        self.assertEqual(len(page_numbers(few)), 3)
+
+    async def test_max_depth(self):
+        with FixtureServer(SmallSiteHandler) as server:
+            records = await self.crawl(server, max_pages=100, max_depth=1, respect_robots=False)
+        self.assertEqual(page_numbers(records), [0, 1, 2])
+
+    async def test_exclude_pattern(self):
+        with FixtureServer(SmallSiteHandler) as server:
+            try:
+                records = await crawl_website(server.url('/page/0.html'), exclude=[r'/page/2\.html'])
+            finally:
+                await close_http_client()
+        self.assertEqual(page_numbers(records), [0])
+
+
+@override_settings(SCRAPER_CRAWL_RESPECT_ROBOTS=True)
+class CrawlViewTests(TestCase):
+    def test_crawl_saves_discovered_urls(self):
+        with FixtureServer(SmallSiteHandler) as server:
+            response = self.client.post('/api/crawl/', json.dumps({'url': server.url('/page/0.html'), 'max_pages': 4}),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['status'], 'success')
+        self.assertEqual(len(page_numbers(body['urls'])), 4)
+        self.assertEqual(SitemapURL.objects.filter(selected=True).count(), 4)
+
+    def test_url_is_required(self):
+        response = self.client.post('/api/crawl/', '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
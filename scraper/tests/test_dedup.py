@@ -0,0 +1,93 @@
+import json
+
+from django.test import TestCase, override_settings
+
+from scraper.chunking import achunk_batch
+from scraper.dedup import (
+    MODE_DROP, Deduplicator, FingerprintStore, SimHashIndex, fingerprint_store, hamming_distance, simhash,
+)
+from scraper.models import ContentFingerprint
+from scraper.tests.test_chunking import ByteEncodingMixin
+
+ARTICLE = (
+    'The scraper fetches every page listed in a sitemap, cleans the markup and splits the text into '
+    'sections. Each section is measured and packed into chunks that fit the configured size, and the '
+    'chunks keep the headings they were found under so search results can show where they came from. '
+    'Pages that repeat another page of the same site almost word for word are reported as duplicates.'
+)
+EDITED = ARTICLE.replace('almost word for word', 'nearly word for word')
+
+
+@override_settings(SCRAPER_DEDUP_PERSIST=False, SCRAPER_DEDUP_MIN_WORDS=20)
+class SimHashTests(TestCase):
+    def test_near_duplicates_are_close(self):
+        self.assertLessEqual(hamming_distance(simhash(ARTICLE), simhash(EDITED)), 6)
+        self.assertEqual(simhash(ARTICLE), simhash(ARTICLE.upper()))
+
+    def test_unrelated_texts_are_far(self):
+        other = ' '.join(f'token{number}' for number in range(80))
+        self.assertGreater(hamming_distance(simhash(ARTICLE), simhash(other)), 10)
+
+    def test_empty_text_has_no_fingerprint(self):
+        self.assertIsNone(simhash(''))
+        self.assertIsNone(simhash('  ... '))
+
+    def test_index_finds_the_closest_entry(self):
+        index = SimHashIndex(distance=3)
+        index.add('a', 0b1111)
+        index.add('b', 0b0111)
+        self.assertEqual(index.find(0b0011), ('b', 1))
+        self.assertEqual(index.find(0b0111, exclude='b'), ('a', 1))
+        self.assertIsNone(index.find(0b1111 << 40))
+        index.remove('b')
+        self.assertNotIn('b', index)
+        self.assertEqual(len(index), 1)
+
+    def test_deduplicator_compares_pages_within_a_site(self):
+        deduplicator = Deduplicator(MODE_DROP, FingerprintStore())
+        self.assertIsNone(deduplicator.page('https://example.com/a', ARTICLE))
+        match = deduplicator.page('https://example.com/b', EDITED)
+        self.assertEqual(match['url'], 'https://example.com/a')
+        self.assertIsNone(deduplicator.page('https://other.org/a', ARTICLE))
+        # Checking a page again compares it with the rest of the site, not its earlier self.
+        self.assertIsNone(deduplicator.page('https://example.com/a', ARTICLE))
+        report = deduplicator.report()
+        self.assertEqual((report['documents_checked'], report['documents_duplicate']), (4, 1))
+
+    def test_short_chunks_are_kept(self):
+        deduplicator = Deduplicator(MODE_DROP, FingerprintStore())
+        self.assertIsNone(deduplicator.chunk('https://example.com/a', 0, 'Copyright Example'))
+        self.assertIsNone(deduplicator.chunk('https://example.com/b', 0, 'Copyright Example'))
+        self.assertIsNone(deduplicator.chunk('https://example.com/a', 1, ARTICLE))
+        self.assertEqual(deduplicator.chunk('https://example.com/b', 1, ARTICLE)['chunk_index'], 1)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Deduplicator('merge')
+
+
+@override_settings(SCRAPER_DEDUP_PERSIST=True)
+class PersistedFingerprintTests(ByteEncodingMixin, TestCase):
+    async def test_fingerprints_are_saved_and_reloaded_outside_the_chunking_thread(self):
+        page = {'url': 'https://example.com/a', 'title': 'A', 'content': ARTICLE}
+        records = await achunk_batch([page], 2000, 0, dedup=Deduplicator(MODE_DROP, FingerprintStore()))
+        self.assertIn('content', records[0])
+        self.assertEqual(await ContentFingerprint.objects.filter(domain='example.com').acount(), 2)
+
+        # A fresh store only knows the first page from the database.
+        copy = {'url': 'https://example.com/b', 'title': 'B', 'content': EDITED}
+        records = await achunk_batch([copy], 2000, 0, dedup=Deduplicator(MODE_DROP, FingerprintStore()))
+        distance = hamming_distance(simhash(ARTICLE), simhash(EDITED))
+        self.assertEqual(records, [{'url': copy['url'], 'duplicate_of': {'url': page['url'], 'distance': distance}}])
+
+    async def test_chunk_endpoint_drops_duplicates(self):
+        self.addCleanup(fingerprint_store.clear)
+        documents = [{'url': f'https://example.com/{name}', 'title': name, 'content': content}
+                     for name, content in (('a', ARTICLE), ('b', EDITED))]
+        response = await self.async_client.post('/api/chunk/', json.dumps({'documents': documents, 'dedup': 'drop'}),
+                                                 content_type='application/json')
+        lines = b''.join([part async for part in response.streaming_content]).decode().splitlines()
+        *records, summary = [json.loads(line) for line in lines]
+
+        self.assertEqual({record['url'] for record in records}, {'https://example.com/a'})
+        self.assertEqual(summary['summary']['dedup']['documents_duplicate'], 1)
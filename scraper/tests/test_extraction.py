@@ -0,0 +1,56 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from benchmarks.fixture_server import FixtureServer, render_article_page
+from scraper.cleaning import OUTPUT_MARKDOWN, extract_main_content, parser_available
+from scraper.extraction import extract_main_markdown, extract_main_text
+from scraper.http_client import close_http_client
+from scraper.utils import fetch_url
+
+CHROME = ('cookies', 'Footer link', 'Section 3', 'Related article', 'Twitter', 'Home')
+
+
+class ExtractMainTextTests(SimpleTestCase):
+    def assertMainContent(self, text: str, number: int):
+        self.assertTrue(text.startswith(f'Article {number} Step 0: configure the component'))
+        self.assertIn(f'$ service restart --page {number}', text)
+        for noise in CHROME:
+            self.assertNotIn(noise, text)
+
+    def test_article_is_found_by_scoring(self):
+        self.assertMainContent(extract_main_text(render_article_page(1, 5).decode()), 1)
+
+    def test_lxml_builder_gives_the_same_content(self):
+        if not parser_available('lxml'):
+            self.skipTest('lxml is not installed')
+        html = render_article_page(2, 5).decode()
+        self.assertEqual(extract_main_text(html, 'lxml'), extract_main_text(html))
+
+    def test_main_and_remove_selectors(self):
+        html = ('<body><nav>Menu</nav><div id="content"><p>Kept text.</p><aside class="ad">Buy now</aside></div>'
+                '<p>Outside</p></body>')
+        text = extract_main_text(html, main_selectors=('#content',), remove_selectors=('.ad',))
+        # Too short to stand out, so the whole page is kept minus what is always dropped.
+        self.assertEqual(text, 'Kept text. Outside')
+
+    def test_markdown_keeps_structure(self):
+        markdown = extract_main_markdown(render_article_page(3, 2).decode())
+        self.assertTrue(markdown.startswith('# Article 3\n\nStep 0: configure the [component](/glossary/0)'))
+        self.assertIn('```\n$ service restart --page 3\n```', markdown)
+        self.assertNotIn('Footer link', markdown)
+
+    def test_failure_falls_back_to_the_whole_page(self):
+        self.assertEqual(extract_main_content('<p>Plain</p>', main_selectors=(object(),)), 'Plain')
+        self.assertEqual(extract_main_content('<p>Plain</p>', main_selectors=(object(),), output=OUTPUT_MARKDOWN),
+                         'Plain')
+
+
+@override_settings(SCRAPER_CLEAN_WORKERS=0, SCRAPER_CACHE_ENABLED=False, SCRAPER_EXTRACT_MAIN_CONTENT=True)
+class FetchMainContentTests(TestCase):
+    async def test_fetched_content_is_the_main_content(self):
+        with FixtureServer() as server:
+            try:
+                result = await fetch_url(server.url('/article/4.html'))
+            finally:
+                await close_http_client()
+        self.assertIn('Step 0: configure the component for page 4', result.content)
+        self.assertNotIn('Footer link', result.content)
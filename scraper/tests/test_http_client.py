@@ -0,0 +1,66 @@
+import gc
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from benchmarks.fixture_server import FixtureServer
+from scraper import http_client
+from scraper.background import BackgroundLoop
+from scraper.http_client import TIER_HTTP, close_http_client, get_http_client, looks_blocked, looks_js_rendered
+from scraper.utils import fetch_url
+
+
+def leaked_clients() -> list:
+    """Clients still registered for event loops that have already been closed."""
+    gc.collect()
+    return [client for loop, client in list(http_client._clients.items()) if loop.is_closed()]
+
+
+class ResponseCheckTests(SimpleTestCase):
+    def test_js_rendered_pages(self):
+        self.assertTrue(looks_js_rendered('<html><body><div id="root"></div><script src="/app.js"></script>'))
+        self.assertTrue(looks_js_rendered('<body><noscript>You need to enable JavaScript to run this app.'))
+        self.assertTrue(looks_js_rendered('<body><p>Loading</p><script>boot()</script></body>'))
+        self.assertFalse(looks_js_rendered('<body><p>' + 'Plain server-rendered text. ' * 20 + '</p></body>'))
+        self.assertFalse(looks_js_rendered('<body><p>Short page without scripts</p></body>'))
+
+    def test_blocked_responses(self):
+        self.assertTrue(looks_blocked(403, ''))
+        self.assertTrue(looks_blocked(200, '<html><title>Just a moment...</title>'))
+        self.assertFalse(looks_blocked(404, '<html><title>Not found</title>'))
+
+
+@override_settings(SCRAPER_CLEAN_WORKERS=0, SCRAPER_CACHE_ENABLED=False)
+class HttpFastPathTests(TestCase):
+    async def test_static_page_is_served_without_a_browser(self):
+        with FixtureServer() as server:
+            try:
+                result = await fetch_url(server.url('/page/3.html'))
+                missing = await fetch_url(server.url('/error/404/1.html'))
+            finally:
+                await close_http_client()
+        self.assertEqual(result.tier, TIER_HTTP)
+        self.assertEqual(result.status, 200)
+        self.assertIn('Paragraph 0 of page 3', result.content)
+        self.assertNotIn('<p>', result.content)
+        self.assertEqual((missing.tier, missing.status, missing.ok), (TIER_HTTP, 404, False))
+
+    def test_request_on_a_short_lived_loop_closes_its_client(self):
+        # The test client runs async views through async_to_sync, like a WSGI server.
+        with FixtureServer() as server:
+            response = self.client.get('/api/fetch-content/', {'url': server.url('/page/1.html')})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['tier'], TIER_HTTP)
+        self.assertEqual(leaked_clients(), [])
+
+
+class BackgroundLoopClientTests(SimpleTestCase):
+    def test_client_is_shared_until_the_loop_stops(self):
+        background = BackgroundLoop('test-http-client')
+
+        async def client():
+            return get_http_client()
+
+        first = background.submit(client()).result(5)
+        self.assertIs(background.submit(client()).result(5), first)
+        background.stop()
+        self.assertTrue(first.is_closed)
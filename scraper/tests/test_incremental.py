@@ -0,0 +1,89 @@
+import threading
+import time
+
+from django.test import TestCase, override_settings
+
+from benchmarks.fixture_server import FixtureHandler, FixtureServer
+from scraper.cache import page_cache
+from scraper.http_client import close_http_client
+from scraper.incremental import lastmod_advanced, refresh_sitemap_urls
+from scraper.models import SitemapURL
+
+
+class CountingHandler(FixtureHandler):
+    """Records how many page requests were being answered at once."""
+
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+    requests = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.requests += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            time.sleep(0.02)
+            super().do_GET()
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+
+def listing(server, numbers, lastmod: str) -> list:
+    return [{'url': server.url(f'/page/{number}.html'), 'size': 0, 'selected': True, 'processed': False,
+             'lastmod': lastmod} for number in numbers]
+
+
+class LastmodTests(TestCase):
+    def test_lastmod_advanced(self):
+        self.assertTrue(lastmod_advanced('2024-01-01', '2024-01-02T00:00:00Z'))
+        self.assertFalse(lastmod_advanced('2024-01-02T10:00:00+00:00', '2024-01-02'))
+        self.assertTrue(lastmod_advanced('', '2024-01-02'))
+        self.assertTrue(lastmod_advanced('2024-01-02', 'yesterday'))
+
+
+@override_settings(SCRAPER_CACHE_ENABLED=True, SCRAPER_CACHE_PERSIST=False, SCRAPER_CLEAN_WORKERS=0)
+class RefreshSitemapUrlsTests(TestCase):
+    def setUp(self):
+        page_cache.clear()
+        CountingHandler.active = CountingHandler.peak = CountingHandler.requests = 0
+
+    def tearDown(self):
+        page_cache.clear()
+
+    async def refresh(self, records, **options):
+        try:
+            return await refresh_sitemap_urls(records, 'example.com', **options)
+        finally:
+            await close_http_client()
+
+    async def test_only_pages_with_a_newer_lastmod_are_fetched_again(self):
+        with FixtureServer(CountingHandler) as server:
+            first = await self.refresh(listing(server, range(6), '2024-01-01'), concurrency=2)
+            await SitemapURL.objects.filter(domain='example.com').aupdate(processed=True)
+            requests = CountingHandler.requests
+
+            second = await self.refresh(listing(server, range(1, 6), '2024-01-01') +
+                                        listing(server, [6], '2024-01-01'), concurrency=2)
+
+        self.assertEqual(len(first['added']), 6)
+        self.assertLessEqual(CountingHandler.peak, 2)
+        # Pages 1-5 are skipped on their lastmod; only the new page 6 is requested.
+        self.assertEqual(CountingHandler.requests - requests, 1)
+        self.assertEqual(second['skipped'], 5)
+        self.assertEqual(second['added'], [server.url('/page/6.html')])
+        self.assertEqual(second['removed'], [server.url('/page/0.html')])
+        unprocessed = [url async for url in SitemapURL.objects.filter(processed=False).values_list('url', flat=True)]
+        self.assertEqual(unprocessed, [server.url('/page/6.html')])
+
+    async def test_unchanged_content_keeps_processed_flag(self):
+        with FixtureServer(CountingHandler) as server:
+            await self.refresh(listing(server, range(3), '2024-01-01'))
+            await SitemapURL.objects.aupdate(processed=True)
+            diff = await self.refresh(listing(server, range(3), '2024-02-01'))
+
+        self.assertEqual((diff['unchanged'], diff['changed'], diff['failed']), (3, [], []))
+        self.assertEqual(await SitemapURL.objects.filter(processed=True).acount(), 3)
@@ -0,0 +1,100 @@
+import json
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from benchmarks.fixture_server import FixtureHandler, FixtureServer
+from scraper.http_client import close_http_client
+from scraper.ingest import STAGES, IngestionPipeline, page_title
+from scraper.jobs import job_runner
+from scraper.models import Chunk, Document, SitemapURL
+from scraper.tests.test_chunking import ByteEncodingMixin
+from scraper.tests.test_jobs import wait_for
+
+
+class SmallSiteHandler(FixtureHandler):
+    page_count = 5
+    paragraphs = 6
+
+
+class PageTitleTests(SimpleTestCase):
+    def test_title_or_page_name(self):
+        self.assertEqual(page_title('<title> Guide &amp;\n Notes </title>', 'https://example.com/a'), 'Guide & Notes')
+        self.assertEqual(page_title('<p>No title</p>', 'https://example.com/docs/getting-started'),
+                         'getting-started')
+
+
+@override_settings(SCRAPER_CLEAN_WORKERS=0, SCRAPER_CACHE_ENABLED=False, SCRAPER_INGEST_QUEUE_SIZE=2)
+class IngestionPipelineTests(ByteEncodingMixin, TestCase):
+    async def ingest(self, server, **options) -> dict:
+        pipeline = IngestionPipeline(server.url('/sitemap.xml'), custom_location=True, chunk_size=400,
+                                     chunk_overlap=0, **options)
+        try:
+            return await pipeline.run()
+        finally:
+            await close_http_client()
+
+    async def test_pages_are_stored_as_documents_and_chunks(self):
+        with FixtureServer(SmallSiteHandler) as server:
+            report = await self.ingest(server)
+            again = await self.ingest(server)
+
+        self.assertEqual((report['urls'], report['skipped'], report['documents']), (5, 0, 5))
+        self.assertEqual(set(report['stages']), set(STAGES))
+        self.assertEqual(report['stages']['fetch']['failed'], 0)
+        self.assertEqual(await Document.objects.acount(), 5)
+        self.assertEqual(await Chunk.objects.acount(), report['chunks'])
+        self.assertGreater(report['chunks'], 5)
+        document = await Document.objects.aget(url=server.url('/page/0.html'))
+        self.assertEqual(document.chunk_count, await Chunk.objects.filter(document=document).acount())
+        self.assertEqual(document.token_count, sum([chunk.tokens async for chunk in document.chunks.all()]))
+        self.assertFalse(await SitemapURL.objects.filter(processed=False).aexists())
+        # Processed URLs are not fetched again.
+        self.assertEqual((again['urls'], again['skipped'], again['documents']), (5, 5, 0))
+
+    async def test_failed_pages_are_counted_and_skipped(self):
+        with FixtureServer(SmallSiteHandler) as server:
+            pipeline = IngestionPipeline(server.url('/page/0.html'), crawl=True, max_pages=3, chunk_size=400,
+                                         chunk_overlap=0)
+            pipeline._fetch = self.failing_fetch(pipeline._fetch)
+            try:
+                report = await pipeline.run()
+            finally:
+                await close_http_client()
+
+        self.assertEqual(report['stages']['fetch']['failed'], 1)
+        self.assertEqual(report['documents'], 2)
+        self.assertFalse(await Document.objects.filter(url=server.url('/page/1.html')).aexists())
+
+    def failing_fetch(self, fetch):
+        async def wrapped(url):
+            if url.endswith('/page/1.html'):
+                raise ValueError('broken page')
+            await fetch(url)
+        return wrapped
+
+
+@override_settings(SCRAPER_CLEAN_WORKERS=0, SCRAPER_CACHE_ENABLED=False, SCRAPER_JOB_RECOVER=False,
+                   SCRAPER_CRAWL_RESPECT_ROBOTS=False)
+class IngestEndpointTests(ByteEncodingMixin, TransactionTestCase):
+    def tearDown(self):
+        job_runner.shutdown()
+
+    def post(self, body: dict):
+        return self.client.post('/api/ingest/', json.dumps(body), content_type='application/json')
+
+    def test_ingest_job(self):
+        with FixtureServer(SmallSiteHandler) as server:
+            response = self.post({'custom_location': server.url('/sitemap.xml'), 'chunk_size': 400,
+                                  'chunk_overlap': 0})
+            self.assertEqual(response.status_code, 202)
+            job_id = response.json()['job']['id']
+            wait_for(lambda: self.client.get(f'/api/jobs/{job_id}/').json()['job']['status'] == 'done')
+
+        self.assertEqual(Document.objects.filter(job_id=job_id).count(), 5)
+        self.assertTrue(Chunk.objects.filter(document__job_id=job_id).exists())
+
+    def test_invalid_options(self):
+        self.assertEqual(self.post({}).status_code, 400)
+        self.assertEqual(self.post({'domain': 'example.com', 'chunk_size': 100, 'chunk_overlap': 100}).status_code,
+                         400)
+        self.assertEqual(self.post({'domain': 'example.com', 'concurrency': {'fetch': 0}}).status_code, 400)
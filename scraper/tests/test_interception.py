@@ -0,0 +1,96 @@
+from django.test import SimpleTestCase, override_settings
+
+from scraper.interception import (
+    PROFILE_ASSETS, PROFILE_OFF, REASON_AFTER_PARSE, REASON_RESOURCE_TYPE, REASON_TRACKER, ResourcePolicy,
+    RouteInterceptor,
+)
+
+
+class FakeRequest:
+    def __init__(self, resource_type: str, url: str):
+        self.resource_type = resource_type
+        self.url = url
+
+
+class FakeRoute:
+    def __init__(self, resource_type: str, url: str = 'https://example.com/asset'):
+        self.request = FakeRequest(resource_type, url)
+        self.outcome = None
+
+    async def continue_(self):
+        self.outcome = 'continued'
+
+    async def abort(self, error_code):
+        self.outcome = 'aborted'
+
+
+class FakePage:
+    def __init__(self):
+        self.routes = []
+
+    async def route(self, pattern, handler):
+        self.routes.append(handler)
+
+    async def unroute(self, pattern, handler):
+        self.routes.remove(handler)
+
+
+@override_settings(SCRAPER_RESOURCE_PROFILE='text', SCRAPER_BLOCKED_DOMAINS=['ads.example.net'],
+                   SCRAPER_RESOURCE_ALLOWLIST={'shop.example.com': ['stylesheet', 'cdn.example.org']})
+class ResourcePolicyTests(SimpleTestCase):
+    def test_default_profile(self):
+        policy = ResourcePolicy.for_url('https://example.com/')
+        self.assertEqual(policy.blocks('image', 'https://example.com/a.png'), REASON_RESOURCE_TYPE)
+        self.assertEqual(policy.blocks('stylesheet', 'https://example.com/a.css'), REASON_RESOURCE_TYPE)
+        self.assertEqual(policy.blocks('script', 'https://www.google-analytics.com/ga.js'), REASON_TRACKER)
+        self.assertEqual(policy.blocks('script', 'https://x.ads.example.net/a.js'), REASON_TRACKER)
+        self.assertIsNone(policy.blocks('script', 'https://example.com/app.js'))
+
+    def test_site_allowlist(self):
+        policy = ResourcePolicy.for_url('https://shop.example.com/item')
+        self.assertIsNone(policy.blocks('stylesheet', 'https://shop.example.com/a.css'))
+        self.assertIsNone(policy.blocks('image', 'https://cdn.example.org/a.png'))
+        self.assertEqual(policy.blocks('font', 'https://shop.example.com/a.woff'), REASON_RESOURCE_TYPE)
+
+    def test_profiles(self):
+        self.assertFalse(ResourcePolicy.for_url('https://example.com/', PROFILE_OFF).blocks_anything)
+        self.assertIsNone(ResourcePolicy.for_url('https://example.com/', PROFILE_ASSETS).blocks('stylesheet', 'x'))
+        with self.assertRaises(ValueError):
+            ResourcePolicy.for_url('https://example.com/', 'everything')
+
+
+class RouteInterceptorTests(SimpleTestCase):
+    async def handle(self, interceptor, resource_type: str, url: str = 'https://example.com/asset') -> str:
+        route = FakeRoute(resource_type, url)
+        await interceptor.handle(route)
+        return route.outcome
+
+    async def test_blocked_requests_are_counted(self):
+        interceptor = RouteInterceptor(ResourcePolicy(('image', 'font'), ('tracker.example',)))
+        outcomes = [await self.handle(interceptor, kind) for kind in ('document', 'image', 'font', 'script')]
+        outcomes.append(await self.handle(interceptor, 'script', 'https://tracker.example/t.js'))
+
+        self.assertEqual(outcomes, ['continued', 'aborted', 'aborted', 'continued', 'aborted'])
+        savings = interceptor.savings.to_dict()
+        self.assertEqual((savings['requests'], savings['requests_blocked']), (5, 3))
+        self.assertEqual(savings['blocked_by_type'], {'image': 1, 'font': 1, 'script': 1})
+        self.assertEqual(savings['bytes_saved_estimate'], 60_000 + 40_000 + 40_000)
+
+    async def test_after_parse_keeps_scripts_and_data_requests(self):
+        interceptor = RouteInterceptor(ResourcePolicy(), stop_at_parse=True)
+        self.assertEqual(await self.handle(interceptor, 'other'), 'continued')
+        interceptor.document_parsed()
+
+        kinds = ('script', 'xhr', 'fetch', 'other', 'manifest')
+        self.assertEqual([await self.handle(interceptor, kind) for kind in kinds],
+                         ['continued', 'continued', 'continued', 'aborted', 'aborted'])
+        self.assertEqual(interceptor.savings.by_reason, {REASON_AFTER_PARSE: 2})
+
+    async def test_installed_only_when_needed(self):
+        page = FakePage()
+        async with RouteInterceptor(ResourcePolicy()).installed(page):
+            self.assertEqual(page.routes, [])
+        interceptor = RouteInterceptor(ResourcePolicy(('image',)))
+        async with interceptor.installed(page):
+            self.assertEqual(page.routes, [interceptor.handle])
+        self.assertEqual(page.routes, [])
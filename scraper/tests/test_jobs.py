@@ -0,0 +1,106 @@
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from benchmarks.fixture_server import FixtureHandler, FixtureServer
+from scraper import jobs
+from scraper.jobs import JobRunner, job_runner
+from scraper.models import CrawlJob
+
+
+class SlowSiteHandler(FixtureHandler):
+    """Sixty pages, each answered after ``delay`` seconds."""
+
+    page_count = 60
+    delay = 0.05
+
+    def do_GET(self):
+        if self.path.startswith('/page/'):
+            time.sleep(self.delay)
+        try:
+            super().do_GET()
+        except (BrokenPipeError, ConnectionResetError):
+            # The crawl was cancelled while this page was on its way.
+            pass
+
+
+def wait_for(condition, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(0.02)
+    raise AssertionError('condition not met in time')
+
+
+@override_settings(SCRAPER_CRAWL_RESPECT_ROBOTS=False, SCRAPER_CRAWL_WORKERS=2, SCRAPER_JOB_RECOVER=False)
+class CrawlJobTests(TransactionTestCase):
+    def tearDown(self):
+        job_runner.shutdown()
+
+    def submit(self, server, max_pages: int) -> int:
+        response = self.client.post('/api/jobs/', json.dumps({
+            'kind': 'crawl', 'url': server.url('/page/0.html'), 'max_pages': max_pages,
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        return response.json()['job']['id']
+
+    def status(self, job_id: int) -> dict:
+        return self.client.get(f'/api/jobs/{job_id}/').json()['job']
+
+    def test_crawl_job_runs_in_the_background(self):
+        with FixtureServer(SlowSiteHandler) as server:
+            job_id = self.submit(server, max_pages=6)
+            job = wait_for(lambda: (job := self.status(job_id))['status'] == 'done' and job)
+
+        self.assertEqual(job['url_count'], 6)
+        results = self.client.get(f'/api/jobs/{job_id}/results/', {'page_size': 4}).json()
+        self.assertEqual((results['total'], len(results['urls'])), (6, 4))
+        self.assertEqual(self.client.get('/api/jobs/999999/').status_code, 404)
+
+    def test_crawl_reports_progress_and_can_be_cancelled(self):
+        with mock.patch.object(jobs, 'RESULT_BATCH_SIZE', 2), FixtureServer(SlowSiteHandler) as server:
+            job_id = self.submit(server, max_pages=60)
+            # Records are stored as the crawl goes, not once it has finished.
+            wait_for(lambda: (job := self.status(job_id))['status'] == 'running' and job['url_count'] >= 2)
+            response = self.client.post(f'/api/jobs/{job_id}/cancel/')
+            self.assertEqual(response.status_code, 200)
+            job = wait_for(lambda: (job := self.status(job_id))['status'] == 'cancelled' and job)
+
+        self.assertLess(job['url_count'], 60)
+        self.assertEqual(self.client.post(f'/api/jobs/{job_id}/cancel/').status_code, 409)
+
+
+class JobRecoveryTests(TransactionTestCase):
+    def orphan(self, status: str) -> CrawlJob:
+        job = CrawlJob.objects.create(kind=CrawlJob.Kind.CRAWL, target='https://example.com', status=status)
+        CrawlJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        return job
+
+    def test_recovery_is_off_by_default(self):
+        job = self.orphan(CrawlJob.Status.RUNNING)
+        self.assertEqual(async_to_sync(JobRunner().recover)(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CrawlJob.Status.RUNNING)
+
+    @override_settings(SCRAPER_JOB_RECOVER=True)
+    def test_recovery_fails_jobs_older_than_the_process_once(self):
+        queued, running = self.orphan(CrawlJob.Status.QUEUED), self.orphan(CrawlJob.Status.RUNNING)
+        done = self.orphan(CrawlJob.Status.DONE)
+        runner = JobRunner()
+        fresh = CrawlJob.objects.create(kind=CrawlJob.Kind.CRAWL, target='https://example.com',
+                                        status=CrawlJob.Status.RUNNING)
+
+        self.assertEqual(async_to_sync(runner.recover)(), 2)
+        self.assertEqual(async_to_sync(runner.recover)(), 0)
+        statuses = dict(CrawlJob.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {
+            queued.pk: CrawlJob.Status.FAILED, running.pk: CrawlJob.Status.FAILED,
+            done.pk: CrawlJob.Status.DONE, fresh.pk: CrawlJob.Status.RUNNING,
+        })
@@ -0,0 +1,38 @@
+from django.test import SimpleTestCase
+
+from benchmarks.fixture_server import render_docs_page
+from scraper.markdown import html_to_markdown, iter_markdown
+from scraper.tests.test_sitemap import pieces
+
+
+class MarkdownTests(SimpleTestCase):
+    def test_structure_survives(self):
+        html = (
+            '<h1>Title</h1><p>Some <strong>bold</strong> and <a href="/x">link</a>.</p>'
+            '<ul><li>one</li><li>two<ul><li>nested</li></ul></li></ul>'
+            '<pre><code class="language-python">x = 1\n</code></pre>'
+            '<table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td>2</td></tr></table>'
+            '<script>tracking()</script>'
+        )
+        self.assertEqual(html_to_markdown(html, base_url='https://example.com/docs/'), (
+            '# Title\n\nSome **bold** and [link](https://example.com/x).\n\n'
+            '- one\n- two\n   - nested\n\n```python\nx = 1\n```\n\n| A | B |\n| --- | --- |\n| 1 | 2 |'
+        ))
+
+    def test_streaming_matches_whole_document(self):
+        html = render_docs_page(3, sections=4).decode()
+        markdown = html_to_markdown(html)
+        self.assertIn('## Section 3', markdown)
+        self.assertNotIn('window.analytics', markdown)
+        self.assertEqual(''.join(iter_markdown(pieces(html, 61))), markdown)
+
+
+
+    def test_inline_elements_stay_apart(self):
+        self.assertEqual(html_to_markdown('<nav><a href="/a">Home</a><a href="/b">Docs</a></nav>'),
+                         '[Home](/a) [Docs](/b)')
+        self.assertEqual(html_to_markdown('<p><a href="/a">Home</a>\n<a href="/b">Docs</a> / <a href="/c">API</a></p>'),
+                         '[Home](/a) [Docs](/b) / [API](/c)')
+        self.assertEqual(html_to_markdown('<p>Read <em>the</em> <a href="/d">guide</a>, then <code>run</code>.</p>'),
+                         'Read _the_ [guide](/d), then `run`.')
+        self.assertEqual(html_to_markdown('<td><a href="/a">Home</a></td><td>Docs</td>'), '[Home](/a) Docs')
@@ -0,0 +1,71 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from benchmarks.fixture_server import FixtureServer
+from scraper import metrics
+from scraper.metrics import Registry, RequestTimings, span
+
+
+class RegistryTests(SimpleTestCase):
+    def test_prometheus_text(self):
+        registry = Registry()
+        registry.counter('jobs_total', 'Jobs.').inc(kind='crawl')
+        registry.counter('jobs_total', 'Jobs.').inc(2, kind='crawl')
+        histogram = registry.histogram('work_seconds', 'Work.', buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        self.assertEqual(registry.render([('pool_size', 'Pool.', [({'pool': 'a"b'}, 3)])]).splitlines(), [
+            '# HELP jobs_total Jobs.',
+            '# TYPE jobs_total counter',
+            'jobs_total{kind="crawl"} 3',
+            '# HELP work_seconds Work.',
+            '# TYPE work_seconds histogram',
+            'work_seconds_bucket{le="0.1"} 1',
+            'work_seconds_bucket{le="1.0"} 2',
+            'work_seconds_bucket{le="+Inf"} 3',
+            'work_seconds_sum 5.55',
+            'work_seconds_count 3',
+            '# HELP pool_size Pool.',
+            '# TYPE pool_size gauge',
+            'pool_size{pool="a\\"b"} 3',
+        ])
+
+    def test_span_counts_errors_and_feeds_request_timings(self):
+        timings = RequestTimings()
+        token = metrics._request_timings.set(timings)
+        try:
+            with span('test_span'):
+                pass
+            with self.assertRaises(KeyError), span('test_span'):
+                raise KeyError('missing')
+        finally:
+            metrics._request_timings.reset(token)
+
+        self.assertEqual(timings.to_dict()['spans']['test_span']['count'], 2)
+        self.assertTrue(timings.server_timing().startswith('test_span;dur='))
+        self.assertIn((('span', 'test_span'), ('type', 'KeyError')),
+                      [labels for _, labels, _ in metrics.errors_total.samples()])
+
+
+@override_settings(SCRAPER_CLEAN_WORKERS=0, SCRAPER_CACHE_ENABLED=False)
+class MetricsViewTests(TestCase):
+    def test_timing_breakdown_and_metrics_endpoint(self):
+        with FixtureServer() as server:
+            response = self.client.get('/api/fetch-content/', {'url': server.url('/page/2.html')},
+                                       headers={'X-Scraper-Timing': '1'})
+            plain = self.client.get('/api/fetch-content/', {'url': server.url('/page/3.html')})
+
+        self.assertIn('html_clean;dur=', response['Server-Timing'])
+        self.assertIn('html_clean', response.json()['timing']['spans'])
+        self.assertNotIn('Server-Timing', plain)
+        self.assertNotIn('timing', plain.json())
+
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('scraper_http_requests_total{status="200",view="fetch_content"}', text)
+        self.assertIn('scraper_fetches_total{outcome="ok",tier="http"}', text)
+        self.assertIn('# TYPE scraper_browser_pool_in_use gauge', text)
+
+    @override_settings(SCRAPER_METRICS_ENABLED=False)
+    def test_metrics_can_be_disabled(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
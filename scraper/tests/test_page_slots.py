@@ -0,0 +1,87 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from scraper.browser_pool import PageSlots
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+        self.visited = []
+
+    def is_closed(self):
+        return self.closed
+
+    async def goto(self, url, **kwargs):
+        self.visited.append(url)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self):
+        self.pages = []
+        self.closed = False
+        self.cookies_cleared = 0
+
+    async def new_page(self):
+        self.pages.append(FakePage())
+        return self.pages[-1]
+
+    async def clear_cookies(self):
+        self.cookies_cleared += 1
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed
+
+    async def new_context(self, **options):
+        self.contexts.append(FakeContext())
+        return self.contexts[-1]
+
+    async def close(self):
+        self.closed = True
+
+
+class PageSlotsTests(SimpleTestCase):
+    async def test_returned_page_is_reset_and_reused(self):
+        slots = PageSlots(FakeBrowser(), max_pages=1)
+        async with slots.page('agent') as page:
+            pass
+        self.assertEqual(page.visited, ['about:blank'])
+
+        # The only slot was released, so this does not wait.
+        async with asyncio.timeout(1):
+            async with slots.page('agent') as again:
+                self.assertIs(again, page)
+        context = slots.browser.contexts[0]
+        self.assertEqual(len(slots.browser.contexts), 1)
+        self.assertEqual(context.cookies_cleared, 2)
+
+    async def test_slot_is_released_when_the_caller_fails(self):
+        slots = PageSlots(FakeBrowser(), max_pages=1)
+        with self.assertRaises(RuntimeError):
+            async with slots.page('agent') as page:
+                raise RuntimeError('render failed')
+        self.assertTrue(page.closed)
+
+        async with asyncio.timeout(1):
+            async with slots.page('agent') as again:
+                self.assertIsNot(again, page)
+
+    async def test_profiles_get_their_own_context(self):
+        slots = PageSlots(FakeBrowser())
+        async with slots.page('agent', {'Accept-Language': 'en'}):
+            async with slots.page('other agent'):
+                pass
+        self.assertEqual(len(slots.browser.contexts), 2)
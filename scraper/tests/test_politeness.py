@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import httpx
+from django.test import SimpleTestCase, override_settings
+
+from scraper.politeness import (
+    OUTCOME_BLOCKED, OUTCOME_ERROR, OUTCOME_OK, OUTCOME_THROTTLED, HostScheduler, host_key, host_scheduler,
+    parse_retry_after, status_outcome,
+)
+
+URL = 'https://example.com/page'
+
+
+def responses(*statuses, retry_after: str = None):
+    """A ``send`` callable answering with ``statuses`` in turn; ``calls`` counts the requests."""
+    pending = list(statuses)
+
+    async def send():
+        send.calls += 1
+        headers = {'retry-after': retry_after} if retry_after is not None else {}
+        return httpx.Response(pending.pop(0), headers=headers)
+
+    send.calls = 0
+    return send
+
+
+class PolitenessHelperTests(SimpleTestCase):
+    def test_retry_after(self):
+        self.assertEqual(parse_retry_after('2.5'), 2.5)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+    def test_outcomes(self):
+        self.assertEqual([status_outcome(status) for status in (200, 404, 403, 429, 503, 500, None)], [
+            OUTCOME_OK, OUTCOME_OK, OUTCOME_BLOCKED, OUTCOME_THROTTLED, OUTCOME_THROTTLED, OUTCOME_ERROR,
+            OUTCOME_ERROR,
+        ])
+
+    def test_host_key(self):
+        self.assertEqual(host_key('https://Example.com:8443/a'), 'example.com:8443')
+        self.assertEqual(host_key('example.com'), 'example.com')
+
+
+@override_settings(SCRAPER_POLITENESS_ENABLED=True, SCRAPER_HOST_RATE=0, SCRAPER_HOST_CONCURRENCY=2,
+                   SCRAPER_HOST_MIN_CONCURRENCY=1, SCRAPER_HOST_MAX_CONCURRENCY=2, SCRAPER_RETRY_ATTEMPTS=2,
+                   SCRAPER_RETRY_BASE_DELAY_MS=10, SCRAPER_RETRY_MAX_DELAY_MS=20)
+class HostSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.scheduler = HostScheduler()
+
+    async def test_in_flight_requests_are_limited_per_host(self):
+        active = peak = 0
+
+        async def fetch(url):
+            nonlocal active, peak
+            async with self.scheduler.slot(url) as slot:
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.02)
+                active -= 1
+                slot.observe(200)
+
+        await asyncio.gather(*(fetch(URL) for _ in range(6)))
+        self.assertEqual(peak, 2)
+        # Another host has slots of its own.
+        await asyncio.gather(*(fetch(URL) for _ in range(2)), *(fetch('https://other.example/') for _ in range(2)))
+        self.assertEqual(peak, 4)
+        self.assertEqual(self.scheduler.stats()['example.com']['successes'], 8)
+
+    async def test_transient_failures_are_retried(self):
+        send = responses(503, 502, 200)
+        response = await self.scheduler.request(URL, send)
+
+        self.assertEqual((response.status_code, send.calls), (200, 3))
+        stats = self.scheduler.stats()['example.com']
+        self.assertEqual((stats['retries'], stats['throttled'], stats['errors'], stats['successes']), (2, 1, 1, 1))
+
+    async def test_last_response_is_returned_when_retries_run_out(self):
+        send = responses(500, 500, 500)
+        self.assertEqual((await self.scheduler.request(URL, send)).status_code, 500)
+        self.assertEqual(send.calls, 3)
+        self.assertEqual((await self.scheduler.request(URL, responses(404))).status_code, 404)
+
+    @override_settings(SCRAPER_RETRY_ATTEMPTS=0)
+    async def test_retry_after_pauses_the_host(self):
+        await self.scheduler.request(URL, responses(429, retry_after='0.3'))
+        stats = self.scheduler.stats()['example.com']
+        self.assertGreater(stats['paused_for'], 0.2)
+        self.assertEqual(stats['concurrency'], 1)
+
+        started = time.monotonic()
+        await self.scheduler.request(URL, responses(200))
+        self.assertGreater(time.monotonic() - started, 0.2)
+
+    async def test_crawl_delay_caps_the_rate(self):
+        self.scheduler.set_crawl_delay(URL, 0.1)
+        started = time.monotonic()
+        for _ in range(3):
+            await self.scheduler.request(URL, responses(200))
+        self.assertGreater(time.monotonic() - started, 0.15)
+        self.assertEqual(self.scheduler.stats()['example.com']['rate'], 10.0)
+
+    @override_settings(SCRAPER_POLITENESS_ENABLED=False)
+    async def test_disabled_scheduler_sends_once(self):
+        send = responses(503)
+        self.assertEqual((await self.scheduler.request(URL, send)).status_code, 503)
+        self.assertEqual((send.calls, self.scheduler.stats()), (1, {}))
+
+
+class HostStatsViewTests(SimpleTestCase):
+    def test_host_stats(self):
+        response = self.client.get('/api/host-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['hosts'], host_scheduler.stats())
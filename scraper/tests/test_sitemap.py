@@ -0,0 +1,118 @@
+import gzip
+
+from django.test import SimpleTestCase
+
+from benchmarks.fixture_server import FixtureHandler, FixtureServer, render_sitemap_index, render_urlset
+from scraper.http_client import close_http_client
+from scraper.sitemap import SitemapResolver, SitemapStreamParser
+from scraper.utils import stream_sitemap_document
+
+
+def pieces(data: bytes, size: int = 7) -> list:
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def parse(chunks) -> tuple:
+    parser = SitemapStreamParser()
+    entries = []
+    for chunk in chunks:
+        entries.extend(parser.feed(chunk))
+    entries.extend(parser.close())
+    return parser, entries
+
+
+class FakeDocuments:
+    """A ``stream`` for :class:`SitemapResolver` serving fixed documents and recording every fetch."""
+
+    def __init__(self, documents: dict):
+        self.documents = documents
+        self.fetched = []
+
+    async def __call__(self, url: str):
+        self.fetched.append(url)
+        body = self.documents.get(url, b'<html><body>Not found</body></html>')
+        for chunk in pieces(body, 64):
+            yield chunk, len(body)
+
+
+class SitemapStreamParserTests(SimpleTestCase):
+    def test_urlset_fed_in_small_chunks(self):
+        parser, entries = parse(pieces(render_urlset('https://example.com', range(5), '2024-01-02')))
+        self.assertEqual(parser.kind, 'urlset')
+        self.assertFalse(parser.is_index)
+        self.assertEqual([entry['loc'] for entry in entries],
+                         [f'https://example.com/page/{number}.html' for number in range(5)])
+        self.assertEqual({entry['lastmod'] for entry in entries}, {'2024-01-02'})
+
+    def test_entries_come_out_while_the_document_is_still_arriving(self):
+        data = render_urlset('https://example.com', range(100))
+        parser = SitemapStreamParser()
+        self.assertGreater(len(parser.feed(data[:len(data) // 2])), 40)
+
+    def test_sitemap_index(self):
+        locations = ['https://example.com/a.xml', 'https://example.com/b.xml.gz']
+        parser, entries = parse(pieces(render_sitemap_index(locations)))
+        self.assertTrue(parser.is_index)
+        self.assertEqual([entry['loc'] for entry in entries], locations)
+
+    def test_gzipped_urlset(self):
+        data = gzip.compress(render_urlset('https://example.com', range(50)))
+        parser, entries = parse(pieces(data, 16))
+        self.assertEqual(parser.kind, 'urlset')
+        self.assertEqual(len(entries), 50)
+
+    def test_text_sitemap(self):
+        data = b'\xef\xbb\xbfhttps://example.com/a\r\n\nnot a url\nhttps://example.com/b'
+        parser, entries = parse(pieces(data, 5))
+        self.assertEqual(parser.kind, 'text')
+        self.assertEqual([entry['loc'] for entry in entries], ['https://example.com/a', 'https://example.com/b'])
+
+    def test_html_is_not_a_sitemap(self):
+        parser, entries = parse([b'<html><body><p>Not found</p></body></html>'])
+        self.assertEqual(parser.kind, 'unknown')
+        self.assertFalse(parser.is_sitemap)
+        self.assertEqual(entries, [])
+
+
+class SitemapResolverTests(SimpleTestCase):
+    async def test_index_of_gzipped_sitemaps(self):
+        with FixtureServer(FixtureHandler) as server:
+            try:
+                resolver = SitemapResolver(stream_sitemap_document)
+                entries = await resolver.resolve(server.url('/sitemap_index.xml'))
+            finally:
+                await close_http_client()
+        self.assertEqual(sorted(entry['url'] for entry in entries),
+                         sorted(server.url(f'/page/{number}.html') for number in range(FixtureHandler.page_count)))
+
+    async def test_cycles_are_fetched_once_and_depth_is_limited(self):
+        documents = FakeDocuments({
+            'https://example.com/index.xml': render_sitemap_index([
+                'https://example.com/index.xml', 'https://example.com/a.xml', 'https://example.com/nested.xml',
+            ]),
+            'https://example.com/a.xml': gzip.compress(render_urlset('https://example.com', range(3))),
+            'https://example.com/nested.xml': render_sitemap_index(['https://example.com/deep.xml']),
+            'https://example.com/deep.xml': render_urlset('https://example.com', range(10, 12)),
+        })
+        resolver = SitemapResolver(documents, max_depth=1)
+        entries = await resolver.resolve('https://example.com/index.xml')
+
+        self.assertEqual(sorted(entry['url'] for entry in entries),
+                         [f'https://example.com/page/{number}.html' for number in range(3)])
+        self.assertEqual(sorted(documents.fetched), [
+            'https://example.com/a.xml', 'https://example.com/index.xml', 'https://example.com/nested.xml',
+        ])
+
+    async def test_probe_walks_the_first_sitemap_from_its_sniffing_download(self):
+        documents = FakeDocuments({
+            'https://example.com/sitemap_index.xml': render_sitemap_index(['https://example.com/pages.xml']),
+            'https://example.com/pages.xml': render_urlset('https://example.com', range(40)),
+            'https://example.com/sitemap.txt': b'https://example.com/from-text\n',
+        })
+        resolver = SitemapResolver(documents)
+        entries = await resolver.probe('https://example.com/')
+
+        self.assertEqual(len(entries), 40)
+        # /sitemap.xml is not a sitemap and /sitemap.txt comes after the index, so neither is walked.
+        self.assertNotIn('https://example.com/from-text', [entry['url'] for entry in entries])
+        self.assertEqual(sorted(documents.fetched), sorted(set(documents.fetched)))
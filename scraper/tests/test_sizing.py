@@ -0,0 +1,83 @@
+import json
+
+from django.test import TestCase, override_settings
+
+from benchmarks.fixture_server import FixtureHandler, FixtureServer, render_page
+from scraper.cache import page_cache
+from scraper.cleaning import extract_main_content
+from scraper.http_client import close_http_client
+from scraper.sizing import METHOD_HEAD, METHOD_TEXT, measure_page_size
+from scraper.tests.test_streaming import read
+
+
+class HeadOnlyHandler(FixtureHandler):
+    """``/head-only`` has an empty body but announces a length on HEAD."""
+
+    def do_GET(self):
+        if self.path == '/head-only':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        super().do_GET()
+
+    def do_HEAD(self):
+        if self.path == '/head-only':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', '1234')
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+@override_settings(SCRAPER_CLEAN_WORKERS=0, SCRAPER_CACHE_ENABLED=True, SCRAPER_CACHE_PERSIST=False,
+                   SCRAPER_EXTRACT_MAIN_CONTENT=True, SCRAPER_HTML_PARSER='html.parser')
+class PageSizeTests(TestCase):
+    def setUp(self):
+        page_cache.clear()
+
+    def tearDown(self):
+        page_cache.clear()
+
+    async def measure(self, url: str, method: str, fallback: bool = False) -> dict:
+        try:
+            return await measure_page_size(url, method, fallback)
+        finally:
+            await close_http_client()
+
+    async def test_text_size_is_the_main_content_length(self):
+        with FixtureServer(HeadOnlyHandler) as server:
+            record = await self.measure(server.url('/page/1.html'), METHOD_TEXT)
+        self.assertEqual(record['size'], len(extract_main_content(render_page(1).decode())))
+        self.assertEqual(record['method'], METHOD_TEXT)
+        self.assertNotIn('error', record)
+
+    async def test_fallback_to_a_cheaper_method(self):
+        with FixtureServer(HeadOnlyHandler) as server:
+            plain = await self.measure(server.url('/head-only'), METHOD_TEXT)
+            record = await self.measure(server.url('/head-only'), METHOD_TEXT, fallback=True)
+        self.assertEqual((plain['size'], plain['error']), (None, 'No size could be determined'))
+        self.assertEqual((record['size'], record['method']), (1234, METHOD_HEAD))
+
+    async def test_batch_endpoint_streams_one_record_per_url(self):
+        with FixtureServer(HeadOnlyHandler) as server:
+            urls = [server.url(f'/page/{number}.html') for number in range(4)]
+            response = await self.async_client.post('/api/get-page-sizes/', json.dumps({
+                'urls': urls + urls[:1], 'method': 'auto', 'concurrency': 2,
+            }), content_type='application/json')
+            *records, summary = [json.loads(line) for line in (await read(response)).splitlines()]
+            single = (await self.async_client.post('/api/get-page-size/', json.dumps({'url': urls[0]}),
+                                                   content_type='application/json')).json()
+
+        self.assertEqual(sorted(record['url'] for record in records), urls)
+        self.assertEqual(summary['summary']['methods'], {'auto': 4})
+        # The batch filled the cache that /get-page-size/ reads.
+        self.assertEqual(single['size'], next(record['size'] for record in records if record['url'] == urls[0]))
+        self.assertEqual(single['cache'], 'hit')
+
+    def test_batch_endpoint_validation(self):
+        for body in ({'urls': []}, {'urls': ['https://example.com'], 'method': 'guess'}):
+            response = self.client.post('/api/get-page-sizes/', json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
@@ -0,0 +1,138 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase
+
+from scraper.models import Chunk, CrawlJob, Document, SitemapURL
+from scraper.storage import iter_export, save_sitemap_urls, set_journal_mode, source_domain
+from scraper.tests.test_streaming import read
+
+
+def url_record(url: str, size: int = 0, selected: bool = False, processed: bool = False) -> dict:
+    return {'url': url, 'size': size, 'selected': selected, 'processed': processed}
+
+
+def new_job() -> CrawlJob:
+    return CrawlJob.objects.create(kind=CrawlJob.Kind.SITEMAP, target='example.com')
+
+
+class SaveSitemapUrlsTests(TestCase):
+    def test_upsert_refreshes_rows_and_keeps_user_state(self):
+        save_sitemap_urls([url_record('https://example.com/a', 10), url_record('https://example.com/b', 20)],
+                          'example.com')
+        SitemapURL.objects.filter(url='https://example.com/a').update(selected=True, processed=True)
+
+        written = save_sitemap_urls([
+            url_record('https://example.com/a', 11),
+            url_record('https://example.com/c', 30),
+            url_record('https://example.com/c', 31),
+        ], 'example.com')
+
+        self.assertEqual(written, 2)
+        self.assertEqual(SitemapURL.objects.count(), 3)
+        row = SitemapURL.objects.get(url='https://example.com/a')
+        self.assertEqual((row.size, row.domain, row.selected, row.processed), (11, 'example.com', True, True))
+        self.assertEqual(SitemapURL.objects.get(url='https://example.com/c').size, 31)
+
+    def test_rows_are_unique_per_source_domain(self):
+        save_sitemap_urls([url_record('https://example.com/a', 10)], 'example.com')
+        save_sitemap_urls([url_record('https://example.com/a', 12)], 'https://Example.com/sitemap.xml')
+        save_sitemap_urls([url_record('https://example.com/a', 20)], 'www.example.com')
+
+        self.assertEqual(dict(SitemapURL.objects.values_list('domain', 'size')),
+                         {'example.com': 12, 'www.example.com': 20})
+
+    def test_jobs_keep_their_urls_when_listed_again(self):
+        first, second = new_job(), new_job()
+        save_sitemap_urls([url_record('https://example.com/a'), url_record('https://example.com/b')], 'example.com',
+                          job=first)
+        save_sitemap_urls([url_record('https://example.com/b'), url_record('https://example.com/c')], 'example.com',
+                          job=second)
+        # A plain /fetch-sitemap/ style save without a job.
+        save_sitemap_urls([url_record('https://example.com/a')], 'example.com')
+
+        self.assertEqual(sorted(first.urls.values_list('url', flat=True)),
+                         ['https://example.com/a', 'https://example.com/b'])
+        self.assertEqual(sorted(second.urls.values_list('url', flat=True)),
+                         ['https://example.com/b', 'https://example.com/c'])
+        results = self.client.get(f'/api/jobs/{first.pk}/results/').json()
+        self.assertEqual([url['url'] for url in results['urls']], ['https://example.com/a', 'https://example.com/b'])
+
+    def test_nothing_to_write(self):
+        self.assertEqual(save_sitemap_urls([], 'example.com'), 0)
+
+    def test_source_domain(self):
+        self.assertEqual(source_domain('Example.COM'), 'example.com')
+        self.assertEqual(source_domain('https://docs.example.com:8443/sitemap.xml'), 'docs.example.com')
+        self.assertEqual(source_domain(source_domain('http://Example.com/')), 'example.com')
+
+
+class SqliteTuningTests(SimpleTestCase):
+    def scratch_connection(self, path: str):
+        """A second connection of the default database's kind to a throwaway file."""
+        default = connections['default']
+        return type(default)({**default.settings_dict, 'NAME': path}, alias='scratch')
+
+    def pragmas(self, path: str) -> dict:
+        scratch = self.scratch_connection(path)
+        try:
+            with scratch.cursor() as cursor:
+                values = {}
+                for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                    cursor.execute(f'PRAGMA {name}')
+                    values[name] = cursor.fetchone()[0]
+                return values
+        finally:
+            scratch.close()
+
+    def test_connections_are_tuned_and_wal_is_switched_on_explicitly(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'scratch.sqlite3')
+            # synchronous=normal (1) is only applied once the database is in WAL mode.
+            self.assertEqual(self.pragmas(path), {'journal_mode': 'delete', 'synchronous': 2, 'busy_timeout': 20000})
+
+            scratch = self.scratch_connection(path)
+            try:
+                self.assertEqual(set_journal_mode(scratch, 'wal'), 'wal')
+            finally:
+                scratch.close()
+            self.assertEqual(self.pragmas(path), {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000})
+
+
+class SqliteJournalCommandTests(TestCase):
+    def test_show_and_refuse(self):
+        out = StringIO()
+        call_command('sqlite_journal', stdout=out)
+        # The test database lives in memory, which has no other journal.
+        self.assertEqual(out.getvalue().strip(), 'Journal mode: memory')
+        with self.assertRaises(CommandError):
+            call_command('sqlite_journal', 'wal', stdout=StringIO())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        for number, domain in enumerate(('example.com', 'example.com', 'other.org')):
+            document = Document.objects.create(url=f'https://{domain}/{number}', domain=domain, title=f'Page {number}')
+            for index in range(2):
+                Chunk.objects.create(document=document, url=document.url, domain=domain, chunk_index=index,
+                                     content=f'Chunk {index} of page {number}', tokens=5)
+
+    def test_chunks_are_walked_in_batches(self):
+        records = list(iter_export('chunks', batch_size=2))
+        self.assertEqual(len(records), 6)
+        self.assertEqual(records[0]['title'], 'Page 0')
+        self.assertEqual(len(list(iter_export('chunks', 'other.org', batch_size=1))), 2)
+
+    async def test_export_endpoint(self):
+        response = await self.async_client.get('/api/export/', {'domain': 'example.com', 'batch_size': 3})
+        lines = (await read(response)).splitlines()
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="chunks.jsonl"')
+        self.assertEqual([json.loads(line)['content'] for line in lines], [
+            'Chunk 0 of page 0', 'Chunk 1 of page 0', 'Chunk 0 of page 1', 'Chunk 1 of page 1',
+        ])
+        self.assertEqual((await self.async_client.get('/api/export/', {'kind': 'images'})).status_code, 400)
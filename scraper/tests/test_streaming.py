@@ -0,0 +1,79 @@
+import json
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from benchmarks.fixture_server import FixtureHandler, FixtureServer
+from scraper.models import SitemapURL
+from scraper.streaming import (
+    EVENT_RECORD, EVENT_SUMMARY, STREAM_NDJSON, STREAM_SSE, encode_event, stream_format, streaming_response,
+)
+
+
+async def read(response) -> str:
+    return b''.join([part async for part in response.streaming_content]).decode()
+
+
+def sse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split('\n\n'):
+        event, data = block.split('\n')
+        events.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+    return events
+
+
+class StreamFormatTests(SimpleTestCase):
+    def test_requested_by_field_or_accept_header(self):
+        request = RequestFactory().post('/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(stream_format(request, {}), STREAM_SSE)
+        self.assertEqual(stream_format(request, {'stream': True}), STREAM_NDJSON)
+        self.assertIsNone(stream_format(RequestFactory().post('/'), {'stream': False}))
+        with self.assertRaises(ValueError):
+            stream_format(request, {'stream': 'xml'})
+
+    def test_encoding(self):
+        self.assertEqual(encode_event(EVENT_RECORD, {'url': 'a'}, STREAM_NDJSON), '{"url": "a"}\n')
+        self.assertEqual(encode_event(EVENT_SUMMARY, {'urls': 1}, STREAM_NDJSON), '{"summary": {"urls": 1}}\n')
+        self.assertEqual(encode_event(EVENT_SUMMARY, {'urls': 1}, STREAM_SSE), 'event: summary\ndata: {"urls": 1}\n\n')
+
+    async def test_failure_mid_stream_becomes_an_error_event(self):
+        async def events():
+            yield EVENT_RECORD, {'url': 'a'}
+            raise RuntimeError('sitemap went away')
+
+        lines = (await read(streaming_response(events()))).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'url': 'a'}, {'error': {'status': 'error', 'message': 'sitemap went away'}},
+        ])
+
+
+@override_settings(SCRAPER_DB_BATCH_SIZE=40)
+class StreamingViewTests(TestCase):
+    async def post(self, path: str, body: dict, **headers):
+        return await self.async_client.post(path, json.dumps(body), content_type='application/json', headers=headers)
+
+    async def test_sitemap_urls_as_ndjson(self):
+        with FixtureServer() as server:
+            response = await self.post('/api/fetch-sitemap/', {
+                'custom_location': server.url('/sitemap_index.xml'), 'stream': 'ndjson',
+            })
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            *records, summary = [json.loads(line) for line in (await read(response)).splitlines()]
+
+        self.assertEqual(len(records), FixtureHandler.page_count)
+        self.assertEqual(summary['summary']['urls'], FixtureHandler.page_count)
+        self.assertEqual(summary['summary']['saved'], FixtureHandler.page_count)
+        self.assertEqual(await SitemapURL.objects.filter(domain='127.0.0.1').acount(), FixtureHandler.page_count)
+
+    @override_settings(SCRAPER_CRAWL_RESPECT_ROBOTS=False)
+    async def test_crawl_as_server_sent_events(self):
+        with FixtureServer() as server:
+            response = await self.post('/api/crawl/', {'url': server.url('/page/0.html'), 'max_pages': 5},
+                                       Accept='text/event-stream')
+            events = sse_events(await read(response))
+
+        self.assertEqual([event for event, _ in events], [EVENT_RECORD] * 5 + [EVENT_SUMMARY])
+        self.assertEqual(events[-1][1]['urls'], 5)
+
+    async def test_unknown_stream_format(self):
+        response = await self.post('/api/crawl/', {'url': 'https://example.com', 'stream': 'xml'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,61 @@
+import os
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, override_settings
+
+from scraper import tokenizer
+from scraper.tests.test_chunking import BYTE_ENCODING, ByteEncodingMixin
+
+
+class CacheDirTests(SimpleTestCase):
+    @override_settings(SCRAPER_TOKENIZER_CACHE_DIR='/srv/tiktoken')
+    def test_setting_is_exported_unless_the_variable_is_set(self):
+        with mock.patch.dict(os.environ, clear=True):
+            tokenizer.configure_cache_dir()
+            self.assertEqual(tokenizer.cache_dir(), '/srv/tiktoken')
+        with mock.patch.dict(os.environ, {'TIKTOKEN_CACHE_DIR': '/tmp/explicit'}):
+            tokenizer.configure_cache_dir()
+            self.assertEqual(tokenizer.cache_dir(), '/tmp/explicit')
+
+    @override_settings(SCRAPER_TOKENIZER_CACHE_DIR=None)
+    def test_no_directory(self):
+        with mock.patch.dict(os.environ, clear=True):
+            tokenizer.configure_cache_dir()
+            self.assertIsNone(tokenizer.cache_dir())
+
+
+class EncodingTests(ByteEncodingMixin, SimpleTestCase):
+    def test_resolve_encoding(self):
+        self.assertEqual(tokenizer.resolve_encoding(None), BYTE_ENCODING)
+        with override_settings(SCRAPER_TOKENIZER_ENCODINGS=['o200k_base']):
+            self.assertEqual(tokenizer.allowed_encodings(), (BYTE_ENCODING, 'o200k_base'))
+            self.assertEqual(tokenizer.resolve_encoding('o200k_base'), 'o200k_base')
+        with self.assertRaises(ValueError):
+            tokenizer.resolve_encoding('o200k_base')
+
+    def test_encodings_are_shared(self):
+        self.assertIs(tokenizer.get_encoding(), tokenizer.get_encoding(BYTE_ENCODING))
+        self.assertIn(BYTE_ENCODING, tokenizer.loaded_encodings())
+
+    def test_unknown_encoding(self):
+        with self.assertRaises(tokenizer.TokenizerUnavailable):
+            tokenizer.get_encoding('no_such_encoding')
+        self.assertNotIn('no_such_encoding', tokenizer.loaded_encodings())
+
+    def test_warm_up_reports_failures(self):
+        with mock.patch('sys.stdout', new_callable=StringIO) as out:
+            tokenizer.warm_up([BYTE_ENCODING, 'no_such_encoding'])
+        self.assertIn('Tokenizer warm-up for no_such_encoding failed', out.getvalue())
+
+    def test_warm_tokenizer_command(self):
+        out = StringIO()
+        call_command('warm_tokenizer', BYTE_ENCODING, stdout=out)
+        self.assertIn(f'{BYTE_ENCODING}: ready', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('warm_tokenizer', 'no_such_encoding', stdout=StringIO())
+
+    @override_settings(SCRAPER_TOKENIZER_WARMUP=False)
+    def test_warm_up_can_be_disabled(self):
+        self.assertIsNone(tokenizer.start_warm_up())
@@ -0,0 +1,53 @@
+from django.test import SimpleTestCase, override_settings
+
+from scraper.url_filter import PublicSuffixList, UrlFilter, normalize_url, registrable_domain
+
+
+class NormalizeUrlTests(SimpleTestCase):
+    def test_canonical_form(self):
+        self.assertEqual(normalize_url('HTTPS://Example.COM:443/a/b?b=2&utm_source=x&a=1#top'),
+                         'https://example.com/a/b?a=1&b=2')
+
+    def test_keeps_non_default_port_and_adds_path(self):
+        self.assertEqual(normalize_url('http://example.com:8080'), 'http://example.com:8080/')
+
+    def test_drops_tracking_parameters_only(self):
+        self.assertEqual(normalize_url('https://example.com/?gclid=1&fbclid=2&page=3'),
+                         'https://example.com/?page=3')
+
+    @override_settings(SCRAPER_TRACKING_PARAMS=['sessionid'])
+    def test_configured_tracking_parameters(self):
+        self.assertEqual(normalize_url('https://example.com/?sessionid=9&q=a'), 'https://example.com/?q=a')
+
+
+class RegistrableDomainTests(SimpleTestCase):
+    def test_builtin_suffixes(self):
+        self.assertEqual(registrable_domain('www.example.co.uk'), 'example.co.uk')
+        self.assertEqual(registrable_domain('docs.example.com'), 'example.com')
+        self.assertEqual(registrable_domain('127.0.0.1'), '127.0.0.1')
+
+    def test_wildcard_and_exception_rules(self):
+        suffixes = PublicSuffixList(['*.ck', '!www.ck'])
+        self.assertEqual(suffixes.registrable_domain('a.b.example.ck'), 'b.example.ck')
+        self.assertEqual(suffixes.registrable_domain('x.www.ck'), 'www.ck')
+
+
+class UrlFilterTests(SimpleTestCase):
+    def test_same_site_scope(self):
+        url_filter = UrlFilter('https://www.example.co.uk/', include=(), exclude=())
+        self.assertTrue(url_filter.accepts('https://shop.example.co.uk/item'))
+        self.assertTrue(url_filter.accepts('/relative/page'))
+        self.assertFalse(url_filter.accepts('https://other.co.uk/'))
+        self.assertFalse(url_filter.accepts('mailto:team@example.co.uk'))
+        self.assertFalse(url_filter.accepts('https://www.example.co.uk/logo.PNG'))
+        self.assertTrue(UrlFilter('https://example.com/', same_site=False).accepts('https://other.org/'))
+
+    def test_include_and_exclude_patterns(self):
+        url_filter = UrlFilter('https://example.com/', include=[r'/docs/'], exclude=[r'/docs/old/'])
+        self.assertEqual(list(url_filter.filter([
+            'https://example.com/docs/a', 'https://example.com/docs/old/b', 'https://example.com/blog/c',
+        ])), ['https://example.com/docs/a'])
+
+    def test_invalid_pattern(self):
+        with self.assertRaises(ValueError):
+            UrlFilter('https://example.com/', include=['('])
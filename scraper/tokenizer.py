@@ -0,0 +1,107 @@
+"""Shared tiktoken encodings, loaded on first use from a local cache.
+
+tiktoken downloads an encoding's BPE ranks the first time it is loaded and
+keeps them in ``TIKTOKEN_CACHE_DIR``, a temp directory by default, so every
+fresh container or worker host fetches them again. When the app starts,
+:func:`configure_cache_dir` points that variable at
+``SCRAPER_TOKENIZER_CACHE_DIR`` unless it is already set; the environment
+is not touched after that, since other threads may be reading it.
+``manage.py warm_tokenizer`` fills the cache ahead of time (e.g. while
+building an image) so nothing is downloaded at request time.
+
+Each encoding is built once per process and shared by every request and
+tokenizer thread (tiktoken encodings are thread-safe). Nothing is loaded at
+import: the first chunking request pays for it, or :func:`warm_up` does in
+the background when the ASGI app starts (``SCRAPER_TOKENIZER_WARMUP``).
+
+Requests may pick one of ``SCRAPER_TOKENIZER_ENCODINGS``;
+``SCRAPER_TOKENIZER_ENCODING`` is the default.
+"""
+import os
+import threading
+
+from django.conf import settings
+
+from .metrics import span
+
+DEFAULT_ENCODING = 'cl100k_base'
+
+_encodings = {}
+_lock = threading.Lock()
+
+
+class TokenizerUnavailable(RuntimeError):
+    """An encoding is neither in the local cache nor downloadable."""
+
+
+def default_encoding() -> str:
+    return getattr(settings, 'SCRAPER_TOKENIZER_ENCODING', DEFAULT_ENCODING)
+
+
+def allowed_encodings() -> tuple:
+    names = tuple(getattr(settings, 'SCRAPER_TOKENIZER_ENCODINGS', ()))
+    return names if default_encoding() in names else (default_encoding(),) + names
+
+
+def resolve_encoding(name: str = None) -> str:
+    """Return ``name``, or the default for None, raising ValueError for encodings not allowed."""
+    if not name:
+        return default_encoding()
+    if name not in allowed_encodings():
+        raise ValueError(f"encoding must be one of {', '.join(allowed_encodings())}")
+    return name
+
+
+def configure_cache_dir():
+    """Set ``TIKTOKEN_CACHE_DIR`` to ``SCRAPER_TOKENIZER_CACHE_DIR`` unless already set (once, at startup)."""
+    directory = getattr(settings, 'SCRAPER_TOKENIZER_CACHE_DIR', None)
+    if directory:
+        os.environ.setdefault('TIKTOKEN_CACHE_DIR', str(directory))
+
+
+def cache_dir():
+    """Directory tiktoken reads and writes encodings in (None for its temp default)."""
+    return os.environ.get('TIKTOKEN_CACHE_DIR')
+
+
+def get_encoding(name: str = None):
+    """Return the process-wide ``tiktoken.Encoding`` for ``name`` (default encoding for None)."""
+    name = name or default_encoding()
+    encoding = _encodings.get(name)
+    if encoding is not None:
+        return encoding
+    with _lock:
+        if name not in _encodings:
+            directory = cache_dir()
+            import tiktoken
+            try:
+                with span('tokenizer_load'):
+                    _encodings[name] = tiktoken.get_encoding(name)
+            except Exception as e:
+                raise TokenizerUnavailable(
+                    f"Tokenizer {name} is not cached in {directory} and could not be downloaded ({e}); "
+                    f"run manage.py warm_tokenizer where the network is reachable"
+                ) from e
+        return _encodings[name]
+
+
+def loaded_encodings() -> list:
+    return sorted(_encodings)
+
+
+def warm_up(names=None):
+    """Load ``names`` (default: the default encoding) now, reporting instead of raising failures."""
+    for name in names or (default_encoding(),):
+        try:
+            get_encoding(name)
+        except Exception as e:
+            print(f"Tokenizer warm-up for {name} failed: {e}")
+
+
+def start_warm_up():
+    """Run :func:`warm_up` in a daemon thread so startup does not wait for it."""
+    if not getattr(settings, 'SCRAPER_TOKENIZER_WARMUP', True):
+        return None
+    thread = threading.Thread(target=warm_up, name='tokenizer-warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,240 @@
+"""URL normalization and precompiled scope filtering for sitemap entries and the crawl frontier.
+
+``normalize_url`` gives the canonical form used to dedupe URLs and key the
+page cache: lowercase scheme and host, no default port, no fragment, and a
+sorted query string without tracking parameters (``utm_*``, ``gclid``, ...).
+
+Site matching compares registrable domains - the public suffix plus one
+label - so ``a.example.co.uk`` and ``b.example.co.uk`` are the same site but
+``example.co.uk`` and ``other.co.uk`` are not. A built-in snapshot covers the
+common multi-label suffixes; point ``SCRAPER_PUBLIC_SUFFIX_LIST`` at a copy of
+https://publicsuffix.org/list/public_suffix_list.dat for the full list.
+
+:class:`UrlFilter` compiles a root URL plus include/exclude patterns
+(``SCRAPER_URL_INCLUDE``, ``SCRAPER_URL_EXCLUDE``) into one matcher that
+decides each URL with a single parse and at most two regex searches.
+"""
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+TRACKING_PARAMS = frozenset((
+    'gclid', 'gclsrc', 'dclid', 'gbraid', 'wbraid', 'fbclid', 'msclkid', 'yclid', 'twclid', 'ttclid',
+    'li_fat_id', 'igshid', 'mc_cid', 'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'mkt_tok', 'oly_anon_id',
+    'oly_enc_id', 'vero_id', 'wickedid', 'rb_clickid', 's_cid', 'ref_src',
+))
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_')
+
+# URL substrings that never lead to a text page.
+NON_PAGE_PATTERNS = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '/cdn-cgi/', '.bib')
+
+# Multi-label public suffixes commonly seen in crawls, including hosting
+# platforms whose subdomains belong to different owners. Single-label TLDs
+# need no entry: the default rule treats the last label as the suffix.
+BUILTIN_PUBLIC_SUFFIXES = '''
+ac.uk co.uk gov.uk ltd.uk me.uk net.uk nhs.uk org.uk plc.uk police.uk sch.uk
+asn.au com.au edu.au gov.au id.au net.au org.au
+ac.nz co.nz geek.nz gen.nz govt.nz net.nz org.nz school.nz
+ac.jp co.jp ed.jp go.jp gr.jp lg.jp ne.jp or.jp
+ac.kr co.kr go.kr ne.kr or.kr re.kr
+com.cn edu.cn gov.cn net.cn org.cn
+com.hk edu.hk gov.hk net.hk org.hk
+com.tw edu.tw gov.tw net.tw org.tw idv.tw
+com.sg edu.sg gov.sg net.sg org.sg
+com.my edu.my gov.my net.my org.my
+co.id go.id or.id web.id ac.id
+com.ph edu.ph gov.ph net.ph org.ph
+co.th go.th in.th or.th ac.th
+com.vn edu.vn gov.vn net.vn org.vn
+ac.in co.in edu.in firm.in gen.in gov.in ind.in net.in org.in
+com.pk edu.pk gov.pk net.pk org.pk
+ac.il co.il gov.il org.il net.il
+com.tr edu.tr gov.tr net.tr org.tr
+com.sa edu.sa gov.sa net.sa org.sa
+com.eg edu.eg gov.eg net.eg org.eg
+ac.za co.za gov.za net.za org.za web.za
+co.ke go.ke or.ke ac.ke
+com.ng edu.ng gov.ng net.ng org.ng
+com.br edu.br gov.br net.br org.br
+com.ar edu.ar gob.ar gov.ar net.ar org.ar
+com.mx edu.mx gob.mx net.mx org.mx
+com.co edu.co gov.co net.co org.co
+com.pe edu.pe gob.pe net.pe org.pe
+com.ua edu.ua gov.ua net.ua org.ua
+com.pl net.pl org.pl edu.pl gov.pl
+co.at or.at gv.at ac.at
+com.es org.es gob.es edu.es nom.es
+com.gr edu.gr gov.gr net.gr org.gr
+com.pt edu.pt gov.pt org.pt
+co.hu org.hu
+com.ru net.ru org.ru
+appspot.com blogspot.com cloudfront.net azurewebsites.net herokuapp.com
+github.io gitlab.io netlify.app pages.dev vercel.app web.app firebaseapp.com
+s3.amazonaws.com elasticbeanstalk.com fly.dev onrender.com readthedocs.io
+'''.split()
+
+
+class PublicSuffixList:
+    """Public suffix rules (plain, ``*.`` wildcard and ``!`` exception) in the publicsuffix.org format."""
+
+    def __init__(self, rules=()):
+        self.rules = set()
+        self.wildcards = set()
+        self.exceptions = set()
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path, encoding='utf-8') as rules:
+            return cls(line.split()[0] for line in rules if line.strip() and not line.startswith('//'))
+
+    def add(self, rule: str):
+        rule = rule.strip().lower()
+        if rule.startswith('!'):
+            target, rule = self.exceptions, rule[1:]
+        elif rule.startswith('*.'):
+            target, rule = self.wildcards, rule[2:]
+        else:
+            target = self.rules
+        target.add(rule)
+        try:
+            # Hosts arrive in their ASCII (punycode) form.
+            target.add(rule.encode('idna').decode('ascii'))
+        except UnicodeError:
+            pass
+
+    def suffix_length(self, labels) -> int:
+        """Number of trailing ``labels`` that form the public suffix."""
+        for i in range(len(labels)):
+            candidate = '.'.join(labels[i:])
+            if candidate in self.exceptions:
+                return len(labels) - i - 1
+            if candidate in self.rules:
+                return len(labels) - i
+            if i + 1 < len(labels) and '.'.join(labels[i + 1:]) in self.wildcards:
+                return len(labels) - i
+        return 1
+
+    def registrable_domain(self, host: str) -> str:
+        """The suffix plus one label (``www.example.co.uk`` -> ``example.co.uk``); IPs and bare suffixes as-is."""
+        host = host.lower().rstrip('.')
+        if not host or host.startswith('[') or host.replace('.', '').isdigit():
+            return host
+        labels = host.split('.')
+        keep = self.suffix_length(labels) + 1
+        return '.'.join(labels[-keep:]) if keep <= len(labels) else host
+
+
+@lru_cache(maxsize=1)
+def public_suffixes() -> PublicSuffixList:
+    path = getattr(settings, 'SCRAPER_PUBLIC_SUFFIX_LIST', None)
+    if path:
+        return PublicSuffixList.from_file(path)
+    return PublicSuffixList(BUILTIN_PUBLIC_SUFFIXES)
+
+
+@lru_cache(maxsize=65536)
+def registrable_domain(host: str) -> str:
+    return public_suffixes().registrable_domain(host)
+
+
+def _host_of(netloc: str) -> str:
+    host = netloc.rpartition('@')[2]
+    if host.startswith('['):
+        return host[:host.find(']') + 1].lower()
+    return host.partition(':')[0].lower()
+
+
+def is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def _normalize_query(query: str) -> str:
+    params = [param for param in query.split('&') if param]
+    extra = getattr(settings, 'SCRAPER_TRACKING_PARAMS', ())
+    kept = [
+        param for param in params
+        if not is_tracking_param(name := param.partition('=')[0]) and name not in extra
+    ]
+    kept.sort()
+    return '&'.join(kept)
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form used to dedupe URLs: see the module docstring."""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{port}'
+    query = _normalize_query(parts.query) if parts.query else ''
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+def _compile(patterns):
+    patterns = [pattern for pattern in patterns if pattern]
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+
+class UrlFilter:
+    """Decide which URLs belong to a crawl or sitemap of ``root_url``.
+
+    A URL is in scope when it is http(s) (or relative), on the root's site
+    (same registrable domain) unless ``same_site`` is False, matches one of
+    the ``include`` regexes if any are given, and matches none of the
+    ``exclude`` regexes. :meth:`is_page` additionally rejects URLs that
+    point at images and other non-text files. Invalid patterns raise
+    ``ValueError``.
+    """
+
+    def __init__(self, root_url: str, include=None, exclude=None, same_site: bool = True):
+        if include is None:
+            include = getattr(settings, 'SCRAPER_URL_INCLUDE', ())
+        if exclude is None:
+            exclude = getattr(settings, 'SCRAPER_URL_EXCLUDE', ())
+        try:
+            self._include = _compile(include)
+            self._exclude = _compile(exclude)
+        except re.error as e:
+            raise ValueError(f"Invalid URL pattern: {e}")
+        self._non_page = _compile(re.escape(pattern) for pattern in NON_PAGE_PATTERNS)
+        self.site = registrable_domain(_host_of(urlsplit(root_url).netloc)) if same_site else None
+
+    def in_scope(self, url: str) -> bool:
+        scheme, _, rest = url.partition('://')
+        if rest:
+            if scheme.lower() not in ('http', 'https'):
+                return False
+            if self.site is not None:
+                netloc = rest.split('/', 1)[0].split('?', 1)[0].split('#', 1)[0]
+                if registrable_domain(_host_of(netloc)) != self.site:
+                    return False
+        elif ':' in url.split('/', 1)[0]:
+            # mailto:, javascript:, tel: and the like.
+            return False
+        if self._exclude is not None and self._exclude.search(url):
+            return False
+        return self._include is None or self._include.search(url) is not None
+
+    def is_page(self, url: str) -> bool:
+        return self._non_page.search(url.lower()) is None
+
+    def accepts(self, url: str) -> bool:
+        return self.in_scope(url) and self.is_page(url)
+
+    def filter(self, urls):
+        """Yield the accepted URLs of ``urls`` (any iterable), in order."""
+        accepts = self.accepts
+        return (url for url in urls if accepts(url))
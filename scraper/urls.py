@@ -5,5 +5,16 @@ from . import views
 urlpatterns = [
     path('fetch-sitemap/', views.fetch_sitemap_urls, name='fetch_sitemap'),
     path('get-page-size/', views.get_page_size, name='get_page_size'),
+    path('get-page-sizes/', views.get_page_sizes, name='get_page_sizes'),
     path('fetch-content/', views.fetch_page_content, name='fetch_content'),
+    path('crawl/', views.crawl_site, name='crawl_site'),
+    path('chunk/', views.chunk_documents, name='chunk_documents'),
+    path('ingest/', views.ingest_site, name='ingest_site'),
+    path('export/', views.export_data, name='export_data'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+    path('host-stats/', views.host_stats, name='host_stats'),
+    path('jobs/', views.submit_job, name='submit_job'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('jobs/<int:job_id>/results/', views.job_results, name='job_results'),
+    path('jobs/<int:job_id>/cancel/', views.cancel_job, name='cancel_job'),
 ] 
\ No newline at end of file
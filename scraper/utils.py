@@ -1,150 +1,161 @@
 import re
 import random
+import asyncio
+import time
 from typing import Optional
-from urllib.parse import urljoin, urlparse, unquote
-import xml.etree.ElementTree as ET
-from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
-import requests
-from collections import deque
-from langchain_text_splitters import MarkdownTextSplitter
-import tiktoken
-
-tokenizer = tiktoken.get_encoding("cl100k_base")
-
-XML_STYLESHEET_PATTERN = re.compile(r'<\?xml-stylesheet.*?\?>')
-DOCTYPE_PATTERN = re.compile(r'<!DOCTYPE.*?>')
-HTML_BODY_PATTERN = re.compile(r'</?(?:html|body).*?>')
-HTML_END_PATTERN = re.compile(r'</html>')
+from urllib.parse import urlparse, unquote
+from django.conf import settings
+from .browser_pool import browser_pool, page_slots
+from .chunking import format_header_metadata, split_markdown  # noqa: F401  (re-exported)
+from .cleaning import OUTPUT_TEXT, aclean_html_content, clean_html_content, extract_main_content  # noqa: F401  (re-exported)
+from .http_client import FetchResult, TIER_BROWSER, TIER_HTTP, http_fetch, looks_blocked, open_http_stream
+from .interception import ResourcePolicy, ResourceSavings, RouteInterceptor
+from .metrics import errors_total, record_fetch, span
+from .politeness import host_scheduler
+from .sitemap import SITEMAP_LOCATIONS, SitemapResolver, find_sitemap_start
+from .url_filter import NON_PAGE_PATTERNS, UrlFilter, registrable_domain
 
 USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
     'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
 ]
 
+FETCH_HEADERS = {
+    'Accept': 'application/xml,text/xml,application/xhtml+xml,text/html;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Cache-Control': 'no-cache',
+    'Pragma': 'no-cache'
+}
+
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+NON_PAGE_RE = re.compile('|'.join(map(re.escape, NON_PAGE_PATTERNS)), re.IGNORECASE)
+
+def __getattr__(name):
+    # ``tokenizer`` is re-exported too, but only loaded when asked for.
+    if name == 'tokenizer':
+        from .tokenizer import get_encoding
+        return get_encoding()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def clean_url(url: str) -> str:
     """Remove trailing colons, slashes, semicolons, and HTML tags from a URL."""
-    url = re.sub(r'<[^>]+>', '', url)  
-    url = url.strip()  
-    url = re.sub(r'[:/;]+$', '', url) 
-    return url
+    if '<' in url:
+        url = HTML_TAG_RE.sub('', url)
+    return url.strip().rstrip(':/;')
 
 def is_same_domain(root_url, link):
-    parsed_root = urlparse(root_url)
+    """True if ``link`` is relative or on the same registrable domain (``example.co.uk``) as ``root_url``."""
     parsed_link = urlparse(link)
     if not parsed_link.scheme and not parsed_link.netloc:
         return True
-
-    root_domain = '.'.join(parsed_root.netloc.split('.')[-2:])
-    link_domain = '.'.join(parsed_link.netloc.split('.')[-2:])
-    return root_domain == link_domain
+    root_host = urlparse(root_url).hostname or ''
+    return registrable_domain(root_host) == registrable_domain(parsed_link.hostname or '')
 
 def is_html_or_text(url) -> bool:
     """
     Check if the URL is valid and doesn't contain excluded patterns.
     Returns True if the URL is valid, False otherwise.
     """
-    excluded_patterns = [
-        '.png', '.jpg', '.jpeg', '.gif', '.svg',
-        '/cdn-cgi/', '.bib'
-    ]
-    url_lower = url.lower()
-    return not any(pattern.lower() in url_lower for pattern in excluded_patterns)
-
-async def fetch_content(url: str, browser) -> tuple[str, int]:
-    """Fetch and return the content of a file and its size using Playwright."""
+    return NON_PAGE_RE.search(url) is None
+
+async def fetch_content(url: str, browser, delay_ms: Optional[int] = None, clean: bool = True,
+                        savings: Optional[ResourceSavings] = None, output: str = OUTPUT_TEXT) -> tuple[str, int]:
+    """Fetch and return the content of a file and its size using Playwright.
+
+    Pages come from the browser's reusable slots (see ``PageSlots``). ``delay_ms``
+    is an opt-in politeness pause before navigating and defaults to
+    ``SCRAPER_FETCH_DELAY_MS`` (0). Pass ``clean=False`` to get the markup
+    itself, e.g. for sitemap XML, and ``output=OUTPUT_MARKDOWN`` for Markdown.
+
+    Subresources are filtered by ``SCRAPER_RESOURCE_PROFILE`` (see
+    :mod:`scraper.interception`); pass a ``ResourceSavings`` to learn what
+    was skipped.
+    """
     url = clean_url(url)
-    
-    context = await browser.new_context(
-        user_agent=random.choice(USER_AGENTS),
-        viewport={'width': 1920, 'height': 1080},
-        extra_http_headers={
-            'Accept': 'application/xml,text/xml,application/xhtml+xml,text/html;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache'
-        }
+    if delay_ms is None:
+        delay_ms = getattr(settings, 'SCRAPER_FETCH_DELAY_MS', 0)
+    if delay_ms:
+        await asyncio.sleep(delay_ms / 1000)
+
+    interceptor = RouteInterceptor(
+        ResourcePolicy.for_url(url),
+        savings,
+        stop_at_parse=getattr(settings, 'SCRAPER_RENDER_STOP_AT_PARSE', False),
     )
-    
+    wait_until = 'domcontentloaded' if interceptor.stop_at_parse else 'load'
     try:
-        page = await context.new_page()
-        await page.wait_for_timeout(1000)
-        
-        response = await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-        
-        if response and response.ok:
-            body = await response.body()
-            size = len(body)
-            
-            content = body.decode('utf-8', errors='ignore')
-            
-            if not content or '<html' in content:
-                content = await page.evaluate('''() => {
-                    const pre = document.querySelector('pre');
-                    if (pre) return pre.textContent;
-                    
-                    const xmlViewer = document.querySelector('#webkit-xml-viewer-source-xml');
-                    if (xmlViewer) return xmlViewer.innerHTML;
-                    
-                    const xmlContent = document.querySelector('body').innerText;
-                    if (xmlContent.includes('<?xml') || xmlContent.includes('<urlset') || xmlContent.includes('<sitemapindex'))
-                        return xmlContent;
-                        
-                    return document.documentElement.outerHTML;
-                }''')
-
-            content = clean_html_content(content)
-
-            return content, size
-        else:
-            print(f"Failed to fetch {url}: HTTP {response.status if response else 'No response'}")
-            return "", 0
+        async with page_slots(browser).page(random.choice(USER_AGENTS), FETCH_HEADERS) as page, \
+                interceptor.installed(page):
+            async with host_scheduler.slot(url) as slot:
+                with span('navigation'):
+                    response = await page.goto(url, wait_until=wait_until, timeout=60000)
+                if response is not None:
+                    slot.observe(response.status, response.headers.get('retry-after'))
+            interceptor.document_parsed()
+
+            if response and response.ok:
+                with span('body_decode'):
+                    body = await response.body()
+                    size = len(body)
+
+                    content = body.decode('utf-8', errors='ignore')
+
+                if not content or '<html' in content:
+                    content = await page.evaluate('''() => {
+                        const pre = document.querySelector('pre');
+                        if (pre) return pre.textContent;
+
+                        const xmlViewer = document.querySelector('#webkit-xml-viewer-source-xml');
+                        if (xmlViewer) return xmlViewer.innerHTML;
+
+                        const xmlContent = document.querySelector('body').innerText;
+                        if (xmlContent.includes('<?xml') || xmlContent.includes('<urlset') || xmlContent.includes('<sitemapindex'))
+                            return xmlContent;
+
+                        return document.documentElement.outerHTML;
+                    }''')
+
+                if clean:
+                    content = await aclean_html_content(content, output=output, base_url=url)
+
+                return content, size
+            else:
+                print(f"Failed to fetch {url}: HTTP {response.status if response else 'No response'}")
+                return "", 0
     except Exception as e:
         print(f"Error fetching {url}: {e}")
+        errors_total.inc(span='fetch_content', type=type(e).__name__)
         return "", 0
-    finally:
-        await context.close()
-
-def crawl_website(root_url, max_pages=100):
-    """Crawl website to find URLs."""
-    visited_urls = set()
-    urls_to_visit = deque([root_url])
-    url_info = []
 
-    while urls_to_visit and len(visited_urls) < max_pages:
-        url = urls_to_visit.popleft()
-        if url in visited_urls:
-            continue
-        visited_urls.add(url)
+async def fetch_url(url: str, render: bool = False, clean: bool = True,
+                    etag: Optional[str] = None, last_modified: Optional[str] = None,
+                    output: str = OUTPUT_TEXT) -> FetchResult:
+    """Fetch a URL with the cheapest tier that works.
 
-        try:
-            response = requests.get(url)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            if is_same_domain(root_url, url):
-                size = len(soup.get_text()) if is_html_or_text(url) else 0
-                url_info.append({
-                    'url': url,
-                    'selected': True,
-                    'processed': bool(size),
-                    'size': size
-                })
-
-                for link_tag in soup.find_all('a', href=True):
-                    link = link_tag['href']
-                    absolute_url = urljoin(url, link)
-                    if urlparse(absolute_url).scheme in ['http', 'https'] and is_same_domain(root_url, absolute_url):
-                        urls_to_visit.append(absolute_url)
-
-        except requests.RequestException:
-            url_info.append({
-                'url': url,
-                'selected': False,
-                'processed': False,
-                'size': 0
-            })
-
-    return url_info
+    The pooled HTTP client is tried first; Playwright is only used when the
+    response is blocked, looks JS-rendered, or ``render`` is True. The
+    returned ``FetchResult.tier`` records which one served the URL. Cleaned
+    content is text, or Markdown with ``output=OUTPUT_MARKDOWN``.
+    """
+    url = clean_url(url)
+    if not render:
+        started = time.perf_counter()
+        headers = {**FETCH_HEADERS, 'User-Agent': random.choice(USER_AGENTS)}
+        result, needs_browser = await http_fetch(url, headers, etag, last_modified)
+        record_fetch(TIER_HTTP, time.perf_counter() - started, result.ok and not needs_browser)
+        if not needs_browser:
+            if clean and result.content:
+                result.content = await aclean_html_content(result.content, output=output, base_url=url)
+            return result
+
+    started = time.perf_counter()
+    savings = ResourceSavings()
+    content, size = await browser_pool.run(fetch_content, url, clean=clean, savings=savings, output=output)
+    record_fetch(TIER_BROWSER, time.perf_counter() - started, bool(content))
+    result = FetchResult(url, content, size, tier=TIER_BROWSER)
+    result.savings = savings.to_dict()
+    return result
 
 def extract_page_name(url):
     """Extract a readable name from URL."""
@@ -164,223 +175,120 @@ def extract_page_name(url):
     
     return leaf if leaf else parsed_url.netloc.split(':')[0]
 
-def split_markdown(markdown_text, header_metadata, max_chunk_size, chunk_overlap_size):
-    """Split markdown text into chunks."""
-    splitter = MarkdownTextSplitter(chunk_size=max_chunk_size, chunk_overlap=chunk_overlap_size)
-    chunks = splitter.split_text(markdown_text)
-    final_chunks = [
-        f"{header_metadata}\n\n{chunk}" for chunk in chunks
-    ]
-    chunk_token_counts = [len(tokenizer.encode(chunk)) for chunk in final_chunks]
-    return list(zip(final_chunks, chunk_token_counts))
-
-def get_header_metadata(soup, url):
-    """Get metadata from page header."""
+def get_header_metadata(soup, url, breadcrumb=()):
+    """Get metadata from page header, naming the section a chunk belongs to if ``breadcrumb`` is given."""
     title = soup.title.string if soup.title else extract_page_name(url)
-    return f"Document Title: {title}. Document URL: {url}\n"
-
-async def fetch_sitemap(root_domain):
-    async def parse_sitemap(sitemap_url, browser):
-        try:
-            content, size = await fetch_content(sitemap_url, browser)
-            if not content:
-                return []
-
-            if not any(marker in content for marker in ('<?xml', '<urlset', '<sitemapindex')):
-                return []
-
-            content = content[content.find('<?xml'):]
-            content = XML_STYLESHEET_PATTERN.sub('', content)
-            content = DOCTYPE_PATTERN.sub('', content)
-            content = HTML_BODY_PATTERN.sub('', content)
-            content = HTML_END_PATTERN.sub('', content)
-            content = content.strip()
-
-            root = ET.fromstring(content)
-            urls = []
-            if root.tag.endswith('sitemapindex'):
-                for sitemap in root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}loc'):
-                    urls.extend(await parse_sitemap(sitemap.text, browser))
-            else:
-                for url in root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}loc'):
-                    urls.append({'url': url.text, 'size': size})
+    return format_header_metadata(title, url, breadcrumb)
 
-            return urls
-        except Exception as e:
-            print(f"Parse sitemap error: {str(e)}")
-            return []
+def build_url_record(entry, root_url, url_filter: Optional[UrlFilter] = None):
+    """Shape one sitemap entry for the API, or return None if it is off-domain or not a page.
 
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        try:
-            if not root_domain.startswith(('http://', 'https://')):
-                root_domain = 'https://' + root_domain
-
-            sitemap_locations = [
-                '/sitemap.xml',
-                '/sitemap_index.xml',
-                '/sitemap.php',
-                '/sitemap.txt'
-            ]
-
-            url_with_size = []
-
-            for location in sitemap_locations:
-                sitemap_url = urljoin(root_domain, location)
-                urls = await parse_sitemap(sitemap_url, browser)
-                if urls:
-                    url_with_size.extend(urls)
-                    break
-
-            filtered_urls = [
-                url for url in url_with_size
-                if is_same_domain(url.get('url'), root_domain) and is_html_or_text(url.get('url'))
-            ]
-
-            processed_urls = []
-            for url in filtered_urls:
-                size = url.get('size', 0)
-                processed_urls.append({
-                    'url': url.get('url'),
-                    'selected': True,
-                    'processed': False,
-                    'size': size
-                })
-
-            return processed_urls
-        except Exception as e:
-            print(f"An error occurred: {str(e)}")
-            return []
-        finally:
-            await browser.close()
-
-async def fetch_sitemap_with_custom_location(sitemap_custom_location):
-    async def parse_sitemap(sitemap_url, browser):
-        try:
-            content, size = await fetch_content(sitemap_url, browser)
-            if not content:
-                return []
-
-            if not any(marker in content for marker in ('<?xml', '<urlset', '<sitemapindex')):
-                return []
-
-            content = content[content.find('<?xml'):]
-            content = XML_STYLESHEET_PATTERN.sub('', content)
-            content = DOCTYPE_PATTERN.sub('', content)
-            content = HTML_BODY_PATTERN.sub('', content)
-            content = HTML_END_PATTERN.sub('', content)
-            content = content.strip()
-
-            root = ET.fromstring(content)
-            urls = []
-            if root.tag.endswith('sitemapindex'):
-                for sitemap in root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}loc'):
-                    urls.extend(await parse_sitemap(sitemap.text, browser))
-            else:
-                for url in root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}loc'):
-                    urls.append({'url': url.text, 'size': size})
-
-            return urls
-        except Exception as e:
-            print(f"Parse sitemap error: {str(e)}")
-            return []
-
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        try:
-            if not sitemap_custom_location.startswith(('http://', 'https://')):
-                sitemap_custom_location = 'https://' + sitemap_custom_location
-
-            url_with_size = []
-            urls = await parse_sitemap(sitemap_custom_location, browser)
-            if urls:
-                url_with_size.extend(urls)
-
-            filtered_urls = [
-                url for url in url_with_size
-                if is_same_domain(url.get('url'), sitemap_custom_location) and is_html_or_text(url.get('url'))
-            ]
-
-            processed_urls = []
-            for url in filtered_urls:
-                size = url.get('size', 0)
-                processed_urls.append({
-                    'url': url.get('url'),
-                    'selected': True,
-                    'processed': False,
-                    'size': size
-                })
-
-            return processed_urls
-        except Exception as e:
-            print(f"An error occurred: {str(e)}")
-            return []
-        finally:
-            await browser.close()
-
-async def get_page_content_size(url: str) -> Optional[int]:
+    Pass a ``UrlFilter`` built once for ``root_url`` when shaping many entries.
     """
-    Fetch the content size of the given URL.
+    url = entry.get('url')
+    if url_filter is None:
+        url_filter = UrlFilter(root_url)
+    if not url or not url_filter.accepts(url):
+        return None
+    return {
+        'url': url,
+        'selected': True,
+        'processed': False,
+        'size': entry.get('size', 0),
+        'lastmod': entry.get('lastmod')
+    }
+
+def build_url_records(url_with_size, root_url, url_filter: Optional[UrlFilter] = None):
+    """Filter sitemap entries to HTML pages on ``root_url``'s domain and shape them for the API."""
+    if url_filter is None:
+        url_filter = UrlFilter(root_url)
+    records = (build_url_record(entry, root_url, url_filter) for entry in url_with_size)
+    return [record for record in records if record is not None]
+
+async def stream_sitemap_document(sitemap_url: str):
+    """Yield ``(chunk, size)`` pairs of raw sitemap bytes.
+
+    Sitemaps are streamed over the pooled HTTP client; only blocked or failed
+    requests fall back to a Playwright fetch. ``size`` is the document size
+    the server announced (Content-Length), or 0 if it did not say.
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
+    url = clean_url(sitemap_url)
+    headers = {**FETCH_HEADERS, 'User-Agent': random.choice(USER_AGENTS)}
+    response = await open_http_stream(url, headers)
+    if response is not None:
         try:
-            context = await browser.new_context(
-                user_agent=random.choice(USER_AGENTS),
-                viewport={"width": 1920, "height": 1080}
-            )
-            page = await context.new_page()
-
-            response = await page.goto(url, wait_until="domcontentloaded", timeout=30000)
-            if not response or not response.ok:
-                return None
-
-            text_content = await page.evaluate('''() => {
-                const elementsToRemove = document.querySelectorAll('script, style, nav, header, footer');
-                elementsToRemove.forEach(el => el.remove());
-                const mainContent = document.querySelector('main, article, [role="main"], .content') || document.body;
-                return mainContent.innerText;
-            }''')
-
-            return len(text_content) if text_content else 0
+            if not looks_blocked(response.status_code, ''):
+                if response.is_success:
+                    size = int(response.headers.get('content-length') or 0)
+                    async for chunk in response.aiter_bytes():
+                        yield chunk, size
+                return
+        finally:
+            await response.aclose()
 
-        except Exception as e:
-            print(f"Error fetching page size for {url}: {e}")
-            return None
+    content, size = await browser_pool.run(fetch_content, url, clean=False)
+    if content:
+        yield content[find_sitemap_start(content):].encode('utf-8'), size
 
-        finally:
-            await browser.close()
+async def iter_sitemap_records(root_domain: str = None, custom_location: str = None,
+                               include=None, exclude=None):
+    """Yield API records for a site's sitemap entries while the sitemaps are still downloading.
 
-def clean_html_content(html_content: str) -> str:
-    """Clean HTML content and extract readable text.
-    
-    Args:
-        html_content: Raw HTML string
-    Returns:
-        Cleaned text content with preserved line breaks
+    ``custom_location`` names the sitemap directly; otherwise the usual
+    locations under ``root_domain`` are probed. ``include``/``exclude`` are
+    regexes a URL must (not) match, see ``UrlFilter``.
     """
+    target = custom_location or root_domain
+    if not target.startswith(('http://', 'https://')):
+        target = 'https://' + target
+    url_filter = UrlFilter(target, include, exclude)
+
+    resolver = SitemapResolver(stream_sitemap_document)
+    if custom_location:
+        entries = resolver.iter_entries(target)
+    else:
+        entries = resolver.iter_probe(target, SITEMAP_LOCATIONS)
+    async for entry in entries:
+        record = build_url_record(entry, target, url_filter)
+        if record is not None:
+            yield record
+
+async def fetch_sitemap(root_domain, include=None, exclude=None):
+    if not root_domain.startswith(('http://', 'https://')):
+        root_domain = 'https://' + root_domain
+    url_filter = UrlFilter(root_domain, include, exclude)
     try:
-        html_content = XML_STYLESHEET_PATTERN.sub('', html_content)
-        html_content = DOCTYPE_PATTERN.sub('', html_content)
-        html_content = HTML_BODY_PATTERN.sub('', html_content)
-        html_content = HTML_END_PATTERN.sub('', html_content)
-        
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        for element in soup(['script', 'style', 'meta', 'link', 'noscript']):
-            element.decompose()
-            
-        text = soup.get_text(separator=' ', strip=True)
-        
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        text = text.strip()
-        
-        return text
-        
+        resolver = SitemapResolver(stream_sitemap_document)
+        url_with_size = await resolver.probe(root_domain, SITEMAP_LOCATIONS)
+
+        return build_url_records(url_with_size, root_domain, url_filter)
     except Exception as e:
-        print(f"Error cleaning HTML content: {e}")
-        return ""
+        print(f"An error occurred: {str(e)}")
+        return []
 
+async def fetch_sitemap_with_custom_location(sitemap_custom_location, include=None, exclude=None):
+    if not sitemap_custom_location.startswith(('http://', 'https://')):
+        sitemap_custom_location = 'https://' + sitemap_custom_location
+    url_filter = UrlFilter(sitemap_custom_location, include, exclude)
+    try:
+        resolver = SitemapResolver(stream_sitemap_document)
+        url_with_size = await resolver.resolve(sitemap_custom_location)
 
+        return build_url_records(url_with_size, sitemap_custom_location, url_filter)
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        return []
+
+async def get_page_content_size(url: str) -> Optional[int]:
+    """
+    Fetch the content size of the given URL.
 
+    The size is the length of the page's main-content text, extracted from
+    the raw HTML by the same engine ``fetch_url`` uses. A browser is only
+    involved when the HTTP tier cannot serve the page.
+    """
+    result = await fetch_url(url, clean=False)
+    if not result.content:
+        return None
+    text = await aclean_html_content(result.content, main_content=True)
+    return len(text)
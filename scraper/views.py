@@ -1,15 +1,62 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from asgiref.sync import sync_to_async, async_to_sync
 import json
-from .utils import fetch_sitemap, fetch_sitemap_with_custom_location, get_page_content_size, fetch_content
-from .models import SitemapURL
-from playwright.async_api import async_playwright
+import time
+from .utils import (
+    aclean_html_content, extract_page_name, fetch_sitemap, fetch_sitemap_with_custom_location, iter_sitemap_records,
+)
+from .browser_pool import browser_pool
+from .cache import page_cache
+from .chunking import UNIT_CHARS, UNITS, achunk_batch
+from .cleaning import OUTPUT_MARKDOWN, OUTPUT_TEXT, OUTPUTS
+from .compression import content_compressor
+from .crawler import crawl_website, iter_crawl_website
+from .dedup import MODE_DROP, MODE_OFF, MODES, Deduplicator, fingerprint_store
+from .ingest import STAGES
+from .jobs import job_runner
+from .models import CrawlJob, SitemapURL
+from .interception import interception_totals
+from .metrics import labelled_stats_gauges, registry, stats_gauges
+from .politeness import host_scheduler
+from .tokenizer import resolve_encoding
+from .storage import EXPORT_CHUNKS, EXPORT_KINDS, aiter_export_batches, asave_sitemap_urls, source_domain
+from .incremental import refresh_sitemap_urls
+from .sizing import METHOD_AUTO, METHODS, iter_page_sizes
+from .streaming import CONTENT_TYPES, EVENT_RECORD, EVENT_SUMMARY, STREAM_NDJSON, stream_format, streaming_response
 import asyncio
 
-create_sitemap_url = sync_to_async(SitemapURL.objects.create)
+async def stream_url_records(records, domain, incremental=False):
+    """Pass URL records on as they arrive, saving them in batches, then summarize.
+
+    An incremental refresh needs the whole listing to find removed URLs, so
+    it runs once the stream is exhausted and its diff goes into the summary.
+    """
+    started = time.perf_counter()
+    batch_size = getattr(settings, 'SCRAPER_DB_BATCH_SIZE', 500)
+    first_url_seconds = None
+    count = saved = 0
+    batch = []
+    async for record in records:
+        if first_url_seconds is None:
+            first_url_seconds = round(time.perf_counter() - started, 3)
+        count += 1
+        batch.append(record)
+        yield EVENT_RECORD, record
+        if not incremental and len(batch) >= batch_size:
+            saved += await asave_sitemap_urls(batch, domain)
+            batch = []
+
+    summary = {'status': 'success', 'urls': count, 'first_url_seconds': first_url_seconds}
+    if incremental:
+        summary['diff'] = await refresh_sitemap_urls(batch, domain)
+    else:
+        summary['saved'] = saved + await asave_sitemap_urls(batch, domain)
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    yield EVENT_SUMMARY, summary
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -19,18 +66,95 @@ async def fetch_sitemap_urls(request):
         domain = data.get('domain')
         custom_location = data.get('custom_location')
 
+        include, exclude = data.get('include'), data.get('exclude')
+        try:
+            fmt = stream_format(request, data)
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
+
+        if fmt:
+            records = iter_sitemap_records(domain, custom_location, include, exclude)
+            return streaming_response(stream_url_records(
+                records, source_domain(domain or custom_location), incremental=bool(data.get('incremental'))
+            ), fmt)
+
         if custom_location:
-            urls = await fetch_sitemap_with_custom_location(custom_location)
+            urls = await fetch_sitemap_with_custom_location(custom_location, include, exclude)
         else:
-            urls = await fetch_sitemap(domain)
+            urls = await fetch_sitemap(domain, include, exclude)
+
+        if data.get('incremental'):
+            diff = await refresh_sitemap_urls(urls, source_domain(domain or custom_location))
+            return JsonResponse({
+                'status': 'success',
+                'urls': urls,
+                'diff': diff
+            })
+
+        await asave_sitemap_urls(urls, source_domain(domain or custom_location))
+
+        return JsonResponse({
+            'status': 'success',
+            'urls': urls
+        })
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def crawl_site(request):
+    try:
+        data = json.loads(request.body)
+        url = data.get('url')
+
+        if not url:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'URL is required'
+            }, status=400)
+
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+
+        max_pages = int(data.get('max_pages', 100))
+        include, exclude = data.get('include'), data.get('exclude')
+        try:
+            fmt = stream_format(request, data)
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
+        if fmt:
+            records = iter_crawl_website(url, max_pages=max_pages, max_depth=data.get('max_depth'),
+                                         include=include, exclude=exclude)
+            return streaming_response(stream_url_records(
+                records, source_domain(url), incremental=bool(data.get('incremental'))
+            ), fmt)
+
+        urls = await crawl_website(
+            url,
+            max_pages=max_pages,
+            max_depth=data.get('max_depth'),
+            include=include,
+            exclude=exclude,
+        )
+
+        if data.get('incremental'):
+            diff = await refresh_sitemap_urls(urls, source_domain(url))
+            return JsonResponse({
+                'status': 'success',
+                'urls': urls,
+                'diff': diff
+            })
 
-        for url_data in urls:
-            await create_sitemap_url(
-                url=url_data['url'],
-                size=url_data['size'],
-                selected=url_data['selected'],
-                processed=url_data['processed']
-            )
+        await asave_sitemap_urls(urls, source_domain(url))
 
         return JsonResponse({
             'status': 'success',
@@ -55,11 +179,12 @@ async def get_page_size(request):
                 'message': 'URL is required'
             }, status=400)
 
-        size = await get_page_content_size(url)
+        size, cache_status = await page_cache.page_size(url)
         
         return JsonResponse({
             'status': 'success',
-            'size': size
+            'size': size,
+            'cache': cache_status
         })
     except Exception as e:
         return JsonResponse({
@@ -67,22 +192,416 @@ async def get_page_size(request):
             'message': str(e)
         }, status=500)
 
-async def async_fetch_content(url):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
+async def stream_page_sizes(urls, method, fallback, concurrency):
+    started = time.perf_counter()
+    methods = {}
+    failed = 0
+    async for record in iter_page_sizes(urls, method, fallback, concurrency):
+        if record['size'] is None:
+            failed += 1
+        else:
+            methods[record['method']] = methods.get(record['method'], 0) + 1
+        yield EVENT_RECORD, record
+    yield EVENT_SUMMARY, {
+        'status': 'success',
+        'urls': len(urls),
+        'failed': failed,
+        'methods': methods,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def get_page_sizes(request):
+    try:
+        data = json.loads(request.body)
+        urls = data.get('urls')
+        method = data.get('method', METHOD_AUTO)
+        max_concurrency = getattr(settings, 'SCRAPER_PAGE_SIZE_CONCURRENCY', 8)
+        concurrency = min(int(data.get('concurrency', max_concurrency)), max_concurrency)
+        max_urls = getattr(settings, 'SCRAPER_PAGE_SIZE_MAX_URLS', 1000)
         try:
-            content, size = await fetch_content(url, browser)
-            return {'content': content, 'size': size}
-        finally:
-            await browser.close()
+            fmt = stream_format(request, data)
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
 
-def fetch_page_content(request):
+        if not urls or not isinstance(urls, list):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'urls must be a non-empty list'
+            }, status=400)
+        if len(urls) > max_urls:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'At most {max_urls} URLs can be sized per request'
+            }, status=400)
+        if method not in METHODS:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'method must be one of {", ".join(METHODS)}'
+            }, status=400)
+
+        return streaming_response(
+            stream_page_sizes(list(dict.fromkeys(urls)), method, bool(data.get('fallback')), concurrency),
+            fmt or STREAM_NDJSON
+        )
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+async def async_fetch_content(url, render=False, output=OUTPUT_TEXT):
+    result, cache_status = await page_cache.fetch(url, render=render, output=output)
+    response = {'content': result.content, 'size': result.size, 'tier': result.tier, 'cache': cache_status}
+    if result.savings is not None:
+        response['savings'] = result.savings
+    return response
+
+async def fetch_page_content(request):
     url = request.GET.get('url')
     if not url:
         return JsonResponse({'error': 'URL parameter is required'}, status=400)
     
     try:
-        result = async_to_sync(async_fetch_content)(url)
+        render = request.GET.get('render', '').lower() in ('1', 'true', 'yes')
+        output = request.GET.get('format', OUTPUT_TEXT)
+        if output not in OUTPUTS:
+            return JsonResponse({'error': f'format must be one of {", ".join(OUTPUTS)}'}, status=400)
+        result = await async_fetch_content(url, render=render, output=output)
         return JsonResponse(result)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+async def prepare_chunk_document(document):
+    """Fill in a chunking request document.
+
+    ``content`` is used as given; ``html`` and documents given only by URL
+    (which are fetched) are converted to Markdown so chunks follow sections.
+    """
+    url = document.get('url', '')
+    content = document.get('content')
+    if content is None and document.get('html'):
+        content = await aclean_html_content(document['html'], output=OUTPUT_MARKDOWN, base_url=url or None)
+    elif content is None and url:
+        result, _ = await page_cache.fetch(url, output=OUTPUT_MARKDOWN)
+        content = result.content
+    return {
+        'url': url,
+        'title': document.get('title') or (extract_page_name(url) if url else 'Untitled'),
+        'content': content or '',
+    }
+
+async def stream_chunk_records(documents, chunk_size, chunk_overlap, unit, dedup_mode=MODE_OFF, encoding=None):
+    """Chunk documents batch by batch, dropping or linking near-duplicates unless ``dedup_mode`` is off."""
+    started = time.perf_counter()
+    batch_size = getattr(settings, 'SCRAPER_CHUNK_BATCH_DOCUMENTS', 32)
+    dedup = Deduplicator(dedup_mode) if dedup_mode != MODE_OFF else None
+    chunk_count = token_count = 0
+    for start in range(0, len(documents), batch_size):
+        batch = await asyncio.gather(*(
+            prepare_chunk_document(document) for document in documents[start:start + batch_size]
+        ))
+        records = await achunk_batch(batch, chunk_size, chunk_overlap, unit, dedup, encoding)
+        for record in records:
+            if 'duplicate_of' in record:
+                if dedup_mode != MODE_DROP:
+                    yield EVENT_RECORD, record
+                continue
+            chunk_count += 1
+            token_count += record['tokens']
+            yield EVENT_RECORD, record
+    summary = {
+        'documents': len(documents),
+        'chunks': chunk_count,
+        'tokens': token_count,
+        'encoding': encoding,
+    }
+    if dedup is not None:
+        summary['dedup'] = dedup.report()
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    yield EVENT_SUMMARY, summary
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def chunk_documents(request):
+    try:
+        data = json.loads(request.body)
+        documents = data.get('documents')
+        chunk_size = int(data.get('chunk_size', 1000))
+        chunk_overlap = int(data.get('chunk_overlap', 200))
+        unit = data.get('unit', UNIT_CHARS)
+        dedup_mode = data.get('dedup') or getattr(settings, 'SCRAPER_DEDUP_MODE', MODE_OFF)
+        try:
+            encoding = resolve_encoding(data.get('encoding'))
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
+        try:
+            fmt = stream_format(request, data)
+        except ValueError as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
+
+        if not documents or not isinstance(documents, list):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'documents must be a non-empty list'
+            }, status=400)
+        if unit not in UNITS or chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'unit must be one of {", ".join(UNITS)} and 0 <= chunk_overlap < chunk_size'
+            }, status=400)
+        if dedup_mode not in MODES:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'dedup must be one of {", ".join(MODES)}'
+            }, status=400)
+
+        return streaming_response(
+            stream_chunk_records(documents, chunk_size, chunk_overlap, unit, dedup_mode, encoding),
+            fmt or STREAM_NDJSON
+        )
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+@require_http_methods(["GET"])
+async def cache_stats(request):
+    return JsonResponse({
+        'status': 'success',
+        'cache': page_cache.stats(),
+        'compression': content_compressor.stats()
+    })
+
+@require_http_methods(["GET"])
+async def metrics(request):
+    """Prometheus text exposition of the scraper's metrics."""
+    if not getattr(settings, 'SCRAPER_METRICS_ENABLED', True):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Metrics are disabled'
+        }, status=404)
+
+    gauges = (
+        stats_gauges('scraper_browser_pool', 'Browser pool utilization', browser_pool.stats())
+        + stats_gauges('scraper_page_cache', 'Page cache counters and size', page_cache.stats())
+        + stats_gauges('scraper_render_interception', 'Subresources seen and blocked while rendering',
+                       interception_totals.stats())
+        + stats_gauges('scraper_compression', 'Page bodies packed for storage and their sizes',
+                       content_compressor.stats())
+        + stats_gauges('scraper_dedup_index', 'Fingerprints held for near-duplicate detection',
+                       fingerprint_store.stats())
+        + labelled_stats_gauges('scraper_host', 'Per-host politeness state', 'host', host_scheduler.stats())
+    )
+    return HttpResponse(registry.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@require_http_methods(["GET"])
+async def host_stats(request):
+    return JsonResponse({
+        'status': 'success',
+        'hosts': host_scheduler.stats()
+    })
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def submit_job(request):
+    try:
+        data = json.loads(request.body)
+        kind = data.get('kind', CrawlJob.Kind.SITEMAP)
+
+        if kind == CrawlJob.Kind.SITEMAP:
+            custom_location = data.get('custom_location')
+            target = custom_location or data.get('domain')
+            options = {
+                'custom_location': bool(custom_location),
+                'incremental': bool(data.get('incremental')),
+                'include': data.get('include'),
+                'exclude': data.get('exclude'),
+            }
+        elif kind == CrawlJob.Kind.CRAWL:
+            target = data.get('url')
+            options = {
+                'max_pages': int(data.get('max_pages', 100)),
+                'max_depth': data.get('max_depth'),
+                'include': data.get('include'),
+                'exclude': data.get('exclude'),
+            }
+        elif kind == CrawlJob.Kind.INGEST:
+            target, options, message = ingest_options(data)
+            if message:
+                return JsonResponse({'status': 'error', 'message': message}, status=400)
+        else:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Unknown job kind: {kind}'
+            }, status=400)
+
+        if not target:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'A domain, custom_location or url is required'
+            }, status=400)
+
+        job = await job_runner.enqueue(kind, target, options)
+        return JsonResponse({
+            'status': 'success',
+            'job': job.to_dict()
+        }, status=202)
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+def ingest_options(data):
+    """``(target, options, error message)`` of an ingestion job request."""
+    custom_location = data.get('custom_location')
+    crawl_url = data.get('url') if data.get('crawl') else None
+    target = custom_location or crawl_url or data.get('domain')
+    max_pages = data.get('max_pages')
+    options = {
+        'custom_location': bool(custom_location),
+        'crawl': bool(crawl_url),
+        'max_pages': int(max_pages) if max_pages else None,
+        'max_depth': data.get('max_depth'),
+        'include': data.get('include'),
+        'exclude': data.get('exclude'),
+        'render': bool(data.get('render')),
+        'reprocess': bool(data.get('reprocess')),
+        'chunk_size': int(data.get('chunk_size', 1000)),
+        'chunk_overlap': int(data.get('chunk_overlap', 200)),
+        'unit': data.get('unit', UNIT_CHARS),
+        'dedup': data.get('dedup') or getattr(settings, 'SCRAPER_DEDUP_MODE', MODE_OFF),
+        'encoding': data.get('encoding') or None,
+        'concurrency': data.get('concurrency') or {},
+    }
+    if not target:
+        return None, options, 'A domain, custom_location or url (with crawl) is required'
+    if options['unit'] not in UNITS or options['chunk_size'] <= 0 \
+            or not 0 <= options['chunk_overlap'] < options['chunk_size']:
+        return target, options, f'unit must be one of {", ".join(UNITS)} and 0 <= chunk_overlap < chunk_size'
+    if options['dedup'] not in MODES:
+        return target, options, f'dedup must be one of {", ".join(MODES)}'
+    try:
+        options['encoding'] = resolve_encoding(options['encoding'])
+    except ValueError as e:
+        return target, options, str(e)
+    concurrency = options['concurrency']
+    if not isinstance(concurrency, dict) or not set(concurrency) <= set(STAGES) \
+            or not all(isinstance(value, int) and value > 0 for value in concurrency.values()):
+        return target, options, f'concurrency must map stages ({", ".join(STAGES)}) to positive integers'
+    return target, options, None
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def ingest_site(request):
+    """Start an ingestion job: discover, fetch, clean, chunk and store a whole site."""
+    try:
+        data = json.loads(request.body)
+        target, options, message = ingest_options(data)
+        if message:
+            return JsonResponse({
+                'status': 'error',
+                'message': message
+            }, status=400)
+
+        job = await job_runner.enqueue(CrawlJob.Kind.INGEST, target, options)
+        return JsonResponse({
+            'status': 'success',
+            'job': job.to_dict()
+        }, status=202)
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+@require_http_methods(["GET"])
+async def export_data(request):
+    """Stream stored chunks (``kind=chunks``) or cached pages (``kind=pages``) as JSON Lines."""
+    kind = request.GET.get('kind', EXPORT_CHUNKS)
+    if kind not in EXPORT_KINDS:
+        return JsonResponse({'status': 'error', 'message': f"kind must be one of {', '.join(EXPORT_KINDS)}"},
+                            status=400)
+    try:
+        batch_size = min(10000, max(1, int(request.GET.get('batch_size',
+                                                           getattr(settings, 'SCRAPER_EXPORT_BATCH_SIZE', 1000)))))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'batch_size must be an integer'}, status=400)
+
+    async def lines():
+        async for records in aiter_export_batches(kind, request.GET.get('domain') or None, batch_size):
+            yield ''.join(json.dumps(record, cls=DjangoJSONEncoder) + '\n' for record in records)
+
+    response = StreamingHttpResponse(lines(), content_type=CONTENT_TYPES[STREAM_NDJSON])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.jsonl"'
+    return response
+
+@require_http_methods(["GET"])
+async def job_status(request, job_id):
+    await job_runner.recover()
+    try:
+        job = await CrawlJob.objects.aget(pk=job_id)
+    except CrawlJob.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+
+    return JsonResponse({
+        'status': 'success',
+        'job': job.to_dict()
+    })
+
+@require_http_methods(["GET"])
+async def job_results(request, job_id):
+    await job_runner.recover()
+    try:
+        job = await CrawlJob.objects.aget(pk=job_id)
+    except CrawlJob.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+        page_size = min(1000, max(1, int(request.GET.get('page_size', 100))))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'page and page_size must be integers'}, status=400)
+
+    queryset = SitemapURL.objects.filter(jobs=job).order_by('id')
+    offset = (page - 1) * page_size
+    total = await queryset.acount()
+    urls = [
+        url async for url in queryset.values('url', 'size', 'selected', 'processed')[offset:offset + page_size]
+    ]
+
+    return JsonResponse({
+        'status': 'success',
+        'job': job.to_dict(),
+        'page': page,
+        'page_size': page_size,
+        'total': total,
+        'urls': urls
+    })
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def cancel_job(request, job_id):
+    await job_runner.recover()
+    if not await CrawlJob.objects.filter(pk=job_id).aexists():
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+
+    cancelled = await job_runner.cancel(job_id)
+    job = await CrawlJob.objects.aget(pk=job_id)
+    return JsonResponse({
+        'status': 'success' if cancelled else 'error',
+        'message': 'Cancellation requested' if cancelled else 'Job already finished',
+        'job': job.to_dict()
+    }, status=200 if cancelled else 409)
@@ -13,4 +13,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scraper_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from scraper.lifespan import LifespanMiddleware  # noqa: E402  (needs the app registry)
+
+application = LifespanMiddleware(django_application)
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,6 +52,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'scraper.metrics.TimingMiddleware',
+    'scraper.http_client.HttpClientMiddleware',
 ]
 
 ROOT_URLCONF = 'scraper_project.urls'
@@ -80,6 +84,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock when a transaction begins (Django 5.1+), so a second
+        # writer waits for it instead of failing to upgrade its read lock; see
+        # SCRAPER_SQLITE_PRAGMAS below for the rest of the connection tuning.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'} if django.VERSION >= (5, 1) else {},
     }
 }
 
@@ -125,3 +133,124 @@ CORS_ALLOWED_ORIGINS = [
 
 # Optional: Allow credentials (cookies, authorization headers)
 # CORS_ALLOW_CREDENTIALS = True
+
+
+# Scraper runtime
+# Browsers are launched lazily and shared by every request in the process.
+SCRAPER_BROWSER_POOL_ENABLED = True
+SCRAPER_BROWSER_POOL_SIZE = 2
+SCRAPER_BROWSER_MAX_PAGES = 200
+SCRAPER_BROWSER_MAX_MEMORY_MB = 2048
+SCRAPER_PAGES_PER_BROWSER = 8
+# Optional politeness pause before each Playwright navigation.
+SCRAPER_FETCH_DELAY_MS = 0
+
+# Sitemap index traversal
+SCRAPER_SITEMAP_CONCURRENCY = 8
+SCRAPER_SITEMAP_MAX_DEPTH = 5
+
+# Site crawler (per-host limits come from the SCRAPER_HOST_* politeness settings)
+SCRAPER_CRAWL_WORKERS = 16
+SCRAPER_CRAWL_MAX_DEPTH = None
+SCRAPER_CRAWL_RESPECT_ROBOTS = True
+
+# Background jobs run in-process; this many at a time.
+SCRAPER_JOB_WORKERS = 2
+SCRAPER_JOB_RECOVER = False  # fail jobs a stopped process left queued/running; only for a single server process
+
+# Discovered URLs are upserted this many rows per INSERT statement.
+SCRAPER_DB_BATCH_SIZE = 500
+
+# Page cache for /fetch-content/ and /get-page-size/ (memory LRU + ScrapedData).
+SCRAPER_CACHE_ENABLED = True
+SCRAPER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SCRAPER_CACHE_TTL = 3600  # seconds before an entry is revalidated
+SCRAPER_CACHE_PERSIST = True
+
+# Pages fetched at once while checking for changes in an incremental refresh.
+SCRAPER_REFRESH_CONCURRENCY = 8
+
+# HTML cleaning runs in worker processes (None: one per CPU, 0: inline).
+SCRAPER_CLEAN_WORKERS = None
+SCRAPER_HTML_PARSER = 'auto'  # 'auto', 'html.parser', 'lxml' or 'selectolax'
+SCRAPER_CLEAN_BATCH_BYTES = 32 * 1024  # smaller documents are batched together
+SCRAPER_CLEAN_BATCH_SIZE = 16
+SCRAPER_CLEAN_BATCH_WAIT_MS = 2
+
+# Content extraction: keep only a page's main content (readability-style).
+SCRAPER_EXTRACT_MAIN_CONTENT = True
+SCRAPER_EXTRACT_MAIN_SELECTORS = ['main', 'article', '[role="main"]', '.content']
+SCRAPER_EXTRACT_REMOVE_SELECTORS = []
+
+# Chunking: tokenizer threads and documents per batch.
+SCRAPER_TOKENIZER_THREADS = 4
+SCRAPER_CHUNK_BATCH_DOCUMENTS = 32
+# Tokenizer encodings (see scraper/tokenizer.py); fill the cache with `manage.py warm_tokenizer`.
+SCRAPER_TOKENIZER_ENCODING = 'cl100k_base'
+SCRAPER_TOKENIZER_ENCODINGS = ['cl100k_base', 'o200k_base']  # what requests may pick with "encoding"
+SCRAPER_TOKENIZER_CACHE_DIR = BASE_DIR / '.tiktoken'  # exported as TIKTOKEN_CACHE_DIR at startup unless that is set
+SCRAPER_TOKENIZER_WARMUP = True  # load the default encoding in the background at ASGI startup
+
+# Batch page sizing (/api/get-page-sizes/): URLs measured at once, URLs per request.
+SCRAPER_PAGE_SIZE_CONCURRENCY = 8
+SCRAPER_PAGE_SIZE_MAX_URLS = 1000
+
+# Per-host politeness for every outgoing request (see scraper/politeness.py).
+SCRAPER_POLITENESS_ENABLED = True
+SCRAPER_HOST_RATE = 20  # requests/sec per host, 0 for no limit; robots Crawl-delay lowers it
+SCRAPER_HOST_BURST = 20
+SCRAPER_HOST_CONCURRENCY = 4  # starting in-flight limit, adapted between the bounds below
+SCRAPER_HOST_MIN_CONCURRENCY = 1
+SCRAPER_HOST_MAX_CONCURRENCY = 32
+SCRAPER_HOST_TARGET_LATENCY_MS = 3000  # slower responses shrink the limit
+SCRAPER_RETRY_ATTEMPTS = 2
+SCRAPER_RETRY_BASE_DELAY_MS = 500
+SCRAPER_RETRY_MAX_DELAY_MS = 30000
+SCRAPER_MAX_RETRY_AFTER = 120  # seconds; longer Retry-After values are capped
+
+# Browser rendering: subresources aborted via route interception (see scraper/interception.py).
+SCRAPER_RESOURCE_PROFILE = 'text'  # 'off', 'assets' or 'text'
+SCRAPER_BLOCKED_DOMAINS = []  # analytics/ad domains to block on top of the built-in list
+SCRAPER_RESOURCE_ALLOWLIST = {}  # per site, e.g. {'example.com': ['stylesheet', 'cdn.example.net']}
+SCRAPER_RENDER_STOP_AT_PARSE = False  # return once the document is parsed, abort later non-script subresources
+
+# Metrics: Prometheus text at /metrics; send this header to get a per-request timing breakdown.
+SCRAPER_METRICS_ENABLED = True
+SCRAPER_TIMING_HEADER = 'X-Scraper-Timing'
+
+# URL scope and normalization for sitemaps and crawls (see scraper/url_filter.py)
+SCRAPER_URL_INCLUDE = []  # regexes; if any are given a URL must match one
+SCRAPER_URL_EXCLUDE = []  # regexes; URLs matching any are dropped
+SCRAPER_TRACKING_PARAMS = []  # query parameters to drop on top of utm_*, gclid, fbclid, ...
+SCRAPER_PUBLIC_SUFFIX_LIST = None  # path to public_suffix_list.dat; None uses the built-in snapshot
+
+# Near-duplicate pages and chunks in /api/chunk/ (see scraper/dedup.py).
+SCRAPER_DEDUP_MODE = 'off'  # used when a request sends no dedup; requests opt in with 'drop' or 'link' (emit a record naming the original)
+SCRAPER_DEDUP_PAGE_DISTANCE = 6  # max differing bits of the 64-bit SimHash; small edits move a page 0-8 bits
+SCRAPER_DEDUP_CHUNK_DISTANCE = 3  # stricter: chunks are short and often templated
+SCRAPER_DEDUP_MIN_WORDS = 20  # shorter chunks are always kept
+SCRAPER_DEDUP_PERSIST = True  # keep fingerprints per site in ContentFingerprint
+
+# Ingestion pipeline (/api/ingest/, see scraper/ingest.py): workers per stage and queue bounds.
+SCRAPER_INGEST_QUEUE_SIZE = 64  # items waiting between two stages before the earlier one blocks
+SCRAPER_INGEST_FETCH_CONCURRENCY = 16
+SCRAPER_INGEST_CLEAN_CONCURRENCY = 8
+SCRAPER_INGEST_CHUNK_CONCURRENCY = 2
+SCRAPER_INGEST_STORE_BATCH = 64  # documents written per transaction
+
+# Storage (see scraper/compression.py and scraper/storage.py).
+SCRAPER_COMPRESSION = 'auto'  # 'zstd' (needs zstandard), 'zlib', 'auto' or 'off'
+SCRAPER_COMPRESSION_LEVEL = None  # codec default: zstd 3, zlib 6
+SCRAPER_COMPRESSION_MIN_BYTES = 256  # shorter bodies are stored as text
+SCRAPER_COMPRESSION_DICT_SAMPLES = 32  # pages per site before its dictionary is trained, 0 for none
+SCRAPER_COMPRESSION_DICT_SIZE = 32 * 1024
+# Per-connection only: WAL is stored in the database file, so it is switched on once
+# at deploy time with `python manage.py sqlite_journal wal` (see scraper/storage.py).
+SCRAPER_SQLITE_PRAGMAS = {
+    'synchronous': 'normal',  # applied only in WAL mode; commits don't wait for an fsync of the database file
+    'busy_timeout': 20000,  # ms a writer waits for the lock before "database is locked"
+    'temp_store': 'memory',
+    'cache_size': -32000,  # KiB of page cache per connection
+    'mmap_size': 128 * 1024 * 1024,
+}
+SCRAPER_EXPORT_BATCH_SIZE = 1000  # rows read per query by /api/export/
@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from scraper import views as scraper_views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('scraper.urls')),
+    path('metrics', scraper_views.metrics, name='metrics'),
 ]